@@ -22,21 +22,32 @@ the full power of Python's extensions, if they want (e.g., numpy, scipy, etc.)
 #  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
 #  for more details.                                                           #
 # ##############################################################################
+import functools
+import hashlib
+import inspect
 import logging
 import math
+import multiprocessing
 import pickle
 import shutil
+import sys
+import threading
 import warnings
+from collections import OrderedDict
+from collections.abc import Mapping
 from multiprocessing.pool import ThreadPool
 from copy import copy
 from typing import Union
 
-from GMXMMPBSA.calculation import InteractionEntropyCalc, C2EntropyCalc
+from GMXMMPBSA.calculation import InteractionEntropyCalc, C2EntropyCalc, interaction_entropy
 
 from GMXMMPBSA import infofile, main, utils
-from GMXMMPBSA.exceptions import NoFileExists
+from GMXMMPBSA.bundle import BundleTable, read_results
+from GMXMMPBSA.exceptions import NoFileExists, OutputError
 from GMXMMPBSA.fake_mpi import MPI
-from GMXMMPBSA.amber_outputs import IEout, C2out
+from GMXMMPBSA.amber_outputs import (IEout, C2out, DecompOut, PairDecompStore, BindingStatistics, parse_rank_file,
+                                     parse_partial_rank_file, rank_extra_files)
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import os
@@ -108,8 +119,7 @@ def _setup_data(data: pd.DataFrame, level=0, iec2=False, name=None, index=None,
     cont = {'line_plot_data': None, 'bar_plot_data': None, 'heatmap_plot_data': None}
     if level == 0:
         options = {'iec2': iec2}
-        data.name = data.name[-1]
-        line_plot_data = data[:-3].to_frame()
+        line_plot_data = data[:-3].rename(data.name[-1]).to_frame()
         if inmemory:
             cont['line_plot_data'] = [line_plot_data, options, change]
         else:
@@ -157,16 +167,35 @@ def _setup_data(data: pd.DataFrame, level=0, iec2=False, name=None, index=None,
             cont['heatmap_plot_data'] = [parquet_file % 'hp', {}, change]
     elif level == 3:
         # Select only the "tot" column, remove the level, change first level of columns to rows and remove the mean
-        # index
-        tempdf = data.loc[:, data.columns.get_level_values(2) == 'tot']
-        line_plot_data = tempdf[:-3].groupby(axis=1, level=0, sort=False).sum().reindex(
-            columns=index).sum(axis=1).rename(name).to_frame()
-        bar_plot_data = tempdf[:-3].groupby(axis=1, level=0, sort=False).sum().agg(
-            [lambda x: x.mean(), lambda x: x.std(ddof=0), lambda x: x.std(ddof=0)/ math.sqrt(len(x))]
-            ).reindex(columns=index)
-        bar_plot_data.index = ['Average', 'SD', 'SEM']
-        heatmap_plot_data = tempdf.loc[["Average"]].droplevel(level=2, axis=1).stack().droplevel(level=0).reindex(
-            columns=index, index=index)
+        # index. It is computed on the array with the level codes, since the pairs are many more than the residues
+        columns = data.columns
+        tot = (columns.codes[2] == columns.levels[2].get_loc('tot') if 'tot' in columns.levels[2] else
+               np.zeros(len(columns), dtype=bool))
+        values = data.to_numpy()[:, tot]
+        res1, res2 = columns.codes[0][tot], columns.codes[1][tot]
+        # position of the residues of the levels in index (-1 if not in index)
+        pos1 = pd.Index(index).get_indexer(columns.levels[0])
+        pos2 = pd.Index(index).get_indexer(columns.levels[1])
+        # sum of the pairs of each residue (frame x index)
+        res_sum = np.full((len(values) - 3, len(index)), np.nan)
+        if len(res1):
+            starts = np.flatnonzero(np.r_[True, res1[1:] != res1[:-1]])
+            # the pairs of each residue are together when returned by get_decomp_energy
+            if len(starts) != len(np.unique(res1)):
+                order = np.argsort(res1, kind='stable')
+                res1, res2, values = res1[order], res2[order], values[:, order]
+                starts = np.flatnonzero(np.r_[True, res1[1:] != res1[:-1]])
+            used = res1[starts]
+            in_index = pos1[used] >= 0
+            res_sum[:, pos1[used][in_index]] = np.add.reduceat(values[:-3], starts, axis=1)[:, in_index]
+        line_plot_data = pd.Series(np.nansum(res_sum, axis=1), index=data.index[:-3], name=name).to_frame()
+        sd = res_sum.std(axis=0)
+        bar_plot_data = pd.DataFrame([res_sum.mean(axis=0), sd, sd / math.sqrt(len(res_sum))],
+                                     index=['Average', 'SD', 'SEM'], columns=index)
+        heatmap = np.full((len(index), len(index)), np.nan)
+        in_index = (pos1[res1] >= 0) & (pos2[res2] >= 0)
+        heatmap[pos2[res2][in_index], pos1[res1][in_index]] = values[-3, in_index]
+        heatmap_plot_data = pd.DataFrame(heatmap, index=index, columns=index)
         if memory:
             cont['line_plot_data'] = [line_plot_data, {}, change]
             cont['bar_plot_data'] = [bar_plot_data, dict(groups=_itemdata_properties(bar_plot_data)), change]
@@ -184,6 +213,8 @@ def _setup_data(data: pd.DataFrame, level=0, iec2=False, name=None, index=None,
 def calculatestar(arg):
     func, args, id, t = arg
     data = args.get('data')
+    if isinstance(data, FrameSelection):
+        data = data.get()
     level = args.get('level', 0)
     iec2 = args.get('iec2', False)
     name = args.get('name')
@@ -192,6 +223,293 @@ def calculatestar(arg):
     return t, id, func(data, level, iec2, name, index, memory, id)
 
 
+class FrameSelection:
+    """
+    Data of a get_ana_data task, selected with keys from a DataFrame when the task runs. The partial selections are
+    kept in selections, since the items of a chart share them
+    """
+
+    def __init__(self, frame: pd.DataFrame, keys, selections: dict):
+        self.frame = frame
+        self.keys = keys
+        self.selections = selections
+
+    def get(self):
+        data = self.frame
+        for i, key in enumerate(self.keys, 1):
+            if i == len(self.keys):
+                return data[key]
+            partial = (id(self.frame),) + self.keys[:i]
+            if partial not in self.selections:
+                self.selections[partial] = data[key]
+            data = self.selections[partial]
+        return data
+
+
+class LazyResults(Mapping):
+    """
+    Read-only dict access to the results of the API (normal, mutant, mutant-normal, decomp_normal and decomp_mutant),
+    which are loaded by sections when they are used for first time. loaders has the loader of the section of each key,
+    which returns the results of all the keys of the section
+    """
+
+    def __init__(self, loaders: dict):
+        self._loaders = loaders
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        if key not in self._data:
+            loader = self._loaders[key]
+            with self._lock:
+                if key not in self._data:
+                    self._data.update(loader())
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._loaders)
+
+    def __len__(self):
+        return len(self._loaders)
+
+    def loaded(self):
+        """ Returns the keys already loaded """
+        return [key for key in self._loaders if key in self._data]
+
+    def __copy__(self):
+        # the copy shares the sections, so they are still loaded only once
+        result = LazyResults.__new__(LazyResults)
+        result.__dict__.update(self.__dict__)
+        return result
+
+    def __getstate__(self):
+        # the API is sent between processes (gmx_MMPBSA_ana), so all the sections are loaded before
+        return {'_data': {key: self[key] for key in self._loaders}}
+
+    def __setstate__(self, state):
+        self._data = state['_data']
+        self._loaders = dict.fromkeys(self._data)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({list(self._loaders)}, loaded={self.loaded()})'
+
+
+class QueryCache:
+    """
+    LRU cache of the results of the MMPBSA_API queries, keyed by the query and its arguments (frame window included).
+    The memory of the cached results is limited to max_memory (MB), and the least recently used results are discarded
+    first. The results are shared by all the calls that hit them, so they must not be modified in place. The objects
+    shared by several results are counted in each one of them
+    """
+
+    def __init__(self, max_memory=512):
+        self.max_memory = max_memory
+        self.hits = 0
+        self.misses = 0
+        self.memory = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, func, refs=()):
+        """
+        Returns the cached result of key, or computes it with func and caches it. refs are the objects identified by
+        their id in key, which are kept alive with the result so their ids are not reused
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        result = func()
+        size = _memory_usage(result)
+        with self._lock:
+            if key not in self._entries and size <= self.max_memory * 2 ** 20:
+                self._entries[key] = (result, size, refs)
+                self.memory += size
+                while self.memory > self.max_memory * 2 ** 20:
+                    _, (_, old_size, _) = self._entries.popitem(last=False)
+                    self.memory -= old_size
+        return result
+
+    def info(self):
+        """ Returns the hit/miss statistics and the memory (MB) used """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, entries=len(self._entries),
+                        memory=self.memory / 2 ** 20, max_memory=self.max_memory)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.memory = 0
+
+    def __getstate__(self):
+        # the cached results are not sent with the API to other processes
+        return dict(max_memory=self.max_memory)
+
+    def __setstate__(self, state):
+        self.__init__(state['max_memory'])
+
+
+def _memory_usage(obj):
+    """ Approximate memory (bytes) of a query result. The objects shared inside the result are counted once """
+    size = 0
+    seen = set()
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, pd.Series):
+            size += obj.to_numpy().nbytes
+        elif isinstance(obj, pd.DataFrame):
+            size += sum(dtype.itemsize * count for dtype, count in obj.dtypes.value_counts().items()) * len(obj)
+        elif isinstance(obj, np.ndarray):
+            size += obj.nbytes
+        else:
+            size += sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                stack.extend(obj.keys())
+                stack.extend(obj.values())
+            elif isinstance(obj, (list, tuple)):
+                stack.extend(obj)
+    return size
+
+
+def _query_key(value, refs):
+    """
+    Hashable key of a query argument. Lists become tuples, and the objects that are not hashable (like the summaries
+    passed to get_binding) are identified by their id and added to refs
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(_query_key(x, refs) for x in value)
+    try:
+        hash(value)
+    except TypeError:
+        refs.append(value)
+        return 'id', id(value)
+    return value
+
+
+def cached_query(method):
+    """
+    Caches the results of a MMPBSA_API query in its QueryCache. verbose only changes the warnings, so it is not part
+    of the key
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        refs = []
+        key = (method.__name__,) + tuple((name, _query_key(value, refs)) for name, value in
+                                         list(arguments.arguments.items())[1:] if name != 'verbose')
+        return self.cache.get(key, lambda: method(self, *args, **kwargs), refs)
+    return wrapper
+
+
+def _options_key(value):
+    """ Key of the options of get_ana_data that doesn't depend on the order of the dicts """
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _options_key(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_options_key(x) for x in value)
+    return value
+
+
+class ChartStore:
+    """
+    Persistent cache of the chart data of get_ana_data in the temporary folder. The chart data of each section is
+    written to a folder named by the digest of the results, the time settings and the options of the section, with an
+    index of the parquet files of every item. The folders are reused when the same results are opened again with the
+    same options, and the least recently used ones are removed when the temporary folder takes more than max_size (MB)
+    """
+    index_name = 'charts.pkl'
+
+    def __init__(self, temp_folder: Path, max_size=2048, reuse=True):
+        self.temp_folder = temp_folder
+        self.max_size = max_size
+        self.reuse = reuse
+        self._sections = {}
+
+    def folder(self, section, *key) -> Path:
+        """ Returns the folder of the chart data of section and key, and reads its index """
+        digest = hashlib.sha256(repr((section,) + _options_key(key)).encode()).hexdigest()[:24]
+        folder = self.temp_folder.joinpath(f'{section}_{digest}')
+        folder.mkdir(exist_ok=True)
+        if section not in self._sections:
+            self._sections[section] = folder, self._read(folder), {}
+        return folder
+
+    def get(self, section, id):
+        """ Returns the stored chart data of the item id, if all its files are still present """
+        folder, index, _ = self._sections[section]
+        if id not in index:
+            return None
+        cont = {}
+        for k, v in index[id].items():
+            if v is None:
+                cont[k] = None
+                continue
+            fname = folder.joinpath(v[0])
+            if not fname.exists():
+                return None
+            cont[k] = [fname.as_posix(), v[1], True]
+        return cont
+
+    def put(self, section, id, cont):
+        """ Adds the chart data of the item id to the index when it was written to parquet files """
+        if all(v is None or isinstance(v[0], str) for v in cont.values()):
+            self._sections[section][2][id] = {k: v if v is None else (Path(v[0]).name, v[1]) for k, v in
+                                              cont.items()}
+
+    def close(self):
+        """ Writes the indexes and removes the least recently used folders when over the size limit """
+        for folder, index, new in self._sections.values():
+            if new:
+                index.update(new)
+                tmp_file = folder.joinpath(f'{self.index_name}.{os.getpid()}')
+                with open(tmp_file, 'wb') as ofile:
+                    pickle.dump(index, ofile, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_file, folder.joinpath(self.index_name))
+            elif folder.joinpath(self.index_name).exists():
+                # the modification time of the index is the last use of the folder
+                os.utime(folder.joinpath(self.index_name))
+        self._evict({folder for folder, _, _ in self._sections.values()})
+        self._sections.clear()
+
+    def _read(self, folder: Path):
+        if not self.reuse or not folder.joinpath(self.index_name).exists():
+            return {}
+        try:
+            with open(folder.joinpath(self.index_name), 'rb') as ifile:
+                return pickle.load(ifile)
+        except Exception as e:
+            logging.warning(f'The chart data index in {folder} could not be read ({e}). It will be created again')
+            return {}
+
+    def _evict(self, keep):
+        folders = []
+        total = 0
+        for folder in self.temp_folder.iterdir():
+            if not folder.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in folder.iterdir() if f.is_file())
+            index_file = folder.joinpath(self.index_name)
+            last_use = index_file.stat().st_mtime if index_file.exists() else folder.stat().st_mtime
+            folders.append((last_use, size, folder))
+            total += size
+        for last_use, size, folder in sorted(folders, key=lambda x: x[0]):
+            if total <= self.max_size * 2 ** 20:
+                break
+            if folder not in keep:
+                shutil.rmtree(folder, ignore_errors=True)
+                total -= size
+
+
 class MMPBSA_API():
     """ Main class that holds all the Free Energy data """
 
@@ -203,9 +521,15 @@ class MMPBSA_API():
         self.fname = None
         self.settings = settings
         self.temp_folder = None
+        self.results_digest = None
+        # mutant, mutant-normal and decomp_mutant results of every mutation of the alanine scanning
+        self._scan = {}
 
+        # cache_memory: memory (MB) of the cached query results
+        # use_temporal_data: reuse the chart data of previous sessions kept in the temporary folder
+        # temp_max_size: size (MB) of the temporary folder over which the least recently used chart data is removed
         self._settings = {'data_on_disk': False, 'create_temporal_data': True, 'use_temporal_data': True, 
-                          'overwrite_temp': True}
+                          'overwrite_temp': True, 'cache_memory': 512, 'temp_max_size': 2048}
         if settings:
             not_keys = []
             for k, v in settings.items():
@@ -215,11 +539,26 @@ class MMPBSA_API():
                 self._settings[k] = v
             if not_keys:
                 logging.warning(f'Not keys {not_keys}. Will be ignored')
+        self.cache = QueryCache(self._settings['cache_memory'])
 
     def setting_time(self, timestart=0, timestep=0, timeunit='ps'):
         self.starttime = timestart
         self.timestep = timestep
         self.timeunit = timeunit
+        # the index of the cached results changes
+        self.cache.clear()
+
+    def cache_info(self):
+        """
+        Get the statistics of the query cache
+        Returns: dict with the hits, misses, entries, memory and max_memory (MB) of the cache
+
+        """
+        return self.cache.info()
+
+    def clear_cache(self):
+        """ Removes all the cached query results """
+        self.cache.clear()
 
     def setup_file(self, fname: Union[Path, str]):
         self.fname = fname if isinstance(fname, Path) else Path(fname)
@@ -274,6 +613,46 @@ class MMPBSA_API():
         """
         return self.app_namespace.FILES
 
+    def get_mutations(self):
+        """
+        Get the mutations of the alanine scanning, in the order they were calculated. The mutant results of the API
+        are the ones of the first mutation until another one is selected with set_mutation
+        Returns: list with the label of every mutation (empty without alanine scanning)
+
+        """
+        return list(self.app_namespace.INFO['mut_strs'])
+
+    def set_mutation(self, mutation: str):
+        """
+        Selects the mutation of the alanine scanning whose results are the mutant, mutant-normal and decomp_mutant
+        results of all the get_* methods
+        Args:
+            mutation: label of the mutation (see get_mutations)
+
+        """
+        mutations = self.get_mutations()
+        if mutation not in mutations:
+            raise ValueError(f"{mutation} is not a mutation of the alanine scanning. Valid mutations are: "
+                             f"{', '.join(mutations)}")
+        INFO = self.app_namespace.INFO
+        INFO['mut_str'] = mutation
+        INFO['mutant_index'] = INFO['mutant_indexes'][mutations.index(mutation)] if INFO['mutant_indexes'] else \
+            INFO['mutant_index']
+        if mutation == mutations[0]:
+            self.data = copy(self._oringin)
+        else:
+            def loader(key):
+                def load():
+                    value = self._oringin[key]
+                    if key in ('mutant', 'mutant-normal', 'decomp_mutant'):
+                        # the section (energy or decomposition) is loaded for all the mutations at once
+                        value = self._scan[mutation][key]
+                    return {key: value}
+                return load
+
+            self.data = LazyResults({key: loader(key) for key in self._oringin})
+        self.cache.clear()
+
     def _get_frames_index(self, framestype, startframe, endframe, interval):
 
         if framestype == 'energy':
@@ -291,6 +670,7 @@ class MMPBSA_API():
     def arg2tuple(arg):
         return arg if isinstance(arg, tuple) else tuple(arg)
 
+    @cached_query
     def get_energy(self, etype: tuple = None, model: tuple = None, mol: tuple = None, term: tuple = None,
                     remove_empty_terms=True, threshold=0.01, startframe=None, endframe=None, interval=1, verbose=True):
         """
@@ -333,13 +713,13 @@ class MMPBSA_API():
                 for m in temp_model_keys:
                     if m in self.data[et]:
                         e_map[et][m] = {}
-                        model_energy = {}
+                        columns = []
+                        frames, means = self._model_frames(et, m)
                         temp_mol_keys = mol or tuple(self.data[et][m].keys())
 
                         for m1 in temp_mol_keys:
                             if m1 in self.data[et][m]:
                                 e_map[et][m][m1] = []
-                                model_energy[m1] = {}
                                 temp_terms_keys = ([x for x in self.data[et][m][m1].keys() if x in term] if term
                                                    else tuple(self.data[et][m][m1].keys()))
                                 valid_terms = []
@@ -350,15 +730,15 @@ class MMPBSA_API():
                                             warnings.warn(f'Not term {t} in etype {et} > model {m} > mol {m1}')
                                     elif (
                                         not remove_empty_terms
-                                        or abs(self.data[et][m][m1][t].mean())
-                                        >= threshold or t in ['GSOLV', 'GGAS', 'TOTAL']
+                                        or abs(means[(m1, t)]) >= threshold
+                                        or t in ['GSOLV', 'GGAS', 'TOTAL']
                                     ):
                                         e_map[et][m][m1].append(t)
-                                        model_energy[m1][t] = self.data[et][m][m1][t][s:e:interval]
+                                        columns.append((m1, t))
                                         valid_terms.append(t)
                             elif verbose:
                                 warnings.warn(f'Not mol {m1} in etype {et} > model {m}')
-                        energy[et][m], summ_df[et][m] = self._model2df(model_energy, index)
+                        energy[et][m], summ_df[et][m] = self._model2df(frames, columns, s, e, interval, index)
 
                     elif verbose:
                         warnings.warn(f'Not model {m} in etype {et}')
@@ -371,15 +751,35 @@ class MMPBSA_API():
                         {('ΔGeff', t): v for t, v in v2['delta']['TOTAL'].to_dict().items()}, index=[0])
         return {'map': e_map, 'data': energy, 'summary': summ_df, 'correlation': corr}
 
-    def _model2df(self, energy, index):
-        energy_df = pd.DataFrame(flatten(energy), index=index)
-        s = pd.concat([energy_df.mean(), energy_df.std(ddof=0), energy_df.std(ddof=0) / math.sqrt(len(index))], axis=1)
-        s.columns = ['Average', 'SD', 'SEM']
-        summary_df = s.T
+    def _model_frames(self, et, m):
+        """
+        Get all the frames of the terms of etype > model as a single array, so each query only slices the frame window
+        and the terms it selects. It is computed once and kept in the query cache
+        Returns: the pd.DataFrame (mol, term) with all the frames and a dict with the mean of each term over all the
+                 frames
+
+        """
+        def model_frames():
+            columns = [(m1, t) for m1, terms in self.data[et][m].items() for t in terms]
+            if not columns:
+                return pd.DataFrame(), {}
+            values = np.column_stack([np.asarray(self.data[et][m][m1][t], dtype=float) for m1, t in columns])
+            return (pd.DataFrame(values, columns=pd.MultiIndex.from_tuples(columns)),
+                    dict(zip(columns, values.mean(axis=0).tolist())))
+        return self.cache.get(('frames', et, m), model_frames)
+
+    def _model2df(self, frames, columns, s, e, interval, index):
+        energy_df = frames.iloc[s:e:interval][columns] if columns else pd.DataFrame(index=range(len(index)))
+        energy_df.index = index
+        values = energy_df.to_numpy()
+        sd = values.std(axis=0)
+        summary_df = pd.DataFrame([values.mean(axis=0), sd, sd / math.sqrt(len(index))],
+                                  index=['Average', 'SD', 'SEM'], columns=energy_df.columns)
         df = pd.concat([energy_df, summary_df])
         df.index.name = index.name
         return df, summary_df
 
+    @cached_query
     def get_nmode_entropy(self, nmtype: tuple = None, mol: tuple = None, term: tuple = None,
                           startframe=None, endframe=None, interval=None, verbose=True):
 
@@ -393,28 +793,30 @@ class MMPBSA_API():
             if et in self.data:
                 energy[et] = {'nmode': {}}
                 summ_df[et] = {'nmode': {}}
-                model_energy = {}
+                columns = []
+                frames, _ = self._model_frames(et, 'nmode')
                 temp_mol_keys = mol or tuple(self.data[et]['nmode'].keys())
                 for m1 in temp_mol_keys:
                     if m1 in self.data[et]['nmode']:
-                        model_energy[m1] = {}
                         temp_terms_keys = ([x for x in self.data[et]['nmode'][m1].keys() if x in term] if term
                                            else tuple(self.data[et]['nmode'][m1].keys()))
                         valid_terms = []
                         for t in temp_terms_keys:
                             if t in self.data[et]['nmode'][m1]:
-                                model_energy[m1][t] = self.data[et]['nmode'][m1][t][s:e:interval]
+                                columns.append((m1, t))
                                 valid_terms.append(t)
                             elif verbose:
                                 warnings.warn(f'Not term {t} in etype {et} > mol {m1}')
                     elif verbose:
                         warnings.warn(f'Not mol {m1} in etype {et}')
-                energy[et]['nmode'], summ_df[et]['nmode'] = self._model2df(model_energy, index)
+                energy[et]['nmode'], summ_df[et]['nmode'] = self._model2df(frames, columns, s, e, interval,
+                                                                            index)
 
             elif verbose:
                 warnings.warn(f'Not nmtype {et} in data')
         return {'map': emapping(energy), 'data': energy, 'summary': summ_df}
 
+    @cached_query
     def get_qh_entropy(self, qhtype: tuple = None, mol: tuple = None, term: tuple = None, verbose=True):
         temp_print_keys = qhtype or tuple(x for x in ['normal', 'mutant', 'mutant-normal'] if x in self.data)
         entropy = {}
@@ -440,6 +842,7 @@ class MMPBSA_API():
         df = pd.DataFrame(flatten(entropy))
         return {'map': emapping(entropy), 'data': df, 'summary': df.xs(('delta', 'TOTAL'), level=[1, 2], axis=1)}
 
+    @cached_query
     def get_c2_entropy(self, c2type: tuple = None, startframe=None, endframe=None, interval=None, verbose=True):
         temp_print_keys = c2type or tuple(x for x in ['normal', 'mutant', 'mutant-normal'] if x in self.data and
                                           self.data[x])
@@ -468,6 +871,7 @@ class MMPBSA_API():
                                                             index=['Average', 'SD', 'SEM'])
         return {'map': emapping(entropy), 'data': entropy_df, 'summary': entropy_df}
 
+    @cached_query
     def get_ie_entropy(self, ietype: tuple = None, startframe=None, endframe=None, interval=None,
                        ie_segment = 25, verbose=True):
         temp_print_keys = ietype or tuple(x for x in ['normal', 'mutant', 'mutant-normal'] if x in self.data and
@@ -515,10 +919,12 @@ class MMPBSA_API():
     def _merge_ent(res_dict: dict, d: dict):
         for e1, v1 in d.items():
             if e1 not in res_dict:
-                res_dict[e1] = v1
+                # copied, so the cached results of the entropy queries are not updated
+                res_dict[e1] = dict(v1)
             else:
                 res_dict[e1].update(v1)
 
+    @cached_query
     def get_entropy(self, etype: tuple = None, model: tuple = None, mol: tuple = None, term: tuple = None,
                     nmstartframe=None, nmendframe=None, nminterval=1, startframe=None, endframe=None, interval=None,
                     ie_segment=25, verbose=True):
@@ -555,27 +961,34 @@ class MMPBSA_API():
         result = {}
         start = list(self.frames.keys()).index(startframe) if startframe else startframe
         end = list(self.frames.keys()).index(endframe) + 1 if endframe else endframe
-        for key in allowed_met:
-            if key in self.data[etype]:
-                edata = self.data[etype][key]['delta']['GGAS'][start:end:interval]
-                if method == 'ie':
-                    ie = InteractionEntropyCalc(edata,
-                                                {'general':
-                                                    dict(
-                                                        temperature=self.app_namespace.INPUT['general']['temperature'],
-                                                        startframe=startframe, endframe=endframe, interval=interval
-                                                    )},
-                                                key, iesegment=ie_segment)
-                    result[key] = IEout({}, key)
-                    result[key].parse_from_dict(dict(data=ie.data, sigma=ie.ie_std, iedata=ie.iedata))
-                else:
-                    c2 = C2EntropyCalc(edata, {'general':
-                                                    dict(temperature=self.app_namespace.INPUT['general'][
-                                                        'temperature'])}, key)
-                    result[key] = C2out(key)
-                    result[key].parse_from_dict(dict(c2data=c2.c2data, c2_std=c2.c2_std, sigma=c2.ie_std, c2_ci=c2.c2_ci))
+        ggas = {key: self.data[etype][key]['delta']['GGAS'][start:end:interval] for key in allowed_met
+                if key in self.data[etype]}
+        if method == 'ie' and ggas:
+            # All the models have the same frames, so they are computed in a single batch
+            ie_data = dict(zip(ggas, interaction_entropy(list(ggas.values()),
+                                                         self.app_namespace.INPUT['general']['temperature'])))
+        for key, edata in ggas.items():
+            if method == 'ie':
+                ie = InteractionEntropyCalc(edata,
+                                            {'general':
+                                                dict(
+                                                    temperature=self.app_namespace.INPUT['general']['temperature'],
+                                                    startframe=startframe, endframe=endframe, interval=interval
+                                                )},
+                                            key, iesegment=ie_segment, data=ie_data[key])
+                result[key] = IEout({}, key)
+                result[key].parse_from_dict(dict(data=ie.data, sigma=ie.ie_std, iedata=ie.iedata))
+            else:
+                general = self.app_namespace.INPUT['general']
+                # the bootstrap settings are not defined in old info files
+                c2 = C2EntropyCalc(edata, {'general': {var: general[var] for var in
+                                                       ['temperature', 'c2_samples', 'c2_seed', 'c2_block',
+                                                        'c2_threads'] if var in general}}, key)
+                result[key] = C2out(key)
+                result[key].parse_from_dict(dict(c2data=c2.c2data, c2_std=c2.c2_std, sigma=c2.ie_std, c2_ci=c2.c2_ci))
         return result
 
+    @cached_query
     def get_binding(self, energy_summary=None, entropy_summary=None, verbose=True):
         binding  = {}
         b_map = {}
@@ -590,8 +1003,7 @@ class MMPBSA_API():
                     binding[et][em] = {}
                     b_map[et][em] = []
                     mol = 'complex' if self.app_namespace.FILES.stability else 'delta'
-                    edata = emv[mol]['TOTAL']
-                    edata.name = 'ΔH'
+                    edata = emv[mol]['TOTAL'].rename('ΔH')
                     if et in entropy_summary:
                         if mol == 'delta':
                             corr[et][em] = {}
@@ -604,7 +1016,7 @@ class MMPBSA_API():
                                 entdata = etv[em]['c2']
                             else:
                                 entdata = etv[mol]['TOTAL']
-                            entdata.name = '-TΔS'
+                            entdata = entdata.rename('-TΔS')
                             dg = edata.loc['Average'] + entdata.loc['Average']
                             std = utils.get_std(edata.loc['SD'], entdata.loc['SD'])
                             dgdata = pd.Series([dg, std, std], index=['Average', 'SD', 'SEM'], name='ΔG')
@@ -617,6 +1029,167 @@ class MMPBSA_API():
                             corr[et][em] = pd.DataFrame(c, index=[0])
         return {'map': b_map, 'data': binding, 'correlation': corr}
 
+    def _decomp_source(self, et, m, m1, c):
+        """
+        Get the decomposition energies of etype > model > mol > component as a single array, so the DataFrames are
+        built without visiting every residue (or pair) and term
+        Returns: the residue labels, the residue indexes of the rows (row x 1 for per-residue, row x 2 for pairwise),
+                 the terms, the function that returns the energies (frame x row x term) of a frame slice and an array
+                 of rows, and the energies read in memory (if any)
+
+        """
+        def decomp_source():
+            output = self.data[et][m][m1]
+            if isinstance(output, PairDecompStore):
+                t = output.allowed_tokens.index(c)
+                first = np.repeat(np.arange(len(output.residues)), np.diff(output.indptr))
+                return (list(output.residues), np.column_stack((first, output.indices)), list(output.terms),
+                        lambda frames, rows: output._energies(t, frames, rows), None)
+            if isinstance(output, DecompOut) and output.array is not None:
+                t = output.allowed_tokens.index(c)
+                return (list(output.residues), np.arange(len(output.residues))[:, None], list(output.terms),
+                        lambda frames, rows: output.array[t, frames][:, rows], None)
+            if isinstance(output[c], BundleTable):
+                paths, dataset = output[c].rows()
+                terms = list(dict.fromkeys(path[-1] for path in paths))
+                # the rows are (residue[, residue], term), with all the terms of a residue (or pair) together
+                if len(paths) % len(terms) == 0 and all(path[-1] == terms[k % len(terms)]
+                                                        for k, path in enumerate(paths)):
+                    residues, labels = self._residue_labels(tuple(path[:-1]) for path in paths[::len(terms)])
+                    def energies(frames, rows):
+                        values = np.asarray(dataset[(rows[:, None] * len(terms) + np.arange(len(terms))).ravel(),
+                                                    frames])
+                        return values.reshape(len(rows), len(terms), values.shape[1]).transpose(2, 0, 1)
+                    return residues, labels, terms, energies, None
+            # dicts of EnergyVectors (like DecompBinding)
+            pairwise = self.app_namespace.INPUT['decomp']['idecomp'] not in [1, 2]
+            items = [((r1, r2), v2) for r1, v1 in output[c].items() for r2, v2 in v1.items()] if pairwise else [
+                ((r1,), v1) for r1, v1 in output[c].items()]
+            terms = list(items[0][1]) if items else list(DecompOut.terms)
+            residues, labels = self._residue_labels(label for label, v in items)
+            values = np.zeros((len(self.frames), len(items), len(terms)))
+            for k, (label, v) in enumerate(items):
+                for i, t in enumerate(terms):
+                    values[:, k, i] = v[t]
+            return residues, labels, terms, lambda frames, rows: values[frames][:, rows], values
+        return self.cache.get(('decomp', et, m, m1, c), decomp_source)
+
+    @staticmethod
+    def _residue_labels(labels):
+        """ Returns the residues of the (residue[, residue]) labels and the labels as residue indexes """
+        residues = {}
+        codes = [[residues.setdefault(res, len(residues)) for res in label] for label in labels]
+        return list(residues), np.array(codes, dtype=int).reshape(len(codes), -1)
+
+    @staticmethod
+    def _selection_rank(selected, residues, codes):
+        """
+        Returns the position of each row in the selected residues (-1 if not selected). Without selection, the rows
+        keep the stored order
+        """
+        if not selected:
+            return np.arange(len(codes))
+        rank = np.full(len(residues), -1)
+        residue_index = {res: i for i, res in enumerate(residues)}
+        for pos, res in enumerate(selected):
+            if res in residue_index and rank[residue_index[res]] < 0:
+                rank[residue_index[res]] = pos
+        return rank[codes]
+
+    def _decomp_block(self, et, m, m1, c, res1, res2, term, res_threshold, frames, verbose):
+        """
+        Get the energies (frame + Average, SD and SEM x residue (or pair) x term) of the selected residues and terms
+        of etype > model > mol > component
+        Returns: the map, the residue labels, the residue indexes of the rows and the terms of the block, and the
+                 energies
+
+        """
+        residues, labels, terms, energies, _ = self._decomp_source(et, m, m1, c)
+        pairwise = labels.shape[1] == 2
+        where = f'etype {et} > model {m} > mol {m1} > comp {c}'
+
+        key1 = self._selection_rank(res1, residues, labels[:, 0])
+        if res1 and verbose:
+            stored = set(labels[:, 0].tolist())
+            for r1 in res1:
+                if r1 not in residues or residues.index(r1) not in stored:
+                    warnings.warn(f'Not res {r1} in {where} ')
+        elif not res1 and pairwise:
+            # the pairs are sorted by the first appearance of their first residue, so they are kept together
+            _, first = np.unique(labels[:, 0], return_index=True)
+            rank = np.zeros(len(residues), dtype=int)
+            rank[labels[first, 0]] = first
+            key1 = rank[labels[:, 0]]
+        key2 = self._selection_rank(res2, residues, labels[:, 1]) if pairwise else np.zeros(len(labels), dtype=int)
+        rows = np.flatnonzero((key1 >= 0) & (key2 >= 0))
+        rows = rows[np.lexsort((key2[rows], key1[rows]))]
+        if pairwise and res2 and verbose:
+            selected = {}
+            for i, j in labels[rows].tolist():
+                selected.setdefault(i, set()).add(j)
+            for i in dict.fromkeys(labels[key1 >= 0, 0].tolist()):
+                for r2 in res2:
+                    if r2 not in residues or residues.index(r2) not in selected.get(i, ()):
+                        warnings.warn(f'Not res {r2} in {where} > res {residues[i]}')
+
+        term_keys = [t for t in term if t in terms] if term else terms
+        if verbose:
+            for t in (term or ()):
+                if t not in terms:
+                    warnings.warn(f'Not term {t} in {where}')
+        values = energies(frames, rows)[..., [terms.index(t) for t in term_keys]]
+        mean = values.mean(axis=0)
+        std = values.std(axis=0)
+        values = np.concatenate((values, mean[None], std[None], std[None] / math.sqrt(len(values))))
+
+        # The per-residue threshold is applied to the total energy, so the residues are kept if it is not selected.
+        # A pair without it contributes 0
+        if res_threshold > 0 and (pairwise or 'tot' in term_keys):
+            tot = mean[:, term_keys.index('tot')] if 'tot' in term_keys else np.zeros(len(rows))
+            if pairwise:
+                # the contribution of a residue is the sum of its pairs
+                contrib = np.bincount(labels[rows, 0], weights=tot, minlength=len(residues))
+                keep = np.abs(contrib[labels[rows, 0]]) >= res_threshold
+            else:
+                keep = np.abs(tot) >= res_threshold
+            rows, values = rows[keep], values[:, keep]
+
+        # all the residues (or pairs) have the same terms
+        term_keys = list(term_keys)
+        e_map = {}
+        for label in labels[rows].tolist():
+            if pairwise:
+                e_map.setdefault(residues[label[0]], {})[residues[label[1]]] = term_keys
+            else:
+                e_map[residues[label[0]]] = term_keys
+        return e_map, (residues, labels[rows], term_keys), values.reshape(len(values), -1)
+
+    @staticmethod
+    def _decomp_columns(blocks):
+        """
+        Builds the (mol, comp, residue[, residue], term) MultiIndex of the decomp blocks from the level codes. blocks
+        are (mol, comp, residues, residue indexes of the rows, terms)
+        """
+        nres = blocks[0][3].shape[1]
+        mols = sorted({b[0] for b in blocks})
+        comps = sorted({b[1] for b in blocks})
+        residues = sorted({res for b in blocks for res in b[2]})
+        terms = sorted({t for b in blocks for t in b[4]})
+        res_code = {res: i for i, res in enumerate(residues)}
+        codes = [[] for _ in range(3 + nres)]
+        for mol, comp, block_residues, labels, block_terms in blocks:
+            size = len(labels) * len(block_terms)
+            block_codes = np.array([res_code[res] for res in block_residues], dtype=int)
+            codes[0].append(np.full(size, mols.index(mol)))
+            codes[1].append(np.full(size, comps.index(comp)))
+            for k in range(nres):
+                codes[2 + k].append(np.repeat(block_codes[labels[:, k]], len(block_terms)))
+            codes[-1].append(np.tile([terms.index(t) for t in block_terms], len(labels)))
+        columns = pd.MultiIndex(levels=[mols, comps] + [residues] * nres + [terms],
+                                codes=[np.concatenate(c) for c in codes], verify_integrity=False)
+        return columns.remove_unused_levels()
+
+    @cached_query
     def get_decomp_energy(self, etype: tuple = None, model: tuple=None, mol: tuple = None, contribution: tuple = None,
                           res1: tuple = None, res2: tuple = None, term: tuple = None, res_threshold=0.5,
                           startframe=None, endframe=None, interval=None, verbose=True):
@@ -646,8 +1219,8 @@ class MMPBSA_API():
                         if verbose:
                             warnings.warn(f'Not model {m} in etype {et}')
                     else:
-                        model_decomp_energy = {}
-
+                        blocks = []
+                        values = []
                         e_map[etkey][m] = {}
                         temp_mol_keys = mol or tuple(self.data[et][m].keys())
 
@@ -656,92 +1229,29 @@ class MMPBSA_API():
                                 if verbose:
                                     warnings.warn(f'Not mol {m1} in etype {et} > model {m}')
                             else:
-                                model_decomp_energy[m1] = {}
                                 e_map[etkey][m][m1] = {}
                                 temp_comp_keys = contribution or tuple(self.data[et][m][m1].keys())
                                 for c in temp_comp_keys:
                                     if c not in self.data[et][m][m1]:
                                         if verbose:
                                             warnings.warn(f'Not component {c} in etype {et} > model {m} > mol {m1}')
+                                    elif c == 'BDC':
+                                        # issue #269
+                                        if verbose:
+                                            warnings.warn('Warning: Empty BDC component...')
                                     else:
-                                        model_decomp_energy[m1][c] = {}
-                                        e_map[etkey][m][m1][c] = {}
-                                        temp_res1_keys = res1 or tuple(self.data[et][m][m1][c].keys())
-
-                                        for r1 in temp_res1_keys:
-                                            remove = False
-                                            if r1 not in self.data[et][m][m1][c]:
-                                                if verbose:
-                                                    warnings.warn(f'Not res {r1} in etype {et} > model {m} > mol {m1} > comp {c} ')
-                                            else:
-                                                temp_energy = {}
-
-                                                if self.app_namespace.INPUT['decomp']['idecomp'] in [1, 2]:
-                                                    temp_emap = []
-                                                    temp_terms_keys = term or tuple(self.data[et][m][m1][c][r1].keys())
-
-                                                    for t in temp_terms_keys:
-                                                        if t not in self.data[et][m][m1][c][r1]:
-                                                            if verbose:
-                                                                warnings.warn(f'Not term {t} in etype {et} > model {m} '
-                                                                              f'> mol {m1} > comp {c} > res {r1}')
-                                                        else:
-                                                            temp_energy[t] = self.data[et][m][m1][c][r1][t][s:e:interval]
-                                                            temp_emap.append(t)
-                                                            mean = temp_energy[t].mean()
-                                                            std = temp_energy[t].std()
-                                                            sem = std / math.sqrt(len(temp_energy[t]))
-                                                            temp_energy[t] = temp_energy[t].append([mean, std, sem])
-                                                            if (t == 'tot' and res_threshold > 0 and
-                                                                    abs(mean) < res_threshold):
-                                                                remove = True
-                                                else:
-                                                    temp_emap = {}
-                                                    temp_res2_keys = res2 or tuple(self.data[et][m][m1][c][r1].keys())
-                                                    # for per-wise only since for per-residue we get the tot value
-                                                    res1_contrib = 0
-                                                    for r2 in temp_res2_keys:
-                                                        if r2 not in self.data[et][m][m1][c][r1]:
-                                                            if verbose:
-                                                                warnings.warn(f'Not res {r2} in etype {et} > model {m}'
-                                                                              f' > mol {m1} > comp {c} > res {r1}')
-                                                        else:
-                                                            temp_energy_r2 = {}
-                                                            temp_emap[r2] = []
-                                                            # energy[et][m][m1][c][r1][r2] = {}
-                                                            temp_terms_keys = term or tuple(self.data[et][m][m1][c][r1][r2].keys())
-                                                            for t in temp_terms_keys:
-                                                                if t not in self.data[et][m][m1][c][r1][r2]:
-                                                                    if verbose:
-                                                                        warnings.warn(
-                                                                        f'Not term {t} in etype {et} > model {m} '
-                                                                        f'> mol {m1} > comp {c} > res {r1} > res {r2}')
-                                                                else:
-                                                                    temp_emap[r2].append(t)
-                                                                    temp_energy_r2[t] = self.data[et][m][m1][c][r1][
-                                                                                            r2][t][s:e:interval]
-                                                                    mean = temp_energy_r2[t].mean()
-                                                                    std = temp_energy_r2[t].std()
-                                                                    sem = std / math.sqrt(len(temp_energy_r2[t]))
-                                                                    temp_energy_r2[t] = temp_energy_r2[t].append([
-                                                                        mean, std, sem])
-                                                                    if t == 'tot':
-                                                                        res1_contrib += mean
-                                                            if temp_energy_r2:
-                                                                temp_energy[r2] = temp_energy_r2
-                                                    if res_threshold > 0 and float(abs(res1_contrib)) < res_threshold:
-                                                        remove = True
-                                                if not remove:
-                                                    model_decomp_energy[m1][c][r1] = temp_energy
-                                                    e_map[etkey][m][m1][c][r1] = temp_emap
-                                # issue #269
-                                if model_decomp_energy[m1].get('BDC') is not None:
-                                    model_decomp_energy[m1].pop('BDC')
-                                    e_map[etkey][m][m1].pop('BDC')
-                                    if verbose:
-                                        warnings.warn('Warning: Empty BDC component...')
-
-                        decomp_energy[etkey][m] = pd.DataFrame(flatten(model_decomp_energy), index=index)
+                                        e_map[etkey][m][m1][c], block, block_values = self._decomp_block(
+                                            et, m, m1, c, res1, res2, term, res_threshold, slice(s, e, interval),
+                                            verbose)
+                                        if block_values.shape[1]:
+                                            blocks.append((m1, c) + block)
+                                            values.append(block_values)
+
+                        if blocks:
+                            decomp_energy[etkey][m] = pd.DataFrame(np.concatenate(values, axis=1), index=index,
+                                                                   columns=self._decomp_columns(blocks))
+                        else:
+                            decomp_energy[etkey][m] = pd.DataFrame(index=index)
         return {'map': e_map, 'data': decomp_energy}
 
     def get_ana_data(self, energy_options=None, entropy_options=None, decomp_options=None, performance_options=None,
@@ -750,21 +1260,32 @@ class MMPBSA_API():
         d = {}
         corr = {}
         ecorr = None
-        memory_args = dict(temp_path=self.temp_folder)
+        # The chart data written to parquet files is kept between sessions. Each section has its own folder, named by
+        # the results, the time settings and the options of the section
+        store = ChartStore(self.temp_folder, self._settings['temp_max_size'], self._settings['use_temporal_data'])
+        chart_key = (self.results_digest, self.app_namespace.INFO['mut_str'], self.starttime, self.timestep,
+                     self.timeunit)
+        selections = {}
+
+        def frame_data(frame, *keys):
+            # the data is selected when the task runs, so the items with stored chart data don't select it
+            return FrameSelection(frame, keys, selections)
+
         if energy_options:
             energy_map, energy, energy_summary, ecorr = self.get_energy(**energy_options, verbose=verbose).values()
             if energy_map:
                 for et, v in ecorr.items():
                     corr[et] = v
                 d['enthalpy'] = {'map': energy_map, 'keys': {}, 'summary': energy_summary}
-                memory_args['inmemory'] = performance_options.get('energy_memory')
+                memory_args = dict(temp_path=store.folder('enthalpy', chart_key, energy_options),
+                                   inmemory=performance_options.get('energy_memory'))
                 for level, value in energy_map.items():
                     for level1, value1 in value.items():
                         for level2, value2 in value1.items():
-                            TASKs.append([_setup_data, dict(data=energy[level][level1][level2][value2], level=1,
+                            TASKs.append([_setup_data, dict(data=frame_data(energy[level][level1], level2, value2), level=1,
                                                             memory=memory_args),
                                           (level, level1, level2), 'enthalpy'])
-                            TASKs.extend([_setup_data, dict(data=energy[level][level1][(level2, level3)], level=0,
+                            TASKs.extend([_setup_data, dict(data=frame_data(energy[level][level1], (level2, level3)), level=0,
                                                             memory=memory_args),
                                           (level, level1, level2,level3), 'enthalpy'] for level3 in value2)
 
@@ -772,7 +1293,8 @@ class MMPBSA_API():
             entropy_map, entropy, entropy_summary = self.get_entropy(**entropy_options, verbose=verbose).values()
             if entropy_map:
                 d['entropy'] = {'map': entropy_map, 'keys': {}, 'summary': entropy_summary}
-                memory_args['inmemory'] = performance_options.get('energy_memory')
+                memory_args = dict(temp_path=store.folder('entropy', chart_key, entropy_options),
+                                   inmemory=performance_options.get('energy_memory'))
                 for level, value in entropy_map.items():
                     for level1, value1 in value.items():
                         if level1 in ['nmode', 'qh']:
@@ -803,7 +1325,8 @@ class MMPBSA_API():
                             corr[et][m] = pd.concat([ecorr[et][m], v1], axis=1)
 
                 d['binding'] = {'map': bind_map, 'keys': {}, 'summary': binding}
-                memory_args['inmemory'] = performance_options.get('energy_memory')
+                memory_args = dict(temp_path=store.folder('binding', chart_key, energy_options, entropy_options),
+                                   inmemory=performance_options.get('energy_memory'))
                 for level, value in bind_map.items():
                     for level1, value1 in value.items():
                         TASKs.extend([_setup_data, dict(data=binding[level][level1][level2], level=1,
@@ -813,7 +1336,8 @@ class MMPBSA_API():
             decomp_map, decomp = self.get_decomp_energy(**decomp_options, verbose=verbose).values()
             if decomp_map:
                 d['decomposition'] = {'map': decomp_map, 'keys': {}}
-                memory_args['inmemory'] = performance_options.get('decomp_memory')
+                memory_args = dict(temp_path=store.folder('decomposition', chart_key, decomp_options),
+                                   inmemory=performance_options.get('decomp_memory'))
                 for level, value in decomp_map.items():
                     for level1, value1 in value.items():
                         for level2, value2 in value1.items():
@@ -826,35 +1350,54 @@ class MMPBSA_API():
                                     item_lvl2 = 1 if self.app_namespace.INPUT['decomp']['idecomp'] in [1, 2] else 2
                                     if self.app_namespace.INPUT['decomp']['idecomp'] in [1, 2]:
                                         TASKs.append(
-                                            [_setup_data, dict(data=decomp[level][level1][level2][level3][level4],
+                                            [_setup_data, dict(data=frame_data(decomp[level][level1], level2, level3,
+                                                                               level4),
                                                                level=item_lvl2, name=level4, index=value4,
                                                                memory=memory_args),
                                              (level, level1, level2, level3, level4), 'decomposition'])
                                         TASKs.extend([_setup_data,
-                                                      dict(data=decomp[level][level1][level2][level3][level4][level5],
+                                                      dict(data=frame_data(decomp[level][level1], level2, level3,
+                                                                           level4, level5),
                                                            memory=memory_args),
                                                     (level, level1, level2, level3, level4, level5), 'decomposition']
                                                      for level5 in value4)
                                     else:
                                         TASKs.append(
-                                            [_setup_data, dict(data=decomp[level][level1][level2][level3][level4],
+                                            [_setup_data, dict(data=frame_data(decomp[level][level1], level2, level3,
+                                                                               level4),
                                                                level=item_lvl2, name=level4, index=list(value4.keys()),
                                                                memory=memory_args),
                                              (level, level1, level2, level3, level4), 'decomposition'])
                                         TASKs.extend([_setup_data,
-                                                      dict(data=decomp[level][level1][level2][level3][level4][level5],
+                                                      dict(data=frame_data(decomp[level][level1], level2, level3,
+                                                                           level4, level5),
                                                            level=1, index=value5, memory=memory_args),
                                                       (level, level1, level2, level3, level4, level5), 'decomposition']
                                                      for level5, value5 in value4.items())
                                 TASKs.append([_setup_data,
-                                              dict(data=decomp[level][level1][level2][level3], level=item_lvl,
-                                                   name=level3, index=index, memory=memory_args),
+                                              dict(data=frame_data(decomp[level][level1], level2, level3),
+                                                   level=item_lvl, name=level3, index=index, memory=memory_args),
                                           (level, level1, level2, level3), 'decomposition'])
 
-        with ThreadPool(performance_options.get('jobs')) as pool:
-            imap_unordered_it = pool.imap_unordered(calculatestar, TASKs)
-            for t, id, result in imap_unordered_it:
-                d[t]['keys'][id] = result
+        # the items with stored chart data are not computed again
+        pending = []
+        for task in TASKs:
+            func, args, id, t = task
+            cont = None if args['memory'].get('inmemory') else store.get(t, id)
+            if cont is None:
+                pending.append(task)
+            else:
+                d[t]['keys'][id] = cont
+
+        try:
+            if pending:
+                with ThreadPool(performance_options.get('jobs')) as pool:
+                    imap_unordered_it = pool.imap_unordered(calculatestar, pending)
+                    for t, id, result in imap_unordered_it:
+                        d[t]['keys'][id] = result
+                        store.put(t, id, result)
+        finally:
+            store.close()
 
         if correlation:
             d['correlation'] = corr
@@ -867,29 +1410,65 @@ class MMPBSA_API():
         info = infofile.InfoFile(app)
         info.read_info(ifile)
         app.normal_system = app.mutant_system = None
-        app.parse_output_files(from_calc=False)
+        app.get_residues()
         self.app_namespace = self._get_namespace(app, 'App')
-        self._oringin = {'normal': app.calc_types.normal, 'mutant': app.calc_types.mutant,
-                         'decomp_normal': app.calc_types.decomp_normal, 'decomp_mutant': app.calc_types.decomp_mutant,
-                         'mutant-normal': app.calc_types.mut_norm,
-                         }
-        self._finalize_reading(ifile)
+
+        # Only the info file is read here. The energy and the decomposition output files are parsed when their results
+        # are used for first time
+        def energy():
+            app.parse_output_files(from_calc=False, decomp=False)
+            for label, scan in app.calc_types.scan.items():
+                self._scan.setdefault(label, {}).update({'mutant': scan.mutant, 'mutant-normal': scan.mut_norm})
+            return {'normal': app.calc_types.normal, 'mutant': app.calc_types.mutant,
+                    'mutant-normal': app.calc_types.mut_norm}
+
+        def decomposition():
+            app.parse_decomp_files()
+            for label, scan in app.calc_types.scan.items():
+                self._scan.setdefault(label, {})['decomp_mutant'] = scan.decomp_mutant
+            return {'decomp_normal': app.calc_types.decomp_normal, 'decomp_mutant': app.calc_types.decomp_mutant}
+
+        self._scan = {}
+
+        self._oringin = LazyResults({'normal': energy, 'mutant': energy, 'decomp_normal': decomposition,
+                                     'decomp_mutant': decomposition, 'mutant-normal': energy})
+        # the digest of the parsed results and the info file, which keeps the variables that only change the entropies.
+        # The output files are represented by their size and modification time, so opening the results doesn't read
+        # them
+        stat = os.stat(ifile)
+        digest = hashlib.sha256(f'{infofile.ParsedResults(app).digest(content=False)} {stat.st_size} '
+                                f'{stat.st_mtime_ns}'.encode())
+        self._finalize_reading(ifile, digest.hexdigest())
 
     def _get_fromBinary(self, ifile):
-        with open(ifile, 'rb') as bf:
-            info = pickle.load(bf)
-            self.app_namespace = self._get_namespace(info, 'Binary')
-            bdata = pickle.load(bf)
-            self._oringin = {'normal': bdata.normal, 'mutant': bdata.mutant, 'decomp_normal': bdata.decomp_normal,
-                             'decomp_mutant': bdata.decomp_mutant, 'mutant-normal': bdata.mut_norm}
-            self._finalize_reading(ifile)
-
-    def _finalize_reading(self, ifile):
+        # The results bundle is memory-mapped, so only the requested energies are read
+        info, bdata = read_results(ifile)
+        self.app_namespace = self._get_namespace(info, 'Binary')
+        self._oringin = {'normal': bdata['normal'], 'mutant': bdata['mutant'], 'decomp_normal': bdata['decomp_normal'],
+                         'decomp_mutant': bdata['decomp_mutant'], 'mutant-normal': bdata['mut_norm']}
+        # the scan of the bundle is a group of groups, and the one of the old pickle files a dict of namespaces
+        self._scan = {label: {key: scan.get(attr, {}) if isinstance(scan, Mapping) else getattr(scan, attr, {})
+                              for key, attr in (('mutant', 'mutant'), ('mutant-normal', 'mut_norm'),
+                                                ('decomp_mutant', 'decomp_mutant'))}
+                      for label, scan in (bdata.get('scan') or {}).items()}
+        from GMXMMPBSA import __version__
+        # the results bundle can take several GB, so it is identified by its name, size and modification time
+        stat = os.stat(ifile)
+        digest = hashlib.sha256(f'{__version__} {Path(ifile).resolve()} {stat.st_size} {stat.st_mtime_ns}'.encode())
+        self._finalize_reading(ifile, digest.hexdigest())
+
+    def _finalize_reading(self, ifile, digest):
+        # The chart data is kept between sessions in folders of the temporary folder (see ChartStore), so only the
+        # chart files that previous versions wrote in its root (<id>_lp, <id>_bp and <id>_hp) are removed. The other
+        # files may belong to other sessions
         self.temp_folder = ifile.parent.joinpath('.gmx_mmpbsa_temp')
-        if self.temp_folder.exists():
-            shutil.rmtree(self.temp_folder)
-        self.temp_folder.mkdir()
+        self.temp_folder.mkdir(exist_ok=True)
+        for fname in self.temp_folder.glob('*_[lbh]p'):
+            if fname.is_file():
+                fname.unlink(missing_ok=True)
+        self.results_digest = digest
         self.data = copy(self._oringin)
+        self.cache.clear()
         self._get_frames()
 
     @staticmethod
@@ -914,10 +1493,14 @@ class MMPBSA_API():
             app.resl = mask2list(app.FILES.complex_fixed, app.INPUT['general']['receptor_mask'],
                                  app.INPUT['general']['ligand_mask'])
 
+        mut_str = app.resl[app.mutant_index].mutant_label if app.mutant_index is not None else ''
         INFO = {'COM_PDB': com_pdb,
                 'input_file': input_file,
                 'mutant_index': app.mutant_index,
-                'mut_str': app.resl[app.mutant_index].mutant_label if app.mutant_index is not None else '',
+                'mut_str': mut_str,
+                # every mutation of the alanine scanning. The files of previous versions have only one
+                'mut_strs': list(getattr(app, 'mut_strs', None) or ([mut_str] if mut_str else [])),
+                'mutant_indexes': list(getattr(app, 'mutant_indexes', None) or []),
                 'numframes': app.numframes,
                 'numframes_nmode': app.numframes_nmode,
                 'output_file': output_file,
@@ -1046,3 +1629,269 @@ def load_gmxmmpbsa_info(fname: Union[Path, str]):
     d_mmpbsa = MMPBSA_API()
     d_mmpbsa.load_file(fname)
     return d_mmpbsa.get_energy(), d_mmpbsa.app_namespace
+
+
+def _system_summary(args):
+    """ Loads the results of a system and returns its summary rows, per-frame values and info (load_systems) """
+    system, fname, options = args
+    cwd = os.getcwd()
+    try:
+        api = MMPBSA_API()
+        api.setting_time()
+        api.setup_file(fname)
+        api.load_file()
+        window = dict(startframe=options['startframe'], endframe=options['endframe'], interval=options['interval'])
+        energy = api.get_energy(options['etype'], options['model'], options['mol'], options['term'],
+                                remove_empty_terms=False, **window, verbose=False)
+        rows = []
+        frames = {}
+        for et, v in energy['summary'].items():
+            for m, summary in v.items():
+                values = summary.to_numpy()
+                for c, (m1, t) in enumerate(summary.columns):
+                    rows.append((system, et, m, m1, t, values[0, c], values[1, c], values[2, c]))
+                    if options['frames']:
+                        # without the Average, SD and SEM rows that follow the frames
+                        frames[(system, et, m, m1, t)] = energy['data'][et][m][(m1, t)].to_numpy()[:-len(summary)]
+        INPUT = api.app_namespace.INPUT
+        if options['entropy']:
+            # ΔG of each entropy approximation, with the names of the correlation data of get_binding
+            dg_string = {'ie': 'ΔGie', 'c2': 'ΔGc2', 'nmode': 'ΔGnm', 'qh': 'ΔGqh'}
+            mol = 'complex' if api.app_namespace.FILES.stability else 'delta'
+            enthalpy = api.get_energy(options['etype'], options['model'], (mol,), ('TOTAL',),
+                                      remove_empty_terms=False, **window, verbose=False)
+            entropy = api.get_entropy(options['etype'], **window, ie_segment=INPUT['general']['ie_segment'],
+                                      verbose=False)
+            binding = api.get_binding(enthalpy['summary'], entropy['summary'], verbose=False)
+            for et, v in binding['data'].items():
+                for m, v1 in v.items():
+                    for ent, data in v1.items():
+                        rows.append((system, et, m, mol, dg_string[ent], *data['ΔG'].to_list()))
+        info = dict(system=system, path=Path(fname).as_posix(), temperature=INPUT['general']['temperature'],
+                    exp_ki=INPUT['general']['exp_ki'], numframes=api.app_namespace.INFO['numframes'])
+    finally:
+        os.chdir(cwd)
+    return rows, frames, info
+
+
+def load_systems(fnames: list, names: list = None, etype=('normal',), model=None, mol=('delta',), term=('TOTAL',),
+                 entropy=False, frames=False, startframe=None, endframe=None, interval=1, jobs=None):
+    """
+    Loads the results (info or .mmxsa files) of several systems concurrently, in worker processes, and returns only
+    their summary. The workers only parse the energy results, and send back the summary rows (and the per-frame values
+    when requested), so hundreds of systems can be compared without keeping their MMPBSA_API objects
+    Args:
+        fnames: the info or .mmxsa files of the systems
+        names: the names of the systems. By default, the names of the folders of the files (or the files, when the
+               folders have the same name)
+        etype, model, mol, term: the results to summarize, as in MMPBSA_API.get_energy. None selects all of them
+        entropy: adds the ΔG with each entropy approximation (terms ΔGie, ΔGc2, ΔGnm and ΔGqh) of the selected mols
+        frames: returns also the per-frame values of the energy terms
+        startframe, endframe, interval: frame window, as in MMPBSA_API.get_energy
+        jobs: the number of worker processes. By default, the number of CPUs
+
+    Returns: pd.DataFrame in long format, with the columns system, etype, model, mol, term, mean, sd and sem. Its
+             attrs['systems'] has the info of every system (path, temperature, exp_ki and numframes). With frames, it
+             returns also a dict with the per-frame values (np.ndarray) of every row, keyed by (system, etype, model,
+             mol, term)
+
+    """
+    fnames = [Path(f).absolute() for f in fnames]
+    for fname in fnames:
+        if not fname.exists():
+            raise NoFileExists(f"cannot find {fname}!")
+    if names is None:
+        names = [f.parent.name for f in fnames]
+        if len(set(names)) != len(names):
+            names = [f.as_posix() for f in fnames]
+    elif len(names) != len(fnames) or len(set(names)) != len(names):
+        raise ValueError('names must have a unique name for every file')
+    options = dict(etype=MMPBSA_API.arg2tuple(etype) if etype else None,
+                   model=MMPBSA_API.arg2tuple(model) if model else None,
+                   mol=MMPBSA_API.arg2tuple(mol) if mol else None,
+                   term=MMPBSA_API.arg2tuple(term) if term else None,
+                   entropy=entropy, frames=frames, startframe=startframe, endframe=endframe, interval=interval)
+    tasks = [(name, fname, options) for name, fname in zip(names, fnames)]
+
+    results = {}
+    jobs = min(jobs or os.cpu_count() or 1, len(tasks))
+    if jobs < 2 or multiprocessing.current_process().daemon:
+        for task in tasks:
+            results[task[0]] = _system_summary(task)
+    else:
+        with multiprocessing.Pool(jobs) as pool:
+            for task, result in zip(tasks, pool.imap(_system_summary, tasks)):
+                results[task[0]] = result
+
+    rows = [row for name in names for row in results[name][0]]
+    summary = pd.DataFrame(rows, columns=['system', 'etype', 'model', 'mol', 'term', 'mean', 'sd', 'sem'])
+    summary.attrs['systems'] = pd.DataFrame([results[name][2] for name in names]).set_index('system')
+    if frames:
+        return summary, {k: v for name in names for k, v in results[name][1].items()}
+    return summary
+
+
+class LiveResults:
+    """
+    Read-only access to the partial results of a gmx_MMPBSA job that is still running. The output files of every rank
+    are read while they are written, so the frames completed and the running estimates of the energies can be
+    followed during the calculations. Every refresh only parses the frames completed since the previous one (the frame
+    being written is left for the next refresh), so it can be polled often from a monitoring script.
+    The NMODE entropy, the decomposition and the other entropy approximations are only available when the job finishes
+    (see MMPBSA_API)
+
+    Example:
+        live = LiveResults('path/to/job/folder')
+        live.refresh()
+        print(live.progress())
+        print(live.get_energy(term=('TOTAL',)))
+    """
+
+    def __init__(self, folder: Union[Path, str] = '.', prefix='_GMXMMPBSA_'):
+        self.folder = Path(folder).absolute()
+        self.prefix = prefix
+        self.app = None
+        self._info_text = None
+        self._jobs = {}
+        self._files = {}
+
+    def _read_info(self):
+        """ Reads the info of the job, and sets its output files again when it changes (the job started again) """
+        info_file = self.folder.joinpath(f'{self.prefix}info.running')
+        if not info_file.exists():
+            # the job finished
+            info_file = self.folder.joinpath(f'{self.prefix}info')
+        if not info_file.exists():
+            raise NoFileExists(f'cannot find the info file of a gmx_MMPBSA job in {self.folder}!')
+        text = info_file.read_text()
+        if text == self._info_text:
+            return
+        app = main.MMPBSA_App(MPI)
+        infofile.InfoFile(app).read_info(info_file)
+        self.app, self._info_text = app, text
+
+        systems = []
+        if app.INPUT['ala']['alarun']:
+            for c in range(len(app._mutant_scan())):
+                app._set_mutation(c)
+                systems.append((app.mut_str, app._energy_jobs(normal=c == 0)))
+        else:
+            systems.append(('', app._energy_jobs()))
+        self._jobs, self._files = {}, {}
+        for mut_str, jobs in systems:
+            for (m, et, m1), (outclass, name, basename, numframes) in jobs.items():
+                output = outclass(name, app.INPUT, app.using_chamber)
+                # the NMODE outputs have no energy blocks
+                if not output._mdout_blocks():
+                    continue
+                key = (et, mut_str if et == 'mutant' else '', m, m1)
+                self._jobs[key] = (outclass, name, self.folder.joinpath(basename).as_posix(), numframes)
+                # the frames of every rank, as they are split in make_trajs
+                per_rank, extras = divmod(numframes, app.mpi_size)
+                for fileno in range(app.mpi_size):
+                    self._files[(key, fileno)] = SimpleNamespace(
+                        size=0, pos=0, complete=False, expected=per_rank + (fileno < extras),
+                        arrays={t: np.zeros(0) for t in output.data_keys})
+
+    def refresh(self):
+        """ Reads the frames completed since the last refresh. Returns the number of frames read """
+        self._read_info()
+        INPUT, chamber = self.app.INPUT, self.app.using_chamber
+        new_frames = 0
+        for (key, fileno), state in self._files.items():
+            if state.complete:
+                continue
+            outclass, _, basename, _ = self._jobs[key]
+            try:
+                size = os.stat(f'{basename}.{fileno}').st_size
+            except FileNotFoundError:
+                continue
+            if size < state.size:
+                # the output file was written again
+                state.size, state.pos = 0, 0
+                state.arrays = {t: v[:0] for t, v in state.arrays.items()}
+            if size != state.size:
+                arrays, state.pos = parse_partial_rank_file(outclass, INPUT, chamber, basename, fileno, state.pos)
+                state.size = size
+                if nframes := len(next(iter(arrays.values()))):
+                    state.arrays = {t: np.concatenate((v, arrays[t])) for t, v in state.arrays.items()}
+                    new_frames += nframes
+            if (len(next(iter(state.arrays.values()))) == state.expected and
+                    all(os.path.exists(f) for f in rank_extra_files(outclass, INPUT, chamber, basename, fileno))):
+                # The terms that are not in the output file (GB surface energies) are computed when the rank finishes
+                # the species, so the output is read again with them
+                try:
+                    state.arrays = parse_rank_file(outclass, INPUT, chamber, basename, fileno, state.expected)
+                    state.complete = True
+                except (OSError, ValueError, OutputError):
+                    # they are still being written
+                    pass
+        return new_frames
+
+    def _frames(self, key):
+        return [len(next(iter(self._files[(key, fileno)].arrays.values()))) for fileno in range(self.app.mpi_size)]
+
+    def progress(self):
+        """
+        Returns the frames completed of every species of every model
+
+        Returns: pd.DataFrame indexed by etype, mutation, model and mol, with the frames completed, the frames
+                 expected, and whether all the terms of every rank were read (complete)
+
+        """
+        if self.app is None:
+            self.refresh()
+        rows = []
+        for key, (_, _, _, numframes) in self._jobs.items():
+            complete = all(self._files[(key, fileno)].complete for fileno in range(self.app.mpi_size))
+            rows.append((*key, sum(self._frames(key)), numframes, complete))
+        return pd.DataFrame(rows, columns=['etype', 'mutation', 'model', 'mol', 'frames', 'expected',
+                                           'complete']).set_index(['etype', 'mutation', 'model', 'mol'])
+
+    def _output(self, key, frames):
+        """ The AmberOutput of the first frames of every rank """
+        outclass, name, basename, _ = self._jobs[key]
+        rank_arrays = [{t: v[:n] for t, v in self._files[(key, fileno)].arrays.items()}
+                       for fileno, n in enumerate(frames)]
+        output = outclass(name, self.app.INPUT, self.app.using_chamber)
+        output.parse_from_arrays(basename, rank_arrays, sum(frames))
+        return output
+
+    def get_energy(self, etype: tuple = None, model: tuple = None, mol: tuple = None, term: tuple = None):
+        """
+        Returns the running estimates of the energies with the frames completed so far. The delta of every rank is
+        computed with the frames completed by all the species. The terms not computed yet (the GB surface energies
+        of the species being calculated) are nan
+        Args:
+            etype, model, mol, term: the results to summarize, as in MMPBSA_API.get_energy. None selects all of them
+
+        Returns: pd.DataFrame in long format, with the columns etype, mutation, model, mol, term, frames, mean, sd and
+                 sem
+
+        """
+        if self.app is None:
+            self.refresh()
+        etype, model, mol, term = (MMPBSA_API.arg2tuple(x) if x else None for x in (etype, model, mol, term))
+        rows = []
+        for et, mut_str, m in dict.fromkeys(key[:3] for key in self._jobs):
+            if etype and et not in etype or model and m not in model:
+                continue
+            mols = [m1 for (et1, mut1, m2, m1) in self._jobs if (et1, mut1, m2) == (et, mut_str, m)]
+            outputs = {}
+            for m1 in mols:
+                frames = self._frames((et, mut_str, m, m1))
+                if (not mol or m1 in mol) and sum(frames):
+                    outputs[m1] = self._output((et, mut_str, m, m1), frames)
+            if (not mol or 'delta' in mol) and len(mols) == 3:
+                frames = np.min([self._frames((et, mut_str, m, m1)) for m1 in mols], axis=0).tolist()
+                if sum(frames):
+                    outputs['delta'] = BindingStatistics(*(self._output((et, mut_str, m, m1), frames) for m1 in mols),
+                                                         self.app.using_chamber, self.app.traj_protocol)
+            for m1, output in outputs.items():
+                for t in output.data_keys + output.composite_keys:
+                    if term and t not in term:
+                        continue
+                    values = np.asarray(output[t], dtype=float)
+                    sd = values.std()
+                    rows.append((et, mut_str, m, m1, t, len(values), values.mean(), sd, sd / math.sqrt(len(values))))
+        return pd.DataFrame(rows, columns=['etype', 'mutation', 'model', 'mol', 'term', 'frames', 'mean', 'sd', 'sem'])
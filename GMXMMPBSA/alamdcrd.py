@@ -25,6 +25,7 @@ scanning.
 
 from GMXMMPBSA.exceptions import MutateError, MutantResError
 import contextlib
+import numpy as np
 
 
 def _getCoords(line, coordsperline, coordsize):
@@ -68,6 +69,147 @@ def _scaledistance(coords, dist):
     return coords  # return the coordinates
 
 
+def _scaledistance_array(origin, target, dist):
+    """
+    Same as _scaledistance, but for (nframes, 3) arrays of the 2 atoms. Returns
+    the new coordinates of target. The operations are done in the same order to
+    get the same numbers
+    """
+    vector = target - origin
+    actualdist = np.sqrt(vector[:, 0] * vector[:, 0] + vector[:, 1] * vector[:, 1] + vector[:, 2] * vector[:, 2])
+    return vector * (dist / actualdist)[:, None] + origin
+
+
+def _is_netcdf(trajname):
+    """ Amber NetCDF trajectories are NetCDF3 files """
+    with open(trajname, 'rb') as traj:
+        return traj.read(3) == b'CDF'
+
+
+def _chunk_size(natom):
+    """ Number of frames to keep in memory at the same time (~256 MB of coordinates) """
+    return max(1, 2 ** 25 // (natom * 3))
+
+
+def _parse_mdcrd_lines(lines, nvalues):
+    """ Parses the 8-character fields of a block of mdcrd lines in one go """
+    buffer = ''.join(line.rstrip('\r\n') for line in lines)
+    if len(buffer) == nvalues * 8:
+        return np.frombuffer(buffer.encode(), dtype='S8').astype(float)
+    # Not a regular layout (i.e. overflowed fields). Go line by line
+    values = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        values.extend(_getCoords(line, len(line) // 8 + bool(len(line) % 8), 8))
+    if len(values) != nvalues:
+        raise MutateError('Could not read the coordinates of the trajectory')
+    return np.array(values)
+
+
+def _format_mdcrd_frame(values):
+    """ Writes the values of one frame 10 per line with %8.3f, as cpptraj does """
+    fields = [f'{value:8.3f}' for value in values.tolist()]
+    return [''.join(fields[i:i + 10]) for i in range(0, len(fields), 10)]
+
+
+def _mutate_mdcrd(trajname, targets, natom, hasbox):
+    """
+    Applies every mutate function of targets, a list of (newname, mutate), to
+    every chunk of (nframes, natom, 3) coordinates of an mdcrd. The original
+    trajectory is read only once
+    """
+    from itertools import islice
+    from math import ceil
+    from contextlib import ExitStack
+
+    coord_lines = ceil(natom * 3 / 10)
+    frame_lines = coord_lines + 1 if hasbox else coord_lines
+    chunk = _chunk_size(natom)
+
+    with open(trajname) as mdcrd, ExitStack() as stack:
+        new_mdcrds = [(stack.enter_context(open(newname, 'w')), mutate) for newname, mutate in targets]
+        # First line is always a comment
+        title = mdcrd.readline()
+        for new_mdcrd, _ in new_mdcrds:
+            new_mdcrd.write('%-80s' % f'{title.strip()} and mutated by gmx_MMPBSA for alanine scanning')
+        while lines := list(islice(mdcrd, frame_lines * chunk)):
+            if len(lines) % frame_lines:
+                raise MutateError(f'Incomplete frame found in {trajname}')
+            nframes = len(lines) // frame_lines
+            coords = np.empty((nframes, natom, 3))
+            box = []
+            for f in range(nframes):
+                frame = lines[f * frame_lines:(f + 1) * frame_lines]
+                coords[f] = _parse_mdcrd_lines(frame[:coord_lines], natom * 3).reshape(natom, 3)
+                if hasbox:
+                    box.append(_format_mdcrd_frame(_parse_mdcrd_lines([frame[-1]], 3))[0])
+            for new_mdcrd, mutate in new_mdcrds:
+                new_coords = mutate(coords)
+                for f in range(nframes):
+                    new_lines = _format_mdcrd_frame(new_coords[f].ravel())
+                    if hasbox:
+                        new_lines.append(box[f])
+                    new_mdcrd.write('\n' + '\n'.join(new_lines))
+        for new_mdcrd, _ in new_mdcrds:
+            new_mdcrd.write('\n')
+
+
+def _mutate_netcdf(trajname, targets, natom):
+    """
+    Applies every mutate function of targets, a list of (newname, mutate), to
+    every chunk of (nframes, natom, 3) coordinates of an Amber NetCDF trajectory
+    """
+    from scipy.io import netcdf_file
+    from parmed.amber import NetCDFTraj
+
+    chunk = _chunk_size(natom)
+    traj = netcdf_file(trajname, 'r', mmap=True)
+    new_trajs = [None] * len(targets)
+    try:
+        coordinates = traj.variables['coordinates']
+        hasbox = 'cell_lengths' in traj.variables
+        nframes = coordinates.shape[0]
+        title = traj.title.decode() if isinstance(traj.title, bytes) else str(traj.title)
+        for start in range(0, nframes, chunk):
+            # Same precision as the mdcrd path
+            coords = np.array(coordinates[start:start + chunk], dtype=float)
+            for t, (newname, mutate) in enumerate(targets):
+                new_coords = mutate(coords)
+                if new_trajs[t] is None:
+                    new_trajs[t] = NetCDFTraj.open_new(newname, new_coords.shape[1], hasbox, crds=True,
+                                                       title=f'{title} and mutated by gmx_MMPBSA for alanine '
+                                                             f'scanning')
+                for f in range(new_coords.shape[0]):
+                    new_trajs[t].add_coordinates(new_coords[f])
+                    if hasbox:
+                        new_trajs[t].add_cell_lengths_angles(traj.variables['cell_lengths'][start + f],
+                                                             traj.variables['cell_angles'][start + f])
+    finally:
+        for new_traj in new_trajs:
+            if new_traj is not None:
+                new_traj.close()
+        # Drop the references to the mapped data before closing
+        coordinates = None
+        traj.close()
+
+
+def mutate_trajectory(trajname, mutants):
+    """
+    Writes all the mutant trajectories of mutants, a list of (newname,
+    MutantMdcrd), reading the original trajectory only once. All the mutants
+    must come from the same original topology and trajectory
+    """
+    if not mutants:
+        return
+    mutant = mutants[0][1]
+    natom = mutant.orig_prm.ptr('natom')
+    targets = [(newname, mut.mutator()) for newname, mut in mutants]
+    if _is_netcdf(trajname):
+        _mutate_netcdf(trajname, targets, natom)
+    else:
+        _mutate_mdcrd(trajname, targets, natom, mutant.hasbox)
+
+
 def _getnumatms(resname):
     """ Returns the number of atoms in a given Amino acid residue """
     if resname in 'GLY':
@@ -150,9 +292,7 @@ def _ressymbol(resname):
 
 
 class MutantMdcrd(object):
-    """ Class for an alanine-mutated amber trajectory file.
-        ASCII only (no netcdf)
-    """
+    """ Class for an alanine-mutated amber trajectory file (mdcrd or NetCDF) """
     def __init__(self, trajname, prm1, prm2):
         self.traj = trajname
         self.orig_prm = prm1
@@ -191,181 +331,86 @@ class MutantMdcrd(object):
         return mutres
 
     def MutateTraj(self, newname):
-        """ Mutates a given mdcrd file based on 2 prmtops """
+        """
+        Mutates a given trajectory (mdcrd or NetCDF) based on 2 prmtops. The new
+        trajectory has the same format as the original one. Frames are mutated in
+        chunks of (nframes, natom, 3) arrays, so the whole trajectory never has
+        to fit in memory
+        """
+        mutate_trajectory(self.traj, [(newname, self)])
 
+    def mutator(self):
+        """ Returns the function that mutates a (nframes, natom, 3) array of coordinates """
         mutres = self.mutres
 
         orig_resname = self.orig_prm.parm_data['RESIDUE_LABEL'][mutres-1]
-        resstart = self.orig_prm.parm_data['RESIDUE_POINTER'][mutres-1]
-        try:
-            nextresstart = self.orig_prm.parm_data['RESIDUE_POINTER'][mutres]
-        except IndexError:
-            nextresstart = self.orig_prm.ptr('natom')
-        number_atoms_mut = self.new_prm.ptr('natom')
-        if self.orig_prm.ptr('ifbox'):
-            number_atoms_mut += 1
-
-        coordsperline = 10  # number of coordinates in each line
-        coordsize = 8       # how large coordinates are in characters
-        counter = 0
-        coords_done = 0
-        coords_tomutate = []
-        temp_holder = []
-
-        # location is 0 before modified coordinates, 1 during modified
-        # coordinates, and 2 after modified coordinates
-        location = 0
-
         if orig_resname == 'GLY':
             raise MutateError('Trying to mutate GLY to ALA! Not currently supported.')
 
-        with open(self.traj) as mdcrd:
-            with open(newname, 'w') as new_mdcrd:
-                for line in mdcrd:
-                    counter += 1
-                    # First line is always a comment
-                    if counter == 1:
-                        new_mdcrd.write('%-80s' % f'{line.strip()} and mutated by gmx_MMPBSA for alanine scanning')
-                        continue
-
-                    if (
-                            location == 0 and
-                            coords_done <= max(resstart * 3 - 4, 0) < coords_done + coordsperline
-                    ):
-                        location = 1
-                        words = _getCoords(line, coordsperline, coordsize)
-                        for i in range(coordsperline):
-                            if coords_done <= resstart * 3 - 4:
-                                if coords_done % coordsperline == 0:
-                                    new_mdcrd.write('\n')
-                                new_mdcrd.write('%8.3f' % words[i])
-                                coords_done += 1
-                            else:
-                                coords_tomutate.append(words[i])
-                    elif location == 1:
-                        words = _getCoords(line, coordsperline, coordsize)
-                        if coordsperline + len(coords_tomutate) >= 3 * (nextresstart - resstart):
-                            location = 2
-                            if nextresstart == self.orig_prm.ptr('natom'):
-                                for i in range(len(words)):
-                                    if len(coords_tomutate) < 3 * (nextresstart - resstart):
-                                        coords_tomutate.append(words[i])
-                                    else:
-                                        temp_holder.append(words[i])
-                            else:
-                                for i in range(coordsperline):
-                                    if len(coords_tomutate) < 3 * (nextresstart - resstart):
-                                        coords_tomutate.append(words[i])
-                                    else:
-                                        temp_holder.append(words[i])
-
-                            new_coords = self._mutate(orig_resname, coords_tomutate)
-                            for i in range(len(new_coords)):
-                                if coords_done % coordsperline == 0:
-                                    new_mdcrd.write('\n')
-                                new_mdcrd.write('%8.3f' % new_coords[i])
-                                coords_done += 1
-                            if len(temp_holder) != 0:
-                                for i in range(len(temp_holder)):
-                                    if coords_done % coordsperline == 0:
-                                        new_mdcrd.write('\n')
-                                    new_mdcrd.write('%8.3f' % temp_holder[i])
-                                    coords_done += 1
-                                    if self.hasbox and coords_done == number_atoms_mut * 3 - 3:
-                                        new_mdcrd.write('\n')
-                                if coords_done == number_atoms_mut * 3:
-                                    coords_done = 0
-                                    location = 0
-
-                            coords_tomutate = []
-                            temp_holder = []
-                        else:
-                            for i in range(coordsperline):
-                                coords_tomutate.append(words[i])
-
-                    elif location == 2:
-                        words = _getCoords(line, coordsperline, coordsize)
-                        for i in range(len(words)):
-                            if (
-                                    coords_done % coordsperline == 0 and
-                                    (not self.hasbox or coords_done < number_atoms_mut * 3 - 3)
-                            ):
-                                new_mdcrd.write('\n')
-                            new_mdcrd.write('%8.3f' % words[i])
-                            coords_done += 1
-                            if self.hasbox and coords_done == number_atoms_mut * 3 - 3:
-                                new_mdcrd.write('\n')
-
-                        if coords_done == number_atoms_mut * 3:
-                            coords_done = 0
-                            location = 0
-                    else:
-                        if coords_done % coordsperline == 0:
-                            new_mdcrd.write('\n')
-                        new_mdcrd.write(line[:-1])
-                        coords_done = coords_done + coordsperline
-                    continue
-
-                new_mdcrd.write('\n')
-
-    def _mutate(self, resname, coords):
+        natom = self.orig_prm.ptr('natom')
+        resstart = self.orig_prm.parm_data['RESIDUE_POINTER'][mutres-1] - 1
+        try:
+            nextresstart = self.orig_prm.parm_data['RESIDUE_POINTER'][mutres] - 1
+        except IndexError:
+            nextresstart = natom
+
+        plan = self._plan(orig_resname, nextresstart - resstart)
+        # Every atom of the mutant residue is taken from the original residue. The H
+        # atoms placed along a truncated bond are overwritten after the gather
+        index = np.array([resstart + (atom if isinstance(atom, int) else atom[1]) for atom in plan])
+        scaled = [(i, resstart + atom[0], resstart + atom[1], atom[2]) for i, atom in enumerate(plan)
+                  if not isinstance(atom, int)]
+
+        def mutate(coords):
+            new_res = coords[:, index]
+            for i, origin, target, dist in scaled:
+                new_res[:, i] = _scaledistance_array(coords[:, origin], coords[:, target], dist)
+            return np.concatenate((coords[:, :resstart], new_res, coords[:, nextresstart:]), axis=1)
+
+        return mutate
+
+    @staticmethod
+    def _get_startindex(resname, natoms):
+        """ Returns the (startindex, cterm) of the residue based on its number of atoms """
+        if _getnumatms(resname) == natoms:
+            return 0, False
+        elif _getnumatms(resname) + 2 == natoms:
+            return 2, False
+        elif _getnumatms(resname) + 1 == natoms:
+            return 0, True
+        raise MutateError('Mismatch in atom # in residue %s. (%d in alamdcrd.py and %d passed '
+                          'in)' % (resname, _getnumatms(resname), natoms))
+
+    def _plan(self, resname, natoms):
+        """
+        Returns the atoms of the alanine residue as indexes of the atoms in the
+        original residue. The H atoms placed along a truncated bond are
+        (origin, target, distance) tuples
+        """
         list_one = 'ARG ASH ASN ASP CYM CYS CYX GLH GLN GLU HID HIE HIP LEU LYN LYS MET PHE SER TRP TYR'
 
         list_two = 'ILE THR VAL'
         list_three = 'PRO'
         chdist = 1.09
         nhdist = 1.01
-        coords_tosend = []
-        new_coords = []
-        if _getnumatms(resname) * 3 == len(coords):
-            startindex = 0
-            cterm = False
-        elif (_getnumatms(resname) + 2) * 3 == len(coords):
-            startindex = 2
-            cterm = False
-        elif (_getnumatms(resname) + 1) * 3 == len(coords):
-            startindex = 0
-            cterm = True
-        else:
-            raise MutateError('Mismatch in atom # in residue %s. (%d in alamdcrd.py and %d passed '
-                              'in)' % (resname, _getnumatms(resname), len(coords)))
+        startindex, cterm = self._get_startindex(resname, natoms)
 
         if resname in list_one:
-            new_coords.extend(coords[i] for i in range((7 + startindex) * 3))
-            coords_tosend.extend(coords[(4 + startindex) * 3 + i] for i in range(3))
-            coords_tosend.extend(coords[(7 + startindex) * 3 + i] for i in range(3))
-            coords_received = _scaledistance(coords_tosend, chdist)
-            new_coords.extend(coords_received[i + 3] for i in range(3))
+            plan = list(range(7 + startindex))
+            plan.append((4 + startindex, 7 + startindex, chdist))
         elif resname in list_two:
-            new_coords.extend(coords[i] for i in range((6 + startindex) * 3))
-            coords_tosend.extend(coords[(4 + startindex) * 3 + i] for i in range(3))
-            coords_tosend.extend(coords[(6 + startindex) * 3 + i] for i in range(3))
-            coords_received = _scaledistance(coords_tosend, chdist)
-            new_coords.extend(coords_received[i + 3] for i in range(3))
-            coords_tosend = []
-            coords_tosend.extend(coords[(4 + startindex) * 3 + i] for i in range(3))
-            coords_tosend.extend(coords[(10 + startindex) * 3 + i] for i in range(3))
-            coords_received = _scaledistance(coords_tosend, chdist)
-            new_coords.extend(coords_received[3 + i] for i in range(3))
+            plan = list(range(6 + startindex))
+            plan.append((4 + startindex, 6 + startindex, chdist))
+            plan.append((4 + startindex, 10 + startindex, chdist))
         elif resname in list_three:
-            new_coords.extend(coords[i] for i in range((1 + startindex) * 3))
-            coords_tosend = coords[startindex * 3:startindex * 3 + 6]
-            coords_received = _scaledistance(coords_tosend, nhdist)
-            new_coords.extend(coords_received[i + 3] for i in range(3))
-            new_coords.extend(coords[(10 + startindex) * 3 + i] for i in range(6))
-            new_coords.extend(coords[(7 + startindex) * 3 + i] for i in range(9))
-            coords_tosend = []
-            coords_tosend.extend(coords[(7 + startindex) * 3 + i] for i in range(3))
-            coords_tosend.extend(coords[(4 + startindex) * 3 + i] for i in range(3))
-            coords_received = _scaledistance(coords_tosend, chdist)
-            new_coords.extend(coords_received[i + 3] for i in range(3))
+            plan = list(range(1 + startindex))
+            plan.append((startindex, startindex + 1, nhdist))
+            plan.extend((10 + startindex, 11 + startindex, 7 + startindex, 8 + startindex, 9 + startindex))
+            plan.append((7 + startindex, 4 + startindex, chdist))
         else:
             raise MutateError(f"Residue {resname} not recognized! Can't mutate.")
-        if cterm:
-            new_coords.extend(coords[len(coords) - 9 + i] for i in range(9))
-        else:
-            new_coords.extend(coords[len(coords) - 6 + i] for i in range(6))
-        return new_coords
+        plan.extend(range(natoms - 3, natoms) if cterm else range(natoms - 2, natoms))
+        return plan
 
 
 class GlyMutantMdcrd(MutantMdcrd):
@@ -374,57 +419,32 @@ class GlyMutantMdcrd(MutantMdcrd):
             self.orig_prm.parm_data['RESIDUE_LABEL'][self.mutres-1]),
                            self.mutres, _ressymbol('GLY'))
 
-    def _mutate(self, resname, coords):
+    def _plan(self, resname, natoms):
+        """
+        Returns the atoms of the glycine residue as indexes of the atoms in the
+        original residue. The H atoms placed along a truncated bond are
+        (origin, target, distance) tuples
+        """
         list_one = 'ARG ASH ASN ASP CYM CYS CYX GLH GLN GLU HID HIE HIP LEU LYN LYS MET PHE SER TRP TYR ALA ILE THR VAL'
         list_two = 'PRO'
 
         chdist = 1.09
         nhdist = 1.01
-
-        coords_tosend = []    # Coordinates to send to be scaled
-        new_coords = []      # Mutated coordinates to return
-
-        if _getnumatms(resname) * 3 == len(coords):
-            startindex = 0
-            cterm = False
-        elif (_getnumatms(resname) + 2) * 3 == len(coords):
-            startindex = 2
-            cterm = False
-        elif (_getnumatms(resname) + 1) * 3 == len(coords):
-            startindex = 0
-            cterm = True
-        else:
-            raise MutateError(('Mismatch in atom # in residue %s. (%d in ' +
-                               'alamdcrd.py and %d passed in)') % (resname, _getnumatms(resname), len(coords)))
+        startindex, cterm = self._get_startindex(resname, natoms)
 
         if resname in list_one:
-            new_coords.extend(coords[i] for i in range((4+startindex)*3))
-            coords_tosend.extend(coords[(2+startindex)*3+i] for i in range(3))
-            coords_tosend.extend(coords[(4+startindex)*3+i] for i in range(3))
-            coords_received = _scaledistance(coords_tosend, chdist)
-
-            new_coords.extend(coords_received[i+3] for i in range(3))
+            plan = list(range(4 + startindex))
+            plan.append((2 + startindex, 4 + startindex, chdist))
         elif resname in list_two:
-            new_coords.extend(coords[i] for i in range((1+startindex)*3))
-            coords_tosend = coords[startindex*3:startindex*3 + 6]
-            coords_received = _scaledistance(coords_tosend, nhdist)
-
-            new_coords.extend(coords_received[i+3] for i in range(3))
-            new_coords.extend(coords[(10+startindex)*3+i] for i in range(6))
-            coords_tosend = []
-            coords_tosend.extend(coords[(10+startindex)*3+i] for i in range(3))
-            coords_tosend.extend(coords[(7+startindex)*3+i] for i in range(3))
-            coords_received = _scaledistance(coords_tosend, chdist)
-
-            new_coords.extend(coords_received[i+3] for i in range(3))
+            plan = list(range(1 + startindex))
+            plan.append((startindex, startindex + 1, nhdist))
+            plan.extend((10 + startindex, 11 + startindex))
+            plan.append((10 + startindex, 7 + startindex, chdist))
         else:
             raise MutateError("Residue %s not recognized! Can't mutate." % resname)
 
-        if cterm:
-            new_coords.extend(coords[len(coords)-9+i] for i in range(9))
-        else:
-            new_coords.extend(coords[len(coords)-6+i] for i in range(6))
-        return new_coords
+        plan.extend(range(natoms - 3, natoms) if cterm else range(natoms - 2, natoms))
+        return plan
 
     def FindMutantResidue(self):
         """ Finds which residue is the alanine mutant in a pair of prmtop files
@@ -23,11 +23,14 @@ All data is stored in a special class derived from the list.
 #  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
 #  for more details.                                                           #
 # ##############################################################################
+import copyreg
 import logging
-from copy import deepcopy
+import mmap
+import os
+from collections.abc import Mapping
 from math import sqrt
 from GMXMMPBSA.exceptions import (OutputError, LengthError, DecompError, GMXMMPBSA_ERROR)
-from GMXMMPBSA.utils import EnergyVector, get_std
+from GMXMMPBSA.utils import EnergyVector, EnergyTable, get_std
 from types import SimpleNamespace
 import numpy as np
 import sys
@@ -66,7 +69,9 @@ class AmberOutput(dict):
     """
     Base Amber output class. It takes a basename as a file name and parses
     through all of the thread-specific output files (assumed to have the suffix
-    .# where # spans from 0 to num_files - 1
+    .# where # spans from 0 to num_files - 1.
+    The energies are stored in an EnergyTable. The data terms are EnergyVector views of the table, while the composite
+    terms are computed when they are first accessed
     """
     print_levels = {'BOND': 2, 'ANGLE': 2, 'DIHED': 2, 'VDWAALS': 1, 'EEL': 1, '1-4 VDW': 2, '1-4 EEL': 2, 'EPOL': 1}
 
@@ -94,42 +99,104 @@ class AmberOutput(dict):
             for key in self.chamber_keys:
                 if key not in self.data_keys:
                     self.data_keys.insert(3, key)
+        self.table = None
+
+    def __reduce_ex__(self, protocol):
+        if self.table is None:
+            return super(AmberOutput, self).__reduce_ex__(protocol)
+        # The dict is rebuilt from the table, so we don't pickle the energies twice
+        return self.__class__, (self.mol, self.INPUT, self.chamber), self.__dict__
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if state.get('table') is None and self.numframes is not None:
+            # pickled by a previous version, with the vectors in the dict
+            self.table = EnergyTable(self.data_keys, self.numframes, self._composites())
+            for key in self.data_keys:
+                self.table.values[self.table.index[key]] = dict.__getitem__(self, key)
+        if self.table is not None:
+            self._set_vectors()
+
+    def __getitem__(self, key):
+        value = super(AmberOutput, self).__getitem__(key)
+        if value is None:
+            # composite term, computed on demand
+            value = self.table.vector(key)
+            super(AmberOutput, self).__setitem__(key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
 
     def parse_from_file(self, basename, num_files=1, numframes=1):
+        self._init_vectors(basename, num_files, numframes)
+        AmberOutput._read(self)
+        self._fill_composite_terms()
+
+    def parse_from_arrays(self, basename, rank_arrays, numframes=1):
+        """
+        Same as parse_from_file, but takes the energy terms of each rank file already parsed by parse_rank_file
+        (usually in another process)
+        """
+        self._init_vectors(basename, len(rank_arrays), numframes)
+        for arrays in rank_arrays:
+            nframes = len(arrays[self.data_keys[0]])
+            if self.frame_idx + nframes > self.numframes:
+                raise LengthError(f'{basename} outputs contain more frames than expected ({self.numframes})')
+            for key, values in arrays.items():
+                self[key][self.frame_idx:self.frame_idx + nframes] = values
+            self.frame_idx += nframes
+        self._fill_nmode_values()
+        self.is_read = True
+        self._fill_composite_terms()
+
+    def _init_vectors(self, basename, num_files, numframes):
         self.num_files = num_files
         self.basename = basename
         self.temperature = self.INPUT['general']['temperature']
         self.numframes = numframes
+        self.table = EnergyTable(self.data_keys, numframes, self._composites())
+        self._set_vectors()
+
+    def _composites(self):
+        """ Components of every composite term, in the order they are added """
+        composites = {key: [] for key in self.composite_keys}
+        for key in self.data_keys:
+            for component in data_key_owner[key]:
+                composites.setdefault(component, []).append(key)
+        return composites
 
+    def _set_vectors(self):
+        """ Builds the dict access to the table. The composite terms are set when they are accessed """
         for key in self.data_keys:
-            self[key] = EnergyVector(numframes)
+            self[key] = self.table.vector(key)
         for key in self.composite_keys:
-            self[key] = EnergyVector(numframes)
-        AmberOutput._read(self)
-        self._fill_composite_terms()
+            self[key] = None
 
-    def _print_vectors(self, csvwriter):
+    def _print_vectors(self, writer):
         """ Prints the energy vectors to a CSV file for easy viewing
             in spreadsheets
         """
         print_keys = list(self.data_keys)
         # Add on the composite keys
         print_keys += self.composite_keys
-
-        # write the header
-        csvwriter.writerow(['Frame #'] + print_keys)
-
-        # write out each frame
-        c = self.INPUT['nmode']['nmstartframe'] if self.__class__ == NMODEout else self.INPUT['general']['startframe']
-        for i in range(self.numframes):
-            csvwriter.writerow([c] + [round(self[key][i], 2) for key in print_keys])
-            c += self.INPUT['nmode']['nminterval'] if self.__class__ == NMODEout else self.INPUT['general']['interval']
+        values = np.array([self[key] for key in print_keys]).T
+        frames = frame_numbers(self.INPUT, len(values), self.__class__ == NMODEout)
+        writer.writeblock(['Frame #'] + print_keys, [frames], values)
 
     def set_frame_range(self, start=None, end=None, interval=None):
-        d = deepcopy(self)
-        for key in d.data_keys:
-            d[key] = d[key][start:end:interval]
-        d._fill_composite_terms()
+        """ Returns a copy with a view of the frames start:end:interval. The energies are not copied """
+        d = self.__class__.__new__(self.__class__)
+        d.__dict__.update(self.__dict__)
+        d.table = self.table.window(start, end, interval)
+        d.numframes = len(d.table)
+        d._set_vectors()
         return d
 
     def summary_output(self):
@@ -167,20 +234,12 @@ class AmberOutput(dict):
             # Skip the composite terms, since we print those at the end
             if key in self.composite_keys:
                 continue
-            avg = float(self[key].mean())
-            stdev = float(self[key].stdev())
-            semp = float(self[key].semp())
-            std = float(self[key].std())
-            sem = float(self[key].sem())
+            avg, stdev, std, semp, sem = self.table.stats(key)
             summary_list.append([key, avg, stdev, std, semp, sem])
 
         for key in self.composite_keys:
             # Now print out the composite terms
-            avg = float(self[key].mean())
-            stdev = float(self[key].stdev())
-            semp = float(self[key].semp())
-            std = float(self[key].std())
-            sem = float(self[key].sem())
+            avg, stdev, std, semp, sem = self.table.stats(key)
             summary_list.append([key, avg, stdev, std, semp, sem])
 
         return summary_list
@@ -193,19 +252,47 @@ class AmberOutput(dict):
 
         # Loop through all filenames
         for fileno in range(self.num_files):
-            with open('%s.%d' % (self.basename, fileno)) as output_file:
-                self._get_energies(output_file)
-            self._extra_reading(fileno)
+            self._read_file(fileno)
         self._fill_nmode_values()
 
         self.is_read = True
 
+    def _read_file(self, fileno):
+        """ Reads the output file of the rank fileno """
+        with open('%s.%d' % (self.basename, fileno)) as output_file:
+            self._get_energies(output_file)
+        self._extra_reading(fileno)
+
     def _get_energies(self, output_file):
-        pass
+        """ Parses the energy blocks of the output file and fills all the terms at once """
+        blocks = self._mdout_blocks()
+        if not blocks:
+            return
+        start = self.frame_idx
+        for block, values in zip(blocks, read_mdout_blocks(output_file, blocks)):
+            if start + len(values) > self.numframes:
+                raise LengthError(f'{output_file.name} contains more frames than expected ({self.numframes})')
+            for c, key in enumerate(block.keys):
+                self[key][start:start + len(values)] = values[:, c]
+        # The last block of every frame closes it
+        self.frame_idx += len(values)
+
+    def _mdout_blocks(self):
+        """ List of MdoutBlock with the energy terms of each frame """
+        return []
+
+    def _sander_block(self, *lines, optional_last=False):
+        """ Energy block printed by sander for each frame. The CHARMM terms are printed after the first line """
+        lines = [['BOND', 'ANGLE', 'DIHED']] + ([['UB', 'IMP', 'CMAP']] if self.chamber else []) + list(lines)
+        return MdoutBlock(rb' BOND', lines, optional_last=optional_last)
 
     def _extra_reading(self, fileno):
         pass
 
+    def _extra_files(self, fileno):
+        """ Files read by _extra_reading, with the terms of the rank fileno that are not in its output file """
+        return []
+
     def _fill_nmode_values(self):
         pass
 
@@ -213,15 +300,57 @@ class AmberOutput(dict):
         """
         Fills in the composite terms WITHOUT adding in terms we're not printing.
         This should be called after the final verbosity level has been set (based
-        on whether or not certain terms need to be added in)
+        on whether or not certain terms need to be added in).
+        The composite terms and statistics are computed again from the table when they are accessed
         """
-
+        self.table.reset()
         for key in self.composite_keys:
-            self[key] = EnergyVector(self.numframes)
+            self[key] = None
 
-        for key in self.data_keys:
-            for component in data_key_owner[key]:
-                self[component] = self[key] + self[component]
+
+def frame_numbers(INPUT, numframes, nmode=False):
+    """ Returns the frame numbers of the printed energy vectors """
+    if nmode:
+        return INPUT['nmode']['nmstartframe'] + INPUT['nmode']['nminterval'] * np.arange(numframes)
+    return INPUT['general']['startframe'] + INPUT['general']['interval'] * np.arange(numframes)
+
+
+def parse_rank_file(outclass, INPUT, chamber, basename, fileno, numframes):
+    """
+    Parses the output file of a single rank. This is the process pool worker of MMPBSA_App.parse_output_files, so it
+    returns plain arrays (one per energy term, with only the frames of this file) instead of the AmberOutput object.
+    The arrays of all ranks are put together with AmberOutput.parse_from_arrays
+    """
+    output = outclass('', INPUT, chamber)
+    output._init_vectors(basename, 1, numframes)
+    output._read_file(fileno)
+    return {key: np.asarray(output[key][:output.frame_idx]) for key in output.data_keys}
+
+
+def parse_partial_rank_file(outclass, INPUT, chamber, basename, fileno, pos=0):
+    """
+    Parses the frames completed after the offset pos in the output file of a rank that is still running (see
+    read_complete_mdout_blocks). Returns the arrays of the energy terms of those frames, like parse_rank_file, and the
+    offset where the next call must start. The terms that are not in the output file (the surface energies of GB,
+    computed once the rank finishes all its frames) are nan
+    """
+    output = outclass('', INPUT, chamber)
+    blocks = output._mdout_blocks()
+    with open('%s.%d' % (basename, fileno)) as output_file:
+        values, pos = read_complete_mdout_blocks(output_file, blocks, pos)
+    nframes = len(values[0]) if values else 0
+    arrays = {key: np.full(nframes, np.nan) for key in output.data_keys}
+    for block, block_values in zip(blocks, values):
+        for c, key in enumerate(block.keys):
+            arrays[key] = block_values[:, c]
+    return arrays, pos
+
+
+def rank_extra_files(outclass, INPUT, chamber, basename, fileno):
+    """ Files with the terms of the rank fileno that are not in its output file (see AmberOutput._extra_reading) """
+    output = outclass('', INPUT, chamber)
+    output.basename = basename
+    return output._extra_files(fileno)
 
 
 class IEout(dict):
@@ -259,16 +388,13 @@ class IEout(dict):
                 f += 1
         self['iedata'] = self['data'][-self['ieframes']:]
 
-    def _print_vectors(self, csvwriter):
+    def _print_vectors(self, writer):
         """ Prints the energy vectors to a CSV file for easy viewing
             in spreadsheets
         """
-        csvwriter.writerow(['Frame #', 'Interaction Entropy'])
-        f = self.INPUT['general']['startframe']
-        for d in self['data']:
-            csvwriter.writerow([f] + [round(d, 2)])
-            f += self.INPUT['general']['interval']
-        csvwriter.writerow([])
+        writer.writeblock(['Frame #', 'Interaction Entropy'],
+                          [frame_numbers(self.INPUT, len(self['data']))], np.asarray(self['data'])[:, None])
+        writer.writerow([])
 
     def summary_output(self):
         summary = self.summary()
@@ -589,7 +715,7 @@ class NMODEout(AmberOutput):
         for t in self.data_keys:
             if np.isnan(self[t]).any():
                 filling = True
-                self[t] = EnergyVector(np.nan_to_num(self[t], nan=float(np.nanmean(self[t]))))
+                self[t][:] = np.nan_to_num(self[t], nan=float(np.nanmean(self[t])))
         if filling:
             logging.warning(f'{self.mol.capitalize()}: Convergence criteria for minimized energy gradient in NMODE\n '
                             '    has not been satisfied in several frames selected. Filling "NaN" with the mean\n'
@@ -598,17 +724,149 @@ class NMODEout(AmberOutput):
                             '    sander (maxcyc)...\n')
 
 
-def conv_float(word):
-    if '*' in word:
-        GMXMMPBSA_ERROR('Some energy terms are undefined. Please, check the input structure and trajectory. Check this '
-                        'section the docs for more info '
-                        'https://valdes-tresanco-ms.github.io/gmx_MMPBSA/dev/Q%26A/calculations/#possible-solutions')
-    elif 'nan' in word.lower():
-        GMXMMPBSA_ERROR('Some energy terms are undefined. Please, check the input structure and trajectory. Check this '
-                        'section the docs for more info '
-                        'https://valdes-tresanco-ms.github.io/gmx_MMPBSA/dev/Q%26A/calculations/#possible-solutions')
-    else:
-        return float(word)
+UNDEFINED_ENERGIES = ('Some energy terms are undefined. Please, check the input structure and trajectory. Check this '
+                      'section the docs for more info '
+                      'https://valdes-tresanco-ms.github.io/gmx_MMPBSA/dev/Q%26A/calculations/#possible-solutions')
+
+
+class MdoutBlock:
+    """
+    Energy block of the Amber output files. The block starts with a line beginning with label (a regex) and every
+    line is defined by the list of data keys of its values (None for the values we don't need). The values are the
+    ones after the "=" of the "LABEL = value" fields or, if words is True, the words after the label. If optional_last
+    is True, the values of the last line may not be in the file
+    """
+
+    def __init__(self, label: bytes, lines, words=False, optional_last=False):
+        value = rb'[ \t]+(\S+)' if words else rb'[^=\n]*=[ \t]*(\S+)'
+        skip = value.replace(rb'(\S+)', rb'\S+')
+        self.keys = []
+        patterns = []
+        for line in lines:
+            # we don't need to match the fields after the last value we need
+            while line and line[-1] is None:
+                line = line[:-1]
+            patterns.append(b''.join(skip if key is None else value for key in line) + rb'[^\n]*')
+            self.keys.extend(key for key in line if key is not None)
+        pattern = rb'\n' + label + patterns[0] + b''.join(rb'\n' + p for p in patterns[1:-1])
+        if len(patterns) > 1:
+            # The optional line is not present when sander finishes the frame
+            pattern += (rb'(?:\n(?![ \t]*minimization)' + patterns[-1] + rb')?' if optional_last else
+                        rb'\n' + patterns[-1])
+        self.regex = re.compile(pattern)
+        # Lines starting with the label. Used to check that every block was parsed
+        self.anchor = re.compile(rb'\n' + label + (rb'[ \t]' if words else b''))
+
+    def parse(self, buffer, fname, pos=0, endpos=None):
+        """
+        Finds all the blocks in the buffer (between pos and endpos) and converts their values in bulk
+        :return: array with a row per block and a column per key
+        """
+        if endpos is None:
+            endpos = len(buffer)
+        matches = self.regex.findall(buffer, pos, endpos)
+        if len(matches) != len(self.anchor.findall(buffer, pos, endpos)):
+            raise OutputError(f'Unable to parse all the energy blocks in {fname}. The output file may be corrupted')
+        tokens = np.array(matches, dtype=bytes).reshape(-1, len(self.keys))
+        # Optional values not printed
+        tokens[tokens == b''] = b'0'
+        try:
+            values = tokens.astype(np.float64)
+        except ValueError:
+            # undefined energies are printed as *****
+            if np.char.count(tokens, b'*').any():
+                GMXMMPBSA_ERROR(UNDEFINED_ENERGIES)
+            raise OutputError(f'Unable to parse the energy values in {fname}')
+        if np.isnan(values).any():
+            GMXMMPBSA_ERROR(UNDEFINED_ENERGIES)
+        return values
+
+
+def read_mdout_blocks(outfile, blocks):
+    """
+    Parses the energy blocks of an Amber output file. The file is memory-mapped and the blocks are found with a regex
+    over the whole buffer instead of reading line by line
+    :param outfile: the opened output file
+    :param blocks: list of MdoutBlock
+    :return: list of arrays (blocks x values), one per block
+    """
+    if not os.fstat(outfile.fileno()).st_size:
+        return [np.zeros((0, len(block.keys))) for block in blocks]
+    with mmap.mmap(outfile.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        return [block.parse(buffer, outfile.name) for block in blocks]
+
+
+def read_complete_mdout_blocks(outfile, blocks, pos=0):
+    """
+    Same as read_mdout_blocks, but for an output file that may still be written. Only the frames after the offset pos
+    (where the previous call stopped) whose blocks are all in the file, and followed by something else, are parsed,
+    so the frame being written (or a line written partially) is left for the next call
+    :return: list of arrays (blocks x values), one per block, and the offset where the next call must start
+    """
+    empty = [np.zeros((0, len(block.keys))) for block in blocks]
+    size = os.fstat(outfile.fileno()).st_size
+    if size <= pos:
+        return empty, pos
+    with mmap.mmap(outfile.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        # the end of the last complete line
+        end = buffer.rfind(b'\n', pos, size) + 1
+        anchors = [[m.start() for m in block.anchor.finditer(buffer, pos, end)] for block in blocks]
+        nframes = min(len(starts) for starts in anchors)
+        if not nframes:
+            return empty, pos
+        # the last frame is complete if all its blocks are complete and sander printed something after them
+        last = [block.regex.match(buffer, starts[nframes - 1], end) for block, starts in zip(blocks, anchors)]
+        if all(last) and buffer[max(m.end() for m in last):end].strip():
+            cut = max(m.end() for m in last)
+        else:
+            nframes -= 1
+            cut = min(starts[nframes] for starts in anchors)
+        if not nframes:
+            return empty, pos
+        return [block.parse(buffer, outfile.name, pos, cut) for block in blocks], cut
+
+
+def read_decomp_lines(outfile, tokens, chunk_size=None):
+    """
+    Yields the decomposition lines of the output file starting with any of tokens. The file is memory-mapped and
+    searched in chunks of about chunk_size bytes (cut at the end of a line), or at once if chunk_size is None
+    """
+    size = os.fstat(outfile.fileno()).st_size
+    if not size:
+        return
+    regex = re.compile(rb'\n((?:' + b'|'.join(token.encode() for token in tokens) + rb') [^\n]*)')
+    with mmap.mmap(outfile.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        pos = 0
+        while pos < size:
+            end = buffer.find(b'\n', pos + chunk_size) if chunk_size else -1
+            if end == -1:
+                end = size
+            if lines := regex.findall(buffer, pos, end):
+                yield lines
+            pos = end
+
+
+def fixed_width_fields(lines, start, size, count, dtype=np.float64):
+    """
+    Converts count fixed-width fields of size characters (separated by one character) from a byte array of lines,
+    slicing the lines as a 2D byte view
+    :return: array with a row per line and a column per field
+    """
+    columns = lines.view(np.uint8).reshape(len(lines), lines.itemsize)
+    stride = size + 1
+    fields = columns[:, start:start + count * stride]
+    if fields.shape[1] < count * stride:
+        # the separator of the last field may be beyond the end of the line
+        fields = np.pad(fields, ((0, 0), (0, count * stride - fields.shape[1])))
+    fields = np.ascontiguousarray(fields.reshape(len(lines), count, stride)[..., :size]).view(f'S{size}')[..., 0]
+    if dtype is bytes:
+        return fields
+    try:
+        return fields.astype(dtype)
+    except ValueError:
+        if np.char.count(fields, b'*').any():
+            GMXMMPBSA_ERROR(UNDEFINED_ENERGIES)
+        raise OutputError('Unable to parse the decomposition energies')
 
 
 class GBout(AmberOutput):
@@ -622,36 +880,23 @@ class GBout(AmberOutput):
         AmberOutput.__init__(self, mol, INPUT, chamber, **kwargs)
         self.data_keys.extend(['EGB', 'ESURF'])
 
-    def _get_energies(self, outfile):
+    def _mdout_blocks(self):
         """ Parses the mdout files for the GB potential terms """
-        while rawline := outfile.readline():
-            if rawline[:5] == ' BOND':
-                words = rawline.split()
-                self['BOND'][self.frame_idx] = conv_float(words[2])
-                self['ANGLE'][self.frame_idx] = conv_float(words[5])
-                self['DIHED'][self.frame_idx] = conv_float(words[8])
-                words = outfile.readline().split()
-                if self.chamber:
-                    self['UB'][self.frame_idx] = conv_float(words[2])
-                    self['IMP'][self.frame_idx] = conv_float(words[5])
-                    self['CMAP'][self.frame_idx] = conv_float(words[8])
-                    words = outfile.readline().split()
-                self['VDWAALS'][self.frame_idx] = conv_float(words[2])
-                self['EEL'][self.frame_idx] = conv_float(words[5])
-                self['EGB'][self.frame_idx] = conv_float(words[8])
-                words = outfile.readline().split()
-                self['1-4 VDW'][self.frame_idx] = conv_float(words[3])
-                self['1-4 EEL'][self.frame_idx] = conv_float(words[7])
-                self.frame_idx += 1
+        return [self._sander_block(['VDWAALS', 'EEL', 'EGB'], ['1-4 VDW', '1-4 EEL'])]
 
     def _extra_reading(self, fileno):
         # Load the ESURF data from the cpptraj output
-        fname = '%s.%d' % (self.basename, fileno)
-        fname = fname.replace('gb.mdout', 'gb_surf.dat')
+        fname = self._extra_files(fileno)[0]
         surf_data = _get_cpptraj_surf(fname)
-        for sd in surf_data:
-            self['ESURF'][self.extraframe_idx] = sd * self.INPUT['gb']['surften'] + self.INPUT['gb']['surfoff']
-            self.extraframe_idx += 1
+        end = self.extraframe_idx + len(surf_data)
+        if end != self.frame_idx:
+            raise OutputError(f'{fname} and {self.basename}.{fileno} contain a different number of frames')
+        self['ESURF'][self.extraframe_idx:end] = surf_data * self.INPUT['gb']['surften'] + self.INPUT['gb']['surfoff']
+        self.extraframe_idx = end
+
+    def _extra_files(self, fileno):
+        fname = '%s.%d' % (self.basename, fileno)
+        return [fname.replace('gb.mdout', 'gb_surf.dat')]
 
 
 class GBNSR6out(AmberOutput):
@@ -666,29 +911,9 @@ class GBNSR6out(AmberOutput):
         # As the MM terms will be updated, in order to maintain order, we need to initialize these keys
         self.data_keys.extend(['EGB', 'ESURF'])
 
-    def _get_energies(self, outfile):
+    def _mdout_blocks(self):
         """ Parses the mdout files for the GB potential terms """
-        while rawline := outfile.readline():
-            if rawline[:5] == ' BOND':
-                words = rawline.split()
-                self['BOND'][self.frame_idx] = conv_float(words[2])
-                self['ANGLE'][self.frame_idx] = conv_float(words[5])
-                self['DIHED'][self.frame_idx] = conv_float(words[8])
-                words = outfile.readline().split()
-                if self.chamber:
-                    self['UB'][self.frame_idx] = conv_float(words[2])
-                    self['IMP'][self.frame_idx] = conv_float(words[5])
-                    self['CMAP'][self.frame_idx] = conv_float(words[8])
-                    words = outfile.readline().split()
-                self['VDWAALS'][self.frame_idx] = conv_float(words[2])
-                self['EEL'][self.frame_idx] = conv_float(words[5])
-                self['EGB'][self.frame_idx] = conv_float(words[8])
-                words = outfile.readline().split()
-                self['1-4 VDW'][self.frame_idx] = conv_float(words[3])
-                self['1-4 EEL'][self.frame_idx] = conv_float(words[7])
-                words = outfile.readline().split()
-                self['ESURF'][self.frame_idx] = conv_float(words[2])
-                self.frame_idx += 1
+        return [self._sander_block(['VDWAALS', 'EEL', 'EGB'], ['1-4 VDW', '1-4 EEL'], ['ESURF'])]
 
 
 class MMout(AmberOutput):
@@ -700,25 +925,9 @@ class MMout(AmberOutput):
     def __init__(self, mol, INPUT, chamber=False, **kwargs):
         AmberOutput.__init__(self, mol, INPUT, chamber, **kwargs)
 
-    def _get_energies(self, outfile):
+    def _mdout_blocks(self):
         """ Parses the mdout files for the GB potential terms """
-        while rawline := outfile.readline():
-            if rawline[:5] == ' BOND':
-                words = rawline.split()
-                self['BOND'][self.frame_idx] = conv_float(words[2])
-                self['ANGLE'][self.frame_idx] = conv_float(words[5])
-                self['DIHED'][self.frame_idx] = conv_float(words[8])
-                words = outfile.readline().split()
-                if self.chamber:
-                    self['UB'][self.frame_idx] = conv_float(words[2])
-                    self['IMP'][self.frame_idx] = conv_float(words[5])
-                    self['CMAP'][self.frame_idx] = conv_float(words[8])
-                    words = outfile.readline().split()
-                self['VDWAALS'][self.frame_idx] = conv_float(words[2])
-                self['EEL'][self.frame_idx] = conv_float(words[5])
-                words = outfile.readline().split()
-                self['1-4 VDW'][self.frame_idx] = conv_float(words[3])
-                self['1-4 EEL'][self.frame_idx] = conv_float(words[7])
+        return [self._sander_block(['VDWAALS', 'EEL'], ['1-4 VDW', '1-4 EEL'])]
 
 
 class PBout(AmberOutput):
@@ -732,51 +941,35 @@ class PBout(AmberOutput):
         # FIXME: include Non linear PB
         self.data_keys.extend(['EPB', 'ENPOLAR', 'EDISPER'])
 
-    def _get_energies(self, outfile):
+    def _mdout_blocks(self):
         """ Parses the energy values from the output files """
-        while rawline := outfile.readline():
-            if rawline[:5] == ' BOND':
-                words = rawline.split()
-                self['BOND'][self.frame_idx] = conv_float(words[2])
-                self['ANGLE'][self.frame_idx] = conv_float(words[5])
-                self['DIHED'][self.frame_idx] = conv_float(words[8])
-                words = outfile.readline().split()
-                if self.chamber:
-                    self['UB'][self.frame_idx] = conv_float(words[2])
-                    self['IMP'][self.frame_idx] = conv_float(words[5])
-                    self['CMAP'][self.frame_idx] = conv_float(words[8])
-                    words = outfile.readline().split()
-                self['VDWAALS'][self.frame_idx] = conv_float(words[2])
-                self['EEL'][self.frame_idx] = conv_float(words[5])
-                self['EPB'][self.frame_idx] = conv_float(words[8])
-                words = outfile.readline().split()
-                self['1-4 VDW'][self.frame_idx] = conv_float(words[3])
-                self['1-4 EEL'][self.frame_idx] = conv_float(words[7])
-                words = outfile.readline().split()
-
-                # electrostatic solvation free energy will not report in amber ouput
-                # when `ipb=0`. in such case, set it as 0 would be reasonable
-                if self.INPUT['pb']['ipb'] == 0:
-                    self['ENPOLAR'][self.frame_idx] = 0
-                else:
-                    self['ENPOLAR'][self.frame_idx] = conv_float(words[2])
-
-                if self.INPUT['pb']['inp'] == 2 and not self.apbs:
-                    self['EDISPER'][self.frame_idx] = conv_float(words[5])
-                self.frame_idx += 1
+        lines = [['VDWAALS', 'EEL', 'EPB'], ['1-4 VDW', '1-4 EEL']]
+        # electrostatic solvation free energy will not report in amber ouput
+        # when `ipb=0`. in such case, set it as 0 would be reasonable
+        npolar = [None if self.INPUT['pb']['ipb'] == 0 else 'ENPOLAR',
+                  'EDISPER' if self.INPUT['pb']['inp'] == 2 and not self.apbs else None]
+        if any(npolar):
+            lines.append(npolar)
+        return [self._sander_block(*lines)]
 
 
 class RISMout(AmberOutput):
     # Which of those keys belong to the gas phase energy contributions
     print_levels = {'BOND': 2, 'ANGLE': 2, 'DIHED': 2, 'VDWAALS': 1, 'EEL': 1,
                     '1-4 VDW': 2, '1-4 EEL': 2, 'ERISM': 1}
+    # Labels of the solute potential energy
+    epot_label = rb'(?:solute_epot|solutePotentialEnergy)'
 
     def __init__(self, mol, INPUT, chamber=False, solvtype=0, **kwargs):
         AmberOutput.__init__(self, mol, INPUT, chamber)
         self.solvtype = solvtype
         self.data_keys.extend(['ERISM'])
 
-    def _get_energies(self, outfile):
+    def _epot_block(self):
+        return MdoutBlock(self.epot_label, [[None, 'VDWAALS', 'EEL', 'BOND', 'ANGLE', 'DIHED', '1-4 VDW', '1-4 EEL']],
+                          words=True)
+
+    def _mdout_blocks(self):
         """ Parses the RISM output file for energy terms """
 
         # Getting the RISM solvation energies requires some decision-making.
@@ -785,28 +978,10 @@ class RISMout(AmberOutput):
         # 1. Standard free energy (solvtype==0)
         # 2. GF free energy (solvtype==1)
         # 3. PC+ GF free energy (solvtype==2)
-
-        while rawline := outfile.readline():
-
-            if re.match(r'(solute_epot|solutePotentialEnergy)', rawline):
-                words = rawline.split()
-                self['VDWAALS'][self.frame_idx] = conv_float(words[2])
-                self['EEL'][self.frame_idx] = conv_float(words[3])
-                self['BOND'][self.frame_idx] = conv_float(words[4])
-                self['ANGLE'][self.frame_idx] = conv_float(words[5])
-                self['DIHED'][self.frame_idx] = conv_float(words[6])
-                self['1-4 VDW'][self.frame_idx] = conv_float(words[7])
-                self['1-4 EEL'][self.frame_idx] = conv_float(words[8])
-
-            elif self.solvtype == 0 and re.match(r'(rism_exchem|rism_excessChemicalPotential)\s', rawline):
-                self['ERISM'][self.frame_idx] = conv_float(rawline.split()[1])
-                self.frame_idx += 1
-            elif self.solvtype == 1 and re.match(r'(rism_exchGF|rism_excessChemicalPotentialGF)\s', rawline):
-                self['ERISM'][self.frame_idx] = conv_float(rawline.split()[1])
-                self.frame_idx += 1
-            elif self.solvtype == 2 and re.match(r'(rism_exchPCPLUS|rism_excessChemicalPotentialPCPLUS)\s', rawline):
-                self['ERISM'][self.frame_idx] = conv_float(rawline.split()[1])
-                self.frame_idx += 1
+        label = {0: rb'(?:rism_exchem|rism_excessChemicalPotential)',
+                 1: rb'(?:rism_exchGF|rism_excessChemicalPotentialGF)',
+                 2: rb'(?:rism_exchPCPLUS|rism_excessChemicalPotentialPCPLUS)'}[self.solvtype]
+        return [self._epot_block(), MdoutBlock(label, [['ERISM']], words=True)]
 
 
 class RISM_std_Out(RISMout):
@@ -840,47 +1015,21 @@ class PolarRISMout(RISMout):
         self.solvtype = solvtype
         self.data_keys.extend(['POLAR SOLV', 'APOLAR SOLV'])
 
-    def _get_energies(self, outfile):
+    def _mdout_blocks(self):
         """ Parses the RISM output file for energy terms """
         # Getting the RISM solvation energies requires some decision-making.
         # There are 2 possibilities (right now):
         #
         # 1. Standard free energy (solvtype==0)
         # 2. GF free energy (solvtype==1)
-
-        while rawline := outfile.readline():
-
-            if re.match(r'(solute_epot|solutePotentialEnergy)', rawline):
-                words = rawline.split()
-                self['VDWAALS'][self.frame_idx] = conv_float(words[2])
-                self['EEL'][self.frame_idx] = conv_float(words[3])
-                self['BOND'][self.frame_idx] = conv_float(words[4])
-                self['ANGLE'][self.frame_idx] = conv_float(words[5])
-                self['DIHED'][self.frame_idx] = conv_float(words[6])
-                self['1-4 VDW'][self.frame_idx] = conv_float(words[8])
-                self['1-4 EEL'][self.frame_idx] = conv_float(words[8])
-
-            elif self.solvtype == 0 and re.match(
-                    r'(rism_polar|rism_polarExcessChemicalPotential)\s', rawline):
-                self['POLAR SOLV'][self.frame_idx] = conv_float(rawline.split()[1])
-            elif self.solvtype == 0 and re.match(
-                    r'(rism_apolar|rism_apolarExcessChemicalPotential)\s', rawline):
-                self['APOLAR SOLV'][self.frame_idx] = conv_float(rawline.split()[1])
-                self.frame_idx += 1
-            elif self.solvtype == 1 and re.match(
-                    r'(rism_polGF|rism_polarExcessChemicalPotentialGF)\s', rawline):
-                self['POLAR SOLV'][self.frame_idx] = conv_float(rawline.split()[1])
-            elif self.solvtype == 1 and re.match(
-                    r'(rism_apolGF|rism_apolarExcessChemicalPotentialGF)\s', rawline):
-                self['APOLAR SOLV'][self.frame_idx] = conv_float(rawline.split()[1])
-                self.frame_idx += 1
-            elif self.solvtype == 2 and re.match(
-                    r'(rism_polPCPLUS|rism_polarExcessChemicalPotentialPCPLUS)\s', rawline):
-                self['POLAR SOLV'][self.frame_idx] = conv_float(rawline.split()[1])
-            elif self.solvtype == 2 and re.match(
-                    r'(rism_apolPCPLUS|rism_apolarExcessChemicalPotentialPCPLUS)\s', rawline):
-                self['APOLAR SOLV'][self.frame_idx] = conv_float(rawline.split()[1])
-                self.frame_idx += 1
+        polar, apolar = {0: (rb'(?:rism_polar|rism_polarExcessChemicalPotential)',
+                             rb'(?:rism_apolar|rism_apolarExcessChemicalPotential)'),
+                         1: (rb'(?:rism_polGF|rism_polarExcessChemicalPotentialGF)',
+                             rb'(?:rism_apolGF|rism_apolarExcessChemicalPotentialGF)'),
+                         2: (rb'(?:rism_polPCPLUS|rism_polarExcessChemicalPotentialPCPLUS)',
+                             rb'(?:rism_apolPCPLUS|rism_apolarExcessChemicalPotentialPCPLUS)')}[self.solvtype]
+        return [self._epot_block(), MdoutBlock(polar, [['POLAR SOLV']], words=True),
+                MdoutBlock(apolar, [['APOLAR SOLV']], words=True)]
 
 
 class PolarRISM_std_Out(PolarRISMout):
@@ -915,42 +1064,14 @@ class QMMMout(GBout):
 
         self.data_keys.extend(['ESCF'])
 
-    def _get_energies(self, outfile):
+    def _mdout_blocks(self):
         """ Parses the energies from a QM/MM output file. NOTE, however, that a
             QMMMout *could* just be a GBout with ESCF==0 if the QM region lies
             entirely outside this system
         """
-
-        while rawline := outfile.readline():
-            if rawline[:5] == ' BOND':
-                words = rawline.split()
-                self['BOND'][self.frame_idx] = conv_float(words[2])
-                self['ANGLE'][self.frame_idx] = conv_float(words[5])
-                self['DIHED'][self.frame_idx] = conv_float(words[8])
-                words = outfile.readline().split()
-
-                if self.chamber:
-                    self['UB'][self.frame_idx] = conv_float(words[2])
-                    self['IMP'][self.frame_idx] = conv_float(words[5])
-                    self['CMAP'][self.frame_idx] = conv_float(words[8])
-                    words = outfile.readline().split()
-
-                self['VDWAALS'][self.frame_idx] = conv_float(words[2])
-                self['EEL'][self.frame_idx] = conv_float(words[5])
-                self['EGB'][self.frame_idx] = conv_float(words[8])
-                words = outfile.readline().split()
-                self['1-4 VDW'][self.frame_idx] = conv_float(words[3])
-                self['1-4 EEL'][self.frame_idx] = conv_float(words[7])
-                words = outfile.readline().split()
-                # This is where ESCF will be. Since ESCF can differ based on which
-                # qmtheory was chosen, we just check to see if it's != ESURF:
-                if words[0] == 'minimization':
-                    continue
-                elif words[0].endswith('='):
-                    self['ESCF'][self.frame_idx] = conv_float(words[1])
-                else:
-                    self['ESCF'][self.frame_idx] = conv_float(words[2])
-                self.frame_idx += 1
+        # This is where ESCF will be (*ESCF= or *ESCF =). When the QM region lies outside this system, sander finishes
+        # the frame instead
+        return [self._sander_block(['VDWAALS', 'EEL', 'EGB'], ['1-4 VDW', '1-4 EEL'], ['ESCF'], optional_last=True)]
 
 
 class BindingStatistics(dict):
@@ -1013,37 +1134,29 @@ class BindingStatistics(dict):
             for component in data_key_owner[key]:
                 self[component] = self[key] + self[component]
 
-    def _print_vectors(self, csvwriter):
+    def _print_vectors(self, writer):
         """ Output all of the energy terms including the differences if we're
             doing a single trajectory simulation and there are no missing terms
         """
         term_text = 'Entropy' if isinstance(self.com, NMODEout) else 'Energy'
-        csvwriter.writerow([f'Complex {term_text} Terms'])
-        self.com._print_vectors(csvwriter)
-        csvwriter.writerow([])
-        csvwriter.writerow([f'Receptor {term_text} Terms'])
-        self.rec._print_vectors(csvwriter)
-        csvwriter.writerow([])
-        csvwriter.writerow([f'Ligand {term_text} Terms'])
-        self.lig._print_vectors(csvwriter)
-        csvwriter.writerow([])
-
-        csvwriter.writerow([f'Delta {term_text} Terms'])
+        writer.title(f'Complex {term_text} Terms', 1)
+        self.com._print_vectors(writer)
+        writer.writerow([])
+        writer.title(f'Receptor {term_text} Terms', 1)
+        self.rec._print_vectors(writer)
+        writer.writerow([])
+        writer.title(f'Ligand {term_text} Terms', 1)
+        self.lig._print_vectors(writer)
+        writer.writerow([])
+
+        writer.title(f'Delta {term_text} Terms', 1)
         print_keys = list(self.data_keys)
         # Add on the composite keys
         print_keys += self.composite_keys
-
-        # write the header
-        csvwriter.writerow(['Frame #'] + print_keys)
-
-        # write out each frame
-        c = self.com.INPUT['nmode']['nmstartframe'] if isinstance(self.com, NMODEout) else self.com.INPUT['general'][
-            'startframe']
-        for i in range(self.numframes):
-            csvwriter.writerow([c] + [round(self[key][i], 2) for key in print_keys])
-            c += self.com.INPUT['nmode']['nminterval'] if isinstance(self.com, NMODEout) else self.com.INPUT['general'][
-                'interval']
-        csvwriter.writerow([])
+        values = np.array([self[key][:self.numframes] for key in print_keys]).T
+        frames = frame_numbers(self.com.INPUT, self.numframes, isinstance(self.com, NMODEout))
+        writer.writeblock(['Frame #'] + print_keys, [frames], values)
+        writer.writerow([])
 
     def report_inconsistency(self, output_format: str = 'ascii'):
         _output_format = 0 if output_format == 'ascii' else 1
@@ -1167,23 +1280,15 @@ class DeltaDeltaStatistics(dict):
             for component in data_key_owner[key]:
                 self[component] = self[key] + self[component]
 
-    def _print_vectors(self, csvwriter):
+    def _print_vectors(self, writer):
         """ Output all of the energy terms including the differences if we're
             doing a single trajectory simulation and there are no missing terms
         """
-        csvwriter.writerow([f'Delta Delta {self.term_text} Terms (Mutant - Normal)'])
-
-        # write the header
-        csvwriter.writerow(['Frame #'] + list(self.keys()))
-
-        # write out each frame
-        c = self.norm.INPUT['nmode']['nmstartframe'] if isinstance(self.norm, NMODEout) else \
-            self.norm.INPUT['general']['startframe']
-        for i in range(self.numframes):
-            csvwriter.writerow([c] + [round(self[key][i], 2) for key in self])
-            c += self.norm.INPUT['nmode']['nminterval'] if isinstance(self.norm, NMODEout) else \
-                self.norm.INPUT['general']['interval']
-        csvwriter.writerow([])
+        writer.title(f'Delta Delta {self.term_text} Terms (Mutant - Normal)', 1)
+        values = np.array([self[key][:self.numframes] for key in self]).T
+        frames = frame_numbers(self.norm.INPUT, self.numframes, isinstance(self.norm, NMODEout))
+        writer.writeblock(['Frame #'] + list(self.keys()), [frames], values)
+        writer.writerow([])
 
     def summary_output(self):
         summary = self.summary()
@@ -1262,24 +1367,15 @@ class DeltaIEC2Statistic(dict):
             else:
                 self[key] = self.mut[key].corr_sub(self.norm[key])
 
-    def _print_vectors(self, csvwriter):
+    def _print_vectors(self, writer):
         """ Output all of the energy terms including the differences if we're
             doing a single trajectory simulation and there are no missing terms
         """
-
-        csvwriter.writerow(['Delta Delta Entropy Terms (Mutant - Normal)'])
-
-        # write the header
-        csvwriter.writerow(['Frame #'] + list(self.keys()))
-
-        # write out each frame
-        c = self.norm.INPUT['nmode']['nmstartframe'] if isinstance(self.norm, NMODEout) else\
-            self.norm.INPUT['general']['startframe']
-        for i in range(self.numframes):
-            csvwriter.writerow([c] + [round(self[key][i], 2) for key in self])
-            c += self.norm.INPUT['nmode']['nminterval'] if isinstance(self.norm, NMODEout) else\
-                self.norm.INPUT['general']['interval']
-        csvwriter.writerow([])
+        writer.title('Delta Delta Entropy Terms (Mutant - Normal)', 1)
+        values = np.array([self[key][:self.numframes] for key in self]).T
+        frames = frame_numbers(self.norm.INPUT, self.numframes, isinstance(self.norm, NMODEout))
+        writer.writeblock(['Frame #'] + list(self.keys()), [frames], values)
+        writer.writerow([])
 
     def summary_output(self):
         summary = self.summary()
@@ -1319,11 +1415,18 @@ class DeltaIEC2Statistic(dict):
 
 
 class DecompOut(dict):
-    """ Class for decomposition output file to collect statistics and output them """
+    """
+    Class for decomposition output file to collect statistics and output them. The energies are stored in a single
+    array with shape (token, frame, residue, term), with the residue labels in residues. The usual dict access
+    (self[token][residue][term]) is kept as a view layer, where every term is an EnergyVector view of that array
+    """
     indicator = "                    PRINT DECOMP - TOTAL ENERGIES"
     descriptions = {'TDC': 'Total Energy Decomposition:',
                     'SDC': 'Sidechain Energy Decomposition:',
                     'BDC': 'Backbone Energy Decomposition:'}
+    terms = ('int', 'vdw', 'eel', 'pol', 'sas', 'tot')
+    # Width of the decomp lines (token, residue and 5 energy terms with their separators)
+    line_width = 61
 
     def __init__(self, mol: str, **kwargs):
         super(DecompOut, self).__init__(**kwargs)
@@ -1342,16 +1445,23 @@ class DecompOut(dict):
         self.surften = None
         self.frame_idx = 0
         self.current_file = 0  # File counter
+        self.array = None
+        self.residues = None
+
+    def __reduce_ex__(self, protocol):
+        if self.array is None:
+            return super(DecompOut, self).__reduce_ex__(protocol)
+        # The dict view is rebuilt from the array, so we don't pickle the energies twice
+        return self.__class__, (self.mol,), self.__dict__
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if state.get('array') is not None:
+            self._set_views()
 
     def set_frame_range(self, start=0, end=None, interval=1):
-        frames_updated = False
-        for term in self.allowed_tokens:
-            for res in self[term]:
-                for et in self[term][res]:
-                    self[term][res][et] = self[term][res][et][start:end:interval]
-                    if not frames_updated:
-                        self.numframes = len(self[term][res][et])
-                        frames_updated = True
+        self.array = self.array[:, start:end:interval]
+        self.numframes = self.array.shape[1]
         self._fill_composite_terms()
 
     def parse_from_file(self, basename, resl, INPUT, surften, num_files=1, numframes=1, mut=False):
@@ -1372,98 +1482,101 @@ class DecompOut(dict):
             self.num_terms = int(self._get_num_terms())
         except TypeError:
             raise OutputError('DecompOut: Not a decomp output file')
-        for token in self.allowed_tokens:
-            self[token] = {}
 
         self._read()
         self._fill_composite_terms()
 
     def _get_num_terms(self):
         """ Gets the number of terms in the output file """
-        with open('%s.%d' % (self.basename, 0), 'r') as decfile:
-            lines = decfile.readlines()
         num_terms = 0
         flag = False
-        for line in lines:
-            if line[:3] == 'TDC':
-                num_terms += 1
-                flag = True
-            elif flag:
-                break
-            # We've now gotten to the end of the Total Decomp Contribution,
-            # so we know how many terms we have
+        with open('%s.%d' % (self.basename, 0), 'r') as decfile:
+            for line in decfile:
+                if line[:3] == 'TDC':
+                    num_terms += 1
+                    flag = True
+                elif flag:
+                    break
+                # We've now gotten to the end of the Total Decomp Contribution,
+                # so we know how many terms we have
         if not flag:
             raise TypeError(f"{self.basename}.0 have 0 TDC starts")
         return num_terms
 
+    def _read_lines(self):
+        """ Reads the lines of the allowed tokens of all the output files as a fixed-width byte array """
+        lines = []
+        for fileno in range(self.num_files):
+            with open('%s.%d' % (self.basename, fileno)) as output_file:
+                for chunk in read_decomp_lines(output_file, self.allowed_tokens):
+                    lines.extend(chunk)
+        return np.array(lines, dtype=f'S{self.line_width}')
+
     def _read(self):
         """
         Internal reading function. This should be called at the end of __init__.
-        It loops through all of the output files to populate the arrays
+        It reads all of the output files and fills the energy array at once
         """
-        for fileno in range(self.num_files):
-            with open('%s.%d' % (self.basename, fileno)) as output_file:
-                self._get_decomp_energies(output_file)
-
-    def _get_decomp_energies(self, outfile):
-        while line := outfile.readline():
-            if self.frame_idx == self.numframes:
-                self.frame_idx = 0
-            if line[:3] in self.allowed_tokens:
-                if self.mut and self.resl[int(line[4:10])].is_mutant():
-                    resnum = self.resl[int(line[4:10])].mutant_string
-                else:
-                    resnum = self.resl[int(line[4:10])].string
-                internal = float(line[11:20])
-                vdw = float(line[21:30])
-                eel = float(line[31:40])
-                pol = float(line[41:50])
-                sas = float(line[51:60]) * self.surften
-
-                if resnum not in self[line[:3]]:
-                    self[line[:3]][resnum] = {}
-                    for term in ['int', 'vdw', 'eel', 'pol', 'sas']:
-                        self[line[:3]][resnum][term] = EnergyVector(self.numframes)
-
-                self[line[:3]][resnum]['int'][self.frame_idx] = internal
-                self[line[:3]][resnum]['vdw'][self.frame_idx] = vdw
-                self[line[:3]][resnum]['eel'][self.frame_idx] = eel
-                self[line[:3]][resnum]['pol'][self.frame_idx] = pol
-                self[line[:3]][resnum]['sas'][self.frame_idx] = sas
-
-                if line[:3] == self.allowed_tokens[-1] and resnum == list(self.resl.values())[-1].string:
-                    self.frame_idx += 1
-
-    def _print_vectors(self, csvwriter):
+        lines = self._read_lines()
+        line_tokens = fixed_width_fields(lines, 0, 3, 1, bytes)[:, 0]
+        self.array = np.zeros((len(self.allowed_tokens), self.numframes, self.num_terms, len(self.terms)))
+        for t, token in enumerate(self.allowed_tokens):
+            token_lines = lines[line_tokens == token.encode()]
+            if len(token_lines) % self.num_terms:
+                raise OutputError(f'{self.basename}: The number of {token} lines is not a multiple of the number of '
+                                  f'residues ({self.num_terms})')
+            resnums = fixed_width_fields(token_lines, 4, 6, 1, int).reshape(-1, self.num_terms)
+            if not len(resnums):
+                continue
+            if (resnums != resnums[0]).any():
+                raise OutputError(f'{self.basename}: The {token} residues are not the same in every frame')
+            residues = [self._res_label(resnum) for resnum in resnums[0]]
+            if self.residues is None:
+                self.residues = residues
+            elif residues != self.residues:
+                raise OutputError(f'{self.basename}: The {token} and {self.allowed_tokens[0]} residues are different')
+            values = fixed_width_fields(token_lines, 11, 9, 5).reshape(len(resnums), self.num_terms, 5)
+            values[..., 4] *= self.surften
+            # As in the sequential reading, the frames after numframes are written again from the first one
+            frames = np.arange(len(values))[-self.numframes:]
+            self.array[t, frames % self.numframes, :, :5] = values[-self.numframes:]
+        if self.residues is None:
+            self.residues = []
+            self.array = self.array[:, :, :0]
+
+    def _res_label(self, resnum):
+        if self.mut and self.resl[resnum].is_mutant():
+            return self.resl[resnum].mutant_string
+        return self.resl[resnum].string
+
+    def _set_views(self):
+        """ Builds the dict access to the energy array """
+        # TOTAL keeps the propagated standard deviation of the terms, like the sum of EnergyVectors
+        std = np.ascontiguousarray(np.moveaxis(self.array[..., :-1], 1, -1)).std(axis=-1).tolist()
+        for t, token in enumerate(self.allowed_tokens):
+            self[token] = {}
+            for r, res in enumerate(self.residues):
+                self[token][res] = {term: self.array[t, :, r, c].view(EnergyVector) for c, term in enumerate(self.terms)}
+                com_std = 0.0
+                for term_std in std[t][r]:
+                    com_std = get_std(com_std, term_std)
+                self[token][res]['tot'].com_std = com_std
+
+    def _print_vectors(self, writer):
         tokens = {'TDC': 'Total Decomposition Contribution (TDC)',
                   'SDC': 'Sidechain Decomposition Contribution (SDC)',
                   'BDC': 'Backbone Decomposition Contribution (BDC)'}
-        for term in self.allowed_tokens:
-            csvwriter.writerow([tokens[term]])
-            csvwriter.writerow(['Frame #', 'Residue', 'Internal', 'van der Waals', 'Electrostatic', 'Polar Solvation',
-                                'Non-Polar Solv.', 'TOTAL'])
-            c = self.INPUT['general']['startframe']
-            for i in range(self.numframes):
-                for res in self[term]:
-                    csvwriter.writerow([c, res] + [round(self[term][res][key][i], 2) for key in self[term][res]])
-                c += self.INPUT['general']['interval']
+        frames = frame_numbers(self.INPUT, self.numframes)
+        for t, term in enumerate(self.allowed_tokens):
+            writer.title(tokens[term], 2)
+            writer.writeblock(['Frame #', 'Residue', 'Internal', 'van der Waals', 'Electrostatic', 'Polar Solvation',
+                               'Non-Polar Solv.', 'TOTAL'],
+                              [np.repeat(frames, len(self.residues)), self.residues * self.numframes],
+                              self.array[t].reshape(-1, len(self.terms)))
 
     def _fill_composite_terms(self):
-        for term in self:
-            for res in self[term]:
-                item = self[term][res][list(self[term][res].keys())[0]]
-                # pair decomp scheme
-                if isinstance(item, dict):
-                    for res2 in self[term][res]:
-                        tot = EnergyVector(self.numframes)
-                        for e in self[term][res][res2]:
-                            tot = tot + self[term][res][res2][e]
-                        self[term][res][res2]['tot'] = tot
-                else:
-                    tot = EnergyVector(self.numframes)
-                    for e in self[term][res]:
-                        tot = tot + self[term][res][e]
-                    self[term][res]['tot'] = tot
+        self.array[..., -1] = self.array[..., :-1].sum(axis=-1)
+        self._set_views()
 
     def summary(self, output_format: str = 'ascii'):
         """ Writes the summary in ASCII format to and open output_file """
@@ -1529,71 +1642,268 @@ class DecompOut(dict):
         return text if _output_format else '\n'.join(text)
 
 
-class PairDecompOut(DecompOut):
-    """ Same as DecompOut, but for Pairwise decomposition """
-    indicator = "                    PRINT PAIR DECOMP - TOTAL ENERGIES"
+class PairDecompView(Mapping):
+    """ Dict access (residue -> residue -> term -> EnergyVector) to a token of a pairwise decomposition store """
 
-    def set_frame_range(self, start=0, end=None, interval=1):
-        frames_updated = False
-        for term in self.allowed_tokens:
-            for res in self[term]:
-                for res2 in self[term][res]:
-                    for et in self[term][res][res2]:
-                        self[term][res][res2][et] = self[term][res][res2][et][start:end:interval]
-                        if not frames_updated:
-                            self.numframes = len(self[term][res][res2][et])
-                            frames_updated = True
-        self._fill_composite_terms()
+    def __init__(self, store, t):
+        self.store = store
+        self.t = t
 
-    def _get_decomp_energies(self, outfile):
-        while line := outfile.readline():
-            if line[:3] in self.allowed_tokens:
-                if self.mut and self.resl[int(line[4:11])].is_mutant():
-                    resnum = self.resl[int(line[4:11])].mutant_string
-                else:
-                    resnum = self.resl[int(line[4:11])].string
-                if self.mut and self.resl[int(line[13:20])].is_mutant():
-                    resnum2 = self.resl[int(line[13:20])].mutant_string
-                else:
-                    resnum2 = self.resl[int(line[13:20])].string
-
-                internal = float(line[21:33])
-                vdw = float(line[34:46])
-                eel = float(line[47:59])
-                pol = float(line[60:72])
-                sas = float(line[73:85]) * self.surften
-
-                if resnum not in self[line[:3]]:
-                    self[line[:3]][resnum] = {}
-
-                if resnum2 not in self[line[:3]][resnum]:
-                    self[line[:3]][resnum][resnum2] = {}
-                    for term in ['int', 'vdw', 'eel', 'pol', 'sas']:
-                        self[line[:3]][resnum][resnum2][term] = EnergyVector(self.numframes)
-
-                self[line[:3]][resnum][resnum2]['int'][self.frame_idx] = internal
-                self[line[:3]][resnum][resnum2]['vdw'][self.frame_idx] = vdw
-                self[line[:3]][resnum][resnum2]['eel'][self.frame_idx] = eel
-                self[line[:3]][resnum][resnum2]['pol'][self.frame_idx] = pol
-                self[line[:3]][resnum][resnum2]['sas'][self.frame_idx] = sas
-                if line[:3] == self.allowed_tokens[-1] and resnum == list(self.resl.values())[-1].string == resnum2:
-                    self.frame_idx += 1
-
-    def _print_vectors(self, csvwriter):
+    def __getitem__(self, res):
+        i = self.store.residue_index.get(res)
+        if i is None or self.store.indptr[i] == self.store.indptr[i + 1]:
+            raise KeyError(res)
+        return PairDecompRowView(self.store, self.t, i)
+
+    def __iter__(self):
+        indptr = self.store.indptr
+        return (res for i, res in enumerate(self.store.residues) if indptr[i + 1] > indptr[i])
+
+    def __len__(self):
+        return int(np.count_nonzero(np.diff(self.store.indptr)))
+
+
+class PairDecompRowView(Mapping):
+    """ Pairs of a residue in a PairDecompView. The EnergyVectors are built when requested """
+
+    def __init__(self, store, t, i):
+        self.store = store
+        self.t = t
+        self.start, self.end = int(store.indptr[i]), int(store.indptr[i + 1])
+
+    def __getitem__(self, res2):
+        j = self.store.residue_index.get(res2)
+        pair = np.flatnonzero(self.store.indices[self.start:self.end] == j) if j is not None else []
+        if not len(pair):
+            raise KeyError(res2)
+        return self.store.pair_vectors(self.t, self.start + int(pair[0]))
+
+    def __iter__(self):
+        return (self.store.residues[j] for j in self.store.indices[self.start:self.end])
+
+    def __len__(self):
+        return self.end - self.start
+
+
+class PairDecompStore:
+    """
+    Sparse storage of the pairwise decomposition. The pairs are kept in a CSR-like layout: the pairs of residues[i]
+    are the residues with index indices[indptr[i]:indptr[i + 1]]. Subclasses define _energies, which returns the
+    energies (float64, with TOTAL) of a token for a range of frames and pairs. The dict access
+    (self[token][res][res2][term]), the statistics and the printed vectors are built on top of it
+    """
+    terms = DecompOut.terms
+    # Bytes of output file or energies processed at once
+    chunk_size = 8 * 2 ** 20
+    # Terms with a propagated standard deviation (EnergyVector.com_std)
+    com_std_terms = ('tot',)
+
+    def __reduce_ex__(self, protocol):
+        # The dict views are rebuilt from the arrays, and a memory-mapped array is pickled as a normal one
+        state = {key: np.asarray(value) if isinstance(value, np.memmap) else value
+                 for key, value in self.__dict__.items()}
+        return copyreg.__newobj__, (self.__class__,), state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if state.get('indptr') is not None:
+            self._set_views()
+
+    def _set_views(self):
+        """ Builds the dict access to the pairs """
+        self.residue_index = {res: i for i, res in enumerate(self.residues)}
+        for t, token in enumerate(self.allowed_tokens):
+            self[token] = PairDecompView(self, t)
+
+    def pair_labels(self):
+        """ Returns the (residue, residue) labels of the stored pairs """
+        first = np.repeat(np.arange(len(self.residues)), np.diff(self.indptr))
+        return [(self.residues[i], self.residues[j]) for i, j in zip(first.tolist(), self.indices.tolist())]
+
+    def pair_vectors(self, t, pair):
+        """ Returns the terms of a stored pair as EnergyVectors """
+        values = self._energies(t, pairs=slice(pair, pair + 1))[:, 0]
+        return {term: EnergyVector(values[:, c],
+                                   float(self.stdev[t, pair, c]) if term in self.com_std_terms else None)
+                for c, term in enumerate(self.terms)}
+
+    def _energies(self, t, frames=slice(None), pairs=slice(None)):
+        raise NotImplementedError
+
+    def _pair_stats(self):
+        """ Returns the mean and the standard deviation (token x pair x term) of the stored pairs """
+        shape = (len(self.allowed_tokens), len(self.indices), len(self.terms))
+        mean, std = np.zeros(shape), np.zeros(shape)
+        step = max(1, self.chunk_size // (8 * len(self.terms) * max(1, self.numframes)))
+        for t in range(shape[0]):
+            for start in range(0, shape[1], step):
+                pairs = slice(start, start + step)
+                # frames in the last axis, as in the EnergyVector statistics
+                values = np.ascontiguousarray(np.moveaxis(self._energies(t, pairs=pairs), 0, -1))
+                mean[t, pairs] = values.mean(axis=-1)
+                std[t, pairs] = values.std(axis=-1)
+        return mean, std
+
+    def _fill_composite_terms(self):
+        self.mean, self.stdev = self._pair_stats()
+        # TOTAL keeps the propagated standard deviation of the terms, like the sum of EnergyVectors
+        tot_std = np.zeros(self.stdev.shape[:2])
+        for c in range(len(self.terms) - 1):
+            tot_std = np.sqrt(tot_std ** 2 + self.stdev[..., c] ** 2)
+        self.stdev[..., -1] = tot_std
+        self._set_views()
+
+    def _summary_rows(self, token):
+        """ Returns the labels, averages and standard deviations of the pairs of token """
+        t = self.allowed_tokens.index(token)
+        return zip(self.pair_labels(), self.mean[t].tolist(), self.stdev[t].tolist())
+
+    def _print_vectors(self, writer):
         tokens = {'TDC': 'Total Decomposition Contribution (TDC)',
                   'SDC': 'Sidechain Decomposition Contribution (SDC)',
                   'BDC': 'Backbone Decomposition Contribution (BDC)'}
-        for term in self.allowed_tokens:
-            csvwriter.writerow([tokens[term]])
-            csvwriter.writerow(['Frame #', 'Resid 1', 'Resid 2', 'Internal', 'van der Waals', 'Electrostatic',
-                                'Polar Solvation', 'Non-Polar Solv.', 'TOTAL'])
-            c = self.INPUT['general']['startframe']
-            for i in range(self.numframes):
-                for res in self[term]:
-                    for res2 in self[term][res]:
-                        csvwriter.writerow([c, res, res2] +
-                                           [round(self[term][res][res2][key][i], 2) for key in self[term][res][res2]])
-                c += self.INPUT['general']['interval']
+        labels = self.pair_labels()
+        res, res2 = [label[0] for label in labels], [label[1] for label in labels]
+        frames = frame_numbers(self.INPUT, self.numframes)
+        step = max(1, self.chunk_size // (8 * len(self.terms) * max(1, len(labels))))
+        for t, term in enumerate(self.allowed_tokens):
+            writer.title(tokens[term], 2)
+            for start in range(0, self.numframes, step):
+                values = self._energies(t, slice(start, start + step))
+                writer.writeblock(['Frame #', 'Resid 1', 'Resid 2', 'Internal', 'van der Waals', 'Electrostatic',
+                                   'Polar Solvation', 'Non-Polar Solv.', 'TOTAL'],
+                                  [np.repeat(frames[start:start + step], len(labels)), res * len(values),
+                                   res2 * len(values)], values.reshape(-1, len(self.terms)), write_header=not start)
+
+
+class PairDecompOut(PairDecompStore, DecompOut):
+    """
+    Same as DecompOut, but for Pairwise decomposition. Only the pairs whose TOTAL reaches pair_threshold (kcal/mol,
+    absolute value) in any frame are kept, as well as the pairs of every residue with itself. The energies are stored
+    as printed (sas without surften) in a float32 array with shape (token, frame, pair, term), which is memory-mapped
+    to a file when it is bigger than pair_memory (MB)
+    """
+    indicator = "                    PRINT PAIR DECOMP - TOTAL ENERGIES"
+    # Width of the pair decomp lines (token, 2 residues and 5 energy terms with their separators)
+    line_width = 86
+
+    def __init__(self, mol: str, **kwargs):
+        super(PairDecompOut, self).__init__(mol, **kwargs)
+        self.indptr = None
+        self.indices = None
+        self.mean = None
+        self.stdev = None
+        self.pairs = None
+        self.printed_pairs = None
+
+    def parse_from_file(self, basename, resl, INPUT, surften, num_files=1, numframes=1, mut=False, pairs=None):
+        """
+        pairs are the (residue, residue) labels to keep instead of applying pair_threshold, so the receptor and ligand
+        keep the pairs of the complex
+        """
+        self.pairs = set(pairs) if pairs is not None else None
+        super(PairDecompOut, self).parse_from_file(basename, resl, INPUT, surften, num_files, numframes, mut)
+        self.pairs = None
+
+    def _get_num_terms(self):
+        """ Gets the number of pairs in the output file and the residue numbers of every pair """
+        printed_pairs = []
+        with open('%s.%d' % (self.basename, 0), 'r') as decfile:
+            for line in decfile:
+                if line[:3] == 'TDC':
+                    printed_pairs.append((int(line[4:11]), int(line[13:20])))
+                elif printed_pairs:
+                    break
+        if not printed_pairs:
+            raise TypeError(f"{self.basename}.0 have 0 TDC starts")
+        self.printed_pairs = np.array(printed_pairs)
+        return len(printed_pairs)
+
+    def _iter_lines(self, tokens):
+        """ Yields the lines of tokens of all the output files in chunks, as fixed-width byte arrays """
+        for fileno in range(self.num_files):
+            with open('%s.%d' % (self.basename, fileno)) as output_file:
+                for lines in read_decomp_lines(output_file, tokens, self.chunk_size):
+                    yield np.array(lines, dtype=f'S{self.line_width}')
+
+    def _new_array(self, shape):
+        """ Returns a zeroed float32 array, memory-mapped to a file when it is bigger than pair_memory """
+        if np.prod(shape) * 4 > self.INPUT['decomp']['pair_memory'] * 2 ** 20:
+            filename = f'{self.basename}.npy'
+            logging.info(f'Storing the {self.mol} pairwise decomposition energies in {filename}...')
+            return np.lib.format.open_memmap(filename, mode='w+', dtype=np.float32, shape=shape)
+        return np.zeros(shape, dtype=np.float32)
+
+    def _select_pairs(self, printed_index):
+        """ Returns the mask of the printed pairs to keep """
+        if self.pairs is not None:
+            return np.array([(self.residues[i], self.residues[j]) in self.pairs for i, j in printed_index.tolist()],
+                            dtype=bool)
+        threshold = self.INPUT['decomp']['pair_threshold']
+        if not threshold:
+            return np.ones(self.num_terms, dtype=bool)
+        # Highest absolute TOTAL of every printed pair
+        highest = np.zeros(self.num_terms)
+        count = 0
+        for lines in self._iter_lines(('TDC',)):
+            values = fixed_width_fields(lines, 21, 12, 5)
+            values[:, 4] *= self.surften
+            first = count % self.num_terms
+            count += len(lines)
+            tot = np.zeros(-(-(first + len(lines)) // self.num_terms) * self.num_terms)
+            tot[first:first + len(lines)] = np.abs(values.sum(axis=1))
+            np.maximum(highest, tot.reshape(-1, self.num_terms).max(axis=0), out=highest)
+        return (highest >= threshold) | (printed_index[:, 0] == printed_index[:, 1])
+
+    def _read(self):
+        """
+        Internal reading function. This should be called at the end of __init__.
+        The output files are read in chunks, so only the kept pairs are held in memory
+        """
+        resnums = list(dict.fromkeys(self.printed_pairs[:, 0].tolist() + self.printed_pairs[:, 1].tolist()))
+        self.residues = [self._res_label(resnum) for resnum in resnums]
+        index = {resnum: i for i, resnum in enumerate(resnums)}
+        printed_index = np.array([[index[res], index[res2]] for res, res2 in self.printed_pairs.tolist()])
+        kept = np.flatnonzero(self._select_pairs(printed_index))
+        # CSR order, keeping the printed order of the pairs of every residue
+        kept = kept[np.argsort(printed_index[kept, 0], kind='stable')]
+        self.indices = printed_index[kept, 1]
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(printed_index[kept, 0], minlength=len(resnums)))))
+        stored = np.full(self.num_terms, -1)
+        stored[kept] = np.arange(len(kept))
+
+        self.array = self._new_array((len(self.allowed_tokens), self.numframes, len(kept), len(self.terms) - 1))
+        counts = dict.fromkeys(self.allowed_tokens, 0)
+        for lines in self._iter_lines(self.allowed_tokens):
+            line_tokens = fixed_width_fields(lines, 0, 3, 1, bytes)[:, 0]
+            for t, token in enumerate(self.allowed_tokens):
+                token_lines = lines[line_tokens == token.encode()]
+                slots = counts[token] + np.arange(len(token_lines))
+                counts[token] += len(token_lines)
+                # As in the sequential reading, the frames after numframes are written again from the first one
+                frames = slots // self.num_terms % self.numframes
+                slots %= self.num_terms
+                resnums = np.concatenate((fixed_width_fields(token_lines, 4, 7, 1, int),
+                                          fixed_width_fields(token_lines, 13, 7, 1, int)), axis=1)
+                if (resnums != self.printed_pairs[slots]).any():
+                    raise OutputError(f'{self.basename}: The {token} pairs are not the same in every frame')
+                pairs = stored[slots]
+                kept_lines = pairs >= 0
+                self.array[t, frames[kept_lines], pairs[kept_lines]] = fixed_width_fields(token_lines[kept_lines],
+                                                                                          21, 12, 5)
+        for token, count in counts.items():
+            if count % self.num_terms:
+                raise OutputError(f'{self.basename}: The number of {token} lines is not a multiple of the number of '
+                                  f'pairs ({self.num_terms})')
+        self.printed_pairs = None
+
+    def _energies(self, t, frames=slice(None), pairs=slice(None)):
+        """ Returns the energies (frame x pair x term) of the token t """
+        # float32 keeps the 3 decimals printed by sander (below 8192 kcal/mol), so the printed values are recovered
+        values = np.round(self.array[t, frames][:, pairs].astype(np.float64), 3)
+        values[..., 4] *= self.surften
+        total = values[..., 0] + values[..., 1] + values[..., 2] + values[..., 3] + values[..., 4]
+        return np.concatenate((values, total[..., None]), axis=-1)
 
     def summary(self, output_format: str = 'ascii'):
         """ Writes the summary in ASCII format to and open output_file """
@@ -1603,6 +1913,7 @@ class PairDecompOut(DecompOut):
             text.extend([[f'{self.mol.capitalize()}:']])
         else:
             text.extend([f'{self.mol.capitalize()}:'])
+        sqrt_frames = sqrt(self.numframes)
         for term in self:
             if _output_format:
                 text.extend([[self.descriptions[term]],
@@ -1615,38 +1926,26 @@ class PairDecompOut(DecompOut):
                             '|    Electrostatic    |   Polar Solvation   |   Non-Polar Solv.   |       TOTAL\n' +
                             '-----------------------------------------------------------------------------'
                             '--------------------------------------------------------------------------------------')
-            for res in self[term]:
-                for res2 in self[term][res]:
-                    int_avg = self[term][res][res2]['int'].mean()
-                    int_std = self[term][res][res2]['int'].stdev()
-                    vdw_avg = self[term][res][res2]['vdw'].mean()
-                    vdw_std = self[term][res][res2]['vdw'].stdev()
-                    eel_avg = self[term][res][res2]['eel'].mean()
-                    eel_std = self[term][res][res2]['eel'].stdev()
-                    pol_avg = self[term][res][res2]['pol'].mean()
-                    pol_std = self[term][res][res2]['pol'].stdev()
-                    sas_avg = self[term][res][res2]['sas'].mean()
-                    sas_std = self[term][res][res2]['sas'].stdev()
-                    tot_avg = self[term][res][res2]['tot'].mean()
-                    tot_std = self[term][res][res2]['tot'].stdev()
-                    sqrt_frames = sqrt(len(self[term][res][res2]['int']))
-                    if _output_format:
-                        # FIXME: use EnergyVector.sem or EnergyVector.semp
-                        text.append([res, res2,
-                                     int_avg, int_std, int_std / sqrt_frames,
-                                     vdw_avg, vdw_std, vdw_std / sqrt_frames,
-                                     eel_avg, eel_std, eel_std / sqrt_frames,
-                                     pol_avg, pol_std, pol_std / sqrt_frames,
-                                     sas_avg, sas_std, sas_std / sqrt_frames,
-                                     tot_avg, tot_std, tot_std / sqrt_frames])
-                    else:
-                        text.append(f"{res:14s} | {res2:14s} "
-                                    f"|{int_avg:9.3f} +/- {int_std:6.3f} "
-                                    f"|{vdw_avg:9.3f} +/- {vdw_std:6.3f} "
-                                    f"|{eel_avg:9.3f} +/- {eel_std:6.3f} "
-                                    f"|{pol_avg:9.3f} +/- {pol_std:6.3f} "
-                                    f"|{sas_avg:9.3f} +/- {sas_std:6.3f} "
-                                    f"|{tot_avg:9.3f} +/- {tot_std:6.3f}")
+            for (res, res2), avg, std in self._summary_rows(term):
+                int_avg, vdw_avg, eel_avg, pol_avg, sas_avg, tot_avg = avg
+                int_std, vdw_std, eel_std, pol_std, sas_std, tot_std = std
+                if _output_format:
+                    # FIXME: use EnergyVector.sem or EnergyVector.semp
+                    text.append([res, res2,
+                                 int_avg, int_std, int_std / sqrt_frames,
+                                 vdw_avg, vdw_std, vdw_std / sqrt_frames,
+                                 eel_avg, eel_std, eel_std / sqrt_frames,
+                                 pol_avg, pol_std, pol_std / sqrt_frames,
+                                 sas_avg, sas_std, sas_std / sqrt_frames,
+                                 tot_avg, tot_std, tot_std / sqrt_frames])
+                else:
+                    text.append(f"{res:14s} | {res2:14s} "
+                                f"|{int_avg:9.3f} +/- {int_std:6.3f} "
+                                f"|{vdw_avg:9.3f} +/- {vdw_std:6.3f} "
+                                f"|{eel_avg:9.3f} +/- {eel_std:6.3f} "
+                                f"|{pol_avg:9.3f} +/- {pol_std:6.3f} "
+                                f"|{sas_avg:9.3f} +/- {sas_std:6.3f} "
+                                f"|{tot_avg:9.3f} +/- {tot_std:6.3f}")
             if _output_format:
                 text.append([])
             else:
@@ -1681,19 +1980,22 @@ class DecompBinding(dict):
         # Parse everything
         self._parse_all_begin()
 
-    def _print_vectors(self, csvwriter):
+    def _print_vectors(self, writer):
         tokens = {'TDC': 'Total Decomposition Contribution (TDC)',
                   'SDC': 'Sidechain Decomposition Contribution (SDC)',
                   'BDC': 'Backbone Decomposition Contribution (BDC)'}
+        frames = frame_numbers(self.INPUT, self.com.numframes)
         for term in self.allowed_tokens:
-            csvwriter.writerow([tokens[term]])
-            csvwriter.writerow(['Frame #', 'Residue', 'Internal', 'van der Waals', 'Electrostatic', 'Polar Solvation',
-                                'Non-Polar Solv.', 'TOTAL'])
-            c = self.INPUT['general']['startframe']
-            for i in range(self.com.numframes):
-                for res in self[term]:
-                    csvwriter.writerow([c, res] + [round(self[term][res][key][i], 2) for key in self[term][res]])
-                c += self.INPUT['general']['interval']
+            writer.title(tokens[term], 2)
+            residues = list(self[term])
+            # (residue, term, frame)
+            values = np.zeros((len(residues), len(DecompOut.terms), self.com.numframes))
+            for r, res in enumerate(residues):
+                values[r] = [self[term][res][key][:self.com.numframes] for key in DecompOut.terms]
+            writer.writeblock(['Frame #', 'Residue', 'Internal', 'van der Waals', 'Electrostatic', 'Polar Solvation',
+                               'Non-Polar Solv.', 'TOTAL'],
+                              [np.repeat(frames, len(residues)), residues * self.com.numframes],
+                              values.transpose(2, 0, 1).reshape(-1, len(DecompOut.terms)))
 
     def _parse_all_begin(self):
         """ Parses through all of the terms in all of the frames, but doesn't
@@ -1780,52 +2082,53 @@ class DecompBinding(dict):
         return text if _output_format else '\n'.join(text)
 
 
-class PairDecompBinding(DecompBinding):
-    """ Class for decomposition binding (pairwise) """
+class PairDecompBinding(PairDecompStore, DecompBinding):
+    """
+    Class for decomposition binding (pairwise). The pairs are the complex ones, and the DELTAs are computed from the
+    complex, receptor and ligand energies when read
+    """
+    com_std_terms = DecompOut.terms
 
     def _parse_all_begin(self):
-        """ Parses through all of the terms in all of the frames, but doesn't
-            do any printing
-        """
-        for term in self.com:
-            for res in self.com[term]:
-                self[term][res] = {}
-                for res2 in self.com[term][res]:
-                    self[term][res][res2] = {}
-                    if res.startswith('R') and res2.startswith('R'):
-                        # Both residues are in the receptor -- pull the next one
-                        other_token = self.rec[term][res][res2]
-                    elif (
-                            res.startswith('R')
-                            and not res2.startswith('R')
-                            or not res.startswith('R')
-                            and not res2.startswith('L')
-                    ):
-                        other_token = {}
-                    else:
-                        # Both residues are in the ligand -- pull the next one
-                        other_token = self.lig[term][res][res2]
-                    for e in self.com[term][res][res2]:
-                        if other_token:
-                            self[term][res][res2][e] = self.com[term][res][res2][e] - other_token[e]
-                        else:
-                            self[term][res][res2][e] = self.com[term][res][res2][e]
-
-    def _print_vectors(self, csvwriter):
-        tokens = {'TDC': 'Total Decomposition Contribution (TDC)',
-                  'SDC': 'Sidechain Decomposition Contribution (SDC)',
-                  'BDC': 'Backbone Decomposition Contribution (BDC)'}
-        for term in self.allowed_tokens:
-            csvwriter.writerow([tokens[term]])
-            csvwriter.writerow(['Frame #', 'Resid 1', 'Resid 2', 'Internal', 'van der Waals', 'Electrostatic',
-                                'Polar Solvation', 'Non-Polar Solv.', 'TOTAL'])
-            c = self.com.INPUT['general']['startframe']
-            for i in range(self.com.numframes):
-                for res in self[term]:
-                    for res2 in self[term][res]:
-                        csvwriter.writerow([c, res, res2] +
-                                           [round(self[term][res][res2][key][i], 2) for key in self[term][res][res2]])
-                c += self.com.INPUT['general']['interval']
+        """ Matches the pairs of the complex with the receptor and ligand ones """
+        self.residues, self.indptr, self.indices = self.com.residues, self.com.indptr, self.com.indices
+        self.numframes = self.com.numframes
+        # The pairs in the receptor (1) or ligand (2) are subtracted, the receptor-ligand ones (0) are taken as is
+        self.other = np.zeros(len(self.indices), dtype=int)
+        self.other_pair = np.zeros(len(self.indices), dtype=int)
+        rec_pairs = {label: k for k, label in enumerate(self.rec.pair_labels())}
+        lig_pairs = {label: k for k, label in enumerate(self.lig.pair_labels())}
+        for k, (res, res2) in enumerate(self.com.pair_labels()):
+            if res.startswith('R') and res2.startswith('R'):
+                self.other[k], other_pairs, other = 1, rec_pairs, self.rec
+            elif res.startswith('L') and res2.startswith('L'):
+                self.other[k], other_pairs, other = 2, lig_pairs, self.lig
+            else:
+                continue
+            if (res, res2) not in other_pairs:
+                raise DecompError(f'The pair {res}-{res2} is not in the {other.mol} decomp output!')
+            self.other_pair[k] = other_pairs[(res, res2)]
+        self._fill_composite_terms()
+
+    def _energies(self, t, frames=slice(None), pairs=slice(None)):
+        """ Returns the DELTA energies (frame x pair x term) of the token t """
+        values = self.com._energies(t, frames, pairs)
+        other, other_pair = self.other[pairs], self.other_pair[pairs]
+        for kind, output in ((1, self.rec), (2, self.lig)):
+            selected = np.flatnonzero(other == kind)
+            if len(selected):
+                values[:, selected] -= output._energies(t, frames, other_pair[selected])
+        return values
+
+    def _fill_composite_terms(self):
+        self.mean = self._pair_stats()[0]
+        # As in the difference of EnergyVectors, the standard deviations are propagated
+        self.stdev = self.com.stdev.copy()
+        for kind, output in ((1, self.rec), (2, self.lig)):
+            selected = np.flatnonzero(self.other == kind)
+            self.stdev[:, selected] = np.sqrt(self.stdev[:, selected] ** 2 +
+                                              output.stdev[:, self.other_pair[selected]] ** 2)
+        self._set_views()
 
     def summary(self, output_format: str = 'ascii'):
 
@@ -1860,39 +2163,27 @@ class PairDecompBinding(DecompBinding):
                              '-----------------------------------------------------------------------------------------'
                              '--------------------------------------------------------------------------'])
 
-            for res in self[term]:
-                for res2 in self[term][res]:
-                    int_avg = self[term][res][res2]['int'].mean()
-                    int_std = self[term][res][res2]['int'].stdev()
-                    vdw_avg = self[term][res][res2]['vdw'].mean()
-                    vdw_std = self[term][res][res2]['vdw'].stdev()
-                    eel_avg = self[term][res][res2]['eel'].mean()
-                    eel_std = self[term][res][res2]['eel'].stdev()
-                    pol_avg = self[term][res][res2]['pol'].mean()
-                    pol_std = self[term][res][res2]['pol'].stdev()
-                    sas_avg = self[term][res][res2]['sas'].mean()
-                    sas_std = self[term][res][res2]['sas'].stdev()
-                    tot_avg = self[term][res][res2]['tot'].mean()
-                    tot_std = self[term][res][res2]['tot'].stdev()
-                    sqrt_frames = sqrt(len(self[term][res][res2]['int']))
-
-                    if _output_format:
-                        # FIXME: use EnergyVector.sem or EnergyVector.semp
-                        text.append([res, res2,
-                                     int_avg, int_std, int_std / sqrt_frames,
-                                     vdw_avg, vdw_std, vdw_std / sqrt_frames,
-                                     eel_avg, eel_std, eel_std / sqrt_frames,
-                                     pol_avg, pol_std, pol_std / sqrt_frames,
-                                     sas_avg, sas_std, sas_std / sqrt_frames,
-                                     tot_avg, tot_std, tot_std / sqrt_frames])
-                    else:
-                        text.append(f"{res:14s} | {res2:14s} "
-                                    f"|{int_avg:9.3f} +/- {int_std:6.3f} "
-                                    f"|{vdw_avg:9.3f} +/- {vdw_std:6.3f} "
-                                    f"|{eel_avg:9.3f} +/- {eel_std:6.3f} "
-                                    f"|{pol_avg:9.3f} +/- {pol_std:6.3f} "
-                                    f"|{sas_avg:9.3f} +/- {sas_std:6.3f} "
-                                    f"|{tot_avg:9.3f} +/- {tot_std:6.3f}")
+            sqrt_frames = sqrt(self.numframes)
+            for (res, res2), avg, std in self._summary_rows(term):
+                int_avg, vdw_avg, eel_avg, pol_avg, sas_avg, tot_avg = avg
+                int_std, vdw_std, eel_std, pol_std, sas_std, tot_std = std
+                if _output_format:
+                    # FIXME: use EnergyVector.sem or EnergyVector.semp
+                    text.append([res, res2,
+                                 int_avg, int_std, int_std / sqrt_frames,
+                                 vdw_avg, vdw_std, vdw_std / sqrt_frames,
+                                 eel_avg, eel_std, eel_std / sqrt_frames,
+                                 pol_avg, pol_std, pol_std / sqrt_frames,
+                                 sas_avg, sas_std, sas_std / sqrt_frames,
+                                 tot_avg, tot_std, tot_std / sqrt_frames])
+                else:
+                    text.append(f"{res:14s} | {res2:14s} "
+                                f"|{int_avg:9.3f} +/- {int_std:6.3f} "
+                                f"|{vdw_avg:9.3f} +/- {vdw_std:6.3f} "
+                                f"|{eel_avg:9.3f} +/- {eel_std:6.3f} "
+                                f"|{pol_avg:9.3f} +/- {pol_std:6.3f} "
+                                f"|{sas_avg:9.3f} +/- {sas_std:6.3f} "
+                                f"|{tot_avg:9.3f} +/- {tot_std:6.3f}")
             if _output_format:
                 text.append([])
             else:
@@ -1906,11 +2197,4 @@ def _get_cpptraj_surf(fname):
     This function will parse out the surface areas printed out by cpptraj in a
     standard data file and return it as an EnergyVector instance.
     """
-    f = open(fname, 'r')
-    vec = EnergyVector()
-    for line in f:
-        if line.startswith('#'):
-            continue
-        vec = vec.append(float(line.split()[1]))
-
-    return vec
+    return EnergyVector(np.loadtxt(fname, usecols=1, comments='#', ndmin=1))
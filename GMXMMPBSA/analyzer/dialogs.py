@@ -14,9 +14,9 @@
 #  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
 #  for more details.                                                           #
 # ##############################################################################
-import pickle
 
 from GMXMMPBSA.analyzer.items_delegate import KiTreeDelegate
+from GMXMMPBSA.bundle import read_results_info
 
 try:
     from PyQt6.QtWidgets import *
@@ -393,24 +393,23 @@ class InitDialog(QDialog):
             mutant = None
             stability = False
             if fname.suffix == '.mmxsa':
-                with open(fname, 'rb') as of:
-                    info = pickle.load(of)
-                    # raise exception when the result file is old
-                    if not info.INPUT.get('general'):
-                        raise TypeError('The current output files were created with an earlier version of gmx_MMPBSA.\n'
-                                        'Please run "gmx_MMPBSA --rewrite-output" to make them compatible with the '
-                                        'current version.')
-
-                    basename = info.INPUT['general']['sys_name']
-                    if basename in names:
-                        while basename in names:
-                            basename = f"{basename}-{names.count(basename) + 1}"
-                        names.append(basename)
-                    temp_ki = [info.INPUT['general']['exp_ki']] if isinstance(info.INPUT['general']['exp_ki'], float) \
-                        else info.INPUT['general']['exp_ki']
-                    mut_only = info.INPUT['ala']['mutant_only']
-                    mutant = info.mut_str
-                    stability = info.FILES.stability
+                info = read_results_info(fname)
+                # raise exception when the result file is old
+                if not info.INPUT.get('general'):
+                    raise TypeError('The current output files were created with an earlier version of gmx_MMPBSA.\n'
+                                    'Please run "gmx_MMPBSA --rewrite-output" to make them compatible with the '
+                                    'current version.')
+
+                basename = info.INPUT['general']['sys_name']
+                if basename in names:
+                    while basename in names:
+                        basename = f"{basename}-{names.count(basename) + 1}"
+                    names.append(basename)
+                temp_ki = [info.INPUT['general']['exp_ki']] if isinstance(info.INPUT['general']['exp_ki'], float) \
+                    else info.INPUT['general']['exp_ki']
+                mut_only = info.INPUT['ala']['mutant_only']
+                mutant = info.mut_str
+                stability = info.FILES.stability
             else:
                 with open(fname) as fi:
                     checked = False
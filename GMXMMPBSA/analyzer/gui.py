@@ -25,9 +25,9 @@ except:
 
 from queue import Queue
 from functools import partial
+import numpy as np
 import pandas as pd
 
-from GMXMMPBSA import utils
 from GMXMMPBSA.analyzer.items_delegate import KiTableDelegate
 from GMXMMPBSA.analyzer.plots import Tables
 from GMXMMPBSA.API import MMPBSA_API
@@ -1026,47 +1026,45 @@ class GMX_MMPBSA_ANA(QMainWindow):
                 item.define_button(r, met_col[m1])
 
     def get_corr_data(self):
+        # A row for every system and type (normal or mutant) of the selection table, in the same order, with the
+        # calculated ΔG of every model. The values of all the systems are gathered first and each model table is
+        # built at once
         self.correlation['data'] = {}
-        for s, sys_id in enumerate(self.systems):
-            dta = {('System', 'Number'): [], ('System', 'Type'): [], ('System', 'Reference'): [],
-                   ('System', 'ExpΔG'): [], ('System', 'Selection'): []}
-            for ct, cv in self.systems[sys_id].get('correlation').items():
-                dta[('System', 'Number')].append(sys_id)
-                dta[('System', 'Type')].append(ct[0].upper())
-                if ct == 'normal':
-                    dta[('System', 'Reference')].append(self.systems[sys_id].get('reference'))
-                else:
-                    dta[('System', 'Reference')].append(False)
-                dta[('System', 'ExpΔG')].append(
-                    ki2energy(self.systems[sys_id]['exp_ki'][ct],
-                              self.systems[sys_id]['namespace'].INPUT['general']['temperature']))
-                dta[('System', 'Selection')].append(cv)
-
-            g = pd.DataFrame(dta, index=range(len(self.systems[sys_id].get('correlation'))))
-            for et, v in self.systems[sys_id]['correlation_data'].items():
-                for m, v1 in v.items():
-                    cdf = pd.concat([g, v1], axis=1)
-                    d = self.correlation['data'].setdefault(m, cdf)
-                    if d.equals(cdf):
-                        continue
-                    self.correlation['data'][m] = pd.concat([d, cdf], ignore_index=True).sort_values(
-                        by=[('System', 'Number'), ('System', 'Type')])
-
-        def subtract_custom_value(x, custom_value):
-            return x - custom_value
-
-        for r, (m, v) in enumerate(self.correlation['data'].items()):
-            ref = v.loc[v[('System', 'Reference')] == True].loc[:, ~v.columns.get_level_values(1).isin(
-                ['Number', 'Type', 'Reference', 'Selection'])]
-            if len(ref.index):
-                for k in ref:
-                    if k[-1] == 'SEM':
+        rows = []
+        values = []
+        for sys_id, system in self.systems.items():
+            for ct, cv in system.get('correlation').items():
+                rows.append((sys_id, ct[0].upper(), system.get('reference') if ct == 'normal' else False,
+                             system['exp_ki'][ct], cv))
+                for m, v1 in system['correlation_data'].get(ct, {}).items():
+                    values.extend((len(rows) - 1, m, *k, value) for k, value in v1.iloc[0].items())
+        if not values:
+            return
+        g = pd.DataFrame(rows, columns=pd.MultiIndex.from_product(
+            [['System'], ['Number', 'Type', 'Reference', 'ExpΔG', 'Selection']]))
+        g[('System', 'ExpΔG')] = ki2energy(g[('System', 'ExpΔG')].to_numpy(dtype=float),
+                                           [self.systems[sys_id]['namespace'].INPUT['general']['temperature']
+                                            for sys_id in g[('System', 'Number')]])
+        values = pd.DataFrame(values, columns=['row', 'model', 'term', 'stat', 'value'])
+        for m, v in values.groupby('model', sort=False):
+            # the columns in the order of the correlation data
+            columns = list(dict.fromkeys(zip(v['term'], v['stat'])))
+            v = v.pivot(index='row', columns=['term', 'stat'], values='value').reindex(index=g.index, columns=columns)
+            self.correlation['data'][m] = pd.concat([g, v], axis=1)
+
+        for m, v in self.correlation['data'].items():
+            reference = v[('System', 'Reference')] == True
+            if reference.any():
+                ref = v.loc[reference].iloc[0]
+                for k in v.columns:
+                    if k[-1] in ['Number', 'Type', 'Reference', 'Selection', 'SEM']:
                         continue
                     elif k[-1] == 'SD':
-                        v[k] = v[k].apply(utils.get_corrstd, args=(ref[k].values[0],))
+                        # same as utils.get_corrstd
+                        v[k] = np.sqrt(v[k] ** 2 + ref[k] ** 2 - 2 * v[k] * ref[k])
                         v[(k[0], 'SEM')] = v[k]
                     else:
-                        v[k] = v[k].apply(subtract_custom_value, args=(ref[k].values[0],))
+                        v[k] = v[k] - ref[k]
 
             met = v.columns.get_level_values(0).unique().to_list()[1:]
             for m1 in met:
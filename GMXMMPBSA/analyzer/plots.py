@@ -47,6 +47,7 @@ from scipy.stats import linregress, pearsonr, spearmanr
 from GMXMMPBSA.analyzer.chartsettings import Palettes
 from GMXMMPBSA.analyzer.style import logo
 from GMXMMPBSA.analyzer.utils import bar_label
+from GMXMMPBSA.correlation import correlate
 
 plt.rcParams["figure.autolayout"] = True
 
@@ -684,10 +685,12 @@ class RegChart(ChartsBase):
                                         'color': rgb2rgbf(options[('Regression Plot', 'Scatter', 'color')])},
                            line_kws=line_kws)
 
-        # get correlation coefficients
-        pearson, ppvalue = pearsonr(data['ExpΔG'], data['Average'])
+        # get correlation coefficients, with their 95% bootstrap confidence intervals
+        coefficients = correlate(data['Average'].to_numpy(), data['ExpΔG'].to_numpy(), ('pearson', 'spearman'),
+                                 seed=0).iloc[0]
+        ppvalue = pearsonr(data['ExpΔG'], data['Average'])[1]
         slope, intercept, r_value, p_value, std_err = linregress(data['ExpΔG'], data['Average'])
-        spearman, spvalue = spearmanr(data['ExpΔG'], data['Average'])
+        spvalue = spearmanr(data['ExpΔG'], data['Average'])[1]
 
         if options[('Regression Plot', 'Distribution', 'show')]:
             args = {}
@@ -718,8 +721,12 @@ class RegChart(ChartsBase):
                                capsize=options[('Regression Plot', 'Scatter', 'error-line', 'cap-size')],
                                color=rgb2rgbf(options[('Regression Plot', 'Scatter', 'error-line', 'color')]))
 
-        pearson_leg = mpatches.Patch(color='white', label=f'Pearson  = {pearson:.2f}  p-value = {ppvalue:.3f}')
-        spearman_leg = mpatches.Patch(color='gray', label=f'Spearman = {spearman:.2f}  p-value = {spvalue:.3f}')
+        pearson_leg = mpatches.Patch(color='white', label=f"Pearson  = {coefficients['pearson']:.2f} "
+                                                          f"[{coefficients['pearson_low']:.2f}, "
+                                                          f"{coefficients['pearson_high']:.2f}]  p-value = {ppvalue:.3f}")
+        spearman_leg = mpatches.Patch(color='gray', label=f"Spearman = {coefficients['spearman']:.2f} "
+                                                          f"[{coefficients['spearman_low']:.2f}, "
+                                                          f"{coefficients['spearman_high']:.2f}]  p-value = {spvalue:.3f}")
         sign = '+' if intercept > 0 else '-'
         equation = Line2D([0], [0], **line_kws, label=f'y = {slope:.2f}x {sign} {abs(intercept):.2f}')
         handles = []
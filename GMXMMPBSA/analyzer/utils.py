@@ -23,6 +23,7 @@ import logging
 import math
 from typing import Union
 
+from GMXMMPBSA.correlation import R, ki2energy
 from GMXMMPBSA.exceptions import GMXMMPBSA_ERROR
 import pandas as pd
 import numpy as np
@@ -30,8 +31,6 @@ from queue import Queue
 import multiprocessing
 from pathlib import Path
 
-R = 0.001987
-
 ncpu = multiprocessing.cpu_count()
 
 style = Path(__file__).joinpath('style')
@@ -339,11 +338,6 @@ def energy2pdb_pml(residue_list, options, pml_path: Path, pdb_path: Path):
         bf.write('zoom sele_residues, 15\n')
 
 
-def ki2energy(ki, temp):
-    # deltaG (inhibition) = R * T * ln ( Ki )
-    return R * temp * math.log(ki * 1e-9) if ki else np.nan
-
-
 def make_corr_DF(corr_data: dict) -> pd.DataFrame:
     data = []
     for x, value in corr_data.items():
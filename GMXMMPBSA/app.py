@@ -99,14 +99,17 @@ def gmxmmpbsa():
         app.loadcheck_prmtops()
         app.file_setup()
         app.run_mmpbsa()
-    # If we are rewriting output, load the info and check prmtops
+        app.parse_output_files()
+    # If we are rewriting output, load the info and the results parsed in the previous run. The output files are
+    # parsed again (after checking the prmtops) only when those results are outdated
     else:
         info = InfoFile(app, True)
         info.read_info()
-        app.loadcheck_prmtops()
+        if not app.read_parsed_results():
+            app.loadcheck_prmtops()
+            app.parse_output_files()
 
-    # Now we parse the output, print, and finish
-    app.parse_output_files()
+    # Now we print, and finish
     app.write_final_outputs()
     app.finalize()
 
@@ -0,0 +1,478 @@
+"""
+This module contains the columnar results bundle (COMPACT_MMXSA_RESULTS.mmxsa).
+
+The bundle is an uncompressed ZIP file with a JSON manifest and one .npy dataset
+per table. Energies are stored as tables (one row per term, residue or residue
+pair, and one column per frame), so every term is a contiguous row that can be
+memory-mapped directly from the bundle without reading the rest of it. The
+manifest keeps the tree (system > model > species > term) and the run info, so
+the results can be opened without importing the classes that created them.
+
+The pairwise decomposition is the exception: it is stored as PairDecompOut keeps
+it in memory (a float32 (token, frame, pair, term) array without TOTAL), and is
+read back as a PairDecompOut whose array is memory-mapped from the bundle. TOTAL
+and the binding DELTAs are computed when read, as in PairDecompBinding.
+
+The results parsed from the output files, used by --rewrite-output (see
+infofile.ParsedResults), are stored with the same layout.
+"""
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+import json
+import pickle
+import struct
+import zipfile
+from collections.abc import Mapping
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+from GMXMMPBSA.amber_outputs import DecompOut, DecompBinding, PairDecompOut, PairDecompBinding
+from GMXMMPBSA.commandlineparser import OptionList
+from GMXMMPBSA.exceptions import GMXMMPBSA_ERROR
+from GMXMMPBSA.utils import EnergyVector
+
+BUNDLE_FORMAT = 'gmx_MMPBSA results bundle'
+BUNDLE_VERSION = 1
+# Results of the calculation stored in the bundle (calc_types attributes)
+DATA_KEYS = ('normal', 'mutant', 'mut_norm', 'decomp_normal', 'decomp_mutant', 'scan')
+# Info file attributes stored as text members
+TEXT_KEYS = ('input_file', 'COM_PDB', 'output_file', 'decomp_output_file')
+# Alignment of the datasets in the bundle, so the memory-mapped arrays are aligned
+ALIGNMENT = 64
+# Attributes of the pairwise decomposition outputs stored in the manifest. The arrays are datasets
+PAIR_ATTRS = ('mol', 'allowed_tokens', 'numframes', 'surften', 'residues')
+PAIR_ARRAYS = ('indptr', 'indices', 'mean', 'stdev')
+PAIR_BINDING_ATTRS = ('desc', 'idecomp', 'verbose', 'num_terms', 'allowed_tokens')
+PAIR_BINDING_ARRAYS = ('other', 'other_pair', 'mean', 'stdev')
+PARSED_FORMAT = 'gmx_MMPBSA parsed results'
+PARSED_VERSION = 1
+# Attributes of the decomposition outputs stored in the parsed results. The arrays are datasets
+DECOMP_ATTRS = ('mol', 'mut', 'numframes', 'num_files', 'num_terms', 'allowed_tokens', 'verbose', 'surften',
+                'basename', 'residues')
+
+
+def _jsonable(obj):
+    """ Converts the INPUT and FILES values that are not JSON types """
+    if isinstance(obj, Path):
+        return obj.as_posix()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    return str(obj)
+
+
+def _is_vector(obj):
+    return isinstance(obj, np.ndarray) and obj.ndim == 1 and obj.dtype.kind in 'biuf'
+
+
+class BundleWriter:
+    """
+    Writes the results bundle. The nodes of the manifest tree are:
+        {'group': {key: node}}: dict (or namespace) of nodes
+        {'table': dataset, 'columns': member}: table of vectors with the same number of frames. The columns member
+                                               has the key path (relative to the node) and the com_std of every row
+        {'array': dataset}: any other array
+        {'value': value}: JSON value
+        {'pairs': dataset, 'attrs': {...}, 'arrays': {...}}: PairDecompOut, with its float32 energies
+        {'pair_binding': {'com', 'rec', 'lig'}, 'attrs': {...}, 'arrays': {...}}: PairDecompBinding of the pairs nodes
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.zipfile = zipfile.ZipFile(filename, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        self.num_datasets = 0
+        # objects shared between several nodes (like the first mutation in scan) are stored once
+        self.memo = {}
+
+    def write(self, info: dict, data: dict):
+        info = dict(info)
+        for key in TEXT_KEYS:
+            text = info.pop(key, None)
+            if text is not None:
+                self.zipfile.writestr(f'text/{key}', text)
+        tree = {key: self._encode(value) for key, value in data.items()}
+        manifest = {'format': BUNDLE_FORMAT, 'version': BUNDLE_VERSION, 'info': info, 'data': {'group': tree}}
+        self.zipfile.writestr('manifest.json', json.dumps(manifest, default=_jsonable))
+        self.zipfile.close()
+
+    def _encode(self, node):
+        if id(node) in self.memo:
+            return self.memo[id(node)][1]
+        if isinstance(node, PairDecompBinding):
+            encoded = self._pair_node(node, PAIR_BINDING_ATTRS, PAIR_BINDING_ARRAYS)
+            encoded['pair_binding'] = {key: self._encode(getattr(node, key)) for key in ('com', 'rec', 'lig')}
+        elif isinstance(node, PairDecompOut):
+            encoded = self._pair_node(node, PAIR_ATTRS, PAIR_ARRAYS)
+            encoded['pairs'] = self._pair_energies(node)
+        elif isinstance(node, DecompOut) and node.array is not None:
+            encoded = {'group': {token: self._decomp_table(node, t) for t, token in enumerate(node.allowed_tokens)}}
+        elif isinstance(node, DecompBinding):
+            encoded = {'group': {token: self._table(list(self._flatten(node[token])), node.com.numframes)
+                                 for token in node}}
+        elif isinstance(node, (Mapping, SimpleNamespace)):
+            items = list(vars(node).items() if isinstance(node, SimpleNamespace) else node.items())
+            sizes = {len(value) if _is_vector(value) else None for key, value in items}
+            if items and None not in sizes and len(sizes) == 1:
+                encoded = self._table([((key,), value) for key, value in items], sizes.pop())
+            else:
+                encoded = {'group': {str(key): self._encode(value) for key, value in items}}
+        elif isinstance(node, np.ndarray):
+            encoded = {'array': self._dataset(np.asarray(node))}
+        else:
+            encoded = {'value': node.tolist() if isinstance(node, np.generic) else node}
+        # the node is kept, so its id is not reused by another object
+        self.memo[id(node)] = node, encoded
+        return encoded
+
+    def _flatten(self, node, path=()):
+        """ Yields the (key path, vector) of all the vectors of a nested dict """
+        for key, value in node.items():
+            if isinstance(value, Mapping):
+                yield from self._flatten(value, path + (key,))
+            else:
+                yield path + (key,), value
+
+    def _table(self, columns, numframes):
+        values = np.empty((len(columns), numframes))
+        for c, (path, vector) in enumerate(columns):
+            values[c] = vector
+        return self._table_node(self._dataset(values), [path for path, vector in columns],
+                                [getattr(vector, 'com_std', None) for path, vector in columns])
+
+    def _decomp_table(self, decomp, t):
+        """ (residue x term) rows of a token of the per-residue decomposition, taken from its array """
+        values = np.moveaxis(decomp.array[t], 0, -1).reshape(-1, decomp.numframes)
+        token = decomp.allowed_tokens[t]
+        return self._table_node(self._dataset(values),
+                                [(res, term) for res in decomp.residues for term in decomp.terms],
+                                [decomp[token][res][term].com_std for res in decomp.residues for term in decomp.terms])
+
+    def _pair_node(self, store, attrs, arrays):
+        """ Attributes (manifest) and arrays (datasets) of a pairwise decomposition output """
+        return {'attrs': {key: getattr(store, key) for key in attrs},
+                'arrays': {key: self._dataset(getattr(store, key)) for key in arrays}}
+
+    def _pair_energies(self, store):
+        """
+        Writes the float32 (token, frame, pair, term) array of a PairDecompOut as is, by chunks of frames, since it
+        may be memory-mapped to a file bigger than the memory
+        """
+        array = store.array
+        step = max(1, store.chunk_size // max(1, array[0, 0].nbytes))
+        with self._open_dataset(array.shape, array.dtype) as dataset:
+            for t in range(array.shape[0]):
+                for start in range(0, array.shape[1], step):
+                    dataset.write(np.ascontiguousarray(array[t, start:start + step]).tobytes())
+            return dataset.name
+
+    def _table_node(self, name, paths, com_std):
+        columns = f'{name[:-len(".npy")]}.json'
+        self.zipfile.writestr(columns, json.dumps({'paths': paths, 'com_std': com_std}, default=_jsonable))
+        return {'table': name, 'columns': columns}
+
+    def _dataset(self, array):
+        array = np.ascontiguousarray(array)
+        with self._open_dataset(array.shape, array.dtype) as dataset:
+            dataset.write(array.tobytes())
+            return dataset.name
+
+    def _open_dataset(self, shape, dtype):
+        """
+        Opens a new .npy member and writes its header. The header is padded so the data is aligned in the bundle,
+        as the .npy files are aligned in the file system
+        """
+        name = f'datasets/{self.num_datasets}.npy'
+        self.num_datasets += 1
+        dataset = self.zipfile.open(zipfile.ZipInfo(name), 'w', force_zip64=True)
+        dataset.name = name
+        header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+            np.lib.format.dtype_to_descr(np.dtype(dtype)), tuple(shape))
+        # magic string, version and header length
+        start = self.zipfile.fp.tell() + 10 + len(header) + 1
+        header += ' ' * (-start % ALIGNMENT) + '\n'
+        dataset.write(np.lib.format.magic(1, 0) + struct.pack('<H', len(header)) + header.encode('latin1'))
+        return dataset
+
+
+def write_bundle(filename, info: dict, calc_types):
+    """ Writes the results (calc_types) and the run info to a results bundle """
+    BundleWriter(filename).write(info, {key: getattr(calc_types, key) for key in DATA_KEYS
+                                        if hasattr(calc_types, key)})
+
+
+class BundleGroup(Mapping):
+    """ Read-only dict access to a group of the bundle. The children are decoded when requested """
+
+    def __init__(self, bundle, node):
+        self.bundle = bundle
+        self.node = node
+        self._cache = {}
+
+    def __getitem__(self, key):
+        if key not in self._cache:
+            self._cache[key] = self.bundle.decode(self.node[key])
+        return self._cache[key]
+
+    def __iter__(self):
+        return iter(self.node)
+
+    def __len__(self):
+        return len(self.node)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({list(self.node)})'
+
+    def __getstate__(self):
+        # the decoded children are memory-mapped, so they are decoded again after unpickling
+        return dict(bundle=self.bundle, node=self.node)
+
+    def __setstate__(self, state):
+        self.__init__(state['bundle'], state['node'])
+
+
+class BundleTable(Mapping):
+    """
+    Read-only dict access to a table of the bundle. The rows are EnergyVector views of the memory-mapped dataset,
+    so only the requested terms are read from the disk
+    """
+
+    def __init__(self, bundle, node, tree=None):
+        self.bundle = bundle
+        self.node = node
+        self._tree = tree
+
+    @property
+    def tree(self):
+        """ Nested dict of the row indexes, built from the columns member when the table is used for first time """
+        if self._tree is None:
+            columns = json.loads(self.bundle.zipfile.read(self.node['columns']))
+            self.com_std = columns['com_std']
+            self._tree = {}
+            for row, path in enumerate(columns['paths']):
+                level = self._tree
+                for key in path[:-1]:
+                    level = level.setdefault(key, {})
+                level[path[-1]] = row
+        return self._tree
+
+    def rows(self):
+        """
+        Returns the key paths of the rows and the memory-mapped dataset (rows x frames) of the whole table, so the
+        table can be read as a single array
+        """
+        columns = json.loads(self.bundle.zipfile.read(self.node['columns']))
+        return columns['paths'], self.bundle.dataset(self.node['table'])
+
+    def __getitem__(self, key):
+        value = self.tree[key]
+        if isinstance(value, dict):
+            sub = BundleTable(self.bundle, self.node, value)
+            sub.com_std = self.com_std
+            return sub
+        vector = self.bundle.dataset(self.node['table'])[value].view(EnergyVector)
+        vector.com_std = self.com_std[value]
+        return vector
+
+    def __iter__(self):
+        return iter(self.tree)
+
+    def __len__(self):
+        return len(self.tree)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({list(self.tree)})'
+
+
+class ResultsBundle:
+    """
+    Reads a results bundle. info has the same variables as the info file namespace of the old binary files and data
+    the results, with the calc_types keys
+    """
+
+    def __init__(self, filename):
+        self.filename = Path(filename)
+        self.zipfile = zipfile.ZipFile(self.filename)
+        self.manifest = json.loads(self.zipfile.read('manifest.json'))
+        if self.manifest.get('format') != BUNDLE_FORMAT:
+            GMXMMPBSA_ERROR(f'{self.filename} is not a gmx_MMPBSA results bundle')
+        if self.manifest['version'] > BUNDLE_VERSION:
+            GMXMMPBSA_ERROR(f"{self.filename} was created with a newer version of gmx_MMPBSA (bundle version "
+                            f"{self.manifest['version']})")
+        self._datasets = {}
+        self.info = self._read_info()
+        self.data = BundleGroup(self, self.manifest['data']['group'])
+
+    def __getstate__(self):
+        # the zip file and the memory-mapped datasets are opened again after unpickling
+        return dict(filename=self.filename.resolve())
+
+    def __setstate__(self, state):
+        self.__init__(state['filename'])
+
+    def _read_info(self):
+        info = SimpleNamespace(**self.manifest['info'])
+        info.FILES = OptionList(**info.FILES)
+        members = set(self.zipfile.namelist())
+        for key in TEXT_KEYS:
+            member = f'text/{key}'
+            setattr(info, key, self.zipfile.read(member).decode() if member in members else None)
+        return info
+
+    def decode(self, node):
+        if 'pairs' in node:
+            store = PairDecompOut(node['attrs']['mol'])
+            store.__setstate__(self._pair_state(node, array=self.dataset(node['pairs'])))
+            return store
+        if 'pair_binding' in node:
+            binding = PairDecompBinding.__new__(PairDecompBinding)
+            com, rec, lig = (self.decode(node['pair_binding'][key]) for key in ('com', 'rec', 'lig'))
+            binding.__setstate__(self._pair_state(node, com=com, rec=rec, lig=lig, residues=com.residues,
+                                                  indptr=com.indptr, indices=com.indices, numframes=com.numframes))
+            return binding
+        if 'group' in node:
+            return BundleGroup(self, node['group'])
+        if 'table' in node:
+            return BundleTable(self, node)
+        if 'array' in node:
+            return self.dataset(node['array']).view(EnergyVector)
+        return node['value']
+
+    def _pair_state(self, node, **kwargs):
+        """ State of a pairwise decomposition output, with its arrays memory-mapped """
+        state = dict(node['attrs'], **{key: self.dataset(name) for key, name in node['arrays'].items()}, **kwargs)
+        state['allowed_tokens'] = tuple(state['allowed_tokens'])
+        return state
+
+    def dataset(self, name):
+        """ Returns the dataset as an array memory-mapped from the bundle (copy-on-write) """
+        if name not in self._datasets:
+            self._datasets[name] = _memmap_dataset(self.filename, self.zipfile, name)
+        return self._datasets[name]
+
+
+def _memmap_dataset(filename, zfile, name):
+    """ Returns the .npy member name of the ZIP file as an array memory-mapped from the file (copy-on-write) """
+    zinfo = zfile.getinfo(name)
+    with open(filename, 'rb') as f:
+        # local file header: the name and the extra field lengths are the last 4 bytes
+        f.seek(zinfo.header_offset + 26)
+        name_length, extra_length = struct.unpack('<HH', f.read(4))
+        f.seek(name_length + extra_length, 1)
+        if np.lib.format.read_magic(f) == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if not np.prod(shape):
+        return np.zeros(shape, dtype)
+    return np.memmap(filename, dtype, 'c', offset, shape, 'F' if fortran_order else 'C')
+
+
+def is_bundle(filename):
+    return zipfile.is_zipfile(filename)
+
+
+def read_results(filename):
+    """
+    Reads the info namespace and the results (dict with the calc_types keys) of a binary results file, either a
+    results bundle or a pickle file written by previous versions
+    """
+    if is_bundle(filename):
+        bundle = ResultsBundle(filename)
+        return bundle.info, bundle.data
+    with open(filename, 'rb') as bf:
+        info = pickle.load(bf)
+        calc_types = pickle.load(bf)
+    return info, {key: getattr(calc_types, key) for key in DATA_KEYS if hasattr(calc_types, key)}
+
+
+def read_results_info(filename):
+    """ Reads only the info namespace of a binary results file """
+    if is_bundle(filename):
+        return ResultsBundle(filename).info
+    with open(filename, 'rb') as bf:
+        return pickle.load(bf)
+
+
+class ParsedResultsWriter(BundleWriter):
+    """
+    Writes the results parsed from the output files of a run. The manifest has the digest, the ligand residue names
+    and the datasets of:
+        energy: [{'output': class name, 'basename': ..., 'ranks': [{term: dataset}]}]: arrays of every rank file of
+                the energy outputs, as returned by parse_rank_file
+        decomp: [{'attrs': {...}, 'arrays': {...}}]: state of every DecompOut or PairDecompOut
+        entropy: [{'key': [...], 'data': dataset}]: Interaction and C2 Entropy data, with their entropy_data key
+    """
+
+    def write(self, digest, energy_arrays, decomp_outputs, entropy_data, ligand_residues):
+        manifest = {'format': PARSED_FORMAT, 'version': PARSED_VERSION, 'digest': digest,
+                    'ligand_residues': list(ligand_residues),
+                    'energy': [{'output': output, 'basename': basename,
+                                'ranks': [{term: self._dataset(values) for term, values in arrays.items()}
+                                          for arrays in rank_arrays]}
+                               for (output, basename), rank_arrays in energy_arrays.items()],
+                    'decomp': [self._decomp_node(output) for output in decomp_outputs],
+                    'entropy': [{'key': list(key), 'data': self._dataset(data)} for key, data in entropy_data.items()]}
+        self.zipfile.writestr('manifest.json', json.dumps(manifest, default=_jsonable))
+        self.zipfile.close()
+
+    def _decomp_node(self, output):
+        if isinstance(output, PairDecompOut):
+            node = self._pair_node(output, DECOMP_ATTRS, PAIR_ARRAYS)
+            node['arrays']['array'] = self._pair_energies(output)
+        else:
+            node = self._pair_node(output, DECOMP_ATTRS, ('array',))
+        return node
+
+
+class ParsedResultsFile:
+    """ Reads the results written by ParsedResultsWriter. The arrays are memory-mapped from the file when requested """
+
+    def __init__(self, filename):
+        self.filename = Path(filename)
+        self.zipfile = zipfile.ZipFile(self.filename)
+        self.manifest = json.loads(self.zipfile.read('manifest.json'))
+        if self.manifest.get('format') != PARSED_FORMAT or self.manifest.get('version') != PARSED_VERSION:
+            raise ValueError(f'not a {PARSED_FORMAT} file (version {PARSED_VERSION})')
+        self.digest = self.manifest['digest']
+        self.ligand_residues = self.manifest['ligand_residues']
+
+    def dataset(self, name):
+        return _memmap_dataset(self.filename, self.zipfile, name)
+
+    def energy_arrays(self):
+        """ Returns the arrays of every rank file of the energy outputs, keyed by (output class name, base name) """
+        return {(node['output'], node['basename']): [{term: self.dataset(name) for term, name in ranks.items()}
+                                                     for ranks in node['ranks']]
+                for node in self.manifest['energy']}
+
+    def decomp_states(self):
+        """ Returns the state of every decomposition output, keyed by its base name """
+        states = {}
+        for node in self.manifest['decomp']:
+            state = dict(node['attrs'], **{key: self.dataset(name) for key, name in node['arrays'].items()})
+            state['allowed_tokens'] = tuple(state['allowed_tokens'])
+            states[state['basename']] = state
+        return states
+
+    def entropy_data(self):
+        """ Returns the Interaction and C2 Entropy data, keyed like entropy_data """
+        return {tuple(node['key']): self.dataset(node['data']) for node in self.manifest['entropy']}
@@ -33,6 +33,7 @@ Classes:
 # ##############################################################################
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from tqdm import tqdm
 from time import sleep
@@ -40,7 +41,10 @@ import json
 
 from GMXMMPBSA.exceptions import CalcError
 from GMXMMPBSA.exceptions import GMXMMPBSA_ERROR
-from GMXMMPBSA.utils import mdout2json
+from GMXMMPBSA.utils import mdout2json, get_scratch_dir
+from GMXMMPBSA.make_trajs import RestartArchive
+from tempfile import mkdtemp
+import shutil
 import os
 import sys
 import numpy as np
@@ -187,11 +191,12 @@ class MultiCalculation(object):
         # everything to a string here. And if it appears to need the rank
         # substituted into the file name, substitute that in here
         try:
-            for command_args in self.list_calc:
+            for j, command_args in enumerate(self.list_calc):
                 for i in range(len(command_args)):
                     command_args[i] = str(command_args[i])
                     if '%d' in command_args[i]:
                         command_args[i] %= rank
+                self.prepare_input(j)
                 process = Popen(command_args, stdin=None, stdout=process_stdout, stderr=process_stderr)
                 calc_failed = bool(process.wait())
                 if calc_failed:
@@ -201,9 +206,18 @@ class MultiCalculation(object):
                 if 'gbnsr6' in command_args[0]:
                     mdout2json(command_args)
         finally:
+            self.cleanup()
             if own_handleo: process_stdout.close()
             if own_handlee: process_stdout.close()
 
+    def prepare_input(self, index):
+        """ Called right before running the index-th command. Nothing to do by default """
+        pass
+
+    def cleanup(self):
+        """ Called once all commands have been run (or one of them failed) """
+        pass
+
         # -#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#
 
     def setup(self):
@@ -345,9 +359,17 @@ class ListEnergyCalculation(MultiCalculation):
         """
         Sets up the command-line arguments. Sander requires a unique restrt file
         for the MPI version (since one is *always* written and you don't want 2
-        threads fighting to write the same dumb file)
+        threads fighting to write the same dumb file). If incrds is a
+        RestartArchive, each frame is extracted to a node-local folder right
+        before its command runs
         """
-        for c, o in zip(self.incrds, self.outputs):
+        if isinstance(self.incrds, RestartArchive):
+            self.scratch = mkdtemp(dir=get_scratch_dir())
+            name = Path(self.incrds.basename).name[:-len('.inpcrd')]
+            incrds = [f"{self.scratch}/{name}.{n}.inpcrd" for n in self.incrds.frames]
+        else:
+            incrds = self.incrds
+        for c, o in zip(incrds, self.outputs):
             command_args = [self.program,
                             '-i', self.input_file,  # input file flag
                             '-p', self.prmtop  # prmtop flag
@@ -363,6 +385,18 @@ class ListEnergyCalculation(MultiCalculation):
 
         self.calc_setup = True
 
+    def prepare_input(self, index):
+        """ Extracts only the frame of the command about to run """
+        if not isinstance(self.incrds, RestartArchive):
+            return
+        if index:
+            Path(self.list_calc[index - 1][self.list_calc[index - 1].index('-c') + 1]).unlink(missing_ok=True)
+        self.incrds.extract(index, self.list_calc[index][self.list_calc[index].index('-c') + 1])
+
+    def cleanup(self):
+        if isinstance(self.incrds, RestartArchive):
+            shutil.rmtree(self.scratch, ignore_errors=True)
+
 
 class RISMCalculation(Calculation):
     """ This class handles RISM calculations """
@@ -535,17 +569,15 @@ class QuasiHarmCalc(Calculation):
         """ Sets up a Quasi-harmonic calculation """
         from subprocess import Popen, PIPE
 
-        # Determine the prefix from our input file... hack way to do this
-        if self.input_file.startswith(self.fnpre + 'mutant_'):
-            prefix = self.fnpre + 'mutant_'
-        else:
-            prefix = self.fnpre
+        # Determine the prefix from our input file ({prefix}cpptrajentropy.in)... hack way to do this
+        prefix = self.input_file[:-len('cpptrajentropy.in')]
 
         # Make sure masks are a list, and that there are enough masks
 
         # First thing we need is the average PDB as a reference
-        ptraj_str = 'trajin %s\naverage %savgcomplex.pdb pdb chainid " "\ngo' % (self.inptraj,
-                                                                                 prefix)
+        inptrajs = self.inptraj if isinstance(self.inptraj, list) else [self.inptraj]
+        ptraj_str = ''.join('trajin %s\n' % traj for traj in inptrajs)
+        ptraj_str += 'average %savgcomplex.pdb pdb chainid " "\ngo' % prefix
 
         outfile = open(self.fnpre + 'create_average.out', 'w')
 
@@ -758,52 +790,60 @@ class PrintCalc(Calculation):
             # stdout.write(self.message + '\n')
 
 
+def interaction_entropy(ggas, temperature):
+    """
+    Computes the Interaction Entropy (-TΔS) per frame of one or several GGAS series (rows) with the same number of
+    frames. The running average of ΔEint is computed with cumulative sums and the running average of exp(ΔEint/kT)
+    with a running log-sum-exp, so it is O(n) and it does not overflow with large fluctuations
+    Args:
+        ggas: GGAS energies (frames) or (series x frames)
+        temperature: temperature in K
+
+    Returns:
+        Interaction Entropy per frame with the same shape as ggas
+    """
+    # boltzmann constant in kcal/(mol⋅K)
+    k = 0.001985875
+    kt = k * temperature
+    ggas = np.asarray(ggas, dtype=float)
+    frames = np.arange(1, ggas.shape[-1] + 1)
+    deint = (ggas - np.cumsum(ggas, axis=-1) / frames) / kt
+    return kt * (np.logaddexp.accumulate(deint, axis=-1) - np.log(frames))
+
+
 class InteractionEntropyCalc:
     """
     Class for Interaction Entropy calculation
     :return {IE_key: data}
     """
 
-    def __init__(self, ggas, INPUT, method, iesegment=None):
+    def __init__(self, ggas, INPUT, method, iesegment=None, data=None):
         """
 
         Args:
             ggas: Model GGAS energy
             INPUT: INPUT dict
             iesegment: If not defined, iesegment = INPUT['ie_segment']
+            data: Interaction Entropy per frame, if it was already computed for several models with
+                  interaction_entropy
         """
         self.ggas = ggas
         self.INPUT = INPUT
         self.method = method
         self.isegment = iesegment or INPUT['general']['ie_segment']
-        self.data = []
+        self.data = data
 
         self._calculate()
 
     def _calculate(self):
-        # boltzmann constant in kcal/(mol⋅K)
-        k = 0.001985875
-        temperature = self.INPUT['general']['temperature']
-
-        exp_energy_int = np.array([], dtype=float)
-        self.data = np.zeros(self.ggas.size, dtype=float)
-
-        for i in tqdm(range(self.ggas.size), bar_format=TQDM_BAR_FORMAT, ascii=True):
-            aeint = self.ggas[:i+1].mean()
-            deint = self.ggas[i] - aeint
-            try:
-                eceint = math.exp(deint / (k * temperature))
-            except CalcError:
-                logging.warning('The internal energy of your system has very large energy fluctuation so it is not '
-                                'possible to continue with the calculations. Please, make sure your system is '
-                                'consistent')
-                logging.info('The Interaction Entropy will be skipped...')
-                self.INPUT['general']['interaction_entropy'] = 0
-                break
-            exp_energy_int = np.append(exp_energy_int, eceint)
-            aeceint = exp_energy_int.mean()
-            cts = k * temperature * math.log(aeceint)
-            self.data[i] = cts
+        if self.data is None:
+            self.data = interaction_entropy(self.ggas, self.INPUT['general']['temperature'])
+        if not np.isfinite(self.data).all():
+            logging.warning('The internal energy of your system has very large energy fluctuation so it is not '
+                            'possible to continue with the calculations. Please, make sure your system is '
+                            'consistent')
+            logging.info('The Interaction Entropy will be skipped...')
+            self.INPUT['general']['interaction_entropy'] = 0
 
         numframes = len(self.data)
         self.ie_std = float(self.ggas.std())
@@ -830,16 +870,85 @@ class InteractionEntropyCalc:
                 out.write('{:d}  {:.2f}\n'.format(f, d))
 
 
+def c2_entropy_bootstrap(ggas, temperature, samples=2000, seed=None, block=1, threads=1, memory=64 * 2 ** 20):
+    """
+    Computes the C2 Entropy of the bootstrap re-samplings of one or several GGAS series (rows) with the same number
+    of frames. The re-samplings are drawn as (re-samplings x frames) index arrays, in chunks of about memory bytes,
+    and shared by all the series. Every chunk has its own random stream spawned from seed, so the result does not
+    depend on the number of series or threads
+    Args:
+        ggas: GGAS energies (frames) or (series x frames)
+        temperature: temperature in K
+        samples: number of re-samplings
+        seed: seed of the random generator. If None, a random seed is used
+        block: block length of the moving block bootstrap. Consecutive frames are correlated, so re-sampling blocks
+               of frames keeps the correlation inside the blocks. 1 means the ordinary (frame by frame) bootstrap
+        threads: number of threads re-sampling the chunks
+        memory: approximate memory (bytes) used by every chunk
+
+    Returns:
+        C2 Entropy of every re-sampling with shape (series x samples) or (samples) for a single series
+    """
+    # gas constant in kcal/(mol⋅K)
+    R = 0.001987
+    ggas = np.asarray(ggas, dtype=float)
+    series = np.atleast_2d(ggas)
+    size = series.shape[-1]
+    # centered, so the variance can be computed in one pass as E[x²] - E[x]²
+    series = series - series.mean(axis=-1, keepdims=True)
+    block = max(1, min(block, size))
+    # int32 indices and re-sampled energies
+    chunk = max(1, memory // (12 * size))
+    chunks = [(start, min(start + chunk, samples)) for start in range(0, samples, chunk)]
+    streams = np.random.SeedSequence(seed).spawn(len(chunks))
+    c2data = np.empty((len(series), samples))
+
+    def resample(start, end, stream):
+        rng = np.random.default_rng(stream)
+        if block == 1:
+            idxs = rng.integers(0, size, (end - start, size), dtype=np.int32)
+        else:
+            starts = rng.integers(0, size - block + 1, (end - start, -(-size // block)), dtype=np.int32)
+            idxs = (starts[..., None] + np.arange(block)).reshape(end - start, -1)[:, :size]
+        for row, edata in enumerate(series):
+            resampled = edata[idxs]
+            mean = resampled.mean(axis=-1)
+            variance = np.einsum('ij,ij->i', resampled, resampled) / size - mean ** 2
+            c2data[row, start:end] = variance / (2 * temperature * R)
+
+    if threads > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(threads) as executor:
+            for future in [executor.submit(resample, *c, stream) for c, stream in zip(chunks, streams)]:
+                future.result()
+    else:
+        for c, stream in zip(chunks, streams):
+            resample(*c, stream)
+    return c2data if ggas.ndim > 1 else c2data[0]
+
+
 class C2EntropyCalc:
     """
-    Class for Interaction Entropy calculation
-    :return {IE_key: data}
+    Class for C2 Entropy calculation
+    :return {C2_key: data}
     """
 
-    def __init__(self, ggas, INPUT, method):
+    def __init__(self, ggas, INPUT, method, bootstrap=None):
+        """
+
+        Args:
+            ggas: Model GGAS energy
+            INPUT: INPUT dict
+            bootstrap: C2 Entropy of the bootstrap re-samplings, if they were already computed for several models
+                       with c2_entropy_bootstrap
+        """
         self.ggas = ggas
         self.INPUT = INPUT
         self.method = method
+        self.samples = INPUT['general'].get('c2_samples', 2000)
+        self.seed = INPUT['general'].get('c2_seed', -1)
+        self.block = INPUT['general'].get('c2_block', 1)
+        self.threads = INPUT['general'].get('c2_threads', 1)
+        self.bootstrap = bootstrap
 
         self._calculate()
 
@@ -850,20 +959,20 @@ class C2EntropyCalc:
         self.ie_std = float(self.ggas.std())
         self.c2data = (self.ie_std ** 2) / (2 * temperature * R)
 
-        size = self.ggas.size
-        array_of_c2 = np.zeros(2000)
-        for i in range(2000):
-            idxs = np.random.randint(0, size, size)
-            ie_std = self.ggas[idxs].std()
-            c2data = (ie_std ** 2) / (2 * temperature * R)
-            array_of_c2[i] = c2data
-
-        self.c2_std = float(np.sort(array_of_c2)[100:1900].std())
-        self.c2_ci = np.percentile(np.sort(array_of_c2)[100:1900], [2.5, 97.5])
+        if self.bootstrap is None:
+            self.bootstrap = c2_entropy_bootstrap(self.ggas, temperature, self.samples,
+                                                  None if self.seed < 0 else self.seed, self.block, self.threads)
+        # the 5% lowest and highest re-samplings are discarded
+        trim = len(self.bootstrap) // 20
+        array_of_c2 = np.sort(self.bootstrap)[trim:len(self.bootstrap) - trim]
+        self.c2_std = float(array_of_c2.std())
+        self.c2_ci = np.percentile(array_of_c2, [2.5, 97.5])
 
     def save_output(self, filename):
         with open(filename, 'w') as out:
             out.write(f'| C2 Entropy results for {self.method} calculations\n')
+            out.write(f'| Bootstrap: {len(self.bootstrap)} re-samplings, block length {self.block}, '
+                      f'seed {self.seed}\n')
             out.write(f'C2 Entropy (-TΔS): {self.c2data:.4f}\n')
             out.write(f'C2 Entropy SD: {self.c2_std:.4f}\n')
             out.write(f'Internal Energy SD (sigma): {self.ie_std:9.2f}\n')
@@ -145,6 +145,14 @@ group.add_argument('-O', '--overwrite', default=False, action='store_true',
 group.add_argument('-prefix', dest='prefix', default='_GMXMMPBSA_',
                    metavar='<file prefix>',
                    help='Prefix for intermediate files.')
+group.add_argument('--topology-cache', dest='topology_cache', nargs='?', default=None, metavar='DIR',
+                   const=os.path.join(os.getenv('XDG_CACHE_HOME', os.path.join('~', '.cache')), 'gmx_MMPBSA',
+                                      'topologies'),
+                   help='''Folder to cache the Amber topologies built from the GROMACS files. When the input files,
+                   groups and topology-related variables are the same of a previous run, the topologies are copied
+                   from the cache instead of being built again. If no folder is defined,
+                   $XDG_CACHE_HOME/gmx_MMPBSA/topologies (~/.cache/gmx_MMPBSA/topologies) is used. The folder can be
+                   deleted at any time.''')
 group = parser.add_argument_group('Input and Output Files', '''These options specify the input files and optional 
 output files.''')
 group.add_argument('-i', dest='input_file', metavar='FILE', help='MM/PBSA input file.')
@@ -155,14 +163,16 @@ group.add_argument('-do', dest='decompout', metavar='FILE', default='FINAL_DECOM
                    help='Output file for decomposition statistics summary.')
 group.add_argument('-eo', dest='energyout', metavar='FILE',
                    help='''CSV-format output of all energy terms for every frame
-                  in every calculation. File name forced to end in [.csv].
-                  This file is only written when specified on the
+                  in every calculation. The format follows the file extension:
+                  [.csv], [.tsv], gzip- or zstd-compressed [.csv.gz],
+                  [.csv.zst] or a long-format [.parquet] table (requires
+                  pyarrow). This file is only written when specified on the
                   command-line.''')
 group.add_argument('-deo', dest='dec_energies', metavar='FILE',
                    help='''CSV-format output of all energy terms for each printed
-                  residue in decomposition calculations. File name forced to end
-                  in [.csv]. This file is only written when specified on the
-                  command-line.''')
+                  residue in decomposition calculations. The format follows the
+                  file extension, as in -eo. This file is only written when
+                  specified on the command-line.''')
 group.add_argument('-nogui', dest='gui', action='store_false', default=True,
                    help='No open gmx_MMPBSA_ana after all calculations finished')
 group.add_argument('-s', '--stability', dest='stability', action='store_true', default=False,
@@ -237,7 +247,11 @@ group = parser.add_argument_group('Miscellaneous Actions')
 group.add_argument('--rewrite-output', dest='rewrite_output', default=False,
                    action='store_true', help='''Do not re-run any calculations,
                   just parse the output files from the previous calculation and
-                  rewrite the output files.''')
+                  rewrite the output files. The results parsed in the previous
+                  calculation (_GMXMMPBSA_parsed.zip, only written with
+                  keep_files = 1 or 2) are used instead while the content of the
+                  output files and the input variables that change them are the
+                  same.''')
 group.add_argument('--clean', dest='clean', action='store_true', default=False,
                    help='''Clean temporary files and quit.''')
 
@@ -0,0 +1,203 @@
+"""
+This module contains the correlation analysis of the calculated binding free
+energies of a series of systems against the experimental ones.
+
+All the columns (model and term) of the aggregate table of API.load_systems are
+correlated at once. The bootstrap confidence intervals are computed with the
+weights of the systems in each sample (the number of times they are drawn), so
+every coefficient of a batch of samples is a few array products instead of a
+resampling loop.
+"""
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+import warnings
+import numpy as np
+import pandas as pd
+
+# Gas constant (kcal/(mol K))
+R = 0.001987
+METHODS = ('pearson', 'spearman', 'kendall')
+# Maximum number of elements of the arrays computed at once (32 MB of float64)
+MAX_ELEMENTS = 2 ** 22
+
+
+def ki2energy(ki, temp):
+    """
+    Experimental binding free energy from the inhibition constant (nM): ΔG = R * T * ln(Ki). ki and temp can be
+    numbers or arrays. The missing (or null) constants give nan
+    """
+    ki = np.asarray(ki, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        energy = np.where(ki > 0, R * np.asarray(temp, dtype=float) * np.log(ki * 1e-9), np.nan)
+    return energy if energy.ndim else float(energy)
+
+
+def _weighted_pearson(x, y, w):
+    """ Pearson coefficients of the columns of x and y (samples x systems x columns) with the weights w """
+    n = w.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xc = x - (w * x).sum(axis=1, keepdims=True) / n
+        yc = y - (w * y).sum(axis=1, keepdims=True) / n
+        return (w * xc * yc).sum(axis=1) / np.sqrt((w * xc ** 2).sum(axis=1) * (w * yc ** 2).sum(axis=1))
+
+
+def _quadratic_form(weights, matrices):
+    """ weights^T M weights of every sample (rows of weights) and every matrix M (systems x systems x columns) """
+    return (np.tensordot(weights, matrices, axes=(1, 0)) * weights[:, :, None]).sum(axis=1)
+
+
+def _coefficients(x, y, mask, weights, methods):
+    """
+    Correlation coefficients of every column of x (systems x columns) with y, for every row of weights (the number of
+    times each system is in a bootstrap sample, or ones for the coefficients of the data). Only the systems in mask
+    are used in each column. The tied values get the average rank (Spearman), and Kendall is the tau-b
+    :return: dict with an array (samples x columns) per method
+    """
+    w = weights[:, :, None] * mask
+    coefficients = {}
+    if 'pearson' in methods:
+        coefficients['pearson'] = _weighted_pearson(x[None], y[None, :, None], w)
+    if 'spearman' not in methods and 'kendall' not in methods:
+        return coefficients
+    pairs = mask[:, None, :] & mask[None, :, :]
+    # sign of the differences of every pair of systems
+    dx = np.sign(x[:, None, :] - x[None, :, :]) * pairs
+    dy = np.sign(y[:, None, None] - y[None, :, None]) * pairs
+    if 'spearman' in methods:
+        # the rank of a system in a sample is the weight of the systems with lower values plus half the weight of the
+        # tied ones (itself included), plus 1/2
+        rx = np.tensordot(weights, (pairs - dx) / 2, axes=(1, 0)) + 0.5
+        ry = np.tensordot(weights, (pairs - dy) / 2, axes=(1, 0)) + 0.5
+        coefficients['spearman'] = _weighted_pearson(rx, ry, w)
+    if 'kendall' in methods:
+        # the pairs of copies of the same system are tied in both values, so they don't count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            coefficients['kendall'] = _quadratic_form(weights, dx * dy) / np.sqrt(
+                _quadratic_form(weights, np.abs(dx)) * _quadratic_form(weights, np.abs(dy)))
+    return coefficients
+
+
+def correlate(x, y, methods=METHODS, n_boot=1000, ci=0.95, seed=None):
+    """
+    Correlation coefficients of every column of x with y, and their bootstrap (percentile) confidence intervals. The
+    systems are drawn with replacement in each bootstrap sample, and all the columns use the same samples
+    Args:
+        x: calculated values (systems x columns), or a single column. The nan values are excluded from their column
+        y: experimental values of the systems. The systems without them are excluded
+        methods: pearson, spearman and/or kendall (tau-b)
+        n_boot: number of bootstrap samples. With 0, the confidence intervals are not computed
+        ci: confidence level of the intervals
+        seed: seed of the random generator, so the intervals can be reproduced
+
+    Returns: pd.DataFrame with a row per column of x (indexed like the columns of x, if it is a pd.DataFrame) and the
+             columns n (number of systems), and the coefficient, lower and upper limit of each method (pearson,
+             pearson_low, pearson_high, ...)
+
+    """
+    index = x.columns if isinstance(x, pd.DataFrame) else None
+    x = np.asarray(x, dtype=float)
+    if x.ndim == 1:
+        x = x[:, None]
+    y = np.asarray(y, dtype=float)
+    if len(y) != len(x):
+        raise ValueError('x and y must have a value for every system')
+    for method in methods:
+        if method not in METHODS:
+            raise ValueError(f'Unknown correlation method {method}. Valid methods are: {", ".join(METHODS)}')
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    mask = ~np.isnan(x)
+    x = np.where(mask, x, 0.0)
+    nsys, ncols = x.shape
+
+    result = {'n': mask.sum(axis=0)}
+    # The pair arrays of Spearman and Kendall take systems^2 elements per column, so large tables are computed by
+    # chunks of columns, and the bootstrap samples in batches
+    chunk = max(1, MAX_ELEMENTS // max(1, nsys * nsys) if {'spearman', 'kendall'} & set(methods) else ncols)
+    batch = max(1, MAX_ELEMENTS // max(1, nsys * min(chunk, ncols)))
+    rng = np.random.default_rng(seed)
+    samples = rng.multinomial(nsys, np.full(nsys, 1 / nsys), size=n_boot) if n_boot and nsys else None
+    alpha = (1 - ci) / 2 * 100
+    for start in range(0, ncols, chunk):
+        cols = slice(start, start + chunk)
+        data = _coefficients(x[:, cols], y, mask[:, cols], np.ones((1, nsys)), methods)
+        if samples is not None:
+            boot = [_coefficients(x[:, cols], y, mask[:, cols], samples[b:b + batch], methods)
+                    for b in range(0, n_boot, batch)]
+        for method in methods:
+            result.setdefault(method, []).append(data[method][0])
+            limits = np.full((2, data[method].shape[1]), np.nan)
+            if samples is not None:
+                values = np.concatenate([b[method] for b in boot])
+                # the samples with constant values have no coefficient
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    limits = np.nanpercentile(values, [alpha, 100 - alpha], axis=0)
+            result.setdefault(f'{method}_low', []).append(limits[0])
+            result.setdefault(f'{method}_high', []).append(limits[1])
+    columns = {'n': result['n']}
+    for method in methods:
+        for key in (method, f'{method}_low', f'{method}_high'):
+            columns[key] = np.concatenate(result[key]) if key in result else np.zeros(0)
+    return pd.DataFrame(columns, index=index)
+
+
+def experimental_energy(systems: pd.DataFrame):
+    """
+    Experimental ΔG of the systems (the attrs['systems'] table of API.load_systems), from their exp_ki and
+    temperature
+    """
+    return pd.Series(ki2energy(systems['exp_ki'].to_numpy(dtype=float), systems['temperature'].to_numpy(dtype=float)),
+                     index=systems.index, name='ExpΔG')
+
+
+def correlation_table(summary: pd.DataFrame, exp_energy=None, etype=('normal',), mol=('delta',), methods=METHODS,
+                      n_boot=1000, ci=0.95, seed=None):
+    """
+    Correlates every model and term of the aggregate table of API.load_systems with the experimental ΔG of the
+    systems, all of them at once
+    Args:
+        summary: the pd.DataFrame returned by API.load_systems
+        exp_energy: experimental ΔG of every system (mapping or pd.Series indexed by system). By default, it is computed
+                    from the exp_ki and temperature of the systems (summary.attrs['systems'])
+        etype, mol: the results to correlate. None selects all of them
+        methods, n_boot, ci, seed: as in correlate
+
+    Returns: pd.DataFrame in long format, with the columns etype, model, mol, term, method, n, r, ci_low and ci_high
+
+    """
+    data = summary
+    if etype:
+        data = data[data['etype'].isin(etype)]
+    if mol:
+        data = data[data['mol'].isin(mol)]
+    x = data.pivot(index='system', columns=['etype', 'model', 'mol', 'term'], values='mean')
+    if exp_energy is None:
+        exp_energy = experimental_energy(summary.attrs['systems'])
+    y = pd.Series(exp_energy, dtype=float).reindex(x.index)
+
+    result = correlate(x, y.to_numpy(), methods, n_boot, ci, seed)
+    rows = []
+    for method in methods:
+        table = result[['n', method, f'{method}_low', f'{method}_high']].set_axis(['n', 'r', 'ci_low', 'ci_high'],
+                                                                                axis=1)
+        rows.append(table.assign(method=method))
+    table = pd.concat(rows).reset_index()
+    return table[['etype', 'model', 'mol', 'term', 'method', 'n', 'r', 'ci_low', 'ci_high']]
@@ -46,8 +46,11 @@ from copy import deepcopy
 ROH = {1: 0.586, 2: 0.699, 3: 0.734, 4: 0.183}
 
 
-def create_inputs(INPUT, prmtop_system, pre):
-    """ Creates the input files for all necessary calculations """
+def create_inputs(INPUT, prmtop_system, pre, size=1, mutant_prefixes=('mutant_',)):
+    """
+    Creates the input files for all necessary calculations. mutant_prefixes has
+    the file prefix of every mutation of the alanine scanning
+    """
     stability = prmtop_system.stability
 
     # since gbnsr6 is independent of sander MM calculation is the same input when decomp or not
@@ -291,13 +294,15 @@ def create_inputs(INPUT, prmtop_system, pre):
         trj_suffix = 'nc' if INPUT['general']['netcdf'] else 'mdcrd'
         com_mask, rec_mask, lig_mask = prmtop_system.Mask('all', True)
         if not INPUT['ala']['mutant_only']:
-            qh_in = QuasiHarmonicInput(com_mask, rec_mask, lig_mask, temperature=INPUT['temperature'],
-                                       stability=stability, prefix=pre, trj_suffix=trj_suffix)
+            qh_in = QuasiHarmonicInput(com_mask, rec_mask, lig_mask, temperature=INPUT['general']['temperature'],
+                                       stability=stability, prefix=pre, trj_suffix=trj_suffix, size=size)
             qh_in.write_input(f'{pre}cpptrajentropy.in')
         if INPUT['ala']['alarun']:
-            qh_in = QuasiHarmonicInput(com_mask, rec_mask, lig_mask, temperature=INPUT['temperature'],
-                                       stability=stability, prefix=pre + 'mutant_', trj_suffix=trj_suffix)
-            qh_in.write_input(f'{pre}mutant_cpptrajentropy.in')
+            for mut_pre in mutant_prefixes:
+                qh_in = QuasiHarmonicInput(com_mask, rec_mask, lig_mask, temperature=INPUT['general']['temperature'],
+                                           stability=stability, prefix=pre + mut_pre, trj_suffix=trj_suffix,
+                                           size=size)
+                qh_in.write_input(f'{pre}{mut_pre}cpptrajentropy.in')
 
 
 class SanderInput(object):
@@ -771,13 +776,14 @@ class QuasiHarmonicInput(object):
     """ Write a cpptraj input file to do a quasi-harmonic entropy calculation """
 
     def __init__(self, com_mask, rec_mask, lig_mask, temperature=298.15, stability=False,
-                 prefix='_GMXMMPBSA_', trj_suffix='mdcrd'):
-        self.file_string = ("trajin %scomplex.%s\n" % (prefix, trj_suffix) +
-                            "reference %savgcomplex.pdb\n" % (prefix) +
-                            "rms mass reference %s\n" % (com_mask) +
-                            "matrix mwcovar name comp.matrix %s\n" % (com_mask) +
-                            "analyze matrix comp.matrix out " +
-                            "%scomplex_entropy.out thermo reduce temp %s\n" % (prefix, temperature))
+                 prefix='_GMXMMPBSA_', trj_suffix='mdcrd', size=1):
+        # Read the thread-specific trajectories in order instead of a full copy
+        self.file_string = ''.join("trajin %scomplex.%s.%d\n" % (prefix, trj_suffix, i) for i in range(size))
+        self.file_string += ("reference %savgcomplex.pdb\n" % (prefix) +
+                             "rms mass reference %s\n" % (com_mask) +
+                             "matrix mwcovar name comp.matrix %s\n" % (com_mask) +
+                             "analyze matrix comp.matrix out " +
+                             "%scomplex_entropy.out thermo reduce temp %s\n" % (prefix, temperature))
         if not stability:
             self.file_string = (self.file_string +
                                 "rms mass reference %s\n" % (rec_mask) +
@@ -22,6 +22,9 @@ re-supplying all of the information again.
 #  for more details.                                                           #
 # ##############################################################################
 
+import hashlib
+import logging
+import os
 import re
 import warnings
 
@@ -90,7 +93,7 @@ class InfoFile(object):
         outfile = open(name, 'w')
         # The data we have to write: INPUT, FILES, and the following attributes:
         # numframes, numframes_nmode, mpi_size (also recognize size),
-        # input_file_text, mut_str, mutant_index
+        # input_file_text, mut_str, mutant_index, mut_strs, mutant_indexes
 
         # Start with INPUT (and the editable vars). Allow this to recognize INFO
         # files from the last version of gmx_MMPBSA
@@ -133,6 +136,9 @@ class InfoFile(object):
         outfile.write("mutant_index = %s\n" % self.app.mutant_index)
         outfile.write("mut_str = '%s'\n" % (self.app.resl[self.app.mutant_index].mutant_label
                                             if self.app.mutant_index is not None else ""))
+        # every mutation of the alanine scanning (not available in the info files of previous versions)
+        outfile.write("mutant_indexes = %s\n" % getattr(self.app, 'mutant_indexes', []))
+        outfile.write("mut_strs = %s\n" % getattr(self.app, 'mut_strs', []))
         outfile.write('using_chamber = %s\n' % self.app.using_chamber)
         outfile.write(self.app.input_file_text)
 
@@ -224,6 +230,115 @@ class InfoFile(object):
         return "'%s'" % var if isinstance(var, str) else f"{var}"
 
 
+class ParsedResults(object):
+    """
+    Sidecar of the info file (prefix + parsed.zip) with the results parsed from the output files: the arrays of every
+    energy output file, the decomposition outputs, the ligand residue names and the Interaction and C2 Entropy data of
+    the GGAS series. It has the layout of the results bundle (a JSON manifest and .npy datasets, see
+    bundle.ParsedResultsWriter), so no object is pickled. With it, --rewrite-output builds the results again from
+    these arrays, without reading the output files or the topologies.
+
+    The sidecar keeps a digest of everything the parsed results depend on: the INPUT variables (except those in
+    OUTPUT_VARS), the number of frames and the name and content of the output files, topologies and fixed complex
+    structure. It is only used while the digest is the same, otherwise the output files are parsed again
+    """
+
+    # Editable variables that don't change the parsed results. The entropies are computed again (from the cached data
+    # when available) after loading them
+    OUTPUT_VARS = {'general': ['exp_ki', 'sys_name', 'ie_segment', 'interaction_entropy', 'c2_entropy', 'verbose'],
+                   'decomp': ['csv_format']}
+
+    # Output files of the calculations (rank suffix is optional, as in the QH output)
+    source_re = re.compile(r'.*\.(mdout|out)(\.\d+)?$')
+    # Bytes of the files hashed at once
+    chunk_size = 2 ** 20
+
+    def __init__(self, app):
+        self.app = app
+
+    def write(self, name=None):
+        """ Writes the parsed results of the app to the sidecar """
+        from GMXMMPBSA.bundle import ParsedResultsWriter
+        if name is None:
+            name = f'{self.app.pre}parsed.zip'
+        # The arrays loaded from the previous sidecar are memory-mapped from it, so it is replaced instead of rewritten
+        ParsedResultsWriter(f'{name}.tmp').write(self.digest(), self.app.energy_arrays, self._decomp_outputs(),
+                                                 self.app.entropy_data, self.app.ligand_residues)
+        os.replace(f'{name}.tmp', name)
+
+    def read(self, name=None):
+        """
+        Loads the parsed results of the sidecar into the app if it is up-to-date (the energy arrays, the
+        decomposition states, the entropy data and the ligand residue names). Returns whether they were loaded
+        """
+        from GMXMMPBSA.bundle import ParsedResultsFile
+        if name is None:
+            name = f'{self.app.pre}parsed.zip'
+        if not os.path.exists(name):
+            return False
+        try:
+            parsed = ParsedResultsFile(name)
+        except Exception as e:
+            logging.warning(f'Could not load the parsed results from {name} ({e}). Parsing the output files again...')
+            return False
+        if parsed.digest != self.digest():
+            logging.info(f'The output files or the input variables have changed since {name} was written. Parsing '
+                         f'the output files again...')
+            return False
+        logging.info(f'Loading the parsed results from {name}...')
+        self.app.energy_arrays = parsed.energy_arrays()
+        self.app.decomp_states = parsed.decomp_states()
+        self.app.entropy_data = parsed.entropy_data()
+        self.app.ligand_residues = parsed.ligand_residues
+        return True
+
+    def digest(self, content=True):
+        """
+        Returns the digest of the INPUT variables and the files the parsed results depend on. Without content, the
+        files are represented by their size and modification time instead of their content, which is much faster
+        but only detects the changes that update them
+        """
+        from GMXMMPBSA import __version__
+        app = self.app
+        info = InfoFile(app)
+        digest = hashlib.sha256(f'{__version__} {app.mpi_size} {app.numframes} {app.numframes_nmode}\n'.encode())
+        for nml, nml_value in sorted(app.INPUT.items()):
+            for var, value in sorted(nml_value.items()):
+                if var not in self.OUTPUT_VARS.get(nml, []):
+                    digest.update(f"INPUT['{nml}']['{var}'] = {info.write_var(value)}\n".encode())
+        for fname in self._source_files():
+            if not content:
+                stat = os.stat(fname)
+                digest.update(f'{fname} {stat.st_size} {stat.st_mtime_ns}\n'.encode())
+                continue
+            digest.update(f'{fname}\n'.encode())
+            with open(fname, 'rb') as source:
+                for chunk in iter(lambda: source.read(self.chunk_size), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def _source_files(self):
+        """ Output files of the calculations, topologies and fixed complex structure """
+        FILES = self.app.FILES
+        files = {fname for fname in os.listdir(os.getcwd())
+                 if fname.startswith(self.app.pre) and self.source_re.match(fname)}
+        files.update(getattr(FILES, var) for var in ('complex_prmtop', 'receptor_prmtop', 'ligand_prmtop',
+                                                     'mutant_complex_prmtop', 'mutant_receptor_prmtop',
+                                                     'mutant_ligand_prmtop', 'complex_fixed')
+                     if getattr(FILES, var, None))
+        files.update(top for mut in getattr(FILES, 'mutant_scan', None) or [] for top in mut if top)
+        return sorted(fname for fname in files if os.path.exists(fname))
+
+    def _decomp_outputs(self):
+        """ Decomposition outputs (not the binding ones) of every system of calc_types """
+        calc_types = self.app.calc_types
+        systems = [calc_types.decomp_normal, calc_types.decomp_mutant]
+        systems += [getattr(scan, 'decomp_mutant', {}) for scan in calc_types.scan.values()]
+        outputs = {id(output): output for system in systems for model in system.values()
+                   for mol, output in model.items() if mol != 'delta'}
+        return list(outputs.values())
+
+
 def _determine_type(thing):
     """ Determines what type this thing is """
     # If it is a string with quotes, strip off the quotes
@@ -419,6 +419,10 @@ input_file.addNamelist('general', 'general',
                            ['interaction_entropy', int, 0, 'Do Interaction Entropy calculation'],
                            ['ie_segment', int, 25, 'Trajectory segment to calculate interaction entropy'],
                            ['c2_entropy', int, 0, 'Do C2 Entropy calculation'],
+                           ['c2_samples', int, 2000, 'Number of bootstrap re-samplings of the C2 Entropy'],
+                           ['c2_seed', int, -1, 'Seed of the C2 Entropy bootstrap (-1 = random)'],
+                           ['c2_block', int, 1, 'Block length of the C2 Entropy bootstrap (1 = by frame)'],
+                           ['c2_threads', int, 1, 'Number of threads used in the C2 Entropy bootstrap'],
 
                             # Miscellaneous options
                            ['assign_chainID', int, 0, 'Assign chains ID'],
@@ -624,7 +628,7 @@ input_file.addNamelist('rism', 'rism',
 
 input_file.addNamelist('ala', 'alanine_scanning',
                        [
-                           ['mutant_res', str, '', 'Which residue will be mutated'],
+                           ['mutant_res', str, '', 'Which residue(s) will be mutated (one mutant per residue)'],
                            ['mutant', str, 'ALA', 'Defines if Alanine or Glycine scanning will be performed'],
                            ['mutant_only', int, 0, 'Only compute mutant energies'],
                            ['cas_intdiel', int, 0, 'Change the intdiel value based on which aa is mutated'],
@@ -639,7 +643,9 @@ input_file.addNamelist('decomp', 'decomposition',
                            ['idecomp', int, 0, 'Which type of decomposition analysis to do'],
                            ['dec_verbose', int, 0, 'Control energy terms are printed to the output'],
                            ['print_res', str, 'within 6', 'Which residues to print decomposition data for'],
-                           ['csv_format', int, 1, 'Write decomposition data in CSV format']
+                           ['csv_format', int, 1, 'Write decomposition data in CSV format'],
+                           ['pair_threshold', float, 0.0, 'Minimum energy of the pairs kept in pairwise decomposition'],
+                           ['pair_memory', int, 1024, 'Maximum memory (MB) for the pairwise decomposition energies']
                        ], trigger='decomprun')
 
 input_file.addNamelist('nmode', 'nmode',
@@ -27,23 +27,29 @@ import os
 import signal
 import sys
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
 from GMXMMPBSA import utils, __version__
 from GMXMMPBSA.amber_outputs import (QHout, NMODEout, QMMMout, GBout, PBout, PolarRISM_std_Out, RISM_std_Out,
                                      PolarRISM_gf_Out, RISM_gf_Out, PolarRISM_pcplus_Out, RISM_pcplus_Out,
                                      BindingStatistics, IEout, C2out, DeltaDeltaStatistics, DeltaIEC2Statistic,
-                                     DeltaDeltaQH, GBNSR6out, MMout)
+                                     DeltaDeltaQH, GBNSR6out, MMout, parse_rank_file)
 from GMXMMPBSA.calculation import (CalculationList, EnergyCalculation, PBEnergyCalculation,
                                    NmodeCalc, QuasiHarmCalc, CopyCalc, PrintCalc, LcpoCalc, MolsurfCalc,
-                                   InteractionEntropyCalc, C2EntropyCalc, MergeOut, ListEnergyCalculation)
+                                   InteractionEntropyCalc, C2EntropyCalc, MergeOut, ListEnergyCalculation,
+                                   interaction_entropy, c2_entropy_bootstrap)
 from GMXMMPBSA.commandlineparser import parser
 from GMXMMPBSA.createinput import create_inputs, SanderRISMInput
 from GMXMMPBSA.exceptions import (MMPBSA_Error, InternalError, InputError, GMXMMPBSA_ERROR)
-from GMXMMPBSA.infofile import InfoFile
+from GMXMMPBSA.infofile import InfoFile, ParsedResults
 from GMXMMPBSA.fake_mpi import MPI as FakeMPI
 from GMXMMPBSA.input_parser import input_file as _input_file
-from GMXMMPBSA.make_trajs import make_trajectories, make_mutant_trajectories
-from GMXMMPBSA.output_file import (write_outputs, write_decomp_output, data2pkl)
+from GMXMMPBSA.make_trajs import (make_trajectories, make_rank_trajectories, make_mutant_trajectories,
+                                  RestartArchive)
+from GMXMMPBSA.output_file import (write_outputs, write_decomp_output, data2bundle)
 from GMXMMPBSA.parm_setup import MMPBSA_System
 from GMXMMPBSA.make_top import CheckMakeTop
 from GMXMMPBSA.timer import Timer
@@ -77,6 +83,12 @@ class MMPBSA_App(object):
         _MPI = self.MPI = MPI
         self.pre = '_GMXMMPBSA_'
         self.INPUT = {}
+        # Interaction and C2 Entropy data of every GGAS series (see _entropy_key)
+        self.entropy_data = {}
+        # Arrays of every rank file of the energy outputs already parsed, keyed by (output class name, base name),
+        # and state of the decomposition outputs loaded with the parsed results, keyed by base name (see ParsedResults)
+        self.energy_arrays = {}
+        self.decomp_states = {}
         if stdout is None:
             _stdout = self.stdout = _unbuf_stdout
         else:
@@ -124,7 +136,7 @@ class MMPBSA_App(object):
 
         # Create input files based on INPUT dict
         if master:
-            create_inputs(INPUT, self.normal_system, self.pre)
+            create_inputs(INPUT, self.normal_system, self.pre, self.mpi_size, [mut.pre for mut in self.mutations])
         self.timer.stop_timer('setup')
 
         # Now create our trajectory files
@@ -143,6 +155,12 @@ class MMPBSA_App(object):
                                 'we have simplified a few things to make the code easier to maintain. Please check the '
                                 'documentation')
 
+        # Now every rank writes its own slice of the trajectories
+        frames = self.MPI.COMM_WORLD.bcast((self.numframes, rec_frames, lig_frames, self.numframes_nmode)
+                                           if master else None, root=0)
+        make_rank_trajectories(INPUT, FILES, self.mpi_rank, self.mpi_size, frames, self.external_progs['cpptraj'],
+                               self.pre)
+
         self.MPI.COMM_WORLD.Barrier()
 
         self.timer.stop_timer('cpptraj')
@@ -152,8 +170,8 @@ class MMPBSA_App(object):
 
         if INPUT['ala']['alarun'] and self.master:
             logging.info('Mutating trajectories...')
-        _, mutant_residue = make_mutant_trajectories(INPUT, FILES, self.mpi_rank, self.external_progs['cpptraj'],
-                                                     self.normal_system, self.mutant_system, self.pre)
+        make_mutant_trajectories(INPUT, FILES, self.mpi_rank, self.external_progs['cpptraj'], self.normal_system,
+                                 self.mutations, self.pre)
 
         self.MPI.COMM_WORLD.Barrier()
 
@@ -202,6 +220,10 @@ class MMPBSA_App(object):
 
         self.stdout.write('\n')
 
+        # The info of the running job, so its partial results can be read (see API.LiveResults)
+        if master:
+            InfoFile(self).write_info(f'{self.pre}info.running')
+
         self.calc_list.run(rank, self.stdout)
 
         self.sync_mpi()
@@ -227,13 +249,17 @@ class MMPBSA_App(object):
             self.calc_list.append(PrintCalc('Running calculations on normal system...'), timer_key=None)
             self._load_calc_list(self.pre, False, self.normal_system)
         if self.INPUT['ala']['alarun']:
-            self.calc_list.append(PrintCalc('Running calculations on mutant system...'), timer_key=None)
-            self._load_calc_list(f'{self.pre}', True, self.mutant_system)
+            # The normal system is calculated only once for all the mutations
+            for mut in self.mutations:
+                label = f' ({mut.label})' if len(self.mutations) > 1 else ''
+                self.calc_list.append(PrintCalc(f'Running calculations on mutant system{label}...'), timer_key=None)
+                self._load_calc_list(f'{self.pre}', mut, mut.system)
 
     def _load_calc_list(self, pre, mutant, parm_system):
         """
         Internal routine to handle building calculation list. Called separately
-        for mutant and normal systems
+        for mutant and normal systems. mutant is False for the normal system or
+        the namespace of the mutation
         """
         # Set up a dictionary of external programs to use based one external progs
         progs = {'gb': self.external_progs['sander'],
@@ -253,12 +279,12 @@ class MMPBSA_App(object):
         # Determine if we just copy the receptor files. This only happens if we
         # are doing mutant calculations, we're not only doing the mutant, and the
         # receptor/mutant receptor topologies are equal. Same for the ligand
-        copy_receptor = (mutant and not self.INPUT['ala']['mutant_only'] and
-                         self.FILES.receptor_prmtop == self.FILES.mutant_receptor_prmtop)
-        copy_ligand = (mutant and not self.INPUT['ala']['mutant_only'] and
-                       self.FILES.ligand_prmtop == self.FILES.mutant_ligand_prmtop)
+        copy_receptor = bool(mutant and not self.INPUT['ala']['mutant_only'] and
+                             self.FILES.receptor_prmtop == mutant.receptor_prmtop)
+        copy_ligand = bool(mutant and not self.INPUT['ala']['mutant_only'] and
+                           self.FILES.ligand_prmtop == mutant.ligand_prmtop)
 
-        prefix = pre + 'mutant_' if mutant else pre
+        prefix = pre + mutant.pre if mutant else pre
 
 
         # First load the GB calculations
@@ -393,12 +419,9 @@ class MMPBSA_App(object):
                                   self.pre + 'restrt.%d')
             self.calc_list.append(c, '    calculating MM...', timer_key='gbnsr6',
                                   output_basename=f'{prefix}complex_mm.mdout.%d')
-            # use pre directly to have only one folder per rank
-            files = sorted(list(Path(f"{pre}inpcrd_{self.mpi_rank}").glob(f"{prefix}complex*.inpcrd")),
-                           key=lambda x: int(x.stem.split('.')[1]))
-            mdouts = [file.parent.joinpath(f"{file.name.split('.')[0]}_gbnsr6{file.suffixes[0]}.mdout").as_posix()
-                      for file in files]
-            inpcrds = [file.as_posix() for file in files]
+            # use pre directly to have only one folder per rank. The frames are packed in one file
+            inpcrds = RestartArchive(f"{pre}inpcrd_{self.mpi_rank}/{prefix}complex.inpcrd")
+            mdouts = [f"{pre}inpcrd_{self.mpi_rank}/{prefix}complex_gbnsr6.{n}.mdout" for n in inpcrds.frames]
 
             c = ListEnergyCalculation(progs['gbnsr6'], parm_system.complex_prmtop, mdin, inpcrds, mdouts)
             self.calc_list.append(c, '    calculating GB...', timer_key='gbnsr6',
@@ -437,12 +460,10 @@ class MMPBSA_App(object):
 
                     self.calc_list.append(c, '    calculating MM...', timer_key='gbnsr6',
                                           output_basename=f'{prefix}receptor_mm.mdout.%d')
-                    files = sorted(list(Path(f"{pre}inpcrd_{self.mpi_rank}").glob(f"{prefix}receptor*.inpcrd")),
-                                   key=lambda x: int(x.stem.split('.')[1]))
-                    mdouts = [
-                        file.parent.joinpath(f"{file.name.split('.')[0]}_gbnsr6{file.suffixes[0]}.mdout").as_posix()
-                        for file in files]
-                    inpcrds = [file.as_posix() for file in files]
+                    # use pre directly to have only one folder per rank. The frames are packed in one file
+                    inpcrds = RestartArchive(f"{pre}inpcrd_{self.mpi_rank}/{prefix}receptor.inpcrd")
+                    mdouts = [f"{pre}inpcrd_{self.mpi_rank}/{prefix}receptor_gbnsr6.{n}.mdout"
+                              for n in inpcrds.frames]
 
                     c = ListEnergyCalculation(progs['gbnsr6'], parm_system.receptor_prmtop, mdin, inpcrds, mdouts)
                     self.calc_list.append(c, '    calculating GB...', timer_key='gbnsr6',
@@ -479,12 +500,10 @@ class MMPBSA_App(object):
 
                     self.calc_list.append(c, '    calculating MM...', timer_key='gbnsr6',
                                           output_basename=f'{prefix}ligand_mm.mdout.%d')
-                    files = sorted(list(Path(f"{pre}inpcrd_{self.mpi_rank}").glob(f"{prefix}ligand*.inpcrd")),
-                                   key=lambda x: int(x.stem.split('.')[1]))
-                    mdouts = [
-                        file.parent.joinpath(f"{file.name.split('.')[0]}_gbnsr6{file.suffixes[0]}.mdout").as_posix()
-                        for file in files]
-                    inpcrds = [file.as_posix() for file in files]
+                    # use pre directly to have only one folder per rank. The frames are packed in one file
+                    inpcrds = RestartArchive(f"{pre}inpcrd_{self.mpi_rank}/{prefix}ligand.inpcrd")
+                    mdouts = [f"{pre}inpcrd_{self.mpi_rank}/{prefix}ligand_gbnsr6.{n}.mdout"
+                              for n in inpcrds.frames]
 
                     c = ListEnergyCalculation(progs['gbnsr6'], parm_system.ligand_prmtop, mdin, inpcrds, mdouts)
                     self.calc_list.append(c, '    calculating GB...', timer_key='gbnsr6',
@@ -655,7 +674,7 @@ class MMPBSA_App(object):
                           progs['qh']), timer_key='qh')
 
             c = QuasiHarmCalc(progs['qh'], parm_system.complex_prmtop,
-                              '%scomplex.%s' % (prefix, trj_sfx),
+                              ['%scomplex.%s.%d' % (prefix, trj_sfx, i) for i in range(self.mpi_size)],
                               '%scpptrajentropy.in' % prefix,
                               '%scpptraj_entropy.out' % prefix,
                               self.INPUT['general']['receptor_mask'],
@@ -681,11 +700,21 @@ class MMPBSA_App(object):
              self.FILES.mutant_complex_prmtop,
              self.FILES.mutant_receptor_prmtop, self.FILES.mutant_ligand_prmtop) = maketop.buildTopology()
             logging.info('Building AMBER topologies from GROMACS files... Done.\n')
+            # Wall-clock time saved by running the independent setup tasks at the same time
+            self.timer.add_timer('setup_saved', 'Time saved by the concurrent setup:')
+            self.timer.add_time('setup_saved', maketop.task_time - maketop.stage_time)
             self.INPUT['general']['receptor_mask'], self.INPUT['general']['ligand_mask'], self.resl = maketop.get_masks()
             self.mutant_index = maketop.com_mut_index
             self.mut_str = self.resl[maketop.com_mut_index].mutant_label if self.mutant_index is not None else ''
+            # One entry per mutation of the alanine scanning. The first one is also in the mutant_* variables
+            self.FILES.mutant_scan = [[mut.complex_prmtop, mut.receptor_prmtop, mut.ligand_prmtop]
+                                      for mut in maketop.mutations]
+            self.mutant_indexes = [mut.com_index for mut in maketop.mutations]
+            self.mut_strs = [self.resl[i].mutant_label for i in self.mutant_indexes]
             self.FILES.complex_fixed = f'{self.FILES.prefix}COM_FIXED.pdb'
         self.FILES = self.MPI.COMM_WORLD.bcast(self.FILES, root=0)
+        self.mutant_indexes, self.mut_strs = self.MPI.COMM_WORLD.bcast(
+            (self.mutant_indexes, self.mut_strs) if self.master else None, root=0)
         self.INPUT = self.MPI.COMM_WORLD.bcast(self.INPUT, root=0)
         self.sync_mpi()
         self.timer.stop_timer('setup_gmx')
@@ -704,17 +733,27 @@ class MMPBSA_App(object):
             logging.info('Loading and checking parameter files for compatibility...')
         self.normal_system = MMPBSA_System(FILES.complex_prmtop, FILES.receptor_prmtop, FILES.ligand_prmtop)
         self.using_chamber = self.normal_system.complex_prmtop.chamber
+        # Residue names of the ligand, printed in the output file
+        self.ligand_residues = ([] if self.normal_system.stability else
+                                list(self.normal_system.ligand_prmtop.parm_data['RESIDUE_LABEL']))
         self.mutant_system = None
+        self.mutations = []
         if INPUT['ala']['alarun']:
-            if (FILES.mutant_receptor_prmtop is None and FILES.mutant_ligand_prmtop is None and not self.stability):
-                GMXMMPBSA_ERROR('Alanine scanning requires either a mutated receptor or mutated ligand topology '
-                                'file!')
-            if FILES.mutant_receptor_prmtop is None:
-                FILES.mutant_receptor_prmtop = FILES.receptor_prmtop
-            elif FILES.mutant_ligand_prmtop is None:
-                FILES.mutant_ligand_prmtop = FILES.ligand_prmtop
-            self.mutant_system = MMPBSA_System(FILES.mutant_complex_prmtop, FILES.mutant_receptor_prmtop,
-                                               FILES.mutant_ligand_prmtop)
+            for c, (com_prmtop, rec_prmtop, lig_prmtop) in enumerate(self._mutant_scan()):
+                if rec_prmtop is None and lig_prmtop is None and not self.stability:
+                    GMXMMPBSA_ERROR('Alanine scanning requires either a mutated receptor or mutated ligand topology '
+                                    'file!')
+                if rec_prmtop is None:
+                    rec_prmtop = FILES.receptor_prmtop
+                elif lig_prmtop is None:
+                    lig_prmtop = FILES.ligand_prmtop
+                self.mutations.append(SimpleNamespace(
+                    pre=utils.mutant_prefix(c), complex_prmtop=com_prmtop, receptor_prmtop=rec_prmtop,
+                    ligand_prmtop=lig_prmtop, system=MMPBSA_System(com_prmtop, rec_prmtop, lig_prmtop),
+                    label=self.mut_strs[c] if getattr(self, 'mut_strs', None) else utils.mutant_prefix(c)[:-1]))
+            FILES.mutant_scan = [[mut.complex_prmtop, mut.receptor_prmtop, mut.ligand_prmtop]
+                                 for mut in self.mutations]
+            self._set_mutation(0)
         # If we have a chamber prmtop, force using sander
         if self.using_chamber:
             if INPUT['rism']['rismrun']:
@@ -724,25 +763,47 @@ class MMPBSA_App(object):
 
         self.normal_system.Map(INPUT['general']['receptor_mask'], INPUT['general']['ligand_mask'])
         self.normal_system.CheckConsistency()
-        if INPUT['ala']['alarun']:
-            self.mutant_system.Map(INPUT['general']['receptor_mask'], INPUT['general']['ligand_mask'])
-            self.mutant_system.CheckConsistency()
+        for mut in self.mutations:
+            mut.system.Map(INPUT['general']['receptor_mask'], INPUT['general']['ligand_mask'])
+            mut.system.CheckConsistency()
         if (INPUT['general']['ligand_mask'] is None or INPUT['general']['receptor_mask'] is None):
             com_mask, INPUT['general']['receptor_mask'], INPUT['general']['ligand_mask'] = \
                 self.normal_system.Mask('all', in_complex=True)
         self.sync_mpi()
         self.timer.stop_timer('setup')
 
+    def _mutant_scan(self):
+        """ Returns the (complex, receptor, ligand) mutant topologies of every mutation """
+        # Info files written before the multiple mutations support only have the mutant_* variables
+        return getattr(self.FILES, 'mutant_scan', None) or [[self.FILES.mutant_complex_prmtop,
+                                                             self.FILES.mutant_receptor_prmtop,
+                                                             self.FILES.mutant_ligand_prmtop]]
+
+    def _set_mutation(self, index):
+        """
+        Makes the index-th mutation of the alanine scanning the current one. All the
+        mutant_* files and attributes, as well as the file prefix of the mutant
+        (mut_pre) refer to this mutation until another one is set
+        """
+        (self.FILES.mutant_complex_prmtop, self.FILES.mutant_receptor_prmtop,
+         self.FILES.mutant_ligand_prmtop) = self._mutant_scan()[index]
+        if getattr(self, 'mutations', None):
+            self.mutant_system = self.mutations[index].system
+        if getattr(self, 'mutant_indexes', None):
+            self.mutant_index = self.mutant_indexes[index]
+            self.mut_str = self.mut_strs[index]
+        self.mut_pre = utils.mutant_prefix(index)
+
     def write_final_outputs(self):
         """ Writes the final output files for gmx_MMPBSA """
         self.timer.add_timer('output', 'Statistics calculation & output writing:')
         self.timer.start_timer('output')
-        if (not hasattr(self, 'input_file_text') or not hasattr(self, 'FILES') or
-                not hasattr(self, 'INPUT') or not hasattr(self, 'normal_system')):
-            GMXMMPBSA_ERROR('I am not prepared to write the final output file!', InternalError)
         # Only the master does this, so bail out if we are not master
         if not self.master:
             return
+        if (not hasattr(self, 'input_file_text') or not hasattr(self, 'FILES') or
+                not hasattr(self, 'INPUT') or not hasattr(self, 'ligand_residues')):
+            GMXMMPBSA_ERROR('I am not prepared to write the final output file!', InternalError)
         # If we haven't already parsed our output files, do that now
         # FIXME: does this make sense?
         if not hasattr(self, 'calc_types'):
@@ -752,10 +813,14 @@ class MMPBSA_App(object):
         if self.INPUT['decomp']['decomprun']:
             write_decomp_output(self)
         if self.INPUT['general']['keep_files'] in [0, 2]:
-            data2pkl(self)
+            data2bundle(self)
+        # The parsed results are kept with the temporary files, so --rewrite-output can use them
+        if self.INPUT['general']['keep_files'] in [1, 2]:
+            ParsedResults(self).write(f'{self.pre}parsed.zip')
 
         info = InfoFile(self)
         info.write_info(f'{self.pre}info')
+        Path(f'{self.pre}info.running').unlink(missing_ok=True)
 
         self.timer.stop_timer('output')
 
@@ -768,7 +833,12 @@ class MMPBSA_App(object):
         logging.info('Timing:')
         if not self.FILES.rewrite_output:
             self.timer.print_('setup_gmx')
-        self.timer.print_('setup')
+            self.timer.print_('setup_saved')
+        # With --rewrite-output, the topologies are not loaded when the parsed results are up-to-date
+        if 'setup' in self.timer.timer_names:
+            self.timer.print_('setup')
+        if 'parsed' in self.timer.timer_names:
+            self.timer.print_('parsed')
 
         if not self.FILES.rewrite_output:
             self._finalize_timers()
@@ -952,6 +1022,13 @@ class MMPBSA_App(object):
                     "variable. Check this tutorial for "
                     "more details https://valdes-tresanco-ms.github.io/gmx_MMPBSA/dev/examples/Protein_ligand/ST")
 
+        if INPUT['general']['c2_entropy']:
+            if INPUT['general']['c2_samples'] < 20:
+                GMXMMPBSA_ERROR('C2_SAMPLES must be at least 20!', InputError)
+            if INPUT['general']['c2_block'] < 1:
+                GMXMMPBSA_ERROR('C2_BLOCK must be a positive integer!', InputError)
+            if INPUT['general']['c2_threads'] < 1:
+                GMXMMPBSA_ERROR('C2_THREADS must be a positive integer!', InputError)
         if INPUT['gb']['igb'] not in [1, 2, 5, 7, 8]:
             GMXMMPBSA_ERROR('Invalid value for IGB (%s)! ' % INPUT['gb']['igb'] + 'IGB must be 1, 2, 5, 7, or 8.', InputError)
         if INPUT['gb']['intdiel'] < 0:
@@ -1004,8 +1081,6 @@ class MMPBSA_App(object):
         if INPUT['decomp']['decomprun'] and INPUT['decomp']['idecomp'] == 0:
             GMXMMPBSA_ERROR('IDECOMP cannot be 0 for Decomposition analysis!', InputError)
 
-        if INPUT['ala']['alarun'] and INPUT['general']['netcdf'] != '':
-            GMXMMPBSA_ERROR('Alanine scanning is incompatible with NETCDF != 0!', InputError)
         if INPUT['general']['ions_parameters'] not in range(1, 17):
             GMXMMPBSA_ERROR('Ions parameters file name must be in %s!' % range(1, 17), InputError)
         if INPUT['general']['PBRadii'] not in range(1, 8):
@@ -1152,59 +1227,123 @@ class MMPBSA_App(object):
         """ Throws up a barrier """
         self.MPI.COMM_WORLD.Barrier()
 
-    def parse_output_files(self, from_calc=True):
+    def get_residues(self):
+        """ Gets the residues (resl) from the fixed complex structure, if they were not loaded """
+        if hasattr(self, 'resl'):
+            return
+        from GMXMMPBSA.utils import mask2list
+        INPUT = self.INPUT
+        self.resl = mask2list(self.FILES.complex_fixed, INPUT['general']['receptor_mask'],
+                              INPUT['general']['ligand_mask'])
+        if INPUT['ala']['alarun']:
+            for index in getattr(self, 'mutant_indexes', None) or [self.mutant_index]:
+                self.resl[index].set_mut(INPUT['ala']['mutant'])
+
+    def parse_output_files(self, from_calc=True, decomp=True):
         """
-        This parses the output files and loads them into dicts for easy access
+        This parses the output files and loads them into dicts for easy access. With decomp=False, the decomposition
+        output files are not parsed (see parse_decomp_files)
         """
         # Only the master does this
-        from types import SimpleNamespace
         if not self.master:
             return
         logging.info('Parsing results to output files...\n')
-        self.calc_types = SimpleNamespace(normal={}, mutant={}, mut_norm={}, decomp_normal={}, decomp_mutant={})
+        # scan has the mutant, mut_norm and decomp_mutant results of every mutation, keyed by its label
+        self.calc_types = SimpleNamespace(normal={}, mutant={}, mut_norm={}, decomp_normal={}, decomp_mutant={},
+                                          scan={})
+        INPUT, FILES = self.INPUT, self.FILES
+        self.get_residues()
+
+        if not INPUT['ala']['alarun']:
+            self._parse_output_files(from_calc, decomp=decomp)
+            return
+
+        # The normal system is parsed only once, together with the first mutation
+        for c in range(len(self._mutant_scan())):
+            self._set_mutation(c)
+            self.calc_types.mutant, self.calc_types.mut_norm, self.calc_types.decomp_mutant = {}, {}, {}
+            self._parse_output_files(from_calc, normal=c == 0, decomp=decomp)
+            self.calc_types.scan[self.mut_str] = SimpleNamespace(mutant=self.calc_types.mutant,
+                                                                 mut_norm=self.calc_types.mut_norm,
+                                                                 decomp_mutant=self.calc_types.decomp_mutant)
+        # mutant, mut_norm and decomp_mutant keep the results of the first mutation
+        self._set_mutation(0)
+        first = self.calc_types.scan[self.mut_str]
+        self.calc_types.mutant, self.calc_types.mut_norm, self.calc_types.decomp_mutant = (
+            first.mutant, first.mut_norm, first.decomp_mutant)
+
+    def parse_decomp_files(self):
+        """
+        Parses only the decomposition output files, into the decomp_normal and decomp_mutant results of calc_types
+        (and the decomp_mutant of every mutation in scan). The energy results already parsed are kept
+        """
+        if not self.master:
+            return
+        if not hasattr(self, 'calc_types'):
+            self.calc_types = SimpleNamespace(normal={}, mutant={}, mut_norm={}, decomp_normal={}, decomp_mutant={},
+                                              scan={})
+        if not self.INPUT['decomp']['decomprun']:
+            return
+        self.get_residues()
+        if not self.INPUT['ala']['alarun']:
+            self._get_decomp()
+            return
+        for c in range(len(self._mutant_scan())):
+            self._set_mutation(c)
+            self.calc_types.decomp_mutant = {}
+            self._get_decomp(normal=c == 0)
+            scan = self.calc_types.scan.setdefault(self.mut_str, SimpleNamespace(mutant={}, mut_norm={}))
+            scan.decomp_mutant = self.calc_types.decomp_mutant
+        self._set_mutation(0)
+        self.calc_types.decomp_mutant = self.calc_types.scan[self.mut_str].decomp_mutant
+
+    def read_parsed_results(self):
+        """
+        Loads the results parsed in the previous run (--rewrite-output) and builds the results from them, so the
+        output files are rebuilt without parsing the output files or loading the topologies again. They are only used
+        if the output files and the input variables that change them are the same. The entropies are computed again
+        with the current variables. Returns whether the parsed results were loaded
+        """
+        self.timer.add_timer('parsed', 'Loading of the parsed results:')
+        self.timer.start_timer('parsed')
+        loaded = self.master and ParsedResults(self).read(f'{self.pre}parsed.zip')
+        loaded = self.MPI.COMM_WORLD.bcast(loaded, root=0)
+        if loaded:
+            self.parse_output_files()
+        self.timer.stop_timer('parsed')
+        return loaded
+
+    def _parse_output_files(self, from_calc, normal=True, decomp=True):
+        """
+        Parses the output files of the normal system (if normal) and the current
+        mutation
+        """
         INPUT, FILES = self.INPUT, self.FILES
         # Quasi-harmonic analysis is a special-case, so handle that separately
         if INPUT['general']['qh_entropy']:
-            if not INPUT['ala']['mutant_only']:
+            if normal and not INPUT['ala']['mutant_only']:
                 self.calc_types.normal['qh'] = QHout(f'{self.pre}cpptraj_entropy.out', INPUT['general']['temperature'])
-            if INPUT['alarun']:
-                self.calc_types.mutant['qh'] = QHout(f'{self.pre}mutant_cpptraj_entropy.out', INPUT['general']['temperature'])
+            if INPUT['ala']['alarun']:
+                self.calc_types.mutant['qh'] = QHout(f'{self.pre}{self.mut_pre}cpptraj_entropy.out',
+                                                     INPUT['general']['temperature'])
             if INPUT['ala']['alarun'] and not INPUT['ala']['mutant_only']:
                 self.calc_types.mut_norm['qh'] = DeltaDeltaQH(self.calc_types.mutant['qh'],
                                                               self.calc_types.normal['qh'])
 
-        # Determine if our GB is QM/MM or not
-        GBClass = QMMMout if INPUT['gb']['ifqnt'] else GBout
-        # Determine which kind of RISM output class we are based on std/gf and
-        # polardecomp
-        if INPUT['rism']['polardecomp']:
-            RISM_GF = PolarRISM_gf_Out
-            RISM_Std = PolarRISM_std_Out
-            RISM_PCplus = PolarRISM_pcplus_Out
-        else:
-            RISM_GF = RISM_gf_Out
-            RISM_Std = RISM_std_Out
-            RISM_PCplus = RISM_pcplus_Out
-        # Now we make a list of the other calculation types, their INPUT triggers,
-        # their key in the calc_types dict, the base name of their output files
-        # without the prefix (with %s-substitution for complex, receptor, or
-        # ligand), and the class for their output
-        nmls = ('nmode', 'gb', 'pb', 'rism', 'rism', 'rism', 'gbnsr6')
-        triggers = ('nmoderun', 'gbrun', 'pbrun', 'rismrun_std', 'rismrun_gf', 'rismrun_pcplus', 'gbnsr6run')
-        outclass = (NMODEout, GBClass, PBout, RISM_Std, RISM_GF, RISM_PCplus, GBNSR6out)
-        outkey = ('nmode', 'gb', 'pb', 'rism std', 'rism gf', 'rism pcplus', 'gbnsr6')
-        basename = ('%s_nm.out', '%s_gb.mdout', '%s_pb.mdout', '%s_rism.mdout', '%s_rism.mdout', '%s_rism.mdout',
-                    '%s_gbnsr6.mdout')
+        # Every species of every model is parsed at once in a process pool
+        jobs = self._energy_jobs(normal)
+        parsed = self._parse_energy_files(jobs)
 
-        for i, key in enumerate(outkey):
-            if not INPUT.get(nmls[i]) or not INPUT[nmls[i]].get(triggers[i]) or not INPUT[nmls[i]][triggers[i]]:
-                continue
-            numframes = self.numframes_nmode if key == 'nmode' else self.numframes
+        def get_output(key, system, mol):
+            output_class, name, output_basename, output_frames = jobs[(key, system, mol)]
+            output = output_class(name, self.INPUT, self.using_chamber)
+            output.parse_from_arrays(output_basename, parsed[(key, system, mol)], output_frames)
+            return output
+
+        for key in dict.fromkeys(job[0] for job in jobs):
             # Non-mutant
-            if not INPUT['ala']['mutant_only']:
-                self.calc_types.normal[key] = {'complex': outclass[i]('complex', self.INPUT, self.using_chamber)}
-                self.calc_types.normal[key]['complex'].parse_from_file(self.pre + basename[i] % 'complex',
-                                                                       self.mpi_size, numframes)
+            if normal and not INPUT['ala']['mutant_only']:
+                self.calc_types.normal[key] = {'complex': get_output(key, 'normal', 'complex')}
                 # check if the nmode output is valid
                 if self.calc_types.normal[key]['complex'].no_nmode_convergence:
                     self.INPUT['nmode']['nmoderun'] = False
@@ -1212,30 +1351,18 @@ class MMPBSA_App(object):
                     continue
 
                 if not self.stability:
-                    self.calc_types.normal[key]['receptor'] = outclass[i]('receptor', self.INPUT, self.using_chamber)
-                    self.calc_types.normal[key]['receptor'].parse_from_file(self.pre + basename[i] % 'receptor',
-                                                                            self.mpi_size, numframes)
-                    self.calc_types.normal[key]['ligand'] = outclass[i]('ligand', self.INPUT, self.using_chamber)
-                    self.calc_types.normal[key]['ligand'].parse_from_file(self.pre + basename[i] % 'ligand',
-                                                                          self.mpi_size, numframes)
+                    self.calc_types.normal[key]['receptor'] = get_output(key, 'normal', 'receptor')
+                    self.calc_types.normal[key]['ligand'] = get_output(key, 'normal', 'ligand')
                     self.calc_types.normal[key]['delta'] = BindingStatistics(self.calc_types.normal[key]['complex'],
                                                                              self.calc_types.normal[key]['receptor'],
                                                                              self.calc_types.normal[key]['ligand'],
                                                                              self.using_chamber, self.traj_protocol)
             # Time for mutant
             if INPUT['ala']['alarun']:
-                self.calc_types.mutant[key] = {'complex': outclass[i]('Mutant-Complex', self.INPUT, self.using_chamber)}
-                self.calc_types.mutant[key]['complex'].parse_from_file(self.pre + 'mutant_' + basename[i] % 'complex',
-                                                                       self.mpi_size, numframes)
+                self.calc_types.mutant[key] = {'complex': get_output(key, 'mutant', 'complex')}
                 if not self.stability:
-                    self.calc_types.mutant[key]['receptor'] = outclass[i]('Mutant-Receptor', self.INPUT,
-                                                                          self.using_chamber)
-                    self.calc_types.mutant[key]['receptor'].parse_from_file(self.pre + 'mutant_' + basename[i] %
-                                                                            'receptor', self.mpi_size, numframes)
-                    self.calc_types.mutant[key]['ligand'] = outclass[i]('Mutant-Ligand', self.INPUT,
-                                                                        self.using_chamber)
-                    self.calc_types.mutant[key]['ligand'].parse_from_file(self.pre + 'mutant_' + basename[i] % 'ligand',
-                                                                          self.mpi_size, numframes)
+                    self.calc_types.mutant[key]['receptor'] = get_output(key, 'mutant', 'receptor')
+                    self.calc_types.mutant[key]['ligand'] = get_output(key, 'mutant', 'ligand')
                     self.calc_types.mutant[key]['delta'] = BindingStatistics(self.calc_types.mutant[key]['complex'],
                                                                              self.calc_types.mutant[key]['receptor'],
                                                                              self.calc_types.mutant[key]['ligand'],
@@ -1254,39 +1381,125 @@ class MMPBSA_App(object):
                     self.calc_types.mut_norm[key]['delta'] = DeltaDeltaStatistics(
                         self.calc_types.mutant[key]['delta'], self.calc_types.normal[key]['delta'])
 
-            self.get_iec2entropy(from_calc)
+            self.get_iec2entropy(from_calc, normal)
 
-        if not hasattr(self, 'resl'):
-            from GMXMMPBSA.utils import mask2list
-            self.resl = mask2list(FILES.complex_fixed, INPUT['general']['receptor_mask'], INPUT['general']['ligand_mask'])
-            if INPUT['ala']['alarun']:
-                self.resl[self.mutant_index].set_mut(INPUT['ala']['mutant'])
+        if decomp and INPUT['decomp']['decomprun']:
+            self._get_decomp(normal)
 
-        if INPUT['decomp']['decomprun']:
-            self._get_decomp()
+    def _energy_jobs(self, normal=True):
+        """
+        Returns the energy output files of every species of every model of the normal system (if normal) and the
+        current mutation, keyed by (model key, 'normal' or 'mutant', species). Each one is (output class, name, base
+        name of the rank files, number of frames)
+        """
+        INPUT = self.INPUT
+        # Determine if our GB is QM/MM or not
+        GBClass = QMMMout if INPUT['gb']['ifqnt'] else GBout
+        # Determine which kind of RISM output class we are based on std/gf and
+        # polardecomp
+        if INPUT['rism']['polardecomp']:
+            RISM_GF = PolarRISM_gf_Out
+            RISM_Std = PolarRISM_std_Out
+            RISM_PCplus = PolarRISM_pcplus_Out
+        else:
+            RISM_GF = RISM_gf_Out
+            RISM_Std = RISM_std_Out
+            RISM_PCplus = RISM_pcplus_Out
+        # Now we make a list of the other calculation types, their INPUT triggers,
+        # their key in the calc_types dict, the base name of their output files
+        # without the prefix (with %s-substitution for complex, receptor, or
+        # ligand), and the class for their output
+        nmls = ('nmode', 'gb', 'pb', 'rism', 'rism', 'rism', 'gbnsr6')
+        triggers = ('nmoderun', 'gbrun', 'pbrun', 'rismrun_std', 'rismrun_gf', 'rismrun_pcplus', 'gbnsr6run')
+        outclass = (NMODEout, GBClass, PBout, RISM_Std, RISM_GF, RISM_PCplus, GBNSR6out)
+        outkey = ('nmode', 'gb', 'pb', 'rism std', 'rism gf', 'rism pcplus', 'gbnsr6')
+        basename = ('%s_nm.out', '%s_gb.mdout', '%s_pb.mdout', '%s_rism.mdout', '%s_rism.mdout', '%s_rism.mdout',
+                    '%s_gbnsr6.mdout')
+
+        enabled = [i for i, key in enumerate(outkey) if INPUT.get(nmls[i]) and INPUT[nmls[i]].get(triggers[i])]
+        mols = ('complex',) if self.stability else ('complex', 'receptor', 'ligand')
+        jobs = {}
+        for i in enabled:
+            numframes = self.numframes_nmode if outkey[i] == 'nmode' else self.numframes
+            if normal and not INPUT['ala']['mutant_only']:
+                for mol in mols:
+                    jobs[(outkey[i], 'normal', mol)] = (outclass[i], mol, self.pre + basename[i] % mol, numframes)
+            if INPUT['ala']['alarun']:
+                for mol in mols:
+                    jobs[(outkey[i], 'mutant', mol)] = (outclass[i], f'Mutant-{mol.capitalize()}',
+                                                        self.pre + self.mut_pre + basename[i] % mol, numframes)
+        return jobs
 
-    def get_iec2entropy(self, from_calc):
+    def _parse_energy_files(self, jobs):
+        """
+        Parses the rank output files of every job (output class, name, basename, number of frames) in a process
+        pool. A new file is submitted only when a parse finishes, so no more than one file per worker is being parsed
+        (and held in memory) at the same time. The files already in energy_arrays are not parsed again. Returns the
+        list of arrays of each rank file, keyed like jobs
+        """
+        sources = {job: (output_class.__name__, basename) for job, (output_class, _, basename, _) in jobs.items()}
+        parsed = {job: self.energy_arrays.get(sources[job]) or [None] * self.mpi_size for job in jobs}
+        tasks = [(job, fileno) for job in jobs if sources[job] not in self.energy_arrays
+                 for fileno in range(self.mpi_size)]
+
+        def task_args(job, fileno):
+            output_class, _, basename, numframes = jobs[job]
+            return output_class, self.INPUT, self.using_chamber, basename, fileno, numframes
+
+        workers = min(len(tasks), os.cpu_count() or 1)
+        # Daemon processes (like the pool workers that load the results in gmx_MMPBSA_ana) can't have children
+        if workers < 2 or multiprocessing.current_process().daemon:
+            for job, fileno in tasks:
+                parsed[job][fileno] = parse_rank_file(*task_args(job, fileno))
+        else:
+            # Forking an MPI process is not safe, so the workers are spawned in that case
+            context = None if isinstance(self.MPI, FakeMPI) else multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                running = {}
+                for job, fileno in tasks:
+                    running[executor.submit(parse_rank_file, *task_args(job, fileno))] = (job, fileno)
+                    if len(running) < workers:
+                        continue
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job_done, fileno_done = running.pop(future)
+                        parsed[job_done][fileno_done] = future.result()
+                for future, (job, fileno) in running.items():
+                    parsed[job][fileno] = future.result()
+        # kept, so they can be saved with the parsed results
+        self.energy_arrays.update({sources[job]: parsed[job] for job in jobs})
+        return parsed
+
+    def get_iec2entropy(self, from_calc, normal=True):
         allowed_met = ['gb', 'pb', 'rism std', 'rism gf', 'rism pcplus', 'gbnsr6']
         if self.INPUT['general']['interaction_entropy']:
-            self.calc_types.normal['ie'] = {}
+            if normal:
+                self.calc_types.normal['ie'] = {}
             if self.INPUT['ala']['alarun']:
                 self.calc_types.mutant['ie'] = {}
                 if not self.INPUT['ala']['mutant_only']:
                     self.calc_types.mut_norm['ie'] = {}
         if self.INPUT['general']['c2_entropy']:
-            self.calc_types.normal['c2'] = {}
+            if normal:
+                self.calc_types.normal['c2'] = {}
             if self.INPUT['ala']['alarun']:
                 self.calc_types.mutant['c2'] = {}
                 if not self.INPUT['ala']['mutant_only']:
                     self.calc_types.mut_norm['c2'] = {}
 
+        ie_data = {}
+        if from_calc and self.INPUT['general']['interaction_entropy']:
+            ie_data = self._interaction_entropy(allowed_met, normal)
+        c2_data = {}
+        if from_calc and self.INPUT['general']['c2_entropy']:
+            c2_data = self._c2_entropy(allowed_met, normal)
         for key in allowed_met:
             if self.INPUT['general']['interaction_entropy']:
-                if key in self.calc_types.normal:
+                if normal and key in self.calc_types.normal:
                     if from_calc:
                         edata = self.calc_types.normal[key]['delta']['GGAS']
                         logging.info('Beginning Interaction Entropy calculations...')
-                        ie = InteractionEntropyCalc(edata, self.INPUT, key)
+                        ie = InteractionEntropyCalc(edata, self.INPUT, key, data=ie_data[('normal', key)])
                         ie.save_output(f'{self.pre}normal_{key}_IE.dat')
 
                     self.calc_types.normal['ie'][key] = IEout(self.INPUT, key)
@@ -1296,23 +1509,24 @@ class MMPBSA_App(object):
                     if from_calc:
                         edata = self.calc_types.mutant[key]['delta']['GGAS']
                         logging.info('Beginning Mutant Interaction Entropy calculations...')
-                        mie = InteractionEntropyCalc(edata, self.INPUT, key)
-                        mie.save_output(f'{self.pre}mutant_{key}_IE.dat')
+                        mie = InteractionEntropyCalc(edata, self.INPUT, key, data=ie_data[('mutant', key)])
+                        mie.save_output(f'{self.pre}{self.mut_pre}{key}_IE.dat')
 
                     self.calc_types.mutant['ie'][key] = IEout(self.INPUT, key)
-                    self.calc_types.mutant['ie'][key].parse_from_file(f'{self.pre}mutant_{key}_IE.dat',
+                    self.calc_types.mutant['ie'][key].parse_from_file(f'{self.pre}{self.mut_pre}{key}_IE.dat',
                                                                  self.numframes)
 
-                if self.INPUT['ala']['alarun'] and not self.INPUT['ala']['mutant_only'] and key in self.calc_types.normal:
+                if (self.INPUT['ala']['alarun'] and not self.INPUT['ala']['mutant_only'] and
+                        key in self.calc_types.normal and key in self.calc_types.mutant):
                     self.calc_types.mut_norm['ie'][key] = DeltaIEC2Statistic(
                         self.calc_types.mutant['ie'][key], self.calc_types.normal['ie'][key])
 
             if self.INPUT['general']['c2_entropy']:
-                if not self.INPUT['ala']['mutant_only'] and key in self.calc_types.normal:
+                if normal and not self.INPUT['ala']['mutant_only'] and key in self.calc_types.normal:
                     if from_calc:
                         edata = self.calc_types.normal[key]['delta']['GGAS']
                         logging.info('Beginning C2 Entropy calculations...')
-                        c2 = C2EntropyCalc(edata, self.INPUT, key)
+                        c2 = C2EntropyCalc(edata, self.INPUT, key, bootstrap=c2_data[('normal', key)])
                         c2.save_output(f'{self.pre}normal_{key}_c2_entropy.dat')
 
                     self.calc_types.normal['c2'][key] = C2out(key)
@@ -1321,16 +1535,76 @@ class MMPBSA_App(object):
                     if from_calc:
                         edata = self.calc_types.mutant[key]['delta']['GGAS']
                         logging.info('Beginning Mutant C2 Entropy calculations...')
-                        c2 = C2EntropyCalc(edata, self.INPUT, key)
-                        c2.save_output(f'{self.pre}mutant_{key}_c2_entropy.dat')
+                        c2 = C2EntropyCalc(edata, self.INPUT, key, bootstrap=c2_data[('mutant', key)])
+                        c2.save_output(f'{self.pre}{self.mut_pre}{key}_c2_entropy.dat')
 
                     self.calc_types.mutant['c2'][key] = C2out(key)
-                    self.calc_types.mutant['c2'][key].parse_from_file(f'{self.pre}mutant_{key}_c2_entropy.dat')
+                    self.calc_types.mutant['c2'][key].parse_from_file(f'{self.pre}{self.mut_pre}{key}_c2_entropy.dat')
 
-                if self.INPUT['ala']['alarun'] and not self.INPUT['ala']['mutant_only'] and key in self.calc_types.normal:
+                if (self.INPUT['ala']['alarun'] and not self.INPUT['ala']['mutant_only'] and
+                        key in self.calc_types.normal and key in self.calc_types.mutant):
                     self.calc_types.mut_norm['c2'][key] = DeltaIEC2Statistic(
                         self.calc_types.mutant['c2'][key], self.calc_types.normal['c2'][key])
 
+    def _entropy_key(self, entropy, system, model):
+        """ Key of the Interaction ('ie') or C2 ('c2') Entropy data of a model in entropy_data """
+        return entropy, system, model, self.mut_pre if system == 'mutant' else ''
+
+    def _cached_entropy(self, entropy, ggas):
+        """
+        Returns the data of the GGAS series already in entropy_data (parsed results loaded with --rewrite-output or
+        computed for a previous model) and the series that are missing, both keyed by (system, model)
+        """
+        data = {key: self.entropy_data[self._entropy_key(entropy, *key)] for key in ggas
+                if self._entropy_key(entropy, *key) in self.entropy_data}
+        return data, {key: edata for key, edata in ggas.items() if key not in data}
+
+    def _interaction_entropy(self, methods, normal=True):
+        """
+        Computes the Interaction Entropy of all the models, normal and mutant, in a single vectorized batch (one per
+        number of frames). Returns the per-frame data keyed by (system, model)
+        """
+        ggas = {}
+        for key in methods:
+            if normal and key in self.calc_types.normal:
+                ggas[('normal', key)] = self.calc_types.normal[key]['delta']['GGAS']
+            if key in self.calc_types.mutant:
+                ggas[('mutant', key)] = self.calc_types.mutant[key]['delta']['GGAS']
+        ie_data, ggas = self._cached_entropy('ie', ggas)
+        for size in {len(edata) for edata in ggas.values()}:
+            keys = [key for key, edata in ggas.items() if len(edata) == size]
+            for key, data in zip(keys, interaction_entropy([ggas[key] for key in keys],
+                                                           self.INPUT['general']['temperature'])):
+                ie_data[key] = self.entropy_data[self._entropy_key('ie', *key)] = data
+        return ie_data
+
+    def _c2_entropy(self, methods, normal=True):
+        """
+        Computes the C2 Entropy bootstrap of all the models, normal and mutant, in a single vectorized batch (one per
+        number of frames). When c2_seed is negative, a random seed is drawn and stored in INPUT, so it is recorded
+        in the output and info files and the bootstrap can be reproduced. Returns the re-samplings keyed by
+        (system, model)
+        """
+        ggas = {}
+        for key in methods:
+            if normal and not self.INPUT['ala']['mutant_only'] and key in self.calc_types.normal:
+                ggas[('normal', key)] = self.calc_types.normal[key]['delta']['GGAS']
+            if key in self.calc_types.mutant:
+                ggas[('mutant', key)] = self.calc_types.mutant[key]['delta']['GGAS']
+        c2_data, ggas = self._cached_entropy('c2', ggas)
+        if ggas and self.INPUT['general']['c2_seed'] < 0:
+            self.INPUT['general']['c2_seed'] = int(np.random.SeedSequence().generate_state(1)[0])
+        for size in {len(edata) for edata in ggas.values()}:
+            keys = [key for key, edata in ggas.items() if len(edata) == size]
+            for key, data in zip(keys, c2_entropy_bootstrap([ggas[key] for key in keys],
+                                                            self.INPUT['general']['temperature'],
+                                                            self.INPUT['general']['c2_samples'],
+                                                            self.INPUT['general']['c2_seed'],
+                                                            self.INPUT['general']['c2_block'],
+                                                            self.INPUT['general']['c2_threads'])):
+                c2_data[key] = self.entropy_data[self._entropy_key('c2', *key)] = data
+        return c2_data
+
     def _get_mm_data(self):
 
         # # FIXME: add pbsa.cuda, APBS and PBDelphi
@@ -1352,14 +1626,14 @@ class MMPBSA_App(object):
         # Time for mutant
         if self.INPUT['ala']['alarun']:
             mm_data['mutant'] = {'complex': MMout('mutant-complex', self.INPUT, self.using_chamber)}
-            mm_data['mutant']['complex'].parse_from_file(f"{self.pre}mutant_complex_mm.mdout", self.mpi_size,
+            mm_data['mutant']['complex'].parse_from_file(f"{self.pre}{self.mut_pre}complex_mm.mdout", self.mpi_size,
                                                          self.numframes)
             if not self.stability:
                 mm_data['mutant']['receptor'] = MMout('mutant-receptor', self.INPUT, self.using_chamber)
-                mm_data['mutant']['receptor'].parse_from_file(f"{self.pre}mutant_receptor_mm.mdout", self.mpi_size,
+                mm_data['mutant']['receptor'].parse_from_file(f"{self.pre}{self.mut_pre}receptor_mm.mdout", self.mpi_size,
                                                               self.numframes)
                 mm_data['mutant']['ligand'] = MMout('mutant-ligand', self.INPUT, self.using_chamber)
-                mm_data['mutant']['ligand'].parse_from_file(f"{self.pre}mutant_ligand_mm.mdout", self.mpi_size,
+                mm_data['mutant']['ligand'].parse_from_file(f"{self.pre}{self.mut_pre}ligand_mm.mdout", self.mpi_size,
                                                             self.numframes)
         return mm_data
 
@@ -1376,7 +1650,7 @@ class MMPBSA_App(object):
             print_res.extend(range(s, e))
         return print_res
 
-    def _get_decomp(self):
+    def _get_decomp(self, normal=True):
         from GMXMMPBSA.amber_outputs import (DecompOut, PairDecompOut, DecompBinding, PairDecompBinding)
         nmls = ('gb', 'pb', 'gbnsr6')
         outkey = ('gb', 'pb', 'gbnsr6')
@@ -1416,20 +1690,15 @@ class MMPBSA_App(object):
             else: # gbnsr6
                 surften = INPUT['gbnsr6']['cavity_surften']
 
-            if not self.INPUT['ala']['mutant_only']:
-                self.calc_types.decomp_normal[key] = {'complex': DecompClass('complex')}
-                self.calc_types.decomp_normal[key]['complex'].parse_from_file(self.pre + basename[i] % 'complex',
-                                                                              com_list, INPUT, surften,
-                                                                              self.mpi_size, self.numframes)
+            if normal and not self.INPUT['ala']['mutant_only']:
+                self.calc_types.decomp_normal[key] = {'complex': self._decomp_output(
+                    DecompClass, 'complex', self.pre + basename[i] % 'complex', com_list, surften)}
                 if not self.stability:
-                    self.calc_types.decomp_normal[key]['receptor'] = DecompClass('receptor')
-                    self.calc_types.decomp_normal[key]['receptor'].parse_from_file(self.pre + basename[i] % 'receptor',
-                                                                                   rec_list, INPUT, surften,
-                                                                                   self.mpi_size, self.numframes)
-                    self.calc_types.decomp_normal[key]['ligand'] = DecompClass('ligand')
-                    self.calc_types.decomp_normal[key]['ligand'].parse_from_file(self.pre + basename[i] % 'ligand',
-                                                                                 lig_list, INPUT, surften,
-                                                                                 self.mpi_size, self.numframes)
+                    pairs = self._decomp_pairs(self.calc_types.decomp_normal[key]['complex'])
+                    self.calc_types.decomp_normal[key]['receptor'] = self._decomp_output(
+                        DecompClass, 'receptor', self.pre + basename[i] % 'receptor', rec_list, surften, **pairs)
+                    self.calc_types.decomp_normal[key]['ligand'] = self._decomp_output(
+                        DecompClass, 'ligand', self.pre + basename[i] % 'ligand', lig_list, surften, **pairs)
                     self.calc_types.decomp_normal[key]['delta'] = DecompBindingClass(
                         self.calc_types.decomp_normal[key]['complex'], self.calc_types.decomp_normal[key]['receptor'],
                         self.calc_types.decomp_normal[key]['ligand'], INPUT,
@@ -1437,45 +1706,44 @@ class MMPBSA_App(object):
 
             if INPUT['ala']['alarun']:
                 # Do mutant
-                self.calc_types.decomp_mutant[key] = {'complex': DecompClass('Mutant-Complex')}
-                self.calc_types.decomp_mutant[key]['complex'].parse_from_file(
-                    (f'{self.pre}mutant_' + basename[i] % 'complex'),
-                    com_list,
-                    INPUT,
-                    surften,
-                    self.mpi_size,
-                    self.numframes,
-                    True
-                )
+                self.calc_types.decomp_mutant[key] = {'complex': self._decomp_output(
+                    DecompClass, 'Mutant-Complex', f'{self.pre}{self.mut_pre}' + basename[i] % 'complex', com_list,
+                    surften, True)}
 
                 if not self.stability:
-                    self.calc_types.decomp_mutant[key]['receptor'] = DecompClass('Mutant-Receptor')
-                    self.calc_types.decomp_mutant[key]['receptor'].parse_from_file(
-                        (f'{self.pre}mutant_' + basename[i] % 'receptor'),
-                        rec_list,
-                        INPUT,
-                        surften,
-                        self.mpi_size,
-                        self.numframes,
-                        True
-                    )
-
-                    self.calc_types.decomp_mutant[key]['ligand'] = DecompClass('Mutant-Ligand')
-                    self.calc_types.decomp_mutant[key]['ligand'].parse_from_file(
-                        (f'{self.pre}mutant_' + basename[i] % 'ligand'),
-                        lig_list,
-                        INPUT,
-                        surften,
-                        self.mpi_size,
-                        self.numframes,
-                        True
-                    )
+                    pairs = self._decomp_pairs(self.calc_types.decomp_mutant[key]['complex'])
+                    self.calc_types.decomp_mutant[key]['receptor'] = self._decomp_output(
+                        DecompClass, 'Mutant-Receptor', f'{self.pre}{self.mut_pre}' + basename[i] % 'receptor',
+                        rec_list, surften, True, **pairs)
+                    self.calc_types.decomp_mutant[key]['ligand'] = self._decomp_output(
+                        DecompClass, 'Mutant-Ligand', f'{self.pre}{self.mut_pre}' + basename[i] % 'ligand',
+                        lig_list, surften, True, **pairs)
 
                     self.calc_types.decomp_mutant[key]['delta'] = DecompBindingClass(
                         self.calc_types.decomp_mutant[key]['complex'], self.calc_types.decomp_mutant[key]['receptor'],
                         self.calc_types.decomp_mutant[key]['ligand'], INPUT,
                         f'Energy Decomposition Analysis (All units kcal/mol): {headers[key]} model ({self.mut_str})')
 
+    def _decomp_output(self, DecompClass, mol, basename, resl, surften, mut=False, **pairs):
+        """
+        Parses the decomposition output files basename, or takes them from decomp_states (the parsed results loaded
+        with --rewrite-output) when they are there
+        """
+        output = DecompClass(mol)
+        if basename in self.decomp_states:
+            output.__setstate__(dict(self.decomp_states[basename], resl=resl, INPUT=self.INPUT))
+        else:
+            output.parse_from_file(basename, resl, self.INPUT, surften, self.mpi_size, self.numframes, mut, **pairs)
+        return output
+
+    @staticmethod
+    def _decomp_pairs(complex_decomp):
+        """ The receptor and ligand pairwise decomposition keep the pairs of the complex """
+        from GMXMMPBSA.amber_outputs import PairDecompOut
+        if isinstance(complex_decomp, PairDecompOut):
+            return {'pairs': complex_decomp.pair_labels()}
+        return {}
+
 
 # Local methods
 
@@ -20,17 +20,28 @@ Generate Amber topology files from GROMACS files
 #  for more details.                                                           #
 # ##############################################################################
 
+import copy
+import hashlib
+import json
 import os
+import pickle
 import platform
+import re
+import shutil
+import tempfile
 import textwrap
+import time
 
 import parmed
+from GMXMMPBSA import __version__
 from GMXMMPBSA.exceptions import *
 from GMXMMPBSA.utils import (selector, get_dist, list2range, res2map, get_indexes, log_subprocess_output, check_str,
                              eq_strs, get_index_groups)
 from GMXMMPBSA.alamdcrd import _scaledistance
 import subprocess
 from pathlib import Path
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import string
 from parmed.tools.changeradii import ChRad
@@ -67,12 +78,165 @@ ions_para_files = {1: 'frcmod.ions234lm_126_tip3p', 2: 'frcmod.ions234lm_126_spc
                    13: 'frcmod.ions1lm_126_tip3p', 14: 'frcmod.ions1lm_126_spce', 15: 'frcmod.ions1lm_126_tip4pew',
                    16: 'frcmod.ions1lm_iod'}
 
+# Maximum number of setup tasks (GROMACS programs, parmchk2, tleap) running at the same time
+SETUP_WORKERS = 4
+
 ions = ["AG", "AL", "Ag", "BA", "BR", "Be", "CA", "CD", "CE", "CL", "CO", "CR", "CS", "CU", "CU1", "Ce", "Cl-", "Cr",
         "Dy", "EU", "EU3", "Er", "F", "FE", "FE2", "GD3", "H3O+", "HE+", "HG", "HZ+", "Hf", "IN", "IOD", "K", "K+",
         "LA", "LI", "LU", "MG", "MN", "NA", "NH4", "NI", "Na+", "Nd", "PB", "PD", "PR", "PT", "Pu", "RB", "Ra", "SM",
         "SR", "Sm", "Sn", "TB", "TL", "Th", "Tl", "Tm", "U4+", "V2+", "Y", "YB2", "ZN", "Zr"]
 
 
+class TopologyCache:
+    """
+    Persistent cache of the Amber topologies built by CheckMakeTop.
+
+    Every entry is a folder named after a hash of everything the build depends on: the content of the GROMACS and
+    mol2 files (including the itp files included by the topologies), the index groups, the input variables read by
+    CheckMakeTop and the external programs. The entry contains the files written during the build (prmtops, fixed
+    PDBs, index files, ...) and the changes made to FILES, INPUT and CheckMakeTop, so a hit restores the same state
+    without running GROMACS, parmchk2, tleap or ParmEd again
+    """
+    # Variables of the input file used to build the topologies
+    INPUT_VARS = {'general': ['forcefields', 'ions_parameters', 'PBRadii', 'assign_chainID', 'interaction_entropy',
+                              'c2_entropy'],
+                  'gb': ['gbrun', 'intdiel', 'ifqnt', 'qm_residues', 'qmcharge_com', 'qmcharge_rec', 'qmcharge_lig'],
+                  'pb': ['pbrun', 'indi', 'radiopt'],
+                  'ala': ['alarun', 'mutant_res', 'mutant', 'cas_intdiel', 'intdiel_nonpolar', 'intdiel_polar',
+                          'intdiel_positive', 'intdiel_negative'],
+                  'decomp': ['decomprun', 'idecomp', 'dec_verbose', 'print_res']}
+    INPUT_FILES = ['complex_tpr', 'complex_index', 'complex_top', 'reference_structure', 'receptor_tpr',
+                   'receptor_index', 'receptor_top', 'ligand_tpr', 'ligand_index', 'ligand_top', 'ligand_mol2']
+    # CheckMakeTop attributes used once the topologies are built
+    STATE_ATTRS = ['resi', 'resl', 'orderl', 'mutations', 'com_mut_index', 'complex_pmrtop', 'receptor_pmrtop',
+                   'ligand_pmrtop', 'mutant_complex_pmrtop', 'mutant_receptor_pmrtop', 'mutant_ligand_pmrtop']
+    # Only the first frame of the trajectories is used to get the structures, so we hash just the beginning
+    TRAJ_HEAD = 64 * 1024 ** 2
+
+    def __init__(self, folder, maketop):
+        self.folder = Path(folder).expanduser()
+        self.maketop = maketop
+        self.key = self._key()
+        self.entry = self.folder.joinpath(self.key)
+        # State before the build. Needed to know what the build changes
+        self._files = copy.deepcopy(vars(maketop.FILES))
+        self._input = copy.deepcopy(maketop.INPUT)
+        self._wdir = self._listdir()
+
+    @staticmethod
+    def _digest(fname, size=None):
+        """ Digest of the content of the file (or its first size bytes) and its size """
+        if not fname:
+            return None
+        sha = hashlib.sha256()
+        read = 0
+        with open(fname, 'rb') as f:
+            while chunk := f.read(1024 ** 2):
+                sha.update(chunk)
+                read += len(chunk)
+                if size and read >= size:
+                    break
+        return f'{sha.hexdigest()}:{os.path.getsize(fname)}'
+
+    def _top_digest(self, fname, visited=None):
+        """ Digest of a GROMACS topology and the files it includes (from the topology folder) """
+        if not fname:
+            return None
+        visited = set() if visited is None else visited
+        fname = Path(fname).resolve()
+        visited.add(fname)
+        digests = [self._digest(fname)]
+        with open(fname) as top:
+            for line in top:
+                if not (match := re.match(r'\s*#include\s+["<](.+)[">]', line)):
+                    continue
+                include = fname.parent.joinpath(match[1])
+                if include.resolve() in visited:
+                    continue
+                # Files from the GROMACS library (GMXLIB) are identified by their name
+                digests.append(self._top_digest(include, visited) if include.exists() else match[1])
+        return digests
+
+    def _key(self):
+        FILES, INPUT = self.maketop.FILES, self.maketop.INPUT
+        data = {
+            'version': [__version__, parmed.__version__],
+            'programs': [self.maketop.external_progs.get(prog) for prog in ['tleap', 'parmchk2', 'make_ndx', 'trjconv',
+                                                                           'editconf']],
+            'input': {nml: {var: INPUT[nml][var] for var in variables} for nml, variables in self.INPUT_VARS.items()},
+            'groups': [FILES.complex_groups, FILES.receptor_group, FILES.ligand_group],
+            'options': [FILES.prefix, FILES.stability],
+            'files': {var: (self._top_digest(getattr(FILES, var)) if var.endswith('_top') else
+                            self._digest(getattr(FILES, var))) for var in self.INPUT_FILES},
+            'trajs': {var: self._digest(getattr(FILES, var)[0], self.TRAJ_HEAD) if getattr(FILES, var) else None
+                      for var in ['complex_trajs', 'receptor_trajs', 'ligand_trajs']}
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _listdir(self):
+        """ Files in the working folder that can be written during the build """
+        return {f.name: (f.stat().st_mtime_ns, f.stat().st_size) for f in os.scandir('.')
+                if f.is_file() and (f.name.startswith(self.maketop.FILES.prefix) or f.name.endswith('.prmtop'))}
+
+    def restore(self):
+        """
+        Copies the cached files to the working folder and restores the state of the build
+        :return: the topologies or None if there is no valid entry
+        """
+        state_file = self.entry.joinpath('state.pkl')
+        if not state_file.exists():
+            logging.info(f'No cached topologies found for these input files in {self.folder}')
+            return
+        try:
+            with open(state_file, 'rb') as f:
+                state = pickle.load(f)
+            for fname in state['files']:
+                shutil.copyfile(self.entry.joinpath('files', fname), fname)
+        except (OSError, EOFError, KeyError, pickle.UnpicklingError) as e:
+            logging.warning(f'Unable to use the cached topologies in {self.entry} ({e}). Building them again...')
+            return
+        for var, value in state['FILES'].items():
+            setattr(self.maketop.FILES, var, value)
+        for nml, values in state['INPUT'].items():
+            self.maketop.INPUT[nml].update(values)
+        for attr, value in state['maketop'].items():
+            setattr(self.maketop, attr, value)
+        logging.info(f'Using the cached topologies in {self.entry}. Skipping the topology building...')
+        return state['tops']
+
+    def store(self, tops):
+        """ Saves the files written during the build and the changes made to the state """
+        FILES, INPUT = self.maketop.FILES, self.maketop.INPUT
+        files = [fname for fname, stat in self._listdir().items() if self._wdir.get(fname) != stat]
+        state = {'tops': tops,
+                 'files': files,
+                 'FILES': {var: value for var, value in vars(FILES).items()
+                           if var not in self._files or self._files[var] != value},
+                 'INPUT': {nml: {var: value for var, value in values.items() if self._input[nml].get(var) != value}
+                           for nml, values in INPUT.items()},
+                 'maketop': {attr: getattr(self.maketop, attr) for attr in self.STATE_ATTRS}}
+        tmp = None
+        try:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            # Write in a temporary folder first, so other runs never see an incomplete entry
+            tmp = Path(tempfile.mkdtemp(prefix=f'.{self.key}.', dir=self.folder))
+            tmp.joinpath('files').mkdir()
+            for fname in files:
+                shutil.copyfile(fname, tmp.joinpath('files', fname))
+            with open(tmp.joinpath('state.pkl'), 'wb') as f:
+                pickle.dump(state, f)
+            try:
+                tmp.rename(self.entry)
+            except OSError:
+                # Other run with the same input files stored it first
+                shutil.rmtree(tmp)
+            logging.info(f'Topologies saved in the cache folder {self.entry}')
+        except OSError as e:
+            logging.warning(f'Unable to save the topologies in the cache folder {self.folder} ({e})')
+            if tmp:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+
 class CheckMakeTop:
     def __init__(self, FILES, INPUT, external_programs):
         self.FILES = FILES
@@ -80,6 +244,11 @@ class CheckMakeTop:
         self.external_progs = external_programs
         self.use_temp = False
         self.com_mut_index = None
+        # one namespace per mutation of the alanine scanning
+        self.mutations = []
+        # time spent by the concurrent setup tasks (as if they ran one after another) and the wall-clock time
+        self.task_time = 0
+        self.stage_time = 0
 
         # Define Gromacs executable
         self.make_ndx = self.external_progs['make_ndx']
@@ -120,6 +289,15 @@ class CheckMakeTop:
         """
         :return: complex, receptor, ligand topologies and their mutants
         """
+        cache = TopologyCache(self.FILES.topology_cache, self) if self.FILES.topology_cache else None
+        if not cache or not (tops := cache.restore()):
+            tops = self._build_topology()
+            if cache:
+                cache.store(tops)
+        self.cleanup_trajs()
+        return tops
+
+    def _build_topology(self):
         self.gmx2pdb()
         if self.FILES.complex_top:
             tops = self.gmxtop2prmtop()
@@ -246,8 +424,6 @@ class CheckMakeTop:
                 if self.INPUT['gb']['qmcharge_lig'] != lig_charge:
                     logging.warning(f'Setting qmcharge_lig = {lig_charge}')
                     self.INPUT['gb']['qmcharge_lig'] = lig_charge
-
-        self.cleanup_trajs()
         return tops
 
     def gmx2pdb(self):
@@ -284,6 +460,58 @@ class CheckMakeTop:
             GMXMMPBSA_ERROR('%s failed when querying %s' % (' '.join(self.make_ndx), self.FILES.complex_index))
         self.FILES.complex_index = com_ndx
 
+        # check if the ligand force field is gaff or gaff2 and get if the ligand mol2 was defined
+        if not self.FILES.ligand_mol2 and "leaprc.gaff2" in self.INPUT['general']['forcefields'] and not \
+                self.FILES.complex_top:
+            logging.warning('You must define the ligand mol2 file (-lm) if the ligand forcefield is '
+                            '"leaprc.gaff" or "leaprc.gaff2". If the ligand is parametrized with Amber force '
+                            'fields ignore this warning')
+
+        # check if stability
+        if self.FILES.stability and (
+                (self.FILES.receptor_tpr or self.FILES.ligand_tpr)
+        ):
+            logging.warning('When Stability calculation mode is selected, receptor and ligand files are not '
+                            'needed...')
+        # Once the complex index is ready, the structures and the ligand parameters are independent of each other,
+        # so they are extracted at the same time
+        tasks = [(self._make_com_str, num_com_rec_group, str_com_rec_group, num_com_lig_group, str_com_lig_group)]
+        # check if ligand is not protein. In any case, non-protein ligand always most be processed
+        if self.FILES.ligand_mol2:
+            tasks.append((self._make_lig_params,))
+        # make a temp receptor pdb (even when stability) if decomp to get correct receptor residues from complex. This
+        # avoids get multiples molecules from complex.split()
+        if self.INPUT['decomp']['decomprun'] and self.FILES.stability:
+            self.use_temp = True
+            logging.warning('When &decomp is defined, we generate a receptor file in order to extract interface '
+                            'residues')
+            tasks.append((self._make_rec_temp, num_com_rec_group))
+        tasks.append((self._make_rec_str, num_com_rec_group, str_com_rec_group))
+        tasks.append((self._make_lig_str, num_com_lig_group, str_com_lig_group))
+        self._run_concurrently(tasks)
+
+        # check for IE variable
+        if (self.FILES.receptor_tpr or self.FILES.ligand_tpr) and (
+                self.INPUT['general']['interaction_entropy'] or self.INPUT['general']['c2_entropy']
+        ):
+            logging.warning("The IE or C2 entropy method don't support the MTP approach...")
+            self.INPUT['general']['interaction_entropy'] = self.INPUT['general']['c2_entropy'] = 0
+
+        # initialize receptor and ligand structures. Needed to get residues map
+        self.complex_str = self.molstr(self.complex_str_file)
+        self.receptor_str = self.molstr(self.receptor_str_file)
+        self.ligand_str = self.molstr(self.ligand_str_file)
+        if self.FILES.reference_structure:
+            self.ref_str = check_str(self.FILES.reference_structure, ref=True)
+        self.check4water()
+        self.indexes = get_indexes(com_ndx=self.FILES.complex_index,
+                                   rec_ndx=self.FILES.receptor_index,
+                                   lig_ndx=self.FILES.ligand_index)
+        self.resi, self.resl, self.orderl = res2map(self.indexes, self.complex_str)
+        self.check_structures(self.complex_str, self.receptor_str, self.ligand_str)
+
+    def _make_com_str(self, num_com_rec_group, str_com_rec_group, num_com_lig_group, str_com_lig_group):
+        """ Extracts the complex structure from the GROMACS files """
         logging.info(f'Normal Complex: Saving group {str_com_rec_group}_{str_com_lig_group} '
                      f'({num_com_rec_group}_{num_com_lig_group}) in {self.FILES.complex_index} file as '
                      f'{self.complex_str_file}')
@@ -308,58 +536,47 @@ class CheckMakeTop:
         log_subprocess_output(c4)
         if c4.wait():  # if it quits with return code != 0
             GMXMMPBSA_ERROR('%s failed when querying %s' % (' '.join(comprog), self.FILES.complex_trajs[0]))
-        # Put receptor and ligand (explicitly defined) to avoid overwrite them
-        # check if ligand is not protein. In any case, non-protein ligand always most be processed
-        if self.FILES.ligand_mol2:
-            logging.info(f'Generating ligand parameters from {self.FILES.ligand_mol2} file...')
-            lig_name = os.path.splitext(os.path.split(self.FILES.ligand_mol2)[1])[0]
-            self.ligand_frcmod = self.FILES.prefix + lig_name + '.frcmod'
-            # run parmchk2
-            parmchk2 = self.external_progs['parmchk2']
-            lig_ff = '2' if "leaprc.gaff2" in self.INPUT['general']['forcefields'] else '1'
-            parmchk2_args = [parmchk2, '-i', self.FILES.ligand_mol2, '-f', 'mol2', '-o', self.ligand_frcmod, '-s',
-                             lig_ff]
-            logging.debug('Running command: ' + ' '.join(parmchk2_args))
-            l3 = subprocess.Popen(parmchk2_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            log_subprocess_output(l3)
-            if l3.wait():
-                GMXMMPBSA_ERROR('%s failed when querying %s' % (parmchk2, self.FILES.ligand_mol2))
 
-        # check if the ligand force field is gaff or gaff2 and get if the ligand mol2 was defined
-        elif "leaprc.gaff2" in self.INPUT['general']['forcefields'] and not self.FILES.complex_top:
-            logging.warning('You must define the ligand mol2 file (-lm) if the ligand forcefield is '
-                            '"leaprc.gaff" or "leaprc.gaff2". If the ligand is parametrized with Amber force '
-                            'fields ignore this warning')
+    def _make_lig_params(self):
+        """ Generates the parameters of the non-protein ligand """
+        logging.info(f'Generating ligand parameters from {self.FILES.ligand_mol2} file...')
+        lig_name = os.path.splitext(os.path.split(self.FILES.ligand_mol2)[1])[0]
+        self.ligand_frcmod = self.FILES.prefix + lig_name + '.frcmod'
+        # run parmchk2
+        parmchk2 = self.external_progs['parmchk2']
+        lig_ff = '2' if "leaprc.gaff2" in self.INPUT['general']['forcefields'] else '1'
+        parmchk2_args = [parmchk2, '-i', self.FILES.ligand_mol2, '-f', 'mol2', '-o', self.ligand_frcmod, '-s',
+                         lig_ff]
+        logging.debug('Running command: ' + ' '.join(parmchk2_args))
+        l3 = subprocess.Popen(parmchk2_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        log_subprocess_output(l3)
+        if l3.wait():
+            GMXMMPBSA_ERROR('%s failed when querying %s' % (parmchk2, self.FILES.ligand_mol2))
+
+    def _make_rec_temp(self, num_com_rec_group):
+        """ Extracts the temporal receptor structure used to get the interface residues """
+        str_format = 'tpr' if self.FILES.complex_tpr[-3:] == 'tpr' else 'pdb'
+        comprog = self.trjconv if str_format == 'tpr' else self.editconf
+        rec_echo_args = echo_command + ['{}'.format(num_com_rec_group)]
+        cp1 = subprocess.Popen(rec_echo_args, stdout=subprocess.PIPE)
+        if str_format == 'tpr':
+            # we extract the pdb from the first frame of trajs to make amber topology
+            pdbrec_args = self.trjconv + ['-f', self.FILES.complex_trajs[0], '-s', self.FILES.complex_tpr, '-o',
+                                          'rec_temp.pdb', '-n', self.FILES.complex_index, '-dump', '0']
+        else:
+            pdbrec_args = self.editconf + ['-f', self.FILES.complex_tpr, '-n', self.FILES.complex_index, '-o',
+                                           'rec_temp.pdb']
+        logging.debug('Running command: ' + ' '.join(echo_command) + ' "' +
+                      (' '.join(rec_echo_args[len(echo_command):]).replace('\n', '\\n')) + '"' +
+                      '| ' + ' '.join(pdbrec_args))
+        cp2 = subprocess.Popen(pdbrec_args, stdin=cp1.stdout, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        log_subprocess_output(cp2)
+        if cp2.wait():  # if it quits with return code != 0
+            GMXMMPBSA_ERROR('%s failed when querying %s' % (' '.join(comprog), self.FILES.complex_trajs[0]))
 
-        # make a temp receptor pdb (even when stability) if decomp to get correct receptor residues from complex. This
-        # avoids get multiples molecules from complex.split()
-        if self.INPUT['decomp']['decomprun'] and self.FILES.stability:
-            self.use_temp = True
-            logging.warning('When &decomp is defined, we generate a receptor file in order to extract interface '
-                            'residues')
-            rec_echo_args = echo_command + ['{}'.format(num_com_rec_group)]
-            cp1 = subprocess.Popen(rec_echo_args, stdout=subprocess.PIPE)
-            if str_format == 'tpr':
-                # we extract the pdb from the first frame of trajs to make amber topology
-                pdbrec_args = self.trjconv + ['-f', self.FILES.complex_trajs[0], '-s', self.FILES.complex_tpr, '-o',
-                                              'rec_temp.pdb', '-n', self.FILES.complex_index, '-dump', '0']
-            else:
-                pdbrec_args = self.editconf + ['-f', self.FILES.complex_tpr, '-n', self.FILES.complex_index, '-o',
-                                               'rec_temp.pdb']
-            logging.debug('Running command: ' + ' '.join(echo_command) + ' "' +
-                          (' '.join(rec_echo_args[len(echo_command):]).replace('\n', '\\n')) + '"' +
-                          '| ' + ' '.join(pdbrec_args))
-            cp2 = subprocess.Popen(pdbrec_args, stdin=cp1.stdout, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            log_subprocess_output(cp2)
-            if cp2.wait():  # if it quits with return code != 0
-                GMXMMPBSA_ERROR('%s failed when querying %s' % (' '.join(comprog), self.FILES.complex_trajs[0]))
-        # check if stability
-        if self.FILES.stability and (
-                (self.FILES.receptor_tpr or self.FILES.ligand_tpr)
-        ):
-            logging.warning('When Stability calculation mode is selected, receptor and ligand files are not '
-                            'needed...')
-        # wt receptor
+    def _make_rec_str(self, num_com_rec_group, str_com_rec_group):
+        """ Extracts the receptor structure from its own GROMACS files (MT) or from the complex (ST) """
+        comprog = self.trjconv if self.FILES.complex_tpr[-3:] == 'tpr' else self.editconf
         if self.FILES.receptor_tpr:
             logging.info('A receptor structure file was defined. Using MT approach...')
             num_rec_group, str_rec_group = get_index_groups(self.FILES.receptor_index, self.FILES.receptor_group)
@@ -423,8 +640,10 @@ class CheckMakeTop:
             log_subprocess_output(cp2)
             if cp2.wait():  # if it quits with return code != 0
                 GMXMMPBSA_ERROR('%s failed when querying %s' % (' '.join(comprog), self.FILES.complex_trajs[0]))
-        # ligand
-        # # check consistence
+
+    def _make_lig_str(self, num_com_lig_group, str_com_lig_group):
+        """ Extracts the ligand structure from its own GROMACS files (MT) or from the complex (ST) """
+        comprog = self.trjconv if self.FILES.complex_tpr[-3:] == 'tpr' else self.editconf
         if self.FILES.ligand_tpr:  # ligand is protein
             # FIXME: if ligand is a zwitterionic aa fail
             logging.info('A ligand structure file was defined. Using MT approach...')
@@ -493,25 +712,6 @@ class CheckMakeTop:
             log_subprocess_output(l2)
             if l2.wait():  # if it quits with return code != 0
                 GMXMMPBSA_ERROR('%s failed when querying %s' % (' '.join(comprog), self.FILES.complex_trajs[0]))
-        # check for IE variable
-        if (self.FILES.receptor_tpr or self.FILES.ligand_tpr) and (
-                self.INPUT['general']['interaction_entropy'] or self.INPUT['general']['c2_entropy']
-        ):
-            logging.warning("The IE or C2 entropy method don't support the MTP approach...")
-            self.INPUT['general']['interaction_entropy'] = self.INPUT['general']['c2_entropy'] = 0
-
-        # initialize receptor and ligand structures. Needed to get residues map
-        self.complex_str = self.molstr(self.complex_str_file)
-        self.receptor_str = self.molstr(self.receptor_str_file)
-        self.ligand_str = self.molstr(self.ligand_str_file)
-        if self.FILES.reference_structure:
-            self.ref_str = check_str(self.FILES.reference_structure, ref=True)
-        self.check4water()
-        self.indexes = get_indexes(com_ndx=self.FILES.complex_index,
-                                   rec_ndx=self.FILES.receptor_index,
-                                   lig_ndx=self.FILES.ligand_index)
-        self.resi, self.resl, self.orderl = res2map(self.indexes, self.complex_str)
-        self.check_structures(self.complex_str, self.receptor_str, self.ligand_str)
 
     def check4water(self):
         if counter := sum(
@@ -689,49 +889,63 @@ class CheckMakeTop:
         lig_amb_prm.save(f"{self.FILES.prefix}LIG.inpcrd", format='rst7', overwrite=True)
 
         if self.INPUT['ala']['alarun']:
-            logging.info('Building Mutant Complex Topology...')
-            # get mutation index in complex
-            self.com_mut_index, self.part_mut, self.part_index = self.getMutationInfo()
-            mut_com_amb_prm = self.makeMutTop(com_amb_prm, self.com_mut_index)
-            logging.info(f"Assigning PBRadii {PBRadii[self.INPUT['general']['PBRadii']]} to Mutant Complex...")
-            action = ChRad(mut_com_amb_prm, PBRadii[self.INPUT['general']['PBRadii']])
-            logging.info('Writing Mutant Complex AMBER topology...')
-            mut_com_amb_prm.write_parm(self.mutant_complex_pmrtop)
-
-            if self.part_mut == 'REC':
-                logging.info('Detecting mutation in Receptor. Building Mutant Receptor topology...')
-                out_prmtop = self.mutant_receptor_pmrtop
-                self.mutant_ligand_pmrtop = None
-                if rec_hastop:
-                    mtop = self.makeMutTop(rec_amb_prm, self.part_index)
-                else:
-                    mut_com_amb_prm.strip(f'!:{rec_indexes_string}')
-                    mtop = mut_com_amb_prm
-            else:
-                logging.info('Detecting mutation in Ligand. Building Mutant Ligand topology...')
-                out_prmtop = self.mutant_ligand_pmrtop
-                self.mutant_receptor_pmrtop = None
-                if lig_hastop:
-                    mtop = self.makeMutTop(lig_amb_prm, self.part_index)
-                else:
-                    mut_com_amb_prm.strip(f':{rec_indexes_string}')
-                    mtop = mut_com_amb_prm
-
-            if com_top_parm == 'chamber':
-                mut_prot_amb_prm = parmed.amber.ChamberParm.from_structure(mtop)
-            else:
-                mut_prot_amb_prm = parmed.amber.AmberParm.from_structure(mtop)
-            logging.info(f"Assigning PBRadii {PBRadii[self.INPUT['general']['PBRadii']]} to Mutant "
-                         f"{'Receptor' if self.part_mut == 'REC' else 'Ligand'}...")
-            action = ChRad(mut_prot_amb_prm, PBRadii[self.INPUT['general']['PBRadii']])
-            logging.info(f"Writing Mutant {'Receptor' if self.part_mut == 'REC' else 'Ligand'} AMBER topology...")
-            mut_prot_amb_prm.write_parm(out_prmtop)
+            self.mutations = self.getMutationInfo()
+            for mut in self.mutations:
+                self._gmxtop2mutprmtop(mut, com_amb_prm, rec_amb_prm, lig_amb_prm, rec_hastop, lig_hastop,
+                                       rec_indexes_string, com_top_parm)
+            self._set_mutant_prmtops()
         else:
             self.mutant_complex_pmrtop = None
 
         return (self.complex_pmrtop, self.receptor_pmrtop, self.ligand_pmrtop, self.mutant_complex_pmrtop,
                 self.mutant_receptor_pmrtop, self.mutant_ligand_pmrtop)
 
+    def _gmxtop2mutprmtop(self, mut, com_amb_prm, rec_amb_prm, lig_amb_prm, rec_hastop, lig_hastop,
+                          rec_indexes_string, com_top_parm):
+        """ Builds the mutant topologies of one mutation from the normal ones """
+        res = self.complex_str.residues[mut.com_index]
+        logging.info(f'Building Mutant Complex Topology ({res.chain}/{res.number})...')
+        mut_com_amb_prm = self.makeMutTop(com_amb_prm, mut.com_index)
+        logging.info(f"Assigning PBRadii {PBRadii[self.INPUT['general']['PBRadii']]} to Mutant Complex...")
+        action = ChRad(mut_com_amb_prm, PBRadii[self.INPUT['general']['PBRadii']])
+        logging.info('Writing Mutant Complex AMBER topology...')
+        mut_com_amb_prm.write_parm(mut.complex_prmtop)
+
+        if mut.part == 'REC':
+            logging.info('Detecting mutation in Receptor. Building Mutant Receptor topology...')
+            out_prmtop = mut.receptor_prmtop
+            mut.ligand_prmtop = None
+            if rec_hastop:
+                mtop = self.makeMutTop(rec_amb_prm, mut.part_index)
+            else:
+                mut_com_amb_prm.strip(f'!:{rec_indexes_string}')
+                mtop = mut_com_amb_prm
+        else:
+            logging.info('Detecting mutation in Ligand. Building Mutant Ligand topology...')
+            out_prmtop = mut.ligand_prmtop
+            mut.receptor_prmtop = None
+            if lig_hastop:
+                mtop = self.makeMutTop(lig_amb_prm, mut.part_index)
+            else:
+                mut_com_amb_prm.strip(f':{rec_indexes_string}')
+                mtop = mut_com_amb_prm
+
+        if com_top_parm == 'chamber':
+            mut_prot_amb_prm = parmed.amber.ChamberParm.from_structure(mtop)
+        else:
+            mut_prot_amb_prm = parmed.amber.AmberParm.from_structure(mtop)
+        logging.info(f"Assigning PBRadii {PBRadii[self.INPUT['general']['PBRadii']]} to Mutant "
+                     f"{'Receptor' if mut.part == 'REC' else 'Ligand'}...")
+        action = ChRad(mut_prot_amb_prm, PBRadii[self.INPUT['general']['PBRadii']])
+        logging.info(f"Writing Mutant {'Receptor' if mut.part == 'REC' else 'Ligand'} AMBER topology...")
+        mut_prot_amb_prm.write_parm(out_prmtop)
+
+    def _set_mutant_prmtops(self):
+        """ The mutant topologies returned by buildTopology are the ones of the first mutation """
+        self.mutant_complex_pmrtop = self.mutations[0].complex_prmtop
+        self.mutant_receptor_pmrtop = self.mutations[0].receptor_prmtop
+        self.mutant_ligand_pmrtop = self.mutations[0].ligand_prmtop
+
     def _split_str(self, start, r, c, basename, struct, mut_index=0):
         end = start + (r[1] - r[0])
         mask = f'!:{start}-{end}'
@@ -776,29 +990,30 @@ class CheckMakeTop:
             self.ligand_list[f'LIG{c}'] = sfile
             start += end
 
-        self.mut_receptor_list = {}
-        self.mut_ligand_list = {}
         if self.INPUT['ala']['alarun']:
-            self.com_mut_index, self.part_mut, self.part_index = self.getMutationInfo()
-            start = 1
-            if self.part_mut == 'REC':
-                logging.info('Detecting mutation in Receptor. Building Mutant Receptor structure...')
-                self.mutant_ligand_pmrtop = None
-                for c, r in enumerate(self.resi['REC']['num']):
-                    end, sfile = self._split_str(
-                        start, r, c, 'MUT_REC', self.receptor_str, self.part_index
-                    )
-                    self.mut_receptor_list[f'MREC{c}'] = sfile
-                    start += end
-            else:
-                logging.info('Detecting mutation in Ligand. Building Mutant Ligand Structure...')
-                self.mutant_receptor_pmrtop = None
-                for c, r in enumerate(self.resi['LIG']['num']):
-                    end, sfile = self._split_str(
-                        start, r, c, 'MUT_LIG', self.ligand_str, self.part_index
-                    )
-                    self.mut_ligand_list[f'MLIG{c}'] = sfile
-                    start += end
+            self.mutations = self.getMutationInfo()
+            for mut in self.mutations:
+                mut.receptor_list = {}
+                mut.ligand_list = {}
+                start = 1
+                if mut.part == 'REC':
+                    logging.info('Detecting mutation in Receptor. Building Mutant Receptor structure...')
+                    mut.ligand_prmtop = None
+                    for c, r in enumerate(self.resi['REC']['num']):
+                        end, sfile = self._split_str(
+                            start, r, c, f'{mut.tag}REC', self.receptor_str, mut.part_index
+                        )
+                        mut.receptor_list[f'MREC{c}'] = sfile
+                        start += end
+                else:
+                    logging.info('Detecting mutation in Ligand. Building Mutant Ligand Structure...')
+                    mut.receptor_prmtop = None
+                    for c, r in enumerate(self.resi['LIG']['num']):
+                        end, sfile = self._split_str(
+                            start, r, c, f'{mut.tag}LIG', self.ligand_str, mut.part_index
+                        )
+                        mut.ligand_list[f'MLIG{c}'] = sfile
+                        start += end
 
     @staticmethod
     def cleantop(top_file, ndx, id='complex'):
@@ -863,7 +1078,8 @@ class CheckMakeTop:
         lig_mask = ':' + ','.join(self.resi['LIG']['string'])
 
         if self.INPUT['ala']['alarun']:
-            self.resl[self.com_mut_index].set_mut(self.INPUT['ala']['mutant'])
+            for mut in self.mutations:
+                self.resl[mut.com_index].set_mut(self.INPUT['ala']['mutant'])
         return rec_mask, lig_mask, self.resl
 
     def get_selected_residues(self, select, qm_sele=False):
@@ -1002,32 +1218,41 @@ class CheckMakeTop:
             GMXMMPBSA_ERROR("No residue for mutation was defined")
         # dict = { resind: [chain, resnum, icode]
         sele_res_dict = self.get_selected_residues(self.INPUT['ala']['mutant_res'])
-        if len(sele_res_dict) != 1:
-            GMXMMPBSA_ERROR('Only ONE mutant residue is allowed!')
-        r = sele_res_dict[0]
-        res = self.complex_str.residues[r - 1]
-        icode = f':{res.insertion_code}' if res.insertion_code else ''
-        if (not parmed.residue.AminoAcidResidue.has(res.name) or res.name in ['CYX', 'PRO', 'GLY'] or
-                res.name == 'ALA' and self.INPUT['ala']['mutant'] == 'ALA'):
-            GMXMMPBSA_ERROR(f"Selecting residue {res.chain}:{res.name}:{res.number}{icode} can't be mutated. Please, "
-                            f"define a valid residue...")
-
-        if r.is_receptor():
-            part_index = r.id_index - 1
-            part_mut = 'REC'
-        elif r.is_ligand():
-            part_index = r.id_index - 1
-            part_mut = 'LIG'
-        else:
-            part_index = None
-            part_mut = None
-            if icode:
-                GMXMMPBSA_ERROR(f'Residue {res.chain}:{res.number}:{res.insertion_code} not found')
+        if len(sele_res_dict) > 1 and self.INPUT['ala']['cas_intdiel']:
+            GMXMMPBSA_ERROR('cas_intdiel is not compatible with multiple mutant residues, since the intdiel is the '
+                            'same for all the mutations!')
+        mutations = []
+        for c, r in enumerate(sele_res_dict):
+            res = self.complex_str.residues[r - 1]
+            icode = f':{res.insertion_code}' if res.insertion_code else ''
+            if (not parmed.residue.AminoAcidResidue.has(res.name) or res.name in ['CYX', 'PRO', 'GLY'] or
+                    res.name == 'ALA' and self.INPUT['ala']['mutant'] == 'ALA'):
+                GMXMMPBSA_ERROR(f"Selecting residue {res.chain}:{res.name}:{res.number}{icode} can't be mutated. "
+                                f"Please, define a valid residue...")
+
+            if r.is_receptor():
+                part_index = r.id_index - 1
+                part_mut = 'REC'
+            elif r.is_ligand():
+                part_index = r.id_index - 1
+                part_mut = 'LIG'
             else:
-                GMXMMPBSA_ERROR(f'Residue {res.chain}:{res.number} not found')
-
-        # return r - 1 since r is the complex mutant index from amber selection format. Needed for top mutation only
-        return r - 1, part_mut, part_index
+                part_index = None
+                part_mut = None
+                if icode:
+                    GMXMMPBSA_ERROR(f'Residue {res.chain}:{res.number}:{res.insertion_code} not found')
+                else:
+                    GMXMMPBSA_ERROR(f'Residue {res.chain}:{res.number} not found')
+
+            # The first mutation keeps the names of the single mutation runs
+            tag = 'MUT_' if c == 0 else f'MUT{c + 1}_'
+            # com_index is r - 1 since r is the complex mutant index from amber selection format. Needed for top
+            # mutation only
+            mutations.append(SimpleNamespace(com_index=r - 1, part=part_mut, part_index=part_index, tag=tag,
+                                             complex_prmtop=f'{tag}COM.prmtop', receptor_prmtop=f'{tag}REC.prmtop',
+                                             ligand_prmtop=f'{tag}LIG.prmtop'))
+        self.com_mut_index = mutations[0].com_index
+        return mutations
 
     def _assign_ter(self):
         for res in self.complex_str.residues:
@@ -1305,63 +1530,53 @@ class CheckMakeTop:
         # clear trajectory
         if not self.INPUT['general']['solvated_trajectory']:
             return
-        logging.info('Cleaning normal complex trajectories...')
-        new_trajs = []
-        for i in range(len(self.FILES.complex_trajs)):
-            trjconv_echo_args = echo_command + ['GMXMMPBSA_REC_GMXMMPBSA_LIG']
-            c5 = subprocess.Popen(trjconv_echo_args, stdout=subprocess.PIPE)
-            # we get only first trajectory to extract a pdb file and make amber topology for complex
-            trjconv_args = self.trjconv + ['-f', self.FILES.complex_trajs[i], '-s', self.FILES.complex_tpr, '-o',
-                                           f'COM_traj_{i}.xtc', '-n', self.FILES.complex_index]
-            logging.debug('Running command: ' + ' '.join(echo_command) + ' "' +
-                          (' '.join(trjconv_echo_args[len(echo_command):]).replace('\n', '\\n')) + '"' +
-                          '| ' + ' '.join(trjconv_args))
-            c6 = subprocess.Popen(trjconv_args, stdin=c5.stdout, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-            log_subprocess_output(c6)
-            if c6.wait():  # if it quits with return code != 0
-                GMXMMPBSA_ERROR('%s failed when querying %s' % (' '.join(self.trjconv), self.FILES.complex_trajs[i]))
-            new_trajs.append(f'COM_traj_{i}.xtc')
-        self.FILES.complex_trajs = new_trajs
-
-        # clear trajectory
+        species = [('complex', 'COM', 'GMXMMPBSA_REC_GMXMMPBSA_LIG')]
         if self.FILES.receptor_tpr:
-            logging.info('Cleaning normal receptor trajectories...')
-            new_trajs = []
-            for i in range(len(self.FILES.receptor_trajs)):
-                trjconv_echo_args = echo_command + ['GMXMMPBSA_REC']
-                c5 = subprocess.Popen(trjconv_echo_args, stdout=subprocess.PIPE)
-                # we get only first trajectory to extract a pdb file and make amber topology for complex
-                trjconv_args = self.trjconv + ['-f', self.FILES.receptor_trajs[i], '-s', self.FILES.receptor_tpr,
-                                               '-o', 'REC_traj_{}.xtc'.format(i), '-n', self.FILES.receptor_index]
-                logging.debug('Running command: ' + ' '.join(echo_command) + ' "' +
-                              (' '.join(trjconv_echo_args[len(echo_command):]).replace('\n', '\\n')) + '"' +
-                              '| ' + ' '.join(trjconv_args))
-                c6 = subprocess.Popen(trjconv_args, stdin=c5.stdout, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                log_subprocess_output(c6)
-                if c6.wait():  # if it quits with return code != 0
-                    GMXMMPBSA_ERROR(
-                        '%s failed when querying %s' % (' '.join(self.trjconv), self.FILES.receptor_trajs[i]))
-                new_trajs.append('REC_traj_{}.xtc'.format(i))
-            self.FILES.receptor_trajs = new_trajs
-
+            species.append(('receptor', 'REC', 'GMXMMPBSA_REC'))
         if self.FILES.ligand_tpr:
-            logging.info('Cleaning normal ligand trajectories...')
-            new_trajs = []
-            for i in range(len(self.FILES.ligand_trajs)):
-                trjconv_echo_args = echo_command + ['GMXMMPBSA_LIG']
-                c5 = subprocess.Popen(trjconv_echo_args, stdout=subprocess.PIPE)
-                # we get only first trajectory to extract a pdb file and make amber topology for complex
-                trjconv_args = self.trjconv + ['-f', self.FILES.ligand_trajs[i], '-s', self.FILES.ligand_tpr, '-o',
-                                               'LIG_traj_{}.xtc'.format(i), '-n', self.FILES.ligand_index]
-                logging.debug('Running command: ' + ' '.join(echo_command) + ' "' +
-                              (' '.join(trjconv_echo_args[len(echo_command):]).replace('\n', '\\n')) + '"' +
-                              '| ' + ' '.join(trjconv_args))
-                c6 = subprocess.Popen(trjconv_args, stdin=c5.stdout, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-                log_subprocess_output(c6)
-                if c6.wait():  # if it quits with return code != 0
-                    GMXMMPBSA_ERROR('%s failed when querying %s' % (' '.join(self.trjconv), self.FILES.ligand_trajs[i]))
-                new_trajs.append('LIG_traj_{}.xtc'.format(i))
-            self.FILES.ligand_trajs = new_trajs
+            species.append(('ligand', 'LIG', 'GMXMMPBSA_LIG'))
+        # Every trajectory is cleaned by its own trjconv, so all of them run at the same time
+        tasks = []
+        for name, tag, group in species:
+            logging.info(f'Cleaning normal {name} trajectories...')
+            trajs = getattr(self.FILES, f'{name}_trajs')
+            new_trajs = [f'{tag}_traj_{i}.xtc' for i in range(len(trajs))]
+            tasks.extend((self._cleanup_traj, traj, getattr(self.FILES, f'{name}_tpr'),
+                          getattr(self.FILES, f'{name}_index'), group, new_traj)
+                         for traj, new_traj in zip(trajs, new_trajs))
+            setattr(self.FILES, f'{name}_trajs', new_trajs)
+        self._run_concurrently(tasks)
+
+    def _cleanup_traj(self, traj, tpr, index, group, new_traj):
+        trjconv_echo_args = echo_command + [group]
+        c5 = subprocess.Popen(trjconv_echo_args, stdout=subprocess.PIPE)
+        trjconv_args = self.trjconv + ['-f', traj, '-s', tpr, '-o', new_traj, '-n', index]
+        logging.debug('Running command: ' + ' '.join(echo_command) + ' "' +
+                      (' '.join(trjconv_echo_args[len(echo_command):]).replace('\n', '\\n')) + '"' +
+                      '| ' + ' '.join(trjconv_args))
+        c6 = subprocess.Popen(trjconv_args, stdin=c5.stdout, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        log_subprocess_output(c6)
+        if c6.wait():  # if it quits with return code != 0
+            GMXMMPBSA_ERROR('%s failed when querying %s' % (' '.join(self.trjconv), traj))
+
+    def _run_concurrently(self, tasks):
+        """
+        Runs independent setup tasks, given as (callable, *args), at the same time and returns their results in
+        order. The tasks mostly wait for external programs, so a small pool of threads is enough
+        """
+        def run(task):
+            start = time.time()
+            result = task[0](*task[1:])
+            return result, time.time() - start
+
+        if not tasks:
+            return []
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=min(len(tasks), os.cpu_count() or 1, SETUP_WORKERS)) as executor:
+            results = list(executor.map(run, tasks))
+        self.stage_time += time.time() - start
+        self.task_time += sum(t for _, t in results)
+        return [result for result, _ in results]
 
     def check_structures(self, com_str, rec_str=None, lig_str=None):
         logging.info('Checking the structures consistency...')
@@ -1516,7 +1731,9 @@ class CheckMakeTop:
                 at.number = c
         return structure
 
-    def _write_ff(self, ofile):
+    def _write_ff(self, ofile, leap_file):
+        # The tleap inputs may run at the same time, so each one writes its own log instead of the shared leap.log
+        ofile.write(f'logFile {self._leap_log(leap_file)}\n')
         for ff in self.INPUT['general']['forcefields']:
             ofile.write(f'source {ff}\n')
         ofile.write('loadOff atomic_ions.lib\n')
@@ -1530,7 +1747,7 @@ class CheckMakeTop:
     def makeToptleap(self):
         logging.info('Building tleap input files...')
         with open(f'{self.FILES.prefix}leap.in', 'w') as tif:
-            self._write_ff(tif)
+            self._write_ff(tif, 'leap.in')
             REC = []
             LIG = []
             for rec in self.receptor_list:
@@ -1578,7 +1795,11 @@ class CheckMakeTop:
         # changed in v1.4.3. We source the gmxMMPBSA ff directly from the data folder instead of copy to the Amber/dat
         data_path = Path(__file__).parent.joinpath('data')
         tleap = self.external_progs['tleap']
-        self._run_tleap(tleap, 'leap.in', data_path)
+        leap_files = ['leap.in']
+        if self.INPUT['ala']['alarun']:
+            leap_files.extend(self._write_mut_leap(mut) for mut in self.mutations)
+        # The normal and mutant topologies are independent of each other, so they are built at the same time
+        self._run_concurrently([(self._run_tleap, tleap, leap_file, data_path) for leap_file in leap_files])
 
         # check if it is a modified PBRadii
         if self.INPUT['general']['PBRadii'] in [5, 6]:
@@ -1604,95 +1825,91 @@ class CheckMakeTop:
                 lig_amb_parm.write_parm(self.ligand_pmrtop)
 
         if self.INPUT['ala']['alarun']:
-            with open(f'{self.FILES.prefix}mut_leap.in', 'w') as mtif:
-                self._write_ff(mtif)
-
-                if self.mutant_receptor_pmrtop:
-                    REC = []
-                    for mrec in self.mut_receptor_list:
-                        REC.append(f'{mrec}')
-                        mtif.write(f'{mrec} = loadpdb {self.mut_receptor_list[mrec]}\n')
-                    mrec_out = ' '.join(REC)
-
-                    if not self.FILES.stability:
-                        mtif.write(f'MREC_OUT = combine {{ {mrec_out} }}\n')
-                        for cys1, cys2 in self.cys_bonds['REC']:
-                            tif.write(f'bond MREC_OUT.{cys1}.SG MREC_OUT.{cys2}.SG\n')
-                        mtif.write(
-                            'saveamberparm MREC_OUT {t} {p}MUT_REC.inpcrd\n'.format(t=self.mutant_receptor_pmrtop,
-                                                                                    p=self.FILES.prefix))
-                    else:
-                        self.mutant_receptor_pmrtop = None
-                    # check if ligand is not protein and always load
-                    if self.FILES.ligand_mol2:
-                        mtif.write('LIG1 = loadmol2 {}\n'.format(self.FILES.ligand_mol2))
-                        self.mutant_ligand_pmrtop = None
-                        if not self.FILES.stability:
-                            mtif.write('check LIG1\n')
-                            mtif.write('loadamberparams {}\n'.format(self.ligand_frcmod))
-                        else:
-                            self.mutant_ligand_pmrtop = None
-                    else:
-                        for lig in self.ligand_list:
-                            mtif.write(f'{lig} = loadpdb {self.ligand_list[lig]}\n')
-                else:
-                    LIG = []
-                    for mlig in self.mut_ligand_list:
-                        LIG.append(f'{mlig}')
-                        mtif.write(f'{mlig} = loadpdb {self.mut_ligand_list[mlig]}\n')
-                    mlig_out = ' '.join(LIG)
-
-                    if not self.FILES.stability:
-                        mtif.write(f'MLIG_OUT = combine {{ {mlig_out} }}\n')
-                        for cys1, cys2 in self.cys_bonds['LIG']:
-                            tif.write(f'bond MLIG_OUT.{cys1}.SG MLIG_OUT.{cys2}.SG\n')
-                        mtif.write('saveamberparm MLIG_OUT {t} {p}MUT_LIG.inpcrd\n'.format(
-                            t=self.mutant_ligand_pmrtop, p=self.FILES.prefix))
-                    else:
-                        self.mutant_ligand_pmrtop = None
-                    for rec in self.receptor_list:
-                        mtif.write(f'{rec} = loadpdb {self.receptor_list[rec]}\n')
-
-                MCOM = self._set_com_order(REC, LIG)
-                mcom_out = ' '.join(MCOM)
-                mtif.write(f'MCOM_OUT = combine {{ {mcom_out} }}\n')
-                for cys1, cys2 in self.cys_bonds['COM']:
-                    tif.write(f'bond MCOM_OUT.{cys1}.SG MCOM_OUT.{cys2}.SG\n')
-                mtif.write('saveamberparm MCOM_OUT {t} {p}MUT_COM.inpcrd\n'.format(t=self.mutant_complex_pmrtop,
-                                                                                   p=self.FILES.prefix))
-                mtif.write('quit')
-
-            self._run_tleap(tleap, 'mut_leap.in', data_path)
-
             # check if it is a modified PBRadii
             if self.INPUT['general']['PBRadii'] in [5, 6]:
-                mcom_prmtop = parmed.load_file(self.mutant_complex_pmrtop)
-                mcom_amb_parm = parmed.amber.AmberParm.from_structure(mcom_prmtop)
-                action = ChRad(mcom_amb_parm, PBRadii[self.INPUT['general']['PBRadii']])
-                logging.info(f"Assigning modified PBRadii {PBRadii[self.INPUT['general']['PBRadii']]} to Mutant Complex AMBER "
-                             f"topology...")
-                mcom_amb_parm.write_parm(self.mutant_complex_pmrtop)
-                if not self.FILES.stability:
-                    mrec_prmtop = parmed.load_file(self.mutant_receptor_pmrtop)
-                    mrec_amb_parm = parmed.amber.AmberParm.from_structure(mrec_prmtop)
-                    action = ChRad(rec_amb_parm, PBRadii[self.INPUT['general']['PBRadii']])
-                    logging.info(f"Assigning modified PBRadii {PBRadii[self.INPUT['general']['PBRadii']]} to Mutant Receptor "
-                                 f"AMBER topology...")
-                    mrec_amb_parm.write_parm(self.mutant_receptor_pmrtop)
-
-                    mlig_prmtop = parmed.load_file(self.mutant_ligand_pmrtop)
-                    mlig_amb_parm = parmed.amber.AmberParm.from_structure(mlig_prmtop)
-                    action = ChRad(mlig_amb_parm, PBRadii[self.INPUT['general']['PBRadii']])
-                    logging.info(f"Assigning modified PBRadii {PBRadii[self.INPUT['general']['PBRadii']]} to Mutant Ligand AMBER "
-                                 f"topology...")
-                    mlig_amb_parm.write_parm(self.mutant_ligand_pmrtop)
-
+                for mut in self.mutations:
+                    mut_tops = [('Complex', mut.complex_prmtop)]
+                    if not self.FILES.stability:
+                        mut_tops.extend([('Receptor', mut.receptor_prmtop), ('Ligand', mut.ligand_prmtop)])
+                    for name, prmtop in mut_tops:
+                        if not prmtop:
+                            continue
+                        mut_amb_parm = parmed.amber.AmberParm.from_structure(parmed.load_file(prmtop))
+                        action = ChRad(mut_amb_parm, PBRadii[self.INPUT['general']['PBRadii']])
+                        logging.info(f"Assigning modified PBRadii {PBRadii[self.INPUT['general']['PBRadii']]} to "
+                                     f"Mutant {name} AMBER topology...")
+                        mut_amb_parm.write_parm(prmtop)
+            self._set_mutant_prmtops()
         else:
             self.mutant_complex_pmrtop = None
 
         return (self.complex_pmrtop, self.receptor_pmrtop, self.ligand_pmrtop, self.mutant_complex_pmrtop,
                 self.mutant_receptor_pmrtop, self.mutant_ligand_pmrtop)
 
+    def _write_mut_leap(self, mut):
+        """ Writes the tleap input of one mutation and returns its name (without prefix) """
+        leap_file = f'{mut.tag.lower()}leap.in'
+        with open(f'{self.FILES.prefix}{leap_file}', 'w') as mtif:
+            self._write_ff(mtif, leap_file)
+
+            if mut.part == 'REC':
+                REC = []
+                for mrec in mut.receptor_list:
+                    REC.append(f'{mrec}')
+                    mtif.write(f'{mrec} = loadpdb {mut.receptor_list[mrec]}\n')
+                mrec_out = ' '.join(REC)
+
+                if not self.FILES.stability:
+                    mtif.write(f'MREC_OUT = combine {{ {mrec_out} }}\n')
+                    for cys1, cys2 in self.cys_bonds['REC']:
+                        mtif.write(f'bond MREC_OUT.{cys1}.SG MREC_OUT.{cys2}.SG\n')
+                    mtif.write('saveamberparm MREC_OUT {t} {p}{m}REC.inpcrd\n'.format(t=mut.receptor_prmtop,
+                                                                                    p=self.FILES.prefix, m=mut.tag))
+                else:
+                    mut.receptor_prmtop = None
+                # check if ligand is not protein and always load
+                if self.FILES.ligand_mol2:
+                    mtif.write('LIG1 = loadmol2 {}\n'.format(self.FILES.ligand_mol2))
+                    mut.ligand_prmtop = None
+                    if not self.FILES.stability:
+                        mtif.write('check LIG1\n')
+                        mtif.write('loadamberparams {}\n'.format(self.ligand_frcmod))
+                    LIG = list(self.ligand_list)
+                else:
+                    LIG = []
+                    for lig in self.ligand_list:
+                        LIG.append(f'{lig}')
+                        mtif.write(f'{lig} = loadpdb {self.ligand_list[lig]}\n')
+            else:
+                LIG = []
+                for mlig in mut.ligand_list:
+                    LIG.append(f'{mlig}')
+                    mtif.write(f'{mlig} = loadpdb {mut.ligand_list[mlig]}\n')
+                mlig_out = ' '.join(LIG)
+
+                if not self.FILES.stability:
+                    mtif.write(f'MLIG_OUT = combine {{ {mlig_out} }}\n')
+                    for cys1, cys2 in self.cys_bonds['LIG']:
+                        mtif.write(f'bond MLIG_OUT.{cys1}.SG MLIG_OUT.{cys2}.SG\n')
+                    mtif.write('saveamberparm MLIG_OUT {t} {p}{m}LIG.inpcrd\n'.format(t=mut.ligand_prmtop,
+                                                                                    p=self.FILES.prefix, m=mut.tag))
+                else:
+                    mut.ligand_prmtop = None
+                REC = []
+                for rec in self.receptor_list:
+                    REC.append(f'{rec}')
+                    mtif.write(f'{rec} = loadpdb {self.receptor_list[rec]}\n')
+
+            MCOM = self._set_com_order(REC, LIG)
+            mcom_out = ' '.join(MCOM)
+            mtif.write(f'MCOM_OUT = combine {{ {mcom_out} }}\n')
+            for cys1, cys2 in self.cys_bonds['COM']:
+                mtif.write(f'bond MCOM_OUT.{cys1}.SG MCOM_OUT.{cys2}.SG\n')
+            mtif.write('saveamberparm MCOM_OUT {t} {p}{m}COM.inpcrd\n'.format(t=mut.complex_prmtop,
+                                                                            p=self.FILES.prefix, m=mut.tag))
+            mtif.write('quit')
+        return leap_file
+
     def _run_tleap(self, tleap, arg1, data_path):
         tleap_args = [
             tleap,
@@ -1705,7 +1922,12 @@ class CheckMakeTop:
         p1 = subprocess.Popen(tleap_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
         log_subprocess_output(p1)
         if p1.wait():
-            GMXMMPBSA_ERROR('%s failed when querying %s' % (tleap, self.FILES.prefix + arg1))
+            GMXMMPBSA_ERROR('%s failed when querying %s. Check the log in %s' % (tleap, self.FILES.prefix + arg1,
+                                                                                  self._leap_log(arg1)))
+
+    def _leap_log(self, leap_file):
+        """ Log file of a tleap input (leap.in -> _GMXMMPBSA_leap.log) """
+        return f'{self.FILES.prefix}{Path(leap_file).stem}.log'
 
     def _set_com_order(self, REC, LIG):
         result = []
@@ -5,9 +5,11 @@ strip trajectories and output the ones that will be used for the calculations.
 Needed for proper operation of gmx_MMPBSA
 
 Methods:
-         make_trajectories(INPUT, FILES, size): Makes all of the non-mutant
-            trajectories needed for the calculation, as well as all dummy
-            files (i.e. restarts and PDBs)
+         make_trajectories(INPUT, FILES, size): Counts the frames to be
+            processed and makes all dummy files (i.e. restarts and PDBs)
+
+         make_rank_trajectories(INPUT, FILES, rank, size, frames): Writes the
+            thread-specific trajectories of each rank
 
          make_mutant_trajectories(INPUT, FILES, rank): Mutates the trajectories
 
@@ -33,20 +35,60 @@ Classes:
 #  for more details.                                                           #
 # ##############################################################################
 
+import shutil
+from tempfile import mkdtemp
 from warnings import warn
 from GMXMMPBSA.exceptions import (TrajError, MMPBSA_Error, InternalError, MutantResError)
+from GMXMMPBSA.utils import get_scratch_dir
 from pathlib import Path
 
 strip_mask = ':WAT,Cl*,CIO,Cs+,IB,K*,Li+,MG*,Na+,Rb+,CS,RB,NA,F,CL'
 
 
+def _split_frames(nframes, size):
+    """
+    Returns the 'first-last' frame string assigned to each rank. Extra frames
+    are assigned incrementally starting with rank 0
+    """
+    frames_per_rank = nframes // size
+    extras = nframes - frames_per_rank * size
+    frame_strings = []
+    last_frame = 1
+    for i in range(size):
+        count = frames_per_rank + 1 if i < extras else frames_per_rank
+        frame_strings.append('%d-%d' % (last_frame, last_frame + count - 1))
+        last_frame += count
+    return frame_strings
+
+
+def _rank_window(nframes, size, rank, startframe, interval):
+    """
+    Maps the processed frames assigned to a rank back to the (startframe,
+    endframe, interval) of the original trajectories, so each rank can read its
+    own frames from them
+    """
+    first, last = map(int, _split_frames(nframes, size)[rank].split('-'))
+    return startframe + (first - 1) * interval, startframe + (last - 1) * interval, interval
+
+
+def _count_frames(startframe, endframe, interval, total_frames):
+    """ Number of frames processed out of total_frames, the same way as Trajectory.Setup """
+    if startframe > total_frames:
+        return 0
+    return (min(endframe, total_frames) - startframe) // interval + 1
+
+
 def make_trajectories(INPUT, FILES, size, cpptraj, pre):
     """
-    This function creates the necessary trajectory files, and creates thread-
-    specific trajectories for parallel calculations
+    This function counts the frames to be processed and creates all dummy
+    files (i.e. restarts and PDBs), plus the full trajectories if requested.
+    The thread-specific trajectories are written by every rank at the same time
+    in make_rank_trajectories
     """
 
     stability = FILES.stability
+    startframe, endframe, interval = (INPUT['general']['startframe'], INPUT['general']['endframe'],
+                                      INPUT['general']['interval'])
 
     # File suffix is dependent on file type
     if INPUT['general']['netcdf']:
@@ -54,21 +96,9 @@ def make_trajectories(INPUT, FILES, size, cpptraj, pre):
     else:
         trj_suffix = 'mdcrd'
 
-    # Make sure we set up for a solvated topology; image, strip solvent, etc.
-    # if FILES.solvated_prmtop:
-    #    traj = Trajectory(FILES.solvated_prmtop, FILES.complex_trajs, cpptraj)
-    #    traj.Setup(INPUT['startframe'], INPUT['endframe'], INPUT['interval'])
-    #    if not stability:
-    #       traj.Image()
-    #    traj.StripSolvent(strip_mask)
-    # # If we do not have a solvated topology...
-    # else:
-    #    print FILES.complex_prmtop, FILES.complex_trajs, cpptraj
-
+    # Only the first frame is needed for the dummy files
     traj = Trajectory(FILES.complex_prmtop, FILES.complex_trajs, cpptraj)
-    traj.Setup(INPUT['general']['startframe'], INPUT['general']['endframe'], INPUT['general']['interval'])
-    # RMS fit
-    traj.rms('!(%s)' % strip_mask)
+    traj.Setup(startframe, endframe, interval)
 
     com_frames = int(traj.processed_frames)
     rec_frames = 0
@@ -76,381 +106,276 @@ def make_trajectories(INPUT, FILES, size, cpptraj, pre):
     num_frames_nmode = 0
 
     # Sanity check
-    if traj.processed_frames < size:
+    if com_frames < size:
         raise MMPBSA_Error('Must have at least as many frames as processors!')
 
-    # We now know how many frames we have in total, so make a list that lists the
-    # number of frames found for each rank, and assign extra frames incrementally
-    frames_per_rank = traj.processed_frames // size
-    extras = traj.processed_frames - frames_per_rank * size
-    frame_count = [frames_per_rank for i in range(size)]
-    for i in range(size):
-        if i < extras: frame_count[i] += 1
-
-    # Dump our complex trajectories
-    if INPUT['general']['full_traj'] or INPUT['general']['qh_entropy']:
-        traj.Outtraj(pre + 'complex.%s' % trj_suffix, filetype=INPUT['general']['netcdf'])
+    traj.Setup(startframe, startframe, 1)
     traj.Outtraj(pre + 'complex.pdb', frames='1', filetype='pdb')
     traj.Outtraj(pre + 'dummycomplex.inpcrd', frames='1', filetype='restart')
 
-    # Now dump thread-specific trajectories
-    last_frame = 1
-    for i in range(size):
-        frame_string = '%d-%d' % (last_frame, last_frame + frame_count[i] - 1)
-        traj.Outtraj(pre + 'complex.%s.%d' % (trj_suffix, i),
-                     frames=frame_string, filetype=INPUT['general']['netcdf'])
-        # TODO: include pbsa.cuda. For APBS and PBDelphi we need to generate pqr instead
-        if INPUT['gbnsr6']['gbnsr6run']:
-            temp_dir = Path(f"{pre}inpcrd_{i}")
-            temp_dir.mkdir()
-            traj.Outtraj(f"{pre}inpcrd_{i}/{pre}complex.inpcrd", frames=frame_string, filetype='restart',
-                         options=['keepext'])
-        last_frame += frame_count[i]
-
-    # Now create the receptor/ligand trajectories if we're taking them from
-    # the complex trajectory
-
+    # Now create the receptor/ligand dummy files if we're taking them from the
+    # complex trajectory
     if not stability and not FILES.receptor_trajs:
         traj.Strip(INPUT['general']['ligand_mask'])
-        if INPUT['general']['full_traj'] or INPUT['general']['qh_entropy']:
-            traj.Outtraj(pre + 'receptor.%s' % trj_suffix, filetype=INPUT['general']['netcdf'])
         traj.Outtraj(pre + 'receptor.pdb', frames='1', filetype='pdb')
         traj.Outtraj(pre + 'dummyreceptor.inpcrd', frames='1', filetype='restart')
-        last_frame = 1
-        for i in range(size):
-            frame_string = '%d-%d' % (last_frame, last_frame + frame_count[i] - 1)
-            traj.Outtraj(pre + 'receptor.%s.%d' % (trj_suffix, i),
-                         frames=frame_string, filetype=INPUT['general']['netcdf'])
-            # FIXME: include pbsa.cuda. For APBS and PBDelphi we need to generate pqr instead
-            if INPUT['gbnsr6']['gbnsr6run']:
-                traj.Outtraj(f"{pre}inpcrd_{i}/{pre}receptor.inpcrd", frames=frame_string, filetype='restart',
-                             options=['keepext'])
-
-            last_frame += frame_count[i]
         traj.Unstrip(restrip_solvent=True)
-        traj.rms('!(%s)' % strip_mask)
         rec_frames = com_frames
 
     if not stability and not FILES.ligand_trajs:
         traj.Strip(INPUT['general']['receptor_mask'])
-        if INPUT['general']['full_traj'] or INPUT['general']['qh_entropy']:
-            traj.Outtraj(pre + 'ligand.%s' % trj_suffix, filetype=INPUT['general']['netcdf'])
         traj.Outtraj(pre + 'ligand.pdb', frames='1', filetype='pdb')
         traj.Outtraj(pre + 'dummyligand.inpcrd', frames='1', filetype='restart')
-        last_frame = 1
-        for i in range(size):
-            frame_string = '%d-%d' % (last_frame, last_frame + frame_count[i] - 1)
-            traj.Outtraj(pre + 'ligand.%s.%d' % (trj_suffix, i),
-                         frames=frame_string, filetype=INPUT['general']['netcdf'])
-            # FIXME: include pbsa.cuda. For APBS and PBDelphi we need to generate pqr instead
-            if INPUT['gbnsr6']['gbnsr6run']:
-                traj.Outtraj(f"{pre}inpcrd_{i}/{pre}ligand.inpcrd", frames=frame_string, filetype='restart',
-                             options=['keepext'])
-
-            last_frame += frame_count[i]
         traj.Unstrip(restrip_solvent=True)
-        traj.rms('!(%s)' % strip_mask)
         lig_frames = com_frames
 
-    # Run cpptraj to get the trajectory
     traj.Run(pre + 'normal_traj_cpptraj.out')
 
     # Go back and do the receptor and ligand if we used a multiple
     # trajectory approach
     if not stability and FILES.receptor_trajs:
-        # Different actions depending on solvation...
-        # if FILES.solvated_receptor_prmtop:
-        #    rectraj = Trajectory(FILES.solvated_receptor_prmtop,
-        #                         FILES.receptor_trajs, cpptraj)
-        #    rectraj.Setup(INPUT['startframe'],INPUT['endframe'],INPUT['interval'])
-        #    rectraj.StripSolvent(strip_mask)
-        # else:
         rectraj = Trajectory(FILES.receptor_prmtop, FILES.receptor_trajs, cpptraj)
-        rectraj.Setup(INPUT['general']['startframe'], INPUT['general']['endframe'], INPUT['general']['interval'])
+        rectraj.Setup(startframe, endframe, interval)
         rec_frames = int(rectraj.processed_frames)
-        rectraj.rms('!(%s)' % strip_mask)
-        if INPUT['general']['full_traj'] or INPUT['general']['qh_entropy']:
-            rectraj.Outtraj(pre + 'receptor.%s' % trj_suffix,
-                            filetype=INPUT['general']['netcdf'])
+        # Don't assume the same number of frames as we had for the complex
+        if rec_frames < size:
+            raise MMPBSA_Error('Too many procs for receptor snapshots')
+        rectraj.Setup(startframe, startframe, 1)
         rectraj.Outtraj(pre + 'receptor.pdb', frames='1', filetype='pdb')
         rectraj.Outtraj(pre + 'dummyreceptor.inpcrd', frames='1',
                         filetype='restart')
-
-        # Now do the same split-up of workload as we did for complex, but don't
-        # assume the same number of frames as we had for the complex
-        if rectraj.processed_frames < size:
-            raise MMPBSA_Error('Too many procs for receptor snapshots')
-        frames_per_rank = rectraj.processed_frames // size
-        extras = rectraj.processed_frames - frames_per_rank * size
-        frame_count = [frames_per_rank for i in range(size)]
-        for i in range(size):
-            if i < extras: frame_count[i] += 1
-        last_frame = 1
-        for i in range(size):
-            frame_string = '%d-%d' % (last_frame, last_frame + frame_count[i] - 1)
-            rectraj.Outtraj(pre + 'receptor.%s.%d' % (trj_suffix, i),
-                            frames=frame_string, filetype=INPUT['general']['netcdf'])
-            # FIXME: include pbsa.cuda. For APBS and PBDelphi we need to generate pqr instead
-            if INPUT['gbnsr6']['gbnsr6run']:
-                rectraj.Outtraj(f"{pre}inpcrd_{i}/{pre}receptor.inpcrd", frames=frame_string, filetype='restart',
-                             options=['keepext'])
-            last_frame += frame_count[i]
-
         rectraj.Run(pre + 'receptor_traj_cpptraj.out')
 
-    # end if not stability and FILES.receptor_trajs
-
     if not stability and FILES.ligand_trajs:
-        # Different actions depending on solvation...
-        # if FILES.solvated_ligand_prmtop:
-        #    ligtraj = Trajectory(FILES.solvated_ligand_prmtop,
-        #                         FILES.ligand_trajs, cpptraj)
-        #    ligtraj.Setup(INPUT['startframe'],INPUT['endframe'],INPUT['interval'])
-        #    ligtraj.StripSolvent(strip_mask)
-        # else:
         ligtraj = Trajectory(FILES.ligand_prmtop, FILES.ligand_trajs, cpptraj)
-        ligtraj.Setup(INPUT['general']['startframe'], INPUT['general']['endframe'], INPUT['general']['interval'])
+        ligtraj.Setup(startframe, endframe, interval)
         lig_frames = int(ligtraj.processed_frames)
-        ligtraj.rms('!(%s)' % strip_mask)
-        ligtraj.Outtraj(pre + 'ligand.%s' % trj_suffix, filetype=INPUT['general']['netcdf'])
+        if lig_frames < size:
+            raise MMPBSA_Error('Too many procs for ligand snapshots')
+        ligtraj.Setup(startframe, startframe, 1)
         ligtraj.Outtraj(pre + 'ligand.pdb', frames='1', filetype='pdb')
         ligtraj.Outtraj(pre + 'dummyligand.inpcrd', frames='1',
                         filetype='restart')
-
-        # Now do the same split-up of workload as we did for complex, but don't
-        # assume the same number of frames as we had for the complex
-        if ligtraj.processed_frames < size:
-            raise MMPBSA_Error('Too many procs for ligand snapshots')
-        frames_per_rank = ligtraj.processed_frames // size
-        extras = ligtraj.processed_frames - frames_per_rank * size
-        frame_count = [frames_per_rank for i in range(size)]
-        for i in range(size):
-            if i < extras: frame_count[i] += 1
-        last_frame = 1
-        for i in range(size):
-            frame_string = '%d-%d' % (last_frame, last_frame + frame_count[i] - 1)
-            ligtraj.Outtraj(pre + 'ligand.%s.%d' % (trj_suffix, i),
-                            frames=frame_string, filetype=INPUT['general']['netcdf'])
-            # FIXME: include pbsa.cuda. For APBS and PBDelphi we need to generate pqr instead
-            if INPUT['gbnsr6']['gbnsr6run']:
-                ligtraj.Outtraj(f"{pre}inpcrd_{i}/{pre}ligand.inpcrd", frames=frame_string, filetype='restart',
-                             options=['keepext'])
-            last_frame += frame_count[i]
-
         ligtraj.Run(pre + 'ligand_traj_cpptraj.out')
 
-    # end if not stability and FILES.ligand_trajs
-
-    # Now make the nmode trajectories
+    # Now count the nmode frames. They are taken out of the processed frames
     if INPUT['nmode']['nmoderun']:
-        nmtraj = Trajectory(FILES.complex_prmtop, [pre + 'complex.%s.%d' %
-                                                   (trj_suffix, i) for i in range(size)], cpptraj)
-        nmtraj.Setup(INPUT['nmode']['nmstartframe'], INPUT['nmode']['nmendframe'], INPUT['nmode']['nminterval'])
-
-        num_frames_nmode = int(nmtraj.processed_frames)
-
-        # Now split up the complex trajectory by thread
-        if nmtraj.processed_frames < size:
+        nm_args = (INPUT['nmode']['nmstartframe'], INPUT['nmode']['nmendframe'], INPUT['nmode']['nminterval'])
+        num_frames_nmode = _count_frames(*nm_args, com_frames)
+        if num_frames_nmode < size:
             raise MMPBSA_Error('More processors than complex nmode frames!')
-
-        frames_per_rank = nmtraj.processed_frames // size
-        extras = nmtraj.processed_frames - frames_per_rank * size
-        frame_count = [frames_per_rank for i in range(size)]
-        for i in range(size):
-            if i < extras: frame_count[i] += 1
-        last_frame = 1
-        for i in range(size):
-            frame_string = '%d-%d' % (last_frame, last_frame + frame_count[i] - 1)
-            nmtraj.Outtraj(pre + 'complex_nm.%s.%d' % (trj_suffix, i),
-                           frames=frame_string, filetype=INPUT['general']['netcdf'])
-            last_frame += frame_count[i]
-
-        nmtraj.Run(pre + 'com_nm_traj_cpptraj.out')
-
         if not stability:
-            nmtraj = Trajectory(FILES.receptor_prmtop, [pre + 'receptor.%s.%d' %
-                                                        (trj_suffix, i) for i in range(size)], cpptraj)
-            nmtraj.Setup(INPUT['nmode']['nmstartframe'], INPUT['nmode']['nmendframe'], INPUT['nmode']['nminterval'])
-            # Now split up the complex trajectory by thread
-            if nmtraj.processed_frames < size:
+            if _count_frames(*nm_args, rec_frames) < size:
                 raise MMPBSA_Error('More processors than receptor nmode frames!')
-
-            frames_per_rank = nmtraj.processed_frames // size
-            extras = nmtraj.processed_frames - frames_per_rank * size
-            frame_count = [frames_per_rank for i in range(size)]
-            for i in range(size):
-                if i < extras: frame_count[i] += 1
-            last_frame = 1
-            for i in range(size):
-                frame_string = '%d-%d' % (last_frame, last_frame + frame_count[i] - 1)
-                nmtraj.Outtraj(pre + 'receptor_nm.%s.%d' % (trj_suffix, i),
-                               frames=frame_string, filetype=INPUT['general']['netcdf'])
-                last_frame += frame_count[i]
-
-            nmtraj.Run(pre + 'rec_nm_traj_cpptraj.out')
-
-            nmtraj = Trajectory(FILES.ligand_prmtop, [pre + 'ligand.%s.%d' %
-                                                      (trj_suffix, i) for i in range(size)], cpptraj)
-            nmtraj.Setup(INPUT['nmode']['nmstartframe'], INPUT['nmode']['nmendframe'], INPUT['nmode']['nminterval'])
-            # Now split up the complex trajectory by thread
-            if nmtraj.processed_frames < size:
+            if _count_frames(*nm_args, lig_frames) < size:
                 raise MMPBSA_Error('More processors than ligand nmode frames!')
 
-            frames_per_rank = nmtraj.processed_frames // size
-            extras = nmtraj.processed_frames - frames_per_rank * size
-            frame_count = [frames_per_rank for i in range(size)]
-            for i in range(size):
-                if i < extras: frame_count[i] += 1
-            last_frame = 1
-            for i in range(size):
-                frame_string = '%d-%d' % (last_frame, last_frame + frame_count[i] - 1)
-                nmtraj.Outtraj(pre + 'ligand_nm.%s.%d' % (trj_suffix, i),
-                               frames=frame_string, filetype=INPUT['general']['netcdf'])
-                last_frame += frame_count[i]
-
-            nmtraj.Run(pre + 'lig_nm_traj_cpptraj.out')
+    return com_frames, rec_frames, lig_frames, num_frames_nmode
 
-        # end if not stability
 
-    # end if INPUT['nmode']['nmoderun']
-    return com_frames, rec_frames, lig_frames, num_frames_nmode
+def make_rank_trajectories(INPUT, FILES, rank, size, frames, cpptraj, pre):
+    """
+    Writes this rank's slice of every species. Each rank reads only its own
+    frames from the original trajectories, so all slices are prepared at the
+    same time instead of by the master alone. Receptor and ligand taken from
+    the complex are sliced in the same pass. frames is the tuple returned by
+    make_trajectories. The last rank also writes the full trajectories when
+    requested, since it has the fewest frames assigned
+    """
+    stability = FILES.stability
+    com_frames, rec_frames, lig_frames, _ = frames
+    startframe, interval = INPUT['general']['startframe'], INPUT['general']['interval']
+    filetype = INPUT['general']['netcdf']
+    gbnsr6run = INPUT['gbnsr6']['gbnsr6run']
+    trj_suffix = 'nc' if filetype else 'mdcrd'
 
+    if gbnsr6run:
+        # TODO: include pbsa.cuda. For APBS and PBDelphi we need to generate pqr instead
+        Path(f"{pre}inpcrd_{rank}").mkdir(exist_ok=True)
+        # cpptraj writes one restart per frame. Write them to a node-local folder
+        # and pack them afterwards
+        scratch = mkdtemp(prefix=pre, dir=get_scratch_dir())
 
-def make_mutant_trajectories(INPUT, FILES, rank, cpptraj, norm_sys, mut_sys, pre):
-    """ Mutates given trajectories and outputs dummy files for mutants """
+    # Every species is a list of (output name, mask to strip)
+    com_species = [('complex', None)]
+    if not stability and not FILES.receptor_trajs:
+        com_species.append(('receptor', INPUT['general']['ligand_mask']))
+    if not stability and not FILES.ligand_trajs:
+        com_species.append(('ligand', INPUT['general']['receptor_mask']))
+    jobs = [(FILES.complex_prmtop, FILES.complex_trajs, com_frames, com_species)]
+    if not stability and FILES.receptor_trajs:
+        jobs.append((FILES.receptor_prmtop, FILES.receptor_trajs, rec_frames, [('receptor', None)]))
+    if not stability and FILES.ligand_trajs:
+        jobs.append((FILES.ligand_prmtop, FILES.ligand_trajs, lig_frames, [('ligand', None)]))
+
+    for prmtop, trajs, nframes, species in jobs:
+        traj = Trajectory(prmtop, trajs, cpptraj)
+        # All ranks fit to the first frame processed, not to their own first one
+        traj.Setup(startframe, startframe, 1)
+        reference = traj.first_frame
+        traj.Setup(*_rank_window(nframes, size, rank, startframe, interval))
+        traj.rms('!(%s)' % strip_mask, reference)
+        for name, mask in species:
+            if mask:
+                traj.Strip(mask)
+            traj.Outtraj(pre + '%s.%s.%d' % (name, trj_suffix, rank), filetype=filetype)
+            if gbnsr6run:
+                traj.Outtraj(f"{scratch}/{pre}{name}.inpcrd", filetype='restart', options=['keepext'])
+            if mask:
+                traj.Unstrip(restrip_solvent=True)
+
+        # Now make the nmode trajectories. The nmode frames are taken out of the
+        # processed frames, so map them back to the original trajectories
+        if INPUT['nmode']['nmoderun']:
+            nmstart, nmend, nminterval = (INPUT['nmode']['nmstartframe'], INPUT['nmode']['nmendframe'],
+                                          INPUT['nmode']['nminterval'])
+            nm_start, nm_end, _ = _rank_window(_count_frames(nmstart, nmend, nminterval, nframes), size, rank,
+                                               nmstart, nminterval)
+            nmtraj = Trajectory(prmtop, trajs, cpptraj)
+            nmtraj.Setup(startframe + (nm_start - 1) * interval, startframe + (nm_end - 1) * interval,
+                         interval * nminterval)
+            nmtraj.rms('!(%s)' % strip_mask, reference)
+            for name, mask in species:
+                if mask:
+                    nmtraj.Strip(mask)
+                nmtraj.Outtraj(pre + '%s_nm.%s.%d' % (name, trj_suffix, rank), filetype=filetype)
+                if mask:
+                    nmtraj.Unstrip(restrip_solvent=True)
+            nmtraj.Run(pre + '%s_nm_traj_cpptraj.out.%d' % (species[0][0], rank))
+
+        if INPUT['general']['full_traj'] and rank == size - 1:
+            fulltraj = Trajectory(prmtop, trajs, cpptraj)
+            fulltraj.Setup(startframe, INPUT['general']['endframe'], interval)
+            fulltraj.rms('!(%s)' % strip_mask, reference)
+            for name, mask in species:
+                if mask:
+                    fulltraj.Strip(mask)
+                fulltraj.Outtraj(pre + '%s.%s' % (name, trj_suffix), filetype=filetype)
+                if mask:
+                    fulltraj.Unstrip(restrip_solvent=True)
+            fulltraj.Run(pre + '%s_full_traj_cpptraj.out' % species[0][0])
+
+        traj.Run(pre + '%s_traj_cpptraj.out.%d' % (species[0][0], rank))
+
+        if gbnsr6run:
+            for name, _ in species:
+                RestartArchive(f"{pre}inpcrd_{rank}/{pre}{name}.inpcrd").pack(scratch)
+
+    if gbnsr6run:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _mutant_mdcrd(trajname, norm_prmtop, mut_prmtop):
+    """ Returns the Alanine or Glycine MutantMdcrd for the given topologies """
     from GMXMMPBSA.alamdcrd import MutantMdcrd, GlyMutantMdcrd
-    import shutil
-    if not INPUT['ala']['alarun']: return None, None
+    try:
+        return MutantMdcrd(trajname, norm_prmtop, mut_prmtop)
+    except MutantResError:
+        return GlyMutantMdcrd(trajname, norm_prmtop, mut_prmtop)
+
+
+def make_mutant_trajectories(INPUT, FILES, rank, cpptraj, norm_sys, mutations, pre):
+    """
+    Mutates given trajectories and outputs dummy files for mutants. mutations is
+    a list with one namespace per mutation (file prefix, topology files and
+    system). Every normal trajectory is read only once, no matter how many
+    mutants are made from it
+    """
+    from GMXMMPBSA.alamdcrd import mutate_trajectory
+    if not INPUT['ala']['alarun']: return None
 
     stability = FILES.stability
 
     if INPUT['general']['netcdf']:
         trj_suffix = 'nc'
-        raise TypeError('Alanine/Glycine scanning requires ASCII trajectories (netcdf=0)')
     else:
         trj_suffix = 'mdcrd'
 
-    if (
-        not stability
-        and (
-            FILES.ligand_prmtop != FILES.mutant_ligand_prmtop
-            or FILES.receptor_prmtop == FILES.mutant_receptor_prmtop
-        )
-        and (
-            FILES.ligand_prmtop == FILES.mutant_ligand_prmtop
-            or FILES.receptor_prmtop != FILES.mutant_receptor_prmtop
-        )
-    ):
-        raise MMPBSA_Error('Alanine/Glycine scanning requires either a mutated '
-                           'ligand or receptor topology file with only 1 mutant residue, but not '
-                           'both')
+    for mut in mutations:
+        if (
+            not stability
+            and (
+                FILES.ligand_prmtop != mut.ligand_prmtop
+                or FILES.receptor_prmtop == mut.receptor_prmtop
+            )
+            and (
+                FILES.ligand_prmtop == mut.ligand_prmtop
+                or FILES.receptor_prmtop != mut.receptor_prmtop
+            )
+        ):
+            raise MMPBSA_Error('Alanine/Glycine scanning requires either a mutated '
+                               'ligand or receptor topology file with only 1 mutant residue, but not '
+                               'both')
 
     master = rank == 0
-    # FIXME: create folders for mutants
+    rec_muts = [mut for mut in mutations if not stability and FILES.receptor_prmtop != mut.receptor_prmtop]
+    lig_muts = [mut for mut in mutations if not stability and FILES.ligand_prmtop != mut.ligand_prmtop]
+
+    def _mutate(name, sys_prmtop, muts, sfx):
+        """ Writes the mutant trajectories of the rank for muts and copies the normal one for the others """
+        trajname = f'{pre}{name}{sfx}.{trj_suffix}.{rank}'
+        mutate_trajectory(trajname, [(f'{pre}{mut.pre}{name}{sfx}.{trj_suffix}.{rank}',
+                                      _mutant_mdcrd(trajname, sys_prmtop, getattr(mut.system, f'{name}_prmtop')))
+                                     for mut in muts])
+        # the mutated residue is *not* present in there
+        if name != 'complex':
+            for mut in mutations:
+                if mut not in muts:
+                    shutil.copyfile(trajname, f'{pre}{mut.pre}{name}{sfx}.{trj_suffix}.{rank}')
 
     # Have each rank mutate our rank's normal complex trajectory
-    try:
-        com_mut = MutantMdcrd(pre + 'complex.%s.%d' % (trj_suffix, rank),
-                              norm_sys.complex_prmtop, mut_sys.complex_prmtop)
-    except MutantResError:
-        com_mut = GlyMutantMdcrd(pre + 'complex.%s.%d' % (trj_suffix, rank),
-                                 norm_sys.complex_prmtop, mut_sys.complex_prmtop)
-    com_mut.MutateTraj(pre + 'mutant_complex.%s.%d' % (trj_suffix, rank))
-
+    _mutate('complex', norm_sys.complex_prmtop, mutations, '')
     # Have each rank mutate our rank's normal receptor or ligand trajectory
     # and copy the normal one to the mutant if the mutated residue is *not*
     # present in there
     if not stability:
-        if FILES.receptor_prmtop != FILES.mutant_receptor_prmtop:
-            try:
-                rec_mut = MutantMdcrd(pre + 'receptor.%s.%d' % (trj_suffix, rank),
-                                      norm_sys.receptor_prmtop, mut_sys.receptor_prmtop)
-            except MutantResError:
-                rec_mut = GlyMutantMdcrd(pre + 'receptor.%s.%d' % (trj_suffix, rank),
-                                         norm_sys.receptor_prmtop, mut_sys.receptor_prmtop)
-            rec_mut.MutateTraj(pre + 'mutant_receptor.%s.%d' % (trj_suffix, rank))
-            shutil.copyfile(pre + 'ligand.%s.%d' % (trj_suffix, rank),
-                            pre + 'mutant_ligand.%s.%d' % (trj_suffix, rank))
-
-        elif FILES.ligand_prmtop != FILES.mutant_ligand_prmtop:
-            try:
-                lig_mut = MutantMdcrd(pre + 'ligand.%s.%d' % (trj_suffix, rank),
-                                      norm_sys.ligand_prmtop, mut_sys.ligand_prmtop)
-            except MutantResError:
-                lig_mut = GlyMutantMdcrd(pre + 'ligand.%s.%d' % (trj_suffix, rank),
-                                         norm_sys.ligand_prmtop, mut_sys.ligand_prmtop)
-            lig_mut.MutateTraj(pre + 'mutant_ligand.%s.%d' % (trj_suffix, rank))
-            shutil.copyfile(pre + 'receptor.%s.%d' % (trj_suffix, rank),
-                            pre + 'mutant_receptor.%s.%d' % (trj_suffix, rank))
+        _mutate('receptor', norm_sys.receptor_prmtop, rec_muts, '')
+        _mutate('ligand', norm_sys.ligand_prmtop, lig_muts, '')
 
     if INPUT['gbnsr6']['gbnsr6run']:
-        temp_dir = Path(f"{pre}inpcrd_{rank}")
-        if not temp_dir.exists():
-            temp_dir.mkdir()
-        com_traj = Trajectory(FILES.mutant_complex_prmtop, f"{pre}mutant_complex.{trj_suffix}.{rank}", cpptraj)
-        com_traj.Setup()
-        com_traj.Outtraj(f"{pre}inpcrd_{rank}/{pre}mutant_complex.inpcrd", filetype='restart', options=['keepext'])
-        com_traj.Run(pre + 'commutant_gbnsr6_traj_cpptraj.out')
-
-        if not stability:
-            # receptor
-            rec_traj = Trajectory(FILES.mutant_receptor_prmtop, f"{pre}mutant_receptor.{trj_suffix}.{rank}", cpptraj)
-            rec_traj.Setup()
-            rec_traj.Outtraj(f"{pre}inpcrd_{rank}/{pre}mutant_receptor.inpcrd", filetype='restart', options=['keepext'])
-            rec_traj.Run(pre + 'recmutant_gbnsr6_traj_cpptraj.out')
-            # ligand
-            lig_traj = Trajectory(FILES.mutant_ligand_prmtop, f"{pre}mutant_ligand.{trj_suffix}.{rank}", cpptraj)
-            lig_traj.Setup()
-            lig_traj.Outtraj(f"{pre}inpcrd_{rank}/{pre}mutant_ligand.inpcrd", filetype='restart', options=['keepext'])
-            lig_traj.Run(pre + 'ligmutant_gbnsr6_traj_cpptraj.out')
+        Path(f"{pre}inpcrd_{rank}").mkdir(exist_ok=True)
+        scratch = mkdtemp(prefix=pre, dir=get_scratch_dir())
+        for mut in mutations:
+            mutant_species = [('complex', mut.complex_prmtop)]
+            if not stability:
+                mutant_species.extend([('receptor', mut.receptor_prmtop), ('ligand', mut.ligand_prmtop)])
+            for name, prmtop in mutant_species:
+                mut_traj = Trajectory(prmtop, f"{pre}{mut.pre}{name}.{trj_suffix}.{rank}", cpptraj)
+                mut_traj.Setup()
+                mut_traj.Outtraj(f"{scratch}/{pre}{mut.pre}{name}.inpcrd", filetype='restart', options=['keepext'])
+                mut_traj.Run(f'{pre}{name[:3]}{mut.pre}gbnsr6_traj_cpptraj.out.{rank}')
+                RestartArchive(f"{pre}inpcrd_{rank}/{pre}{mut.pre}{name}.inpcrd").pack(scratch)
+        shutil.rmtree(scratch, ignore_errors=True)
 
     # Have our master dump out dummy files
     if master:
-        com_traj = Trajectory(FILES.mutant_complex_prmtop, pre + 'mutant_complex.%s.0' % trj_suffix, cpptraj)
-        com_traj.Setup(1, 1, 1)
-        com_traj.Outtraj(pre + 'mutant_complex.pdb', frames='1', filetype='pdb')
-        com_traj.Outtraj(pre + 'mutant_dummycomplex.inpcrd', frames='1', filetype='restart')
-        com_traj.Run(pre + 'mutant_complex_cpptraj.out')
-        if not stability:
-            rec_traj = Trajectory(FILES.mutant_receptor_prmtop, pre + 'mutant_receptor.%s.0' % trj_suffix, cpptraj)
-            rec_traj.Setup(1, 1, 1)
-            rec_traj.Outtraj(pre + 'mutant_receptor.pdb', frames='1', filetype='pdb')
-            rec_traj.Outtraj(pre + 'mutant_dummyreceptor.inpcrd', frames='1', filetype='restart')
-            rec_traj.Run(pre + 'mutant_receptor_cpptraj.out')
-
-            lig_traj = Trajectory(FILES.mutant_ligand_prmtop, pre + 'mutant_ligand.%s.0' % trj_suffix, cpptraj)
-            lig_traj.Setup(1, 1, 1)
-            lig_traj.Outtraj(pre + 'mutant_ligand.pdb', frames='1', filetype='pdb')
-            lig_traj.Outtraj(pre + 'mutant_dummyligand.inpcrd', frames='1', filetype='restart')
-            lig_traj.Run(pre + 'mutant_ligand_cpptraj.out')
+        for mut in mutations:
+            mutant_species = [('complex', mut.complex_prmtop)]
+            if not stability:
+                mutant_species.extend([('receptor', mut.receptor_prmtop), ('ligand', mut.ligand_prmtop)])
+            for name, prmtop in mutant_species:
+                traj = Trajectory(prmtop, f'{pre}{mut.pre}{name}.{trj_suffix}.0', cpptraj)
+                traj.Setup(1, 1, 1)
+                traj.Outtraj(f'{pre}{mut.pre}{name}.pdb', frames='1', filetype='pdb')
+                traj.Outtraj(f'{pre}{mut.pre}dummy{name}.inpcrd', frames='1', filetype='restart')
+                traj.Run(f'{pre}{mut.pre}{name}_cpptraj.out')
 
     # Mutate our nmode trajectories if need be
     if INPUT['nmode']['nmoderun']:
-        com_mut = MutantMdcrd(pre + 'complex_nm.%s.%d' % (trj_suffix, rank),
-                              norm_sys.complex_prmtop, mut_sys.complex_prmtop)
-        com_mut.MutateTraj(pre + 'mutant_complex_nm.%s.%d' % (trj_suffix, rank))
-        if not stability and FILES.receptor_prmtop != FILES.mutant_receptor_prmtop:
-            rec_mut = MutantMdcrd(pre + 'receptor_nm.%s.%d' % (trj_suffix, rank),
-                                  norm_sys.receptor_prmtop, mut_sys.receptor_prmtop)
-            rec_mut.MutateTraj(pre + 'mutant_receptor_nm.%s.%d' %
-                               (trj_suffix, rank))
-            shutil.copyfile(pre + 'ligand_nm.%s.%d' % (trj_suffix, rank),
-                            pre + 'mutant_ligand_nm.%s.%d' % (trj_suffix, rank))
-
-        if not stability and FILES.ligand_prmtop != FILES.mutant_ligand_prmtop:
-            lig_mut = MutantMdcrd(pre + 'ligand_nm.%s.%d' % (trj_suffix, rank),
-                                  norm_sys.ligand_prmtop, mut_sys.ligand_prmtop)
-            lig_mut.MutateTraj(pre + 'mutant_ligand_nm.%s.%d' %
-                               (trj_suffix, rank))
-            shutil.copyfile(pre + 'ligand_nm.%s.%d' % (trj_suffix, rank),
-                            pre + 'mutant_ligand_nm.%s.%d' % (trj_suffix, rank))
-
-    # If we're doing a quasi-harmonic approximation we need the full com traj
-    if (INPUT['general']['full_traj'] or INPUT['general']['qh_entropy']) and master:
-        com_mut = MutantMdcrd(pre + 'complex.%s' % trj_suffix, norm_sys.complex_prmtop, mut_sys.complex_prmtop)
-        com_mut.MutateTraj(pre + 'mutant_complex.%s' % trj_suffix)
-
-    return str(com_mut), com_mut.mutres
+        _mutate('complex', norm_sys.complex_prmtop, mutations, '_nm')
+        if not stability:
+            _mutate('receptor', norm_sys.receptor_prmtop, rec_muts, '_nm')
+            _mutate('ligand', norm_sys.ligand_prmtop, lig_muts, '_nm')
+
+    # The quasi-harmonic approximation reads the thread-specific trajectories, so
+    # the full com traj is only mutated when it was requested
+    if INPUT['general']['full_traj'] and master:
+        trajname = f'{pre}complex.{trj_suffix}'
+        mutate_trajectory(trajname, [(f'{pre}{mut.pre}complex.{trj_suffix}',
+                                      _mutant_mdcrd(trajname, norm_sys.complex_prmtop, mut.system.complex_prmtop))
+                                     for mut in mutations])
+
+    return [str(_mutant_mdcrd(None, norm_sys.complex_prmtop, mut.system.complex_prmtop)) for mut in mutations]
 
 
 class Trajectory(object):
@@ -600,9 +525,14 @@ class Trajectory(object):
 
         # We now have to trajin each of the analyzed trajectories
 
+        self.first_frame = None
         for i in range(len(self.traj_files)):
             if traj_starts[i] < 0: continue  # skip -1's
 
+            # Keep where the first analyzed frame is, in case it's needed as reference
+            if self.first_frame is None:
+                self.first_frame = (self.traj_files[i], traj_starts[i])
+
             self.actions.append('trajin %s %d %d %d' % (self.traj_files[i],
                                                         traj_starts[i], traj_ends[i], interval))
 
@@ -675,9 +605,16 @@ class Trajectory(object):
 
     # -#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#
 
-    def rms(self, mask):
-        """ Does an RMS fit around a specific mask """
-        self.actions.append('rmsd %s mass first' % mask)
+    def rms(self, mask, reference=None):
+        """
+        Does an RMS fit around a specific mask. By default it fits to the first
+        frame read, otherwise to frame reference = (traj_file, frame)
+        """
+        if reference is None:
+            self.actions.append('rmsd %s mass first' % mask)
+        else:
+            self.actions.append('reference %s frame %d [fitref]' % reference)
+            self.actions.append('rmsd %s mass ref [fitref]' % mask)
 
     # -#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#
 
@@ -744,3 +681,81 @@ class Trajectory(object):
             self.actions.append(
                 f"outtraj {filename} {filetype} onlyframes {frames} {nobox}"
             )
+
+
+class RestartArchive(object):
+    """
+    Packs the restart files written by cpptraj (one per frame) into a single file
+    per species and rank, plus an index with the offset of every frame. The
+    frames are extracted one by one when they are needed, so we don't keep
+    thousands of small files around.
+
+        archive = RestartArchive('_GMXMMPBSA_inpcrd_0/_GMXMMPBSA_complex.inpcrd')
+        archive.pack(folder_with_restarts)
+        for i in range(len(archive)):
+            archive.extract(i, 'frame.inpcrd')
+    """
+
+    def __init__(self, basename):
+        self.basename = str(basename)
+        self.filename = self.basename + '.pack'
+        self.index_file = self.basename + '.idx'
+        self._index = None
+
+    # -#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#
+
+    def pack(self, folder):
+        """ Packs the restart files of this species found in folder, then removes them """
+        import json
+
+        name = Path(self.basename).name
+        stem = name[:-len('.inpcrd')] if name.endswith('.inpcrd') else name
+
+        # cpptraj keepext writes <stem>.<frame>.inpcrd
+        def frame_number(path):
+            number = path.name[len(stem):-len('.inpcrd')].strip('.')
+            return int(number) if number else 1
+
+        restarts = sorted(Path(folder).glob(f"{stem}.*inpcrd"), key=frame_number)
+        if not restarts:
+            raise TrajError(f'No restart files found for {name} in {folder}')
+
+        frames, offsets = [], [0]
+        with open(self.filename, 'wb') as pack:
+            for restart in restarts:
+                offsets.append(offsets[-1] + pack.write(restart.read_bytes()))
+                frames.append(frame_number(restart))
+                restart.unlink()
+        with open(self.index_file, 'w') as index:
+            json.dump({'frames': frames, 'offsets': offsets}, index)
+        self._index = {'frames': frames, 'offsets': offsets}
+
+    # -#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#
+
+    @property
+    def index(self):
+        if self._index is None:
+            import json
+            with open(self.index_file) as index:
+                self._index = json.load(index)
+        return self._index
+
+    @property
+    def frames(self):
+        """ Frame numbers as written by cpptraj """
+        return self.index['frames']
+
+    def __len__(self):
+        return len(self.index['frames'])
+
+    # -#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#
+
+    def extract(self, i, dest):
+        """ Writes the i-th packed frame to dest """
+        start, end = self.index['offsets'][i], self.index['offsets'][i + 1]
+        with open(self.filename, 'rb') as pack:
+            pack.seek(start)
+            data = pack.read(end - start)
+        with open(dest, 'wb') as restart:
+            restart.write(data)
+        return dest
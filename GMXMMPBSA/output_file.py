@@ -21,22 +21,26 @@ statistics printing.
 #  for more details.                                                           #
 # ##############################################################################
 
-from types import SimpleNamespace
 from GMXMMPBSA import utils
+from GMXMMPBSA.bundle import write_bundle
+from GMXMMPBSA.exceptions import GMXMMPBSA_ERROR, InputError
 from math import sqrt, ceil
 from os import linesep as ls
-import pickle
+import numpy as np
 
 
-def data2pkl(app):
-    info_file = SimpleNamespace(
+def data2bundle(app):
+    """ Writes the results and the run info to the results bundle (COMPACT_MMXSA_RESULTS.mmxsa) """
+    info = dict(
         INPUT=app.INPUT,
-        FILES=app.FILES,
+        FILES=vars(app.FILES),
         size=app.mpi_size,
         numframes=app.numframes,
         numframes_nmode=app.numframes_nmode,
         mutant_index=app.mutant_index,
         mut_str=app.mut_str,
+        mutant_indexes=getattr(app, 'mutant_indexes', []),
+        mut_strs=getattr(app, 'mut_strs', []),
         using_chamber=app.using_chamber,
         input_file=app.input_file_text,
         COM_PDB=''.join(open(app.FILES.complex_fixed).readlines()),
@@ -44,26 +48,20 @@ def data2pkl(app):
         decomp_output_file=''.join(open(app.FILES.decompout).readlines()) if app.INPUT['decomp']['decomprun']
         else None
     )
-
-    with open('COMPACT_MMXSA_RESULTS.mmxsa', "wb") as f:
-        pickle.dump(info_file, f)
-        pickle.dump(app.calc_types, f)
+    write_bundle('COMPACT_MMXSA_RESULTS.mmxsa', info, app.calc_types)
 
 
 def write_outputs(app):
     """ Writes stability or binding output file """
-    import csv
     # Load some objects into top-level name space
     FILES = app.FILES
     INPUT = app.INPUT
     mut_str = app.mut_str
-    prmtop_system = app.normal_system
     stability = app.stability
 
     # Open the energy vector CSV output file if we are writing one
     if FILES.energyout:
-        ene_csv = open(FILES.energyout, 'w')
-        energyvectors = csv.writer(ene_csv, dialect='excel')
+        energyvectors = EnergyVectorWriter(FILES.energyout)
 
     # Open the file and write some initial data to it
     final_output = OutputFile(FILES.output_file, 'w')
@@ -74,9 +72,8 @@ def write_outputs(app):
         final_output.add_comment('')
         final_output.add_comment('Receptor mask:                  "%s"' % INPUT['general']['receptor_mask'])
         final_output.add_comment('Ligand mask:                    "%s"' % INPUT['general']['ligand_mask'])
-        if prmtop_system.ligand_prmtop.ptr('nres') == 1:
-            final_output.add_comment('Ligand residue name is:         "%s"' %
-                                     prmtop_system.ligand_prmtop.parm_data['RESIDUE_LABEL'][0])
+        if len(app.ligand_residues) == 1:
+            final_output.add_comment('Ligand residue name is:         "%s"' % app.ligand_residues[0])
     final_output.add_comment('')
     final_output.add_comment('Calculations performed using %s complex frames' % app.numframes)
     if INPUT['nmode']['nmoderun']:
@@ -86,8 +83,11 @@ def write_outputs(app):
             final_output.add_comment('Interaction Entropy calculations performed using last %s frames' %
                                      ceil(app.numframes * (INPUT['general']['ie_segment'] / 100)))
         if INPUT['general']['c2_entropy']:
-            final_output.add_comment('C2 Entropy Std. Dev. and Conf. Interv. (95%) have been obtained by '
-                                     'bootstrapping with number of re-samplings = 2000')
+            final_output.add_comment('C2 Entropy Std. Dev. and Conf. Interv. (95%%) have been obtained by '
+                                     'bootstrapping with number of re-samplings = %s, block length = %s and '
+                                     'seed = %s' % (INPUT['general'].get('c2_samples', 2000),
+                                                    INPUT['general'].get('c2_block', 1),
+                                                    INPUT['general'].get('c2_seed', -1)))
     if INPUT['pb']['pbrun']:
         if INPUT['pb']['sander_apbs']:
             final_output.add_comment('Poisson Boltzmann calculations performed using iAPBS interface to sander '
@@ -239,7 +239,7 @@ def write_outputs(app):
             final_output.add_section(nm_sys_norm.summary_output())
             # Now dump the energy vectors in CSV format
             if FILES.energyout:
-                energyvectors.writerow(['NMODE entropy results'])
+                energyvectors.title('NMODE entropy results')
                 nm_sys_norm._print_vectors(energyvectors)
                 energyvectors.writerow([])
 
@@ -253,7 +253,7 @@ def write_outputs(app):
             final_output.add_section(nm_sys_mut.summary_output())
             # Now dump the energy vectors in CSV format
             if FILES.energyout:
-                energyvectors.writerow([mut_str + ' Mutant NMODE entropy results'])
+                energyvectors.title(mut_str + ' Mutant NMODE entropy results')
                 nm_sys_mut._print_vectors(energyvectors)
                 energyvectors.writerow([])
 
@@ -289,7 +289,7 @@ def write_outputs(app):
             final_output.add_section(sys_norm.summary_output())
             # Dump energy vectors to a CSV
             if FILES.energyout:
-                energyvectors.writerow([headers[i].strip()])
+                energyvectors.title(headers[i].strip())
                 sys_norm._print_vectors(energyvectors)
                 energyvectors.writerow([])
 
@@ -329,7 +329,7 @@ def write_outputs(app):
             final_output.add_section(sys_mut.summary_output())
             # Dump energy vectors to a CSV
             if FILES.energyout:
-                energyvectors.writerow([mut_str + ' Mutant ' + headers[i]])
+                energyvectors.title(mut_str + ' Mutant ' + headers[i])
                 sys_mut._print_vectors(energyvectors)
                 energyvectors.writerow([])
 
@@ -388,8 +388,55 @@ def write_outputs(app):
 
     # end for solv in ['gbrun', 'pbrun', ...]
 
+    # All the mutations of the alanine scanning side by side
+    if INPUT['ala']['alarun'] and not INPUT['ala']['mutant_only'] and len(app.calc_types.scan) > 1:
+        final_output.add_section(scan_summary(app))
+
     if FILES.energyout:
-        ene_csv.close()
+        energyvectors.close()
+
+
+def scan_summary(app):
+    """ Returns the ΔΔH and ΔΔG (Mutant - Normal) table of every mutation and model of the alanine scanning """
+    INPUT = app.INPUT
+    stability = app.stability
+    part = 'complex' if stability else 'delta'
+    models = {'gb': 'GB', 'pb': 'PB', 'rism std': '3D-RISM', 'rism gf': '3D-RISM (GF)', 'rism pcplus': '3D-RISM (PC+)',
+              'gbnsr6': 'GBNSR6'}
+    entropies = []
+    if INPUT['general']['qh_entropy']:
+        entropies.append(('qh', 'ΔΔG (QH)'))
+    if not stability:
+        if INPUT['general']['interaction_entropy']:
+            entropies.append(('ie', 'ΔΔG (IE)'))
+        if INPUT['general']['c2_entropy']:
+            entropies.append(('c2', 'ΔΔG (C2)'))
+    if INPUT['nmode']['nmoderun']:
+        entropies.append(('nmode', 'ΔΔG (NM)'))
+
+    header = f"{'Mutation':<24}{'Model':<16}{'ΔΔH':>9}{'SD':>9}{'SEM':>9}" + ''.join(f'{name:>12}' for _, name in
+                                                                                 entropies)
+    text = [f'ALANINE SCANNING SUMMARY ({len(app.calc_types.scan)} mutations, Mutant - Normal):', '', header,
+            '-' * len(header)]
+    for label, scan in app.calc_types.scan.items():
+        for key, model in models.items():
+            if key not in scan.mut_norm:
+                continue
+            ddh = scan.mut_norm[key][part]['TOTAL']
+            ddh_avg = ddh.mean()
+            row = f'{label:<24}{model:<16}{ddh_avg:>9.2f}{ddh.std():>9.2f}{ddh.sem():>9.2f}'
+            for entropy, _ in entropies:
+                if entropy == 'qh':
+                    ddg = ddh_avg + scan.mut_norm['qh'][part]['TOTAL']
+                elif entropy == 'ie':
+                    ddg = ddh_avg + scan.mut_norm['ie'][key]['iedata'].mean()
+                elif entropy == 'nmode':
+                    ddg = ddh_avg + scan.mut_norm['nmode'][part]['TOTAL'].mean()
+                else:
+                    ddg = ddh_avg + scan.mut_norm['c2'][key]['c2data']
+                row += f'{ddg:>12.2f}'
+            text.append(row)
+    return '\n'.join(text) + '\n'
 
 
 def write_decomp_output(app):
@@ -423,8 +470,7 @@ def write_decomp_output(app):
 
     # Open up the CSV energy vector file
     if FILES.dec_energies:
-        dec_energies_f = open(FILES.dec_energies, 'w')
-        dec_energies = writer(dec_energies_f)
+        dec_energies = EnergyVectorWriter(FILES.dec_energies)
 
     for i, key in enumerate(outkeys):
         # if triggers[i] not in INPUT or not INPUT[triggers[i]]:
@@ -444,16 +490,16 @@ def write_decomp_output(app):
 
             # Now it's time to dump everything to the CSV file
             if FILES.dec_energies:
-                dec_energies.writerow([headers[i] + '\n'])
-                dec_energies.writerow(['Complex:'])
+                dec_energies.title(headers[i] + '\n')
+                dec_energies.title('Complex:', 1)
                 app.calc_types.decomp_normal[key]['complex']._print_vectors(dec_energies)
                 if not stability:
                     dec_energies.writerow(['\n'])
-                    dec_energies.writerow(['Receptor:'])
+                    dec_energies.title('Receptor:', 1)
                     app.calc_types.decomp_normal[key]['receptor']._print_vectors(dec_energies)
-                    dec_energies.writerow(['Ligand:'])
+                    dec_energies.title('Ligand:', 1)
                     app.calc_types.decomp_normal[key]['ligand']._print_vectors(dec_energies)
-                    dec_energies.writerow(['DELTAS:'])
+                    dec_energies.title('DELTAS:', 1)
                     app.calc_types.decomp_normal[key]['delta']._print_vectors(dec_energies)
                 dec_energies.writerow('\n')
         # Mutant system
@@ -470,27 +516,140 @@ def write_decomp_output(app):
                 decompout.writeline(decomp_mut.summary())
             # Now it's time to dump everything to the CSV file
             if FILES.dec_energies:
-                dec_energies.writerow([headers[i] + '(%s mutant)\n' % app.mut_str])
-                dec_energies.writerow(['Complex:'])
+                dec_energies.title(headers[i] + '(%s mutant)\n' % app.mut_str)
+                dec_energies.title('Complex:', 1)
                 app.calc_types.decomp_mutant[key]['complex']._print_vectors(dec_energies)
                 if not stability:
                     dec_energies.writerow(['\n'])
-                    dec_energies.writerow(['Receptor:'])
+                    dec_energies.title('Receptor:', 1)
                     app.calc_types.decomp_mutant[key]['receptor']._print_vectors(dec_energies)
                     dec_energies.writerow(['\n'])
-                    dec_energies.writerow(['Ligand:'])
+                    dec_energies.title('Ligand:', 1)
                     app.calc_types.decomp_mutant[key]['ligand']._print_vectors(dec_energies)
                     dec_energies.writerow(['\n'])
-                    dec_energies.writerow(['DELTAS:'])
+                    dec_energies.title('DELTAS:', 1)
                     app.calc_types.decomp_mutant[key]['delta']._print_vectors(dec_energies)
                 dec_energies.writerow(['\n'])
 
     # Close the file(s)
     if FILES.dec_energies:
-        dec_energies_f.close()
+        dec_energies.close()
     dec_out_file.close()
 
 
+class EnergyVectorWriter:
+    """
+    Writer of the per-frame energy vectors (-eo and -deo files). The format is chosen from the file name:
+        .csv or .tsv: comma- or tab-separated values, optionally compressed with gzip (.csv.gz) or zstd (.csv.zst)
+        .parquet: a long-format table (Section, Frame, Residue, Residue 2, Term, Energy) with the full precision
+                  values, that can be loaded with pandas.read_parquet
+    The _print_vectors methods write the title and blank rows with writerow and title, and the energies by blocks
+    with writeblock, which formats a whole block of rows at once instead of a csv.writer call per row
+    """
+    # rows formatted at once
+    block_size = 2 ** 16
+    columns = ('Section', 'Frame', 'Residue', 'Residue 2', 'Term', 'Energy')
+
+    def __init__(self, fname):
+        import csv
+        self.fname = str(fname)
+        self.titles = []
+        self.parquet = None
+        name = self.fname.lower()
+        if name.endswith('.parquet'):
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                GMXMMPBSA_ERROR('pyarrow is required to write the energy vectors in Parquet format. Install it or '
+                                'use a .csv or .tsv file', InputError)
+            self.pa = pyarrow
+            string = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+            self.schema = pyarrow.schema([('Section', string), ('Frame', pyarrow.int64()), ('Residue', string),
+                                          ('Residue 2', string), ('Term', string), ('Energy', pyarrow.float64())])
+            self.parquet = pyarrow.parquet.ParquetWriter(self.fname, self.schema)
+            return
+        if name.endswith('.gz'):
+            import gzip
+            self.file = gzip.open(self.fname, 'wt', newline='')
+            name = name[:-3]
+        elif name.endswith('.zst'):
+            try:
+                import zstandard
+            except ImportError:
+                GMXMMPBSA_ERROR('zstandard is required to write zstd-compressed energy vectors. Install it or use '
+                                'a .gz file', InputError)
+            self.file = zstandard.open(self.fname, 'wt', newline='')
+            name = name[:-4]
+        else:
+            self.file = open(self.fname, 'w', newline='')
+        self.delimiter = '\t' if name.endswith('.tsv') else ','
+        self.csvwriter = csv.writer(self.file, dialect='excel-tab' if self.delimiter == '\t' else 'excel')
+
+    def writerow(self, row):
+        """ Writes a row as is (blank rows, separators). Ignored in Parquet """
+        if self.parquet is None:
+            self.csvwriter.writerow(row)
+
+    def title(self, text, level=0):
+        """ Writes a title. The titles of every level, up to this one, are the Section of the next blocks """
+        del self.titles[level:]
+        self.titles.append(text.strip())
+        self.writerow([text])
+
+    def writeblock(self, header, labels, values, write_header=True):
+        """
+        Writes a block of rows
+        Args:
+            header: names of the label columns and the terms
+            labels: label columns (frame and residues), with a value per row
+            values: energies (row x term)
+            write_header: False when the block continues the previous one
+        """
+        values = np.asarray(values, dtype=float)
+        labels = [column.tolist() if isinstance(column, np.ndarray) else column for column in labels]
+        if self.parquet is not None:
+            self._write_table(header[len(labels):], labels, values)
+            return
+        # rounded as the values printed so far, so the half-way cases don't change
+        values = np.round(values, 2)
+        if write_header:
+            self.csvwriter.writerow(header)
+        d = self.delimiter
+        nterms = values.shape[1]
+        prefixes = [d.join(map(str, row)) + d for row in zip(*labels)]
+        for start in range(0, len(prefixes), self.block_size):
+            # the floats are written as the csv writer does (repr: 1.0, -12.3, -0.0), with its line terminator
+            fields = list(map(repr, values[start:start + self.block_size].ravel().tolist()))
+            self.file.write(''.join(prefix + d.join(fields[i * nterms:(i + 1) * nterms]) + '\r\n'
+                                    for i, prefix in enumerate(prefixes[start:start + self.block_size])))
+
+    def _write_table(self, terms, labels, values):
+        pa = self.pa
+        nrows, nterms = values.shape
+
+        def strings(column, repeat=1):
+            if column is None:
+                return pa.DictionaryArray.from_arrays(pa.nulls(nrows * repeat, pa.int32()), pa.array([], pa.string()))
+            names, indices = np.unique(np.asarray(column, dtype=str), return_inverse=True)
+            return pa.DictionaryArray.from_arrays(np.repeat(indices.astype(np.int32), repeat), names.tolist())
+
+        residues = list(labels[1:]) + [None] * (3 - len(labels))
+        section = ' > '.join(self.titles)
+        table = pa.Table.from_arrays(
+            [strings([section] * nrows, nterms), pa.array(np.repeat(np.asarray(labels[0], dtype=np.int64), nterms)),
+             strings(residues[0], nterms), strings(residues[1], nterms),
+             pa.DictionaryArray.from_arrays(np.tile(np.arange(nterms, dtype=np.int32), nrows), list(terms)),
+             pa.array(values.ravel())], schema=self.schema)
+        self.parquet.write_table(table)
+
+    def close(self):
+        if self.parquet is not None:
+            self.parquet.close()
+        else:
+            self.file.close()
+
+
 class OutputFile(object):
     """ Main output file """
 
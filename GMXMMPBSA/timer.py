@@ -85,6 +85,15 @@ class Timer(object):
 
     # -#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#
 
+    def add_time(self, timer_name, seconds):
+        """ Adds time measured elsewhere to the specified timer """
+        if not timer_name in self.timer_names:
+            self.add_timer(timer_name, '%s timer' % timer_name)
+
+        self.timers[timer_name] += seconds
+
+    # -#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#-#
+
     def end_all(self):
         """ End all of the timers """
         while len(self.active_timers) > 0:
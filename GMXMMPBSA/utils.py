@@ -158,6 +158,72 @@ def get_corrstd(val1, val2):
     return sqrt(val1 ** 2 + val2 ** 2 - 2 * val1 * val2)
 
 
+class EnergyTable:
+    """
+    Columnar storage of the energy terms: a 2-D float array with a row per term and a column per frame, so every term
+    is an EnergyVector view of its row. The composite terms (the sum of their components) are computed on demand and
+    cached, the statistics are memoized per frame window, and window() returns a table with a view of the frames
+    instead of a copy
+    """
+
+    def __init__(self, keys, numframes=0, composites=None):
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        # composite term -> components, in the order they are added
+        self.composites = composites or {}
+        self.values = np.zeros((len(self.keys), numframes))
+        # frames of the parent table as (start, number of frames, step)
+        self.frames = (0, numframes, 1)
+        self._vectors = {}
+        # shared by all the windows of a table
+        self._stats = {}
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    def __getstate__(self):
+        # the caches are rebuilt on demand
+        return dict(self.__dict__, _vectors={}, _stats={})
+
+    def vector(self, key):
+        """ Returns the term key as an EnergyVector. The composite terms keep the propagated standard deviation """
+        if key in self.index:
+            return self.values[self.index[key]].view(EnergyVector)
+        if key not in self._vectors:
+            total = EnergyVector(len(self))
+            for component in self.composites[key]:
+                # Same as the sum of EnergyVectors (component + total), without computing the std of total every time
+                component = self.vector(component)
+                total_std = total.com_std or float(total.std())
+                total = EnergyVector(np.add(component, total), get_std(float(component.std()), total_std))
+            self._vectors[key] = total
+        return self._vectors[key]
+
+    def stats(self, key):
+        """ Returns the average, SD(Prop.), SD, SEM(Prop.) and SEM of the term key in this window """
+        if (key, self.frames) not in self._stats:
+            vector = self.vector(key)
+            self._stats[(key, self.frames)] = (float(vector.mean()), float(vector.stdev()), float(vector.std()),
+                                               float(vector.semp()), float(vector.sem()))
+        return self._stats[(key, self.frames)]
+
+    def reset(self):
+        """ Clears the cached composite terms and statistics after the values change """
+        self._vectors.clear()
+        self._stats.clear()
+
+    def window(self, start=None, end=None, interval=None):
+        """ Returns a table with a view of the frames start:end:interval, sharing the memoized statistics """
+        frames = range(self.frames[0], self.frames[0] + self.frames[1] * self.frames[2],
+                       self.frames[2])[start:end:interval]
+        table = object.__new__(self.__class__)
+        table.__dict__.update(self.__dict__)
+        table.values = self.values[:, start:end:interval]
+        table.frames = (frames.start, len(frames), frames.step)
+        table._vectors = {}
+        return table
+
+
 def calc_sum(vector1, vector2, mut=False) -> (float, float):
     """
     Calculate the mean and std of the two vector/numbers sum
@@ -708,6 +774,7 @@ def remove(flag, fnpre='_GMXMMPBSA_'):
                     bool(re.match('#?(COM|REC|LIG|MUT_COM|MUT_REC|MUT_LIG)_traj_(\d)\.xtc', fil)) or
                     fil == 'COMPACT_MMXSA_RESULTS.mmxsa' or
                     fil in other_files or
+                    bool(re.match(r'MUT\d+_(COM|REC|LIG)\.prmtop$', fil)) or
                     fil in result_files):
                 if Path(fil).is_dir():
                     shutil.rmtree(fil)
@@ -718,10 +785,30 @@ def remove(flag, fnpre='_GMXMMPBSA_'):
         for fil in allfiles:
 
             if fil.startswith(fnpre) or bool(re.match('#?(COM|REC|LIG|MUT_COM|MUT_REC|MUT_LIG)_traj_(\d)\.xtc',
-                                                      fil)) or fil in other_files:
+                                                      fil)) or fil in other_files or bool(
+                    re.match(r'MUT\d+_(COM|REC|LIG)\.prmtop$', fil)):
                 os.remove(fil)
 
 
+def get_scratch_dir():
+    """
+    Returns a node-local folder (tmpfs if available) for short-lived files, so they
+    don't hit the metadata server of shared file systems. None means the default
+    temporary folder
+    """
+    shm = Path('/dev/shm')
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm.as_posix()
+
+
+def mutant_prefix(index):
+    """
+    Returns the prefix of the intermediate files of the index-th mutation of the
+    alanine scanning. The first one keeps the name used for a single mutation
+    """
+    return 'mutant_' if index == 0 else f'mutant{index + 1}_'
+
+
 def find_progs(INPUT, mpi_size=0):
     """ Find the necessary programs based in the user INPUT """
     # List all of the used programs with the conditions that they are needed
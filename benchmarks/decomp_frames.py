@@ -0,0 +1,246 @@
+"""
+Benchmark and equivalence check of the decomposition DataFrames of the API (MMPBSA_API.get_decomp_energy and the
+level 3 chart data of _setup_data).
+
+Synthetic per-residue and pairwise decomposition results are built in memory for every number of residues, and their
+DataFrames are built with the API.py of this tree and with a reference version of it, which by default is the one
+before _decomp_block was added, when the frames were flattened column by column (taken from the git history). The
+DataFrames must be equal (rtol 1e-9), and the time of both is printed
+
+Usage:
+    python benchmarks/decomp_frames.py [-r 100 300 600] [-n FRAMES] [--pair-frames FRAMES] [--band BAND]
+                                       [--reference REVISION_OR_FILE] [--no-reference]
+
+The exit status is 1 if any DataFrame is different
+"""
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#   This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+import argparse
+import importlib.util
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+REPO = Path(__file__).resolve().parents[1]
+sys.path.insert(0, REPO.as_posix())
+
+from GMXMMPBSA import API, amber_outputs
+
+
+def reference_module(reference):
+    """
+    Loads the reference API from a file or from a git revision of this repository. By default, the revision before
+    _decomp_block was added
+    """
+    if Path(reference or '').is_file():
+        fname = Path(reference)
+    else:
+        if not reference:
+            commits = subprocess.run(['git', '-C', REPO, 'log', '--format=%H', '--reverse', '-S', 'def _decomp_block',
+                                      '--', 'GMXMMPBSA/API.py'], capture_output=True, text=True,
+                                     check=True).stdout.split()
+            if not commits:
+                sys.exit('_decomp_block is not in the git history. Use --reference')
+            reference = f'{commits[0]}^'
+        source = subprocess.run(['git', '-C', REPO, 'show', f'{reference}:GMXMMPBSA/API.py'],
+                                capture_output=True, text=True, check=True).stdout
+        fname = Path(tempfile.mkdtemp()).joinpath('API.py')
+        fname.write_text(source)
+    print(f'Reference API: {reference or fname}')
+    # inside the GMXMMPBSA package, so its relative imports work
+    spec = importlib.util.spec_from_file_location('GMXMMPBSA._reference_API', fname)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def decomp_input(idecomp, frames):
+    return {'general': {'temperature': 298.15, 'startframe': 1, 'endframe': frames, 'interval': 1},
+            'decomp': {'idecomp': idecomp, 'dec_verbose': 0, 'pair_threshold': 0, 'pair_memory': 4096}}
+
+
+def residue_output(mol, residues, frames, INPUT, rng):
+    """ Per-residue decomposition (TDC) with a few residues of high contribution """
+    output = amber_outputs.DecompOut(mol)
+    output.allowed_tokens = ('TDC',)
+    output.residues = list(residues)
+    output.numframes = frames
+    output.INPUT = INPUT
+    output.array = np.zeros((1, frames, len(residues), 6))
+    output.array[..., :5] = rng.normal(0, 1, (1, frames, len(residues), 5)) * rng.uniform(0, 3, len(residues))[:, None]
+    output.num_terms = len(residues)
+    output._fill_composite_terms()
+    return output
+
+
+def pair_output(mol, residues, frames, INPUT, rng, band=None, pairs=None):
+    """
+    Pairwise decomposition (TDC) of the pairs of residues closer than band in the sequence (all of them if band is
+    None), or of pairs
+    """
+    output = amber_outputs.PairDecompOut(mol)
+    output.allowed_tokens = ('TDC',)
+    output.residues = list(residues)
+    output.numframes = frames
+    output.INPUT = INPUT
+    output.surften = 0.0072
+    n = len(residues)
+    if pairs is None:
+        i, j = np.divmod(np.arange(n * n), n)
+        keep = np.abs(i - j) <= (band or n)
+        i, j = i[keep], j[keep]
+    else:
+        index = {res: k for k, res in enumerate(residues)}
+        i = np.array([index[a] for a, b in pairs], dtype=int)
+        j = np.array([index[b] for a, b in pairs], dtype=int)
+    output.indptr = np.r_[0, np.cumsum(np.bincount(i, minlength=n))]
+    output.indices = j
+    weight = np.where(np.abs(i - j) < 3, 5, 0.3)[:, None]
+    output.array = np.round(rng.normal(0, 1, (1, frames, len(i), 5)) * weight, 3).astype(np.float32)
+    output.num_terms = len(i)
+    output._fill_composite_terms()
+    return output
+
+
+def results(kind, nres, frames, band, seed=0):
+    """ Info namespace and data of a synthetic decomposition (complex, receptor, ligand and delta) """
+    rng = np.random.default_rng(seed)
+    nlig = max(5, nres // 10)
+    names = ([f'R:A:ALA:{i}' for i in range(1, nres - nlig + 1)] +
+             [f'L:B:LIG:{i}' for i in range(nres - nlig + 1, nres + 1)])
+    rec, lig = names[:nres - nlig], names[nres - nlig:]
+    if kind == 'per-residue':
+        INPUT = decomp_input(1, frames)
+        com = residue_output('complex', names, frames, INPUT, rng)
+        decomp = {'complex': com, 'receptor': residue_output('receptor', rec, frames, INPUT, rng),
+                  'ligand': residue_output('ligand', lig, frames, INPUT, rng)}
+        decomp['delta'] = amber_outputs.DecompBinding(decomp['complex'], decomp['receptor'], decomp['ligand'], INPUT,
+                                                      'delta')
+    else:
+        INPUT = decomp_input(3, frames)
+        com = pair_output('complex', names, frames, INPUT, rng, band)
+        labels = com.pair_labels()
+        in_rec, in_lig = set(rec), set(lig)
+        decomp = {'complex': com,
+                  'receptor': pair_output('receptor', rec, frames, INPUT, rng,
+                                          pairs=[p for p in labels if p[0] in in_rec and p[1] in in_rec]),
+                  'ligand': pair_output('ligand', lig, frames, INPUT, rng,
+                                        pairs=[p for p in labels if p[0] in in_lig and p[1] in in_lig])}
+        decomp['delta'] = amber_outputs.PairDecompBinding(decomp['complex'], decomp['receptor'], decomp['ligand'],
+                                                          INPUT, 'delta')
+    info = SimpleNamespace(INPUT=INPUT, FILES=SimpleNamespace(stability=False), numframes=frames, numframes_nmode=0,
+                           size=1, INFO={'mut_str': ''})
+    data = {'normal': {}, 'mutant': {}, 'mut_norm': {}, 'decomp_normal': {'gb': decomp}, 'decomp_mutant': {}}
+    return info, data
+
+
+def api(module, info, data):
+    mmpbsa = module.MMPBSA_API()
+    mmpbsa.setting_time()
+    mmpbsa.app_namespace = info
+    mmpbsa.data = data
+    mmpbsa.frames = {i: i for i in range(1, info.numframes + 1)}
+    mmpbsa.nmframes = {}
+    return mmpbsa
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def equal(ref, cur):
+    """ Compares the results of get_decomp_energy (nested dicts of maps and DataFrames) """
+    if isinstance(ref, dict):
+        return list(ref) == list(cur) and all(equal(ref[key], cur[key]) for key in ref)
+    if isinstance(ref, pd.DataFrame):
+        try:
+            pd.testing.assert_frame_equal(ref, cur, check_exact=False, rtol=1e-9)
+        except AssertionError:
+            return False
+        return True
+    return ref == cur
+
+
+def chart_data(module, frame, index, folder):
+    """ Level 3 chart data of the delta TDC of a pairwise decomposition """
+    memory = dict(inmemory=True, temp_path=folder)
+    return module._setup_data(frame, 3, name='TDC', index=index, memory=memory, id=('delta',))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('-r', '--residues', type=int, nargs='+', default=[100, 300, 600],
+                        help='number of residues of each system')
+    parser.add_argument('-n', '--frames', type=int, default=1000, help='frames of the per-residue decomposition')
+    parser.add_argument('--pair-frames', type=int, default=200, help='frames of the pairwise decomposition')
+    parser.add_argument('--band', type=int, default=20, help='only the pairs of residues closer than this in the '
+                                                             'sequence are stored, as in a real complex')
+    parser.add_argument('--reference', help='API.py file or git revision of the reference API')
+    parser.add_argument('--no-reference', action='store_true', help='only time the API of this tree')
+    args = parser.parse_args()
+
+    reference = None if args.no_reference else reference_module(args.reference)
+    folder = Path(tempfile.mkdtemp())
+    warnings.simplefilter('ignore')
+    failed = False
+    print(f'{"decomposition":12s} {"residues":>8s} {"frames":>6s} {"columns":>8s} {"reference":>10s} '
+          f'{"current":>10s} {"speed-up":>9s}  DataFrames')
+    for kind in ('per-residue', 'pairwise'):
+        frames = args.frames if kind == 'per-residue' else args.pair_frames
+        for nres in args.residues:
+            info, data = results(kind, nres, frames, args.band)
+            options = dict(res_threshold=0)
+            cur, tcur = timed(lambda: api(API, info, data).get_decomp_energy(**options))
+            ncols = sum(frame.shape[1] for frame in cur['data']['normal'].values())
+            if reference:
+                ref, tref = timed(lambda: api(reference, info, data).get_decomp_energy(**options))
+                same = equal(ref, cur)
+                failed |= not same
+                times = f'{tref:9.2f}s {tcur:9.2f}s {tref / tcur:8.1f}x  {"equal" if same else "DIFFERENT"}'
+            else:
+                times = f'{"":>10s} {tcur:9.2f}s'
+            print(f'{kind:12s} {nres:8d} {frames:6d} {ncols:8d} {times}')
+            if kind == 'pairwise':
+                frame = cur['data']['normal']['gb']['delta']['TDC']
+                index = list(cur['map']['normal']['gb']['delta']['TDC'])
+                chart, tcur = timed(lambda: chart_data(API, frame, index, folder))
+                if reference:
+                    ref_chart, tref = timed(lambda: chart_data(reference, frame, index, folder))
+                    same = all(equal(ref_chart[key][0], chart[key][0])
+                               for key in ('line_plot_data', 'bar_plot_data', 'heatmap_plot_data'))
+                    failed |= not same
+                    times = f'{tref:9.2f}s {tcur:9.2f}s {tref / tcur:8.1f}x  {"equal" if same else "DIFFERENT"}'
+                else:
+                    times = f'{"":>10s} {tcur:9.2f}s'
+                print(f'{"  _setup_data(3)":37s} {times}')
+    sys.exit(int(failed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Benchmark and equivalence check of the parser of the Amber energy outputs (amber_outputs.MdoutBlock).
+
+Synthetic sander outputs (GB, GB with CHAMBER terms, GBNSR6, PB with every ipb/inp variant, QM/MM and RISM) are parsed
+with the amber_outputs module of this tree and with a reference version of it, which by default is the line by line
+parser that MdoutBlock replaced (taken from the git history). Every energy term must be identical, except for the
+bugs fixed by MdoutBlock (listed in FIXED). The time of both parsers is printed for every output
+
+Usage:
+    python benchmarks/mdout_parser.py [-n FRAMES] [-r REPEAT] [--reference REVISION_OR_FILE] [--keep DIR]
+
+The exit status is 1 if any energy term is different
+"""
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#   This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+import argparse
+import importlib.util
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from copy import deepcopy
+from pathlib import Path
+
+import numpy as np
+
+REPO = Path(__file__).resolve().parents[1]
+sys.path.insert(0, REPO.as_posix())
+
+from GMXMMPBSA import amber_outputs
+
+INPUT = {'pb': {'sander_apbs': 0, 'ipb': 2, 'inp': 2},
+         'general': {'temperature': 298.15, 'startframe': 1, 'interval': 1},
+         'gb': {'surften': 0.0072, 'surfoff': 0.0}, 'nmode': {}}
+
+# Bugs of the reference parser fixed by MdoutBlock. {class: (description, terms that differ)}
+FIXED = {'MMout': ('the reference never advanced frame_idx, so it kept only the last frame', None),
+         'PolarRISM_std_Out': ('the reference read 1-4 VDW from the 1-4 EEL column', ['1-4 VDW'])}
+
+
+def reference_module(reference):
+    """
+    Loads the reference amber_outputs from a file or from a git revision of this repository. By default, the revision
+    before MdoutBlock was added
+    """
+    if Path(reference or '').is_file():
+        fname = Path(reference)
+    else:
+        if not reference:
+            commits = subprocess.run(['git', '-C', REPO, 'log', '--format=%H', '--reverse', '-S', 'class MdoutBlock',
+                                      '--', 'GMXMMPBSA/amber_outputs.py'], capture_output=True, text=True,
+                                     check=True).stdout.split()
+            if not commits:
+                sys.exit('MdoutBlock is not in the git history. Use --reference')
+            reference = f'{commits[0]}^'
+        source = subprocess.run(['git', '-C', REPO, 'show', f'{reference}:GMXMMPBSA/amber_outputs.py'],
+                                capture_output=True, text=True, check=True).stdout
+        fname = Path(tempfile.mkdtemp()).joinpath('amber_outputs.py')
+        fname.write_text(source)
+    print(f'Reference parser: {reference or fname}')
+    # inside the GMXMMPBSA package, so its relative imports work
+    spec = importlib.util.spec_from_file_location('GMXMMPBSA._reference_amber_outputs', fname)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_sander(fname, frames, seed, chamber=False, extra=None):
+    """ sander minimization output with a single step (like the mmpbsa_py_energy ones) """
+    rng = random.Random(seed)
+    with open(fname, 'w') as f:
+        f.write('\n          -------------------------------------------------------\n'
+                '          Amber 20 SANDER                              2020\n' + 'header line\n' * 200)
+        for i in range(frames):
+            v = [rng.uniform(-20000, 20000) for _ in range(12)]
+            f.write(f'minimizing coord set #{i + 1:6d}\n\n\n'
+                    '   NSTEP       ENERGY          RMS            GMAX         NAME    NUMBER\n'
+                    '      1      -5.0429E+03     1.4426E+01     9.8211E+01     OD2      1234\n\n')
+            f.write(f' BOND    = {v[0]:13.4f}  ANGLE   = {v[1]:13.4f}  DIHED      = {v[2]:13.4f}\n')
+            if chamber:
+                f.write(f' UB      = {v[9]:13.4f}  IMP     = {v[10]:13.4f}  CMAP       = {v[11]:13.4f}\n')
+            f.write(f' VDWAALS = {v[3]:13.4f}  EEL     = {v[4]:13.4f}  EGB        = {v[5]:13.4f}\n')
+            f.write(f' 1-4 VDW = {v[6]:13.4f}  1-4 EEL = {v[7]:13.4f}  RESTRAINT  =        0.0000\n')
+            if extra:
+                f.write(extra(v))
+            f.write(' minimization completed, ENE= -.50429E+04  RMS= 0.144E+02\n\n')
+
+
+def write_surf(fname, frames, seed):
+    """ cpptraj surface output """
+    rng = random.Random(seed)
+    with open(fname, 'w') as f:
+        f.write('#Frame surf\n' + ''.join(f'{i + 1} {rng.uniform(1e3, 5e3):.4f}\n' for i in range(frames)))
+
+
+def write_rism(fname, frames, seed, gf='', polar=False):
+    """ 3D-RISM output """
+    rng = random.Random(seed)
+    with open(fname, 'w') as f:
+        f.write('header line\n' * 50)
+        for _ in range(frames):
+            v = [rng.uniform(-1e4, 1e4) for _ in range(11)]
+            epot = ' '.join(f'{x:16.8f}' for x in v[:8])
+            f.write(f'|  solute_epot       {epot}\nsolute_epot       {epot}\n')
+            f.write(f'rism_excessChemicalPotential{gf}   {v[8]:16.8f}  {v[9]:12.5f}\n')
+            if not gf:
+                f.write(f'rism_excessChemicalPotentialGF   {v[9]:16.8f}  {v[9]:12.5f}\n')
+            if polar:
+                f.write(f'rism_polarExcessChemicalPotential{gf}   {v[9]:16.8f}\n'
+                        f'rism_apolarExcessChemicalPotential{gf}   {v[10]:16.8f}\n')
+
+
+def outputs(folder: Path, frames):
+    """
+    Writes the synthetic outputs to folder
+    :return: list of (name, class name, basename, number of files, frames per file, chamber, INPUT changes)
+    """
+    esurf = lambda v: f' ESURF   = {v[8]:13.4f}\n'
+    enpolar = lambda v: f' ENPOLAR = {v[8]:13.4f}  EDISPER = {v[9]:13.4f}\n'
+    files = {'gb': dict(), 'chgb': dict(chamber=True), 'ns': dict(extra=esurf), 'pb': dict(extra=enpolar),
+             'qm_dftbgb': dict(extra=lambda v: f' DFTBESCF= {v[8]:13.4f}\n'),
+             'qm_gb': dict(extra=lambda v: f' ESCF    = {v[8]:13.4f}\n')}
+    for seed, (name, kwargs) in enumerate(files.items()):
+        write_sander(folder.joinpath(f'{name}.mdout.0'), frames, seed, **kwargs)
+        if name.endswith('gb'):
+            write_surf(folder.joinpath(f'{name}_surf.dat.0'), frames, seed)
+    # a second rank file
+    write_sander(folder.joinpath('gb.mdout.1'), frames, len(files))
+    write_surf(folder.joinpath('gb_surf.dat.1'), frames, len(files))
+    write_rism(folder.joinpath('rism.mdout.0'), frames, 0)
+    write_rism(folder.joinpath('rismgf.mdout.0'), frames, 1, gf='GF')
+    write_rism(folder.joinpath('prism.mdout.0'), frames, 2, polar=True)
+    path = lambda name: folder.joinpath(name).as_posix()
+    return [('GB, 2 files', 'GBout', path('gb.mdout'), 2, frames, False, {}),
+            ('GB, CHAMBER', 'GBout', path('chgb.mdout'), 1, frames, True, {}),
+            ('MM, CHAMBER', 'MMout', path('chgb.mdout'), 1, frames, True, {}),
+            ('GBNSR6', 'GBNSR6out', path('ns.mdout'), 1, frames, False, {}),
+            ('PB, ipb=2 inp=2', 'PBout', path('pb.mdout'), 1, frames, False, {}),
+            ('PB, ipb=2 inp=1', 'PBout', path('pb.mdout'), 1, frames, False, {'inp': 1}),
+            ('PB, ipb=0 inp=1', 'PBout', path('pb.mdout'), 1, frames, False, {'ipb': 0, 'inp': 1}),
+            ('QM/MM, DFTB', 'QMMMout', path('qm_dftbgb.mdout'), 1, frames, False, {}),
+            ('QM/MM', 'QMMMout', path('qm_gb.mdout'), 1, frames, False, {}),
+            ('RISM, std', 'RISM_std_Out', path('rism.mdout'), 1, frames, False, {}),
+            ('RISM, GF', 'RISM_gf_Out', path('rismgf.mdout'), 1, frames, False, {}),
+            ('Polar RISM, std', 'PolarRISM_std_Out', path('prism.mdout'), 1, frames, False, {})]
+
+
+def parse(module, cls, basename, num_files, frames, chamber, pb, repeat):
+    """ :return: the parsed output and the best time of repeat parsings """
+    ifile = deepcopy(INPUT)
+    ifile['pb'].update(pb)
+    best = None
+    for _ in range(repeat):
+        output = getattr(module, cls)('complex', ifile, chamber)
+        start = time.perf_counter()
+        output.parse_from_file(basename, num_files, num_files * frames)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return output, best
+
+
+def compare(cls, reference, current):
+    """ :return: the energy terms that are different (the ones of the fixed bugs are not checked) """
+    description, fixed = FIXED.get(cls, (None, []))
+    different = []
+    for key in reference.data_keys:
+        if fixed is not None and key in fixed:
+            continue
+        ref, cur = np.asarray(reference[key]), np.asarray(current[key])
+        if fixed is None:
+            # the reference kept only the last frame, in the first position
+            ref, cur = ref[:1], cur[-1:]
+        if not np.array_equal(ref, cur):
+            different.append(key)
+    return different
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('-n', '--frames', type=int, default=20000, help='frames per output file')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='the best time of this number of parsings is '
+                                                                   'printed')
+    parser.add_argument('--reference', help='amber_outputs.py file or git revision of the reference parser')
+    parser.add_argument('--keep', help='folder where the synthetic outputs are written (and kept)')
+    args = parser.parse_args()
+
+    reference = reference_module(args.reference)
+    folder = Path(args.keep or tempfile.mkdtemp())
+    folder.mkdir(parents=True, exist_ok=True)
+    print(f'Writing the outputs ({args.frames} frames per file) to {folder}')
+    failed = False
+    print(f'{"output":20s} {"frames":>8s} {"reference":>10s} {"current":>10s} {"speed-up":>9s}  terms')
+    for name, cls, basename, num_files, frames, chamber, pb in outputs(folder, args.frames):
+        ref, tref = parse(reference, cls, basename, num_files, frames, chamber, pb, args.repeat)
+        cur, tcur = parse(amber_outputs, cls, basename, num_files, frames, chamber, pb, args.repeat)
+        different = compare(cls, ref, cur)
+        failed |= bool(different)
+        status = f'DIFFERENT: {", ".join(different)}' if different else 'identical'
+        if cls in FIXED:
+            status += f' (fixed: {FIXED[cls][0]})'
+        print(f'{name:20s} {num_files * frames:8d} {tref:9.3f}s {tcur:9.3f}s {tref / tcur:8.1f}x  {status}')
+    sys.exit(int(failed))
+
+
+if __name__ == '__main__':
+    main()
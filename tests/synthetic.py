@@ -0,0 +1,141 @@
+"""
+Synthetic output files for the tests. The writers return the values they write, so the tests can compare the parsed
+results with them
+"""
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+import numpy as np
+
+TOKENS = ('TDC', 'SDC', 'BDC')
+
+
+class Residue:
+    """ The attributes of utils.Residue used by the decomposition outputs """
+
+    def __init__(self, index, ligand=False):
+        self.string = f'{"L" if ligand else "R"}:{"B" if ligand else "A"}:{"LIG" if ligand else "ALA"}:{index}'
+        self.mutant_string = self.string
+
+    def is_mutant(self):
+        return False
+
+
+def residue_lists(nrec, nlig):
+    """ Complex, receptor and ligand residues (resl) of the decomposition outputs, keyed by their number """
+    com = {i: Residue(i, i > nrec) for i in range(1, nrec + nlig + 1)}
+    rec = {i: com[i] for i in range(1, nrec + 1)}
+    lig = {i: com[nrec + i] for i in range(1, nlig + 1)}
+    return com, rec, lig
+
+
+def decomp_input(idecomp=1, dec_verbose=3, pair_threshold=0.0, pair_memory=4096):
+    return {'general': {'temperature': 298.15, 'startframe': 1, 'interval': 1},
+            'decomp': {'idecomp': idecomp, 'dec_verbose': dec_verbose, 'pair_threshold': pair_threshold,
+                       'pair_memory': pair_memory}}
+
+
+def write_decomp(basename, frames, resnums, tokens=TOKENS, seed=0):
+    """
+    Writes a per-residue decomposition output of every rank (frames has the frames of each rank)
+    :return: the values written (token x frame x residue x 5 terms), with the frames of all ranks
+    """
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.uniform(-50, 50, (len(tokens), sum(frames), len(resnums), 5)), 3)
+    frame = 0
+    for rank, nframes in enumerate(frames):
+        with open(f'{basename}.{rank}', 'w') as output:
+            output.write('header line\n' * 20)
+            for _ in range(nframes):
+                output.write('                    PRINT DECOMP - TOTAL ENERGIES\n\n'
+                             'resid |internal  |vdw       |eel       |pol       |sas\n=====\n')
+                for t, token in enumerate(tokens):
+                    for r, resnum in enumerate(resnums):
+                        output.write(f'{token}{resnum:7d}' + ''.join(f'{v:10.3f}' for v in values[t, frame, r]) + '\n')
+                frame += 1
+    return values
+
+
+def read_decomp_lines(basename, num_files, tokens=TOKENS):
+    """
+    Reads a decomposition output line by line, as the parser before the energy array did
+    :return: {token: [(residue numbers, 5 values) of every line]}
+    """
+    lines = {token: [] for token in tokens}
+    for rank in range(num_files):
+        with open(f'{basename}.{rank}') as output:
+            for line in output:
+                if line[:3] in lines:
+                    fields = line[3:].replace('->', ' ').split()
+                    lines[line[:3]].append((tuple(int(x) for x in fields[:-5]), [float(x) for x in fields[-5:]]))
+    return lines
+
+
+def write_pair_decomp(basename, frames, resnums, tokens=TOKENS, seed=0):
+    """
+    Writes a pairwise decomposition output of every rank, with all the pairs of resnums. The energies of the pairs of
+    residues far in the sequence are small, as in a real complex
+    :return: the pairs (residue numbers) and the values written (token x frame x pair x 5 terms)
+    """
+    rng = np.random.default_rng(seed)
+    pairs = [(i, j) for i in resnums for j in resnums]
+    weight = np.array([10 if abs(i - j) < 2 else 0.1 for i, j in pairs])[:, None]
+    values = np.round(rng.normal(0, 1, (len(tokens), sum(frames), len(pairs), 5)) * weight, 3)
+    frame = 0
+    for rank, nframes in enumerate(frames):
+        with open(f'{basename}.{rank}', 'w') as output:
+            output.write('header line\n' * 20)
+            for _ in range(nframes):
+                output.write('                    PRINT PAIR DECOMP - TOTAL ENERGIES\n\n'
+                             'resid1->resid2 |internal  |vdw       |eel       |pol       |sas\n=====\n')
+                for t, token in enumerate(tokens):
+                    for p, (i, j) in enumerate(pairs):
+                        output.write(f'{token}{i:8d}->{j:7d}' + ''.join(f'{v:13.3f}' for v in values[t, frame, p]) +
+                                     '\n')
+                frame += 1
+    return pairs, values
+
+
+GB_TERMS = ('BOND', 'ANGLE', 'DIHED', 'VDWAALS', 'EEL', 'EGB', '1-4 VDW', '1-4 EEL')
+
+
+def gb_frames(nframes, seed=0):
+    """
+    Energy blocks printed by sander for nframes frames of a GB calculation
+    :return: the text of every frame and the values written ({term: array})
+    """
+    rng = np.random.default_rng(seed)
+    values = {term: np.round(rng.uniform(-2000, 2000, nframes), 4) for term in GB_TERMS}
+    frames = []
+    for i in range(nframes):
+        v = {term: values[term][i] for term in GB_TERMS}
+        frames.append(f'minimizing coord set #{i + 1:6d}\n\n\n'
+                      '   NSTEP       ENERGY          RMS            GMAX         NAME    NUMBER\n'
+                      '      1      -5.0429E+03     1.4426E+01     9.8211E+01     OD2      1234\n\n'
+                      f' BOND    = {v["BOND"]:13.4f}  ANGLE   = {v["ANGLE"]:13.4f}  DIHED      = {v["DIHED"]:13.4f}\n'
+                      f' VDWAALS = {v["VDWAALS"]:13.4f}  EEL     = {v["EEL"]:13.4f}  EGB        = {v["EGB"]:13.4f}\n'
+                      f' 1-4 VDW = {v["1-4 VDW"]:13.4f}  1-4 EEL = {v["1-4 EEL"]:13.4f}  RESTRAINT  =        0.0000\n'
+                      ' minimization completed, ENE= -.50429E+04  RMS= 0.144E+02\n\n')
+    return frames, values
+
+
+def write_surf(fname, surf):
+    """ Surface areas of the frames, as written by cpptraj """
+    with open(fname, 'w') as output:
+        output.write('#Frame surf\n' + ''.join(f'{i:8d} {value:12.4f}\n' for i, value in enumerate(surf, start=1)))
@@ -0,0 +1,130 @@
+"""
+The results bundle (.mmxsa) replaced the pickle file of the results. These tests write the same results as a bundle and
+as a pickle file, as before, and compare what read_results gets from both
+"""
+
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from GMXMMPBSA import amber_outputs
+from GMXMMPBSA.bundle import ResultsBundle, read_results, write_bundle
+from GMXMMPBSA.utils import EnergyVector
+from synthetic import decomp_input, residue_lists, write_decomp, write_pair_decomp
+
+SURFTEN = 0.0072
+FRAMES = (3, 3)
+MOLS = ('complex', 'receptor', 'ligand')
+INPUT = dict(decomp_input(), pb={'sander_apbs': 0}, gb={'surften': SURFTEN, 'surfoff': 0.0})
+
+
+def energies(seed=0):
+    rng = np.random.default_rng(seed)
+    outputs = []
+    for mol in MOLS:
+        output = amber_outputs.GBout(mol, INPUT)
+        arrays = [{key: rng.normal(0, 20, nframes) for key in output.data_keys} for nframes in FRAMES]
+        output.parse_from_arrays(f'{mol}_gb.mdout', arrays, sum(FRAMES))
+        outputs.append(output)
+    return dict(zip(MOLS, outputs), delta=amber_outputs.BindingStatistics(*outputs))
+
+
+def decomposition(folder, output_class, writer, idecomp):
+    INPUT['decomp']['idecomp'] = idecomp
+    outputs = []
+    pairs = None
+    for seed, (mol, resl) in enumerate(zip(MOLS, residue_lists(4, 2))):
+        basename = folder.joinpath(f'{mol}_{idecomp}.mdout').as_posix()
+        writer(basename, FRAMES, list(resl), seed=seed)
+        output = output_class(mol)
+        options = {'pairs': pairs} if pairs is not None else {}
+        output.parse_from_file(basename, resl, INPUT, SURFTEN, len(FRAMES), sum(FRAMES), **options)
+        if output_class is amber_outputs.PairDecompOut and pairs is None:
+            pairs = output.pair_labels()
+        outputs.append(output)
+    binding = amber_outputs.PairDecompBinding if idecomp == 3 else amber_outputs.DecompBinding
+    return dict(zip(MOLS, outputs), delta=binding(*outputs, INPUT, 'delta'))
+
+
+@pytest.fixture
+def results(tmp_path):
+    rng = np.random.default_rng(3)
+    ie = amber_outputs.IEout(INPUT, 'gb')
+    ie.parse_from_dict({'data': EnergyVector(rng.normal(size=sum(FRAMES))), 'sigma': 2.5,
+                        'iedata': EnergyVector(rng.normal(size=3)), 'ieframes': 3})
+    c2 = amber_outputs.C2out('gb')
+    c2.parse_from_dict({'c2data': 1.5, 'c2_std': np.float64(0.2), 'sigma': 3.0, 'c2_ci': np.array([1.2, 1.8])})
+    calc_types = SimpleNamespace(
+        normal={'gb': energies(), 'ie': {'gb': ie}, 'c2': {'gb': c2}}, mutant={}, mut_norm={},
+        decomp_normal={'gb': decomposition(tmp_path, amber_outputs.DecompOut, write_decomp, 1),
+                       'pb': decomposition(tmp_path, amber_outputs.PairDecompOut, write_pair_decomp, 3)},
+        decomp_mutant={}, scan={})
+    info = {'INPUT': INPUT, 'FILES': {'stability': False}, 'size': 1, 'numframes': sum(FRAMES), 'numframes_nmode': 0,
+            'mutant_index': None, 'mut_str': '', 'using_chamber': False, 'input_file': '&general\n/\n',
+            'COM_PDB': 'ATOM\n' * 10, 'output_file': 'out', 'decomp_output_file': 'dec'}
+    # The results file of previous versions: the info namespace and calc_types, pickled
+    with open(tmp_path.joinpath('results.pkl'), 'wb') as bf:
+        pickle.dump(SimpleNamespace(**dict(info, FILES=SimpleNamespace(**info['FILES']))), bf)
+        pickle.dump(calc_types, bf)
+    write_bundle(tmp_path.joinpath('results.mmxsa'), info, calc_types)
+    return tmp_path.joinpath('results.pkl'), tmp_path.joinpath('results.mmxsa')
+
+
+def assert_same_leaves(expected, value, path=()):
+    """ Compares every energy of the results read, returns the number of vectors compared """
+    if isinstance(expected, np.ndarray):
+        np.testing.assert_array_equal(expected, value, err_msg=str(path))
+        if isinstance(expected, EnergyVector):
+            assert isinstance(value, EnergyVector), path
+            assert value.com_std == pytest.approx(expected.com_std, rel=1e-15), path
+        return 1
+    if hasattr(expected, 'keys'):
+        assert list(expected) == list(value), path
+        return sum(assert_same_leaves(expected[key], value[key], path + (key,)) for key in expected)
+    assert expected == value, path
+    return 0
+
+
+def test_round_trip(results):
+    old, new = results
+    old_info, old_data = read_results(old)
+    info, data = read_results(new)
+    assert set(data) == set(old_data)
+    assert sum(assert_same_leaves(old_data[key], data[key], (key,)) for key in old_data) > 1000
+    assert info.INPUT == old_info.INPUT
+    assert (info.COM_PDB, info.FILES.stability, info.numframes) == (old_info.COM_PDB, False, sum(FRAMES))
+
+
+def test_memory_mapped_vectors(results):
+    _, new = results
+    bundle = ResultsBundle(new)
+    vector = bundle.data['normal']['gb']['complex']['BOND']
+    assert isinstance(vector.base, np.memmap)
+    pair = bundle.data['decomp_normal']['pb']['complex']
+    assert isinstance(pair, amber_outputs.PairDecompOut) and isinstance(pair.array, np.memmap)
+    # The file is opened copy-on-write
+    value = float(vector[0])
+    vector[0] = 1e9
+    assert ResultsBundle(new).data['normal']['gb']['complex']['BOND'][0] == value
@@ -0,0 +1,124 @@
+"""
+correlate computes the coefficients of all the columns and bootstrap samples at once, with the weights of the systems
+in every sample. These tests compare it with scipy.stats on the data and on every resampled set of systems
+"""
+
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from GMXMMPBSA import correlation
+
+stats = pytest.importorskip('scipy.stats')
+
+SCIPY = {'pearson': lambda x, y: stats.pearsonr(x, y)[0],
+         'spearman': lambda x, y: stats.spearmanr(x, y)[0],
+         'kendall': lambda x, y: stats.kendalltau(x, y, variant='b')[0]}
+
+
+def scipy_coefficient(method, x, y):
+    """ The coefficient of scipy, nan for constant values """
+    if np.ptp(x) == 0 or np.ptp(y) == 0:
+        return np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return SCIPY[method](x, y)
+
+
+@pytest.fixture
+def data():
+    """ 12 systems and 4 columns, with tied values, and a few systems without values """
+    rng = np.random.default_rng(0)
+    y = rng.normal(-9, 2, 12)
+    x = y[:, None] * rng.uniform(0.2, 1, 4) + rng.normal(0, 2, (12, 4))
+    x[:, 1] = np.round(x[:, 1])
+    x[[2, 7], 2] = np.nan
+    y[5] = np.nan
+    return x, y
+
+
+def test_coefficients(data):
+    x, y = data
+    result = correlation.correlate(x, y, n_boot=0)
+    valid = ~np.isnan(y)
+    for c in range(x.shape[1]):
+        mask = valid & ~np.isnan(x[:, c])
+        assert result['n'][c] == mask.sum()
+        for method in correlation.METHODS:
+            assert result[method][c] == pytest.approx(scipy_coefficient(method, x[mask, c], y[mask]), rel=1e-10)
+            assert np.isnan(result[f'{method}_low'][c]) and np.isnan(result[f'{method}_high'][c])
+
+
+def test_bootstrap(data):
+    x, y = data
+    n_boot, seed = 200, 7
+    result = correlation.correlate(x, y, n_boot=n_boot, ci=0.9, seed=seed)
+    # the same samples, drawn from the systems with experimental value, resampled one by one
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    samples = np.random.default_rng(seed).multinomial(len(y), np.full(len(y), 1 / len(y)), size=n_boot)
+    for c in range(x.shape[1]):
+        for method in correlation.METHODS:
+            values = []
+            for weights in samples:
+                index = np.repeat(np.arange(len(y)), weights)
+                index = index[~np.isnan(x[index, c])]
+                values.append(scipy_coefficient(method, x[index, c], y[index]))
+            low, high = np.nanpercentile(values, [5, 95])
+            assert result[f'{method}_low'][c] == pytest.approx(low, rel=1e-10)
+            assert result[f'{method}_high'][c] == pytest.approx(high, rel=1e-10)
+
+
+def test_seed_and_chunks(data, monkeypatch):
+    x, y = data
+    frame = pd.DataFrame(x, columns=list('abcd'))
+    result = correlation.correlate(frame, y, n_boot=100, seed=3)
+    assert list(result.index) == list('abcd')
+    pd.testing.assert_frame_equal(result, correlation.correlate(frame, y, n_boot=100, seed=3))
+    assert not result.equals(correlation.correlate(frame, y, n_boot=100, seed=4))
+    # computed by chunks of columns and batches of samples
+    monkeypatch.setattr(correlation, 'MAX_ELEMENTS', 150)
+    pd.testing.assert_frame_equal(result, correlation.correlate(frame, y, n_boot=100, seed=3), rtol=1e-12)
+
+
+def test_correlation_table(data):
+    x, y = data
+    # the pivot of correlation_table sorts the systems, so they are named in order to draw the same samples
+    systems = [f'system{i:02d}' for i in range(len(y))]
+    terms = ['TOTAL', 'ΔGie', 'ΔGc2', 'ΔGnm']
+    summary = pd.DataFrame([(system, 'normal', 'gb', 'delta', term, x[i, c], 1.0, 0.1)
+                            for i, system in enumerate(systems) for c, term in enumerate(terms)],
+                           columns=['system', 'etype', 'model', 'mol', 'term', 'mean', 'sd', 'sem'])
+    # exp_ki (nM) of the experimental ΔG
+    ki = np.exp(y / (correlation.R * 300.0)) * 1e9
+    summary.attrs['systems'] = pd.DataFrame({'system': systems, 'temperature': 300.0,
+                                             'exp_ki': ki}).set_index('system')
+    np.testing.assert_allclose(correlation.experimental_energy(summary.attrs['systems']), y, rtol=1e-12)
+    table = correlation.correlation_table(summary, n_boot=50, seed=1)
+    expected = correlation.correlate(pd.DataFrame(x, columns=terms), y, n_boot=50, seed=1)
+    for row in table.itertuples():
+        assert row.n == expected.loc[row.term, 'n']
+        assert (row.r, row.ci_low, row.ci_high) == pytest.approx(
+            tuple(expected.loc[row.term, [row.method, f'{row.method}_low', f'{row.method}_high']]), rel=1e-12)
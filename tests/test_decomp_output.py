@@ -0,0 +1,108 @@
+"""
+DecompOut keeps the per-residue decomposition in a (token, frame, residue, term) array. These tests compare it with the
+line by line reading of the output files
+"""
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+import pickle
+from functools import reduce
+
+import numpy as np
+import pytest
+
+from GMXMMPBSA.amber_outputs import DecompOut
+from synthetic import TOKENS, decomp_input, read_decomp_lines, residue_lists, write_decomp
+
+SURFTEN = 0.0072
+FRAMES = (4, 3)
+
+
+@pytest.fixture
+def decomp(tmp_path):
+    """ Per-residue decomposition of a complex of 6 + 3 residues in 2 rank files """
+    basename = tmp_path.joinpath('complex_gb.mdout').as_posix()
+    com, _, _ = residue_lists(6, 3)
+    write_decomp(basename, FRAMES, list(com))
+    output = DecompOut('complex')
+    output.parse_from_file(basename, com, decomp_input(dec_verbose=3), SURFTEN, len(FRAMES), sum(FRAMES))
+    return output, com
+
+
+def line_values(output, token):
+    """ (frame x residue x 5 terms) values of token read line by line, with sas multiplied by surften """
+    lines = read_decomp_lines(output.basename, output.num_files)[token]
+    values = np.array([line for _, line in lines]).reshape(output.numframes, len(output.residues), 5)
+    values[..., 4] *= SURFTEN
+    return values, [resnums[0] for resnums, _ in lines[:len(output.residues)]]
+
+
+def test_array_is_the_output_file(decomp):
+    output, com = decomp
+    assert output.array.shape == (len(TOKENS), sum(FRAMES), len(com), len(DecompOut.terms))
+    for t, token in enumerate(TOKENS):
+        values, resnums = line_values(output, token)
+        assert output.residues == [com[resnum].string for resnum in resnums]
+        np.testing.assert_allclose(output.array[t, ..., :5], values, rtol=0, atol=1e-12)
+        np.testing.assert_allclose(output.array[t, ..., 5], values.sum(axis=-1), rtol=1e-12)
+
+
+def test_views_are_the_array(decomp):
+    output, _ = decomp
+    for t, token in enumerate(output.allowed_tokens):
+        assert list(output[token]) == output.residues
+        for r, res in enumerate(output.residues):
+            for c, term in enumerate(output.terms):
+                vector = output[token][res][term]
+                assert np.shares_memory(vector, output.array)
+                np.testing.assert_array_equal(vector, output.array[t, :, r, c])
+            # TOTAL keeps the standard deviation propagated by the sum of the EnergyVectors of the terms
+            total = reduce(lambda a, b: a + b, (output[token][res][term] for term in output.terms[:-1]))
+            assert output[token][res]['tot'].com_std == pytest.approx(total.com_std, rel=1e-12)
+
+
+def test_only_total_without_dec_verbose(tmp_path):
+    basename = tmp_path.joinpath('complex_gb.mdout').as_posix()
+    com, _, _ = residue_lists(4, 2)
+    values = write_decomp(basename, (5,), list(com))
+    output = DecompOut('complex')
+    output.parse_from_file(basename, com, decomp_input(dec_verbose=0), SURFTEN, 1, 5)
+    assert list(output) == ['TDC']
+    values[..., 4] *= SURFTEN
+    np.testing.assert_allclose(output.array[..., :5], values[:1], rtol=0, atol=1e-12)
+
+
+def test_pickle_rebuilds_the_views(decomp):
+    output, _ = decomp
+    copy = pickle.loads(pickle.dumps(output))
+    np.testing.assert_array_equal(copy.array, output.array)
+    for token in output:
+        for res in output[token]:
+            assert np.shares_memory(copy[token][res]['int'], copy.array)
+            assert copy[token][res]['tot'].com_std == output[token][res]['tot'].com_std
+
+
+def test_frame_range(decomp):
+    output, _ = decomp
+    array = output.array.copy()
+    output.set_frame_range(1, None, 2)
+    assert output.numframes == len(range(1, sum(FRAMES), 2))
+    np.testing.assert_array_equal(output.array, array[:, 1::2])
+    res = output.residues[0]
+    np.testing.assert_array_equal(output['TDC'][res]['vdw'], array[0, 1::2, 0, 1])
@@ -0,0 +1,112 @@
+"""
+AmberOutput keeps its energies in an EnergyTable, with the composite terms computed on demand. These tests compare it
+with the vectors the composite terms were built with before (the sum of the EnergyVectors of the data terms)
+"""
+
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+
+import pickle
+
+import numpy as np
+import pytest
+
+from GMXMMPBSA.amber_outputs import GBout, PBout, data_key_owner
+from GMXMMPBSA.utils import EnergyVector
+
+INPUT = {'general': {'temperature': 298.15, 'startframe': 1, 'interval': 1}, 'pb': {'sander_apbs': 0}}
+
+
+def rank_arrays(output, frames, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{key: rng.normal(0, 20, nframes) for key in output.data_keys} for nframes in frames]
+
+
+def energy_vectors(output_class, frames, chamber=False, frame_range=slice(None)):
+    """ The output of the energies of every rank, and the vectors of its frames built as before the EnergyTable """
+    output = output_class('complex', INPUT, chamber)
+    arrays = rank_arrays(output, frames)
+    output.parse_from_arrays('complex_gb.mdout', arrays, sum(frames))
+    vectors = {key: EnergyVector(np.concatenate([rank[key] for rank in arrays])[frame_range])
+               for key in output.data_keys}
+    for key in output.composite_keys:
+        vectors[key] = EnergyVector(len(vectors[output.data_keys[0]]))
+    for key in output.data_keys:
+        for component in data_key_owner[key]:
+            vectors[component] = vectors[key] + vectors[component]
+    return output, vectors
+
+
+def vector_stats(vector):
+    return float(vector.mean()), float(vector.stdev()), float(vector.std()), vector.semp(), vector.sem()
+
+
+def assert_same_terms(output, vectors):
+    assert list(output) == list(vectors)
+    for key, vector in vectors.items():
+        np.testing.assert_allclose(output[key], vector, rtol=1e-12, atol=1e-12)
+        if vector.com_std is None:
+            assert output[key].com_std is None
+        else:
+            assert output[key].com_std == pytest.approx(vector.com_std, rel=1e-12)
+        assert output.table.stats(key) == pytest.approx(vector_stats(vector), rel=1e-12)
+
+
+@pytest.mark.parametrize('output_class, chamber', [(GBout, False), (GBout, True), (PBout, False)])
+def test_composite_terms(output_class, chamber):
+    output, vectors = energy_vectors(output_class, (5, 4), chamber)
+    assert_same_terms(output, vectors)
+    # The data terms are views of the table
+    assert all(np.shares_memory(output[key], output.table.values) for key in output.data_keys)
+
+
+def test_frame_range():
+    output, _ = energy_vectors(GBout, (6, 5))
+    stats = output.table.stats('TOTAL')
+    window = output.set_frame_range(1, None, 3)
+    _, vectors = energy_vectors(GBout, (6, 5), frame_range=slice(1, None, 3))
+    assert window.numframes == len(range(1, 11, 3))
+    assert_same_terms(window, vectors)
+    assert np.shares_memory(window.table.values, output.table.values)
+    # A window of a window is the same frames of the parent table
+    nested = window.set_frame_range(1, None, 2)
+    _, vectors = energy_vectors(GBout, (6, 5), frame_range=slice(4, None, 6))
+    assert nested.table.frames == (4, 2, 6)
+    assert_same_terms(nested, vectors)
+    # The statistics of the parent are not those of the windows
+    assert output.table.stats('TOTAL') == stats
+
+
+def test_reset():
+    output, vectors = energy_vectors(GBout, (4,))
+    total = output['TOTAL']
+    output['EGB'][:] += 1.5
+    output._fill_composite_terms()
+    np.testing.assert_allclose(output['TOTAL'], total + 1.5, rtol=1e-12)
+    assert output.table.stats('TOTAL')[0] == pytest.approx(float(vectors['TOTAL'].mean()) + 1.5, rel=1e-12)
+
+
+def test_pickle():
+    output, vectors = energy_vectors(GBout, (3, 3))
+    # with a composite term already computed
+    output['GGAS']
+    copy = pickle.loads(pickle.dumps(output))
+    assert_same_terms(copy, vectors)
+    assert all(np.shares_memory(copy[key], copy.table.values) for key in copy.data_keys)
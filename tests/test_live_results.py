@@ -0,0 +1,192 @@
+"""
+LiveResults reads the output files of a job while they are written. These tests write the GB output files of a job
+frame by frame, also leaving a frame half written, and compare the running estimates with the frames written so far
+and, once the job finishes, with the output files parsed by GBout
+"""
+
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+
+import numpy as np
+import pytest
+
+from GMXMMPBSA.amber_outputs import BindingStatistics, GBout
+from GMXMMPBSA.API import LiveResults
+from synthetic import GB_TERMS, gb_frames, write_surf
+
+MOLS = ('complex', 'receptor', 'ligand')
+# frames of every rank, as they are split in make_trajs
+NUMFRAMES, RANKS = 5, (3, 2)
+SURFTEN = 0.0072
+
+INFO = f"""# You can alter the variables below
+#
+# MODIFY NOTHING BELOW HERE, OR GET WHAT YOU DESERVE
+INPUT['general']['temperature'] = 298.15
+INPUT['general']['startframe'] = 1
+INPUT['general']['interval'] = 1
+INPUT['gb']['gbrun'] = True
+INPUT['gb']['ifqnt'] = 0
+INPUT['gb']['surften'] = {SURFTEN}
+INPUT['gb']['surfoff'] = 0.0
+INPUT['pb']['pbrun'] = False
+INPUT['pb']['sander_apbs'] = 0
+INPUT['rism']['polardecomp'] = 0
+INPUT['ala']['alarun'] = False
+INPUT['ala']['mutant_only'] = False
+FILES.prefix = '_GMXMMPBSA_'
+FILES.stability = False
+FILES.receptor_trajs = None
+FILES.ligand_trajs = None
+size = {len(RANKS)}
+numframes = {NUMFRAMES}
+numframes_nmode = 0
+mutant_index = None
+mut_str = ''
+using_chamber = False
+"""
+
+
+class Job:
+    """ Output files of a GB job, written frame by frame """
+
+    def __init__(self, folder):
+        self.folder = folder
+        folder.joinpath('_GMXMMPBSA_info.running').write_text(INFO)
+        self.frames, self.values, self.surf = {}, {}, {}
+        for seed, mol in enumerate(MOLS):
+            self.frames[mol], self.values[mol] = gb_frames(NUMFRAMES, seed)
+            self.surf[mol] = np.round(np.random.default_rng(seed).uniform(1000, 5000, NUMFRAMES), 4)
+        self.written = {(mol, rank): 0 for mol in MOLS for rank in range(len(RANKS))}
+
+    def basename(self, mol):
+        return self.folder.joinpath(f'_GMXMMPBSA_{mol}_gb.mdout')
+
+    def write(self, mol, rank, nframes, partial=''):
+        """ Writes the next nframes frames of the rank, and the first lines of the next one (partial) """
+        first = sum(RANKS[:rank])
+        with open(f'{self.basename(mol)}.{rank}', 'w') as output:
+            output.write('header line\n' * 20)
+            output.write(''.join(self.frames[mol][first:first + nframes]))
+            output.write(partial)
+        self.written[(mol, rank)] = nframes
+
+    def partial_frame(self, mol, rank):
+        """ The first lines of the next frame of the rank, up to the middle of the last energy line """
+        frame = self.frames[mol][sum(RANKS[:rank]) + self.written[(mol, rank)]]
+        return frame[:frame.index(' 1-4 VDW') + 20]
+
+    def finish(self, mol, rank):
+        self.write(mol, rank, RANKS[rank])
+        first = sum(RANKS[:rank])
+        write_surf(self.folder.joinpath(f'_GMXMMPBSA_{mol}_gb_surf.dat.{rank}'),
+                   self.surf[mol][first:first + RANKS[rank]])
+
+    def frame_values(self, mol, frames):
+        """ Values of the first frames of every rank """
+        index = np.concatenate([sum(RANKS[:rank]) + np.arange(n) for rank, n in enumerate(frames)]).astype(int)
+        return {term: values[index] for term, values in self.values[mol].items()}
+
+
+@pytest.fixture
+def job(tmp_path):
+    return Job(tmp_path)
+
+
+def energy_rows(live, **query):
+    return {(row.mol, row.term): row for row in live.get_energy(**query).itertuples()}
+
+
+def test_partial_frames(job):
+    live = LiveResults(job.folder)
+    assert live.refresh() == 0
+    job.write('complex', 0, 2, job.partial_frame('complex', 0))
+    assert live.refresh() == 2
+    # nothing new, and the frame being written is not read
+    assert live.refresh() == 0
+    progress = live.progress()
+    assert progress.loc[('normal', '', 'gb', 'complex')].tolist() == [2, NUMFRAMES, False]
+    assert progress.loc[('normal', '', 'gb', 'receptor')].tolist() == [0, NUMFRAMES, False]
+
+    rows = energy_rows(live)
+    values = job.frame_values('complex', (2, 0))
+    output = GBout('complex', live.app.INPUT)
+    assert set(rows) == {('complex', term) for term in output.data_keys + output.composite_keys}
+    for term in GB_TERMS:
+        assert rows[('complex', term)].frames == 2
+        assert rows[('complex', term)].mean == pytest.approx(values[term].mean(), rel=1e-12)
+        assert rows[('complex', term)].sd == pytest.approx(values[term].std(), rel=1e-12)
+    # the surface energies are computed when the rank finishes
+    assert np.isnan(rows[('complex', 'ESURF')].mean)
+
+    # the frame is completed, and all the blocks of the next one are written, but it is still being written
+    job.write('complex', 0, 3)
+    with open(f'{job.basename("complex")}.0', 'a') as output:
+        output.write(job.frames['complex'][3][:job.frames['complex'][3].index(' minimization')])
+    assert live.refresh() == 1
+    assert live.progress().loc[('normal', '', 'gb', 'complex'), 'frames'] == 3
+
+
+def test_delta_with_the_frames_of_all_species(job):
+    live = LiveResults(job.folder)
+    job.write('complex', 0, 3)
+    job.write('complex', 1, 1, job.partial_frame('complex', 1))
+    for mol in ('receptor', 'ligand'):
+        job.write(mol, 0, 2)
+        job.write(mol, 1, 2)
+    live.refresh()
+    assert 'delta' not in {row.mol for row in live.get_energy(mol=('complex',)).itertuples()}
+    rows = energy_rows(live, term=GB_TERMS)
+    # the frames of every rank completed by the 3 species
+    values = {mol: job.frame_values(mol, (2, 1)) for mol in MOLS}
+    for term in GB_TERMS:
+        delta = values['complex'][term] - values['receptor'][term] - values['ligand'][term]
+        assert rows[('delta', term)].frames == 3
+        assert rows[('delta', term)].mean == pytest.approx(delta.mean(), rel=1e-12)
+        assert rows[('delta', term)].sd == pytest.approx(delta.std(), rel=1e-12)
+    assert rows[('complex', 'BOND')].frames == 4 and rows[('receptor', 'BOND')].frames == 4
+
+
+def test_finished_job(job):
+    live = LiveResults(job.folder)
+    job.write('complex', 0, 1)
+    live.refresh()
+    for mol in MOLS:
+        for rank in range(len(RANKS)):
+            job.finish(mol, rank)
+    job.folder.joinpath('_GMXMMPBSA_info.running').rename(job.folder.joinpath('_GMXMMPBSA_info'))
+    assert live.refresh() == 3 * NUMFRAMES - 1
+    assert live.progress()['complete'].all()
+    assert live.refresh() == 0
+
+    # the output files parsed when the job finishes
+    outputs = []
+    for mol in MOLS:
+        output = GBout(mol, live.app.INPUT)
+        output.parse_from_file(job.basename(mol).as_posix(), len(RANKS), NUMFRAMES)
+        outputs.append(output)
+    outputs = dict(zip(MOLS, outputs), delta=BindingStatistics(*outputs))
+    rows = energy_rows(live)
+    assert len(rows) == sum(len(output.data_keys) + len(output.composite_keys) for output in outputs.values())
+    for (mol, term), row in rows.items():
+        values = np.asarray(outputs[mol][term])
+        assert row.frames == NUMFRAMES
+        assert (row.mean, row.sd) == pytest.approx((values.mean(), values.std()), rel=1e-12)
+    np.testing.assert_allclose(np.asarray(outputs['complex']['ESURF']), job.surf['complex'] * SURFTEN, rtol=1e-12)
@@ -0,0 +1,143 @@
+"""
+load_systems summarizes several systems in worker processes. These tests compare its summary with the one of an
+MMPBSA_API loaded for each system, and with the energies written to the results bundles
+"""
+
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from GMXMMPBSA import amber_outputs
+from GMXMMPBSA.API import MMPBSA_API, load_systems
+from GMXMMPBSA.bundle import write_bundle
+from GMXMMPBSA.utils import EnergyVector
+
+NUMFRAMES = 10
+MOLS = ('complex', 'receptor', 'ligand')
+NREC, NLIG = 3, 1
+
+
+def input_namelists(exp_ki):
+    return {'general': {'temperature': 298.15, 'startframe': 1, 'interval': 1, 'endframe': NUMFRAMES,
+                        'exp_ki': exp_ki, 'ie_segment': 25, 'receptor_mask': f':1-{NREC}',
+                        'ligand_mask': f':{NREC + 1}-{NREC + NLIG}'},
+            'gb': {'surften': 0.0072, 'surfoff': 0.0}, 'pb': {'sander_apbs': 0},
+            'nmode': {'nmoderun': False}, 'decomp': {'decomprun': False}}
+
+
+def write_system(folder, seed, exp_ki):
+    """ Results bundle of a system with GB and PB energies and their IE and C2 entropies """
+    rng = np.random.default_rng(seed)
+    INPUT = input_namelists(exp_ki)
+    normal = {'ie': {}, 'c2': {}}
+    for model, output_class in (('gb', amber_outputs.GBout), ('pb', amber_outputs.PBout)):
+        outputs = {}
+        for mol in ('receptor', 'ligand', 'complex'):
+            output = output_class(mol, INPUT)
+            arrays = {key: rng.normal(-10, 5, NUMFRAMES) for key in output.data_keys}
+            if mol == 'complex':
+                # the bonded terms of the single trajectory protocol cancel out
+                for key in amber_outputs.BindingStatistics.st_null:
+                    arrays[key] = outputs['receptor'][key] + outputs['ligand'][key]
+            output.parse_from_arrays(f'{mol}_{model}.mdout', [arrays], NUMFRAMES)
+            outputs[mol] = output
+        outputs = [outputs[mol] for mol in MOLS]
+        normal[model] = dict(zip(MOLS, outputs), delta=amber_outputs.BindingStatistics(*outputs))
+        normal['ie'][model] = amber_outputs.IEout(INPUT, model)
+        normal['ie'][model].parse_from_dict({'data': EnergyVector(rng.normal(2, 1, NUMFRAMES)), 'sigma': 2.5,
+                                             'iedata': EnergyVector(rng.normal(2, 1, 3)), 'ieframes': 3})
+        normal['c2'][model] = amber_outputs.C2out(model)
+        normal['c2'][model].parse_from_dict({'c2data': rng.uniform(1, 3), 'c2_std': 0.2, 'sigma': 3.0,
+                                             'c2_ci': np.array([1.2, 1.8])})
+    calc_types = SimpleNamespace(normal=normal, mutant={}, mut_norm={}, decomp_normal={}, decomp_mutant={}, scan={})
+    com_pdb = ''.join(f'ATOM  {i:5d}  CA  {"ALA" if i <= NREC else "LIG"} {"A" if i <= NREC else "B"}{i:4d}    '
+                      f'{0:8.3f}{0:8.3f}{0:8.3f}  1.00  0.00           C\n' for i in range(1, NREC + NLIG + 1))
+    info = {'INPUT': INPUT, 'FILES': {'stability': False, 'complex_fixed': 'COM.pdb'}, 'size': 1,
+            'numframes': NUMFRAMES, 'numframes_nmode': 0, 'mutant_index': None, 'mut_str': '', 'using_chamber': False,
+            'input_file': '&general\n/\n', 'COM_PDB': com_pdb, 'output_file': '', 'decomp_output_file': None}
+    folder.mkdir()
+    write_bundle(folder.joinpath('COMPACT_MMXSA_RESULTS.mmxsa'), info, calc_types)
+    return folder.joinpath('COMPACT_MMXSA_RESULTS.mmxsa'), normal
+
+
+@pytest.fixture
+def systems(tmp_path):
+    cwd = os.getcwd()
+    yield [write_system(tmp_path.joinpath(f'system{i}'), i, exp_ki) for i, exp_ki in enumerate((0.5, 2.0, 10.0))]
+    os.chdir(cwd)
+
+
+def api_summary(fname, window, entropy=False):
+    """ Summary rows (etype, model, mol, term): (mean, sd, sem) of a system, with its own MMPBSA_API """
+    api = MMPBSA_API()
+    api.setting_time()
+    api.load_file(fname)
+    energy = api.get_energy(remove_empty_terms=False, **window, verbose=False)
+    rows = {(et, m, m1, t): tuple(summary[(m1, t)]) for et, v in energy['summary'].items()
+            for m, summary in v.items() for m1, t in summary.columns}
+    if entropy:
+        enthalpy = api.get_energy(mol=('delta',), term=('TOTAL',), remove_empty_terms=False, **window,
+                                  verbose=False)
+        entropy = api.get_entropy(**window, ie_segment=25, verbose=False)
+        binding = api.get_binding(enthalpy['summary'], entropy['summary'], verbose=False)
+        names = {'ie': 'ΔGie', 'c2': 'ΔGc2'}
+        rows.update({(et, m, 'delta', names[ent]): tuple(data['ΔG']) for et, v in binding['data'].items()
+                     for m, v1 in v.items() for ent, data in v1.items()})
+    return rows
+
+
+@pytest.mark.parametrize('window', [{}, dict(startframe=3, endframe=9, interval=2)])
+def test_summary(systems, window):
+    summary, frames = load_systems([fname for fname, _ in systems], model=None, mol=None, term=None, frames=True,
+                                   jobs=1, **window)
+    assert list(summary.attrs['systems'].index) == ['system0', 'system1', 'system2']
+    assert summary.attrs['systems']['exp_ki'].tolist() == [0.5, 2.0, 10.0]
+    assert (summary.attrs['systems']['numframes'] == NUMFRAMES).all()
+    frame_slice = slice((window.get('startframe') or 1) - 1, window.get('endframe'), window.get('interval', 1))
+    for name, (fname, normal) in zip(summary.attrs['systems'].index, systems):
+        rows = summary[summary['system'] == name]
+        expected = api_summary(fname, window)
+        assert len(rows) == len(expected)
+        for row in rows.itertuples():
+            key = (row.etype, row.model, row.mol, row.term)
+            assert (row.mean, row.sd, row.sem) == pytest.approx(expected[key], rel=1e-12)
+            values = np.asarray(normal[row.model][row.mol][row.term])[frame_slice]
+            np.testing.assert_allclose(frames[(name,) + key], values, rtol=1e-12)
+            assert row.mean == pytest.approx(values.mean(), rel=1e-12)
+
+
+def test_entropy_and_processes(systems):
+    fnames = [fname for fname, _ in systems]
+    summary = load_systems(fnames, names=['a', 'b', 'c'], entropy=True, jobs=1)
+    # the same summary from the worker processes
+    assert summary.equals(load_systems(fnames, names=['a', 'b', 'c'], entropy=True, jobs=2))
+    for name, fname in zip('abc', fnames):
+        rows = summary[summary['system'] == name]
+        expected = {key: value for key, value in api_summary(fname, {}, entropy=True).items()
+                    if key[2] == 'delta' and key[3] in ('TOTAL', 'ΔGie', 'ΔGc2')}
+        assert sorted(rows['term']) == sorted(['TOTAL', 'ΔGie', 'ΔGc2'] * 2)
+        for row in rows.itertuples():
+            assert (row.mean, row.sd, row.sem) == pytest.approx(expected[(row.etype, row.model, row.mol, row.term)],
+                                                                rel=1e-12)
@@ -0,0 +1,135 @@
+"""
+PairDecompOut keeps only the selected pairs of the pairwise decomposition in a sparse (CSR) store. These tests compare
+it, and PairDecompBinding, with the line by line reading of the output files
+"""
+
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+
+import numpy as np
+import pytest
+
+from GMXMMPBSA.amber_outputs import PairDecompBinding, PairDecompOut
+from synthetic import TOKENS, decomp_input, read_decomp_lines, residue_lists, write_pair_decomp
+
+SURFTEN = 0.0072
+FRAMES = (3, 2)
+NREC, NLIG = 4, 2
+
+
+def line_values(basename, resl, num_files=len(FRAMES)):
+    """ {token: {(residue, residue): (frame x 6 terms)}} read line by line, with sas multiplied by surften """
+    energies = {}
+    for token, lines in read_decomp_lines(basename, num_files).items():
+        pairs = {}
+        for (i, j), values in lines:
+            pairs.setdefault((resl[i].string, resl[j].string), []).append(values)
+        energies[token] = {}
+        for label, values in pairs.items():
+            values = np.array(values)
+            values[:, 4] *= SURFTEN
+            energies[token][label] = np.concatenate((values, values.sum(axis=1, keepdims=True)), axis=1)
+    return energies
+
+
+def parse(tmp_path, mol, resl, seed=0, pairs=None, **options):
+    basename = tmp_path.joinpath(f'{mol}_gb.mdout').as_posix()
+    write_pair_decomp(basename, FRAMES, list(resl), seed=seed)
+    output = PairDecompOut(mol)
+    output.parse_from_file(basename, resl, decomp_input(idecomp=3, **options), SURFTEN, len(FRAMES), sum(FRAMES),
+                           pairs=pairs)
+    return output, line_values(basename, resl)
+
+
+def stored_energies(output):
+    """ {token: {(residue, residue): (frame x 6 terms)}} of the dict access to the store """
+    return {token: {(res, res2): np.array([output[token][res][res2][term] for term in output.terms]).T
+                    for res in output[token] for res2 in output[token][res]}
+            for token in output}
+
+
+def assert_same_energies(stored, expected):
+    assert list(stored) == list(expected)
+    for token in expected:
+        assert list(stored[token]) == list(expected[token])
+        for label, values in expected[token].items():
+            np.testing.assert_allclose(stored[token][label], values, rtol=1e-12, atol=1e-12)
+
+
+def test_all_pairs(tmp_path):
+    com, _, _ = residue_lists(NREC, NLIG)
+    output, expected = parse(tmp_path, 'complex', com)
+    assert list(output) == list(TOKENS)
+    assert output.pair_labels() == list(expected['TDC'])
+    assert_same_energies(stored_energies(output), expected)
+    for t, token in enumerate(TOKENS):
+        values = np.array(list(expected[token].values()))
+        np.testing.assert_allclose(output.mean[t], values.mean(axis=1), rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(output.stdev[t, :, :5], values[..., :5].std(axis=1), rtol=1e-12, atol=1e-12)
+        # TOTAL keeps the standard deviation propagated from the terms
+        np.testing.assert_allclose(output.stdev[t, :, 5], np.sqrt((values[..., :5].std(axis=1) ** 2).sum(axis=1)),
+                                   rtol=1e-12)
+
+
+def test_pair_threshold(tmp_path):
+    com, _, _ = residue_lists(NREC, NLIG)
+    threshold = 2.0
+    output, expected = parse(tmp_path, 'complex', com, pair_threshold=threshold)
+    kept = [label for label, values in expected['TDC'].items()
+            if np.abs(values[:, 5]).max() >= threshold or label[0] == label[1]]
+    assert 0 < len(kept) < len(expected['TDC'])
+    assert set(output.pair_labels()) == set(kept)
+    assert_same_energies(stored_energies(output), {token: {label: expected[token][label] for label in
+                                                           output.pair_labels()} for token in TOKENS})
+
+
+def test_memory_mapped_store(tmp_path):
+    com, _, _ = residue_lists(NREC, NLIG)
+    in_memory, _ = parse(tmp_path, 'complex', com)
+    mapped, expected = parse(tmp_path, 'complex2', com, pair_memory=0)
+    assert isinstance(mapped.array, np.memmap)
+    assert not isinstance(in_memory.array, np.memmap)
+    np.testing.assert_array_equal(mapped.array, in_memory.array)
+    assert_same_energies(stored_energies(mapped), expected)
+
+
+def test_binding(tmp_path):
+    com, rec, lig = residue_lists(NREC, NLIG)
+    complex_output, com_values = parse(tmp_path, 'complex', com, pair_threshold=2.0)
+    labels = complex_output.pair_labels()
+    receptor, rec_values = parse(tmp_path, 'receptor', rec, seed=1, pairs=labels)
+    ligand, lig_values = parse(tmp_path, 'ligand', lig, seed=2, pairs=labels)
+    # The receptor and ligand keep the pairs of the complex
+    assert receptor.pair_labels() == [label for label in labels if label in rec_values['TDC']]
+    assert ligand.pair_labels() == [label for label in labels if label in lig_values['TDC']]
+
+    delta = PairDecompBinding(complex_output, receptor, ligand, decomp_input(idecomp=3), 'delta')
+    expected = {}
+    for token in TOKENS:
+        expected[token] = {}
+        for label in labels:
+            values = com_values[token][label].copy()
+            for other in (rec_values, lig_values):
+                if label in other[token]:
+                    values -= other[token][label]
+            expected[token][label] = values
+    assert_same_energies(stored_energies(delta), expected)
+    np.testing.assert_allclose(delta.mean, [np.array(list(expected[token].values())).mean(axis=1) for token in TOKENS],
+                               rtol=1e-12, atol=1e-12)
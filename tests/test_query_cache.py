@@ -0,0 +1,145 @@
+"""
+The queries of MMPBSA_API are cached in a QueryCache. These tests check the cache itself, and compare the cached
+queries with the same queries of an API without cache
+"""
+
+
+# ##############################################################################
+#                           GPLv3 LICENSE INFO                                 #
+#                                                                              #
+#  Copyright (C) 2020  Mario S. Valdes-Tresanco and Mario E. Valdes-Tresanco   #
+#  Copyright (C) 2014  Jason Swails, Bill Miller III, and Dwight McGee         #
+#                                                                              #
+#   Project: https://github.com/Valdes-Tresanco-MS/gmx_MMPBSA                  #
+#                                                                              #
+#   This program is free software; you can redistribute it and/or modify it    #
+#  under the terms of the GNU General Public License version 3 as published    #
+#  by the Free Software Foundation.                                            #
+#                                                                              #
+#  This program is distributed in the hope that it will be useful, but         #
+#  WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY  #
+#  or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License    #
+#  for more details.                                                           #
+# ##############################################################################
+
+
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from GMXMMPBSA import amber_outputs
+from GMXMMPBSA.API import MMPBSA_API, QueryCache
+from synthetic import decomp_input, residue_lists, write_decomp
+
+NUMFRAMES = 8
+MOLS = ('complex', 'receptor', 'ligand')
+
+
+def test_hits_and_misses():
+    cache = QueryCache()
+    calls = []
+    result = cache.get(('query', 1), lambda: calls.append(1) or np.arange(3))
+    assert cache.get(('query', 1), lambda: calls.append(1) or np.arange(3)) is result
+    cache.get(('query', 2), lambda: calls.append(2) or np.arange(3))
+    assert calls == [1, 2]
+    assert cache.info() == dict(hits=1, misses=2, entries=2, memory=2 * result.nbytes / 2 ** 20, max_memory=512)
+    cache.clear()
+    assert cache.info()['entries'] == 0 and cache.info()['memory'] == 0
+
+
+def test_least_recently_used_are_discarded():
+    # room for 2 results of 0.4 MB
+    cache = QueryCache(max_memory=1)
+    results = {key: cache.get(key, lambda: np.zeros(50000)) for key in 'abc'}
+    assert list(cache._entries) == ['b', 'c']
+    # b is used, so c is the next one discarded
+    assert cache.get('b', lambda: None) is results['b']
+    cache.get('d', lambda: np.zeros(50000))
+    assert list(cache._entries) == ['b', 'd']
+    assert cache.memory == 2 * results['b'].nbytes
+    # a result bigger than the cache is not kept
+    cache.get('e', lambda: np.zeros(200000))
+    assert list(cache._entries) == ['b', 'd']
+
+
+def test_pickled_cache_is_empty():
+    cache = QueryCache(64)
+    cache.get('a', lambda: 1)
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.max_memory == 64 and copy.info()['entries'] == 0
+
+
+def api(tmp_path, cache_memory):
+    """ API with the GB energies and the per-residue decomposition of synthetic results """
+    rng = np.random.default_rng(0)
+    INPUT = dict(decomp_input(), pb={'sander_apbs': 0})
+    INPUT['general'].update(endframe=NUMFRAMES)
+    energies, decomp = [], []
+    for mol, resl in zip(MOLS, residue_lists(4, 2)):
+        output = amber_outputs.GBout(mol, INPUT)
+        output.parse_from_arrays(f'{mol}_gb.mdout', [{key: rng.normal(0, 20, NUMFRAMES) for key in output.data_keys}],
+                                 NUMFRAMES)
+        energies.append(output)
+        basename = tmp_path.joinpath(f'{mol}_decomp.mdout').as_posix()
+        if not tmp_path.joinpath(f'{mol}_decomp.mdout.0').exists():
+            write_decomp(basename, (NUMFRAMES,), list(resl), seed=len(decomp))
+        output = amber_outputs.DecompOut(mol)
+        output.parse_from_file(basename, resl, INPUT, 0.0072, 1, NUMFRAMES)
+        decomp.append(output)
+    mmpbsa = MMPBSA_API({'cache_memory': cache_memory})
+    mmpbsa.setting_time()
+    mmpbsa.app_namespace = SimpleNamespace(INPUT=INPUT, FILES=SimpleNamespace(stability=False), numframes=NUMFRAMES,
+                                           numframes_nmode=0, size=1, INFO={'mut_str': ''})
+    mmpbsa.data = {'normal': {'gb': dict(zip(MOLS, energies), delta=amber_outputs.BindingStatistics(*energies))},
+                   'decomp_normal': {'gb': dict(zip(MOLS, decomp),
+                                                delta=amber_outputs.DecompBinding(*decomp, INPUT, 'delta'))}}
+    mmpbsa.frames = {i: i for i in range(1, NUMFRAMES + 1)}
+    mmpbsa.nmframes = {}
+    return mmpbsa
+
+
+def assert_same_results(expected, value):
+    if isinstance(expected, dict):
+        assert list(expected) == list(value)
+        for key in expected:
+            assert_same_results(expected[key], value[key])
+    elif isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(expected, value)
+    else:
+        assert expected == value
+
+
+QUERIES = [('get_energy', {}),
+           ('get_energy', dict(startframe=3, endframe=7, interval=2)),
+           ('get_energy', dict(mol=('delta',), term=['TOTAL', 'GGAS'], remove_empty_terms=False)),
+           ('get_decomp_energy', dict(res_threshold=0)),
+           ('get_decomp_energy', dict(startframe=2, endframe=6, res_threshold=1.0))]
+
+
+# the BDC of the decomposition is skipped with a warning (issue #269)
+@pytest.mark.filterwarnings('ignore:Warning. Empty BDC component')
+@pytest.mark.parametrize('query, options', QUERIES)
+def test_cached_query(tmp_path, query, options):
+    cached, uncached = api(tmp_path, 512), api(tmp_path, 0)
+    result = getattr(cached, query)(**options)
+    assert_same_results(getattr(uncached, query)(**options), result)
+    assert uncached.cache_info()['entries'] == 0
+    # the arguments are the key, not how they are passed, and verbose is not part of it
+    hits = cached.cache_info()['hits']
+    assert getattr(cached, query)(**options, verbose=False) is result
+    assert cached.cache_info()['hits'] == hits + 1
+    cached.setting_time()
+    assert getattr(cached, query)(**options) is not result
+
+
+def test_frame_windows(tmp_path):
+    mmpbsa = api(tmp_path, 512)
+    total = np.asarray(mmpbsa.data['normal']['gb']['delta']['TOTAL'])
+    for start, end, interval in ((None, None, 1), (2, 8, 3), (1, 4, 1), (2, 8, 3)):
+        summary = mmpbsa.get_energy(startframe=start, endframe=end, interval=interval)['summary']
+        values = total[(start or 1) - 1:end:interval]
+        assert summary['normal']['gb']['delta']['TOTAL']['Average'] == pytest.approx(values.mean(), rel=1e-12)
+        assert summary['normal']['gb']['delta']['TOTAL']['SD'] == pytest.approx(values.std(), rel=1e-12)